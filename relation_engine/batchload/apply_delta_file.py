@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+
+import argparse
+import getpass
+
+from relation_engine.batchload.graph_delta import GraphDelta, apply_graph_delta
+from relation_engine.batchload.arango_connection import connect
+from relation_engine.batchload.time_travelling_database import ArangoBatchTimeTravellingDB
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="""
+Apply a delta file, as written by relation_engine/taxa/taxa_release_diff.py, as a delta load in a
+data namespace.
+
+The latest load in the namespace must be the complete load of the release the delta file was
+calculated from, i.e. its load version must be the base version recorded in the delta file.
+""".strip())
+    parser.add_argument(
+        '--delta-file',
+        required=True,
+        help='the path to the delta file.')
+    parser.add_argument(
+        '--arango-url',
+        required=True,
+        help='The url of the ArangoDB server (e.g. http://localhost:8528). Multiple ' +
+        'comma separated urls may be supplied, in which case requests are distributed ' +
+        'across them round robin.')
+    parser.add_argument(
+        '--database',
+        required=True,
+        help='the name of the ArangoDB database that will be altered')
+    parser.add_argument(
+        '--user',
+        help='the ArangoDB user name; if --pwd-file is not included a password prompt will be ' +
+        'presented. Omit to connect with default credentials.')
+    parser.add_argument(
+        '--pwd-file',
+        help='the path to a file containing the ArangoDB password and nothing else; ' +
+        'if --user is included and --pwd-file is omitted a password prompt will be presented.')
+    parser.add_argument(
+        '--load-namespace',
+        required=True,
+        help='the name of the data that is being loaded, e.g. ncbi_taxa, gtdb_taxa, etc. ' +
+        'Must be unique across all load sources and consistent across loads.')
+    parser.add_argument(
+        '--load-registry-collection',
+        required=True,
+        help='the name of the ArangoDB collection where the load will be registered. ' +
+        'This is typically the same collection for all delta loaded data.')
+    parser.add_argument(
+        '--node-collection',
+        required=True,
+        help='the name of the ArangoDB collection into which nodes will be loaded')
+    parser.add_argument(
+        '--edge-collection',
+        required=True,
+        help='the name of the ArangoDB collection into which edges will be loaded')
+    parser.add_argument(
+        '--merge-edge-collection',
+        help='the name of the ArangoDB collection into which merge edges will be loaded. ' +
+        'Required if the delta file contains merges.')
+    parser.add_argument(
+        '--load-version',
+        required=True,
+        help='the version of this load. This version will be added to a field in the nodes and ' +
+             'edges and will be used as part of the _key field.')
+    parser.add_argument(
+        '--load-timestamp',
+        type=int,
+        required=True,
+        help='the timestamp to be applied to the load, in unix epoch milliseconds. Any nodes ' +
+             'or edges created in this load will start to exist with this time stamp. ' +
+             'NOTE: the user is responsible for ensuring this timestamp is greater than any ' +
+             'other timestamps previously used to load data into the namespace.')
+    parser.add_argument(
+        '--release-timestamp',
+        type=int,
+        required=True,
+        help='the timestamp, in unix epoch milliseconds, when the data was released ' +
+        'at the source.')
+
+    return parser.parse_args()
+
+
+def main():
+    a = parse_args()
+    delta = GraphDelta(a.delta_file)
+    pwd = None
+    if a.user:
+        if a.pwd_file:
+            with open(a.pwd_file) as pwd_file:
+                pwd = pwd_file.read().strip()
+        else:
+            pwd = getpass.getpass()
+    db = connect(a.arango_url.split(','), a.database, a.user, pwd)
+    attdb = ArangoBatchTimeTravellingDB(
+        db,
+        a.load_registry_collection,
+        a.node_collection,
+        default_edge_collection=a.edge_collection,
+        merge_collection=a.merge_edge_collection)
+
+    apply_graph_delta(a.load_namespace, delta, attdb, a.load_timestamp, a.release_timestamp,
+                      a.load_version)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+"""
+Creates python-arango database connections for the loaders with configurable HTTP settings.
+"""
+
+import gzip
+from urllib.parse import urlparse
+
+from arango import ArangoClient
+from arango.http import HTTPClient
+from arango.response import Response
+from requests import Session
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_REQUEST_TIMEOUT_SEC = 60
+# smaller bodies aren't worth the CPU to compress
+COMPRESS_MIN_BYTES = 64 * 1024
+# JSON compresses well even at the fastest level
+COMPRESS_LEVEL = 1
+
+# the endpoint used by import_bulk
+_IMPORT_PATH = '/_api/import'
+
+
+class LoaderHTTPClient(HTTPClient):
+    """
+    A python-arango HTTP client with a configurable connection pool size, keep alive, request
+    timeout, and request body compression.
+
+    The retry settings are the same as python-arango's default client.
+    """
+
+    def __init__(
+            self,
+            pool_size=DEFAULT_POOL_SIZE,
+            keep_alive=True,
+            request_timeout_sec=DEFAULT_REQUEST_TIMEOUT_SEC,
+            compress_requests=False):
+        """
+        pool_size - the maximum number of connections to keep open per host. Should be at least
+          the number of threads making requests concurrently.
+        keep_alive - False to close the connection after each request.
+        request_timeout_sec - the request timeout in seconds.
+        compress_requests - True to gzip large bulk import request bodies. The ArangoDB server
+          must support gzip Content-Encoding for requests.
+        """
+        if pool_size < 1:
+            raise ValueError('pool_size must be at least 1')
+        if request_timeout_sec <= 0:
+            raise ValueError('request_timeout_sec must be greater than 0')
+        self._pool_size = pool_size
+        self._keep_alive = keep_alive
+        self._request_timeout_sec = request_timeout_sec
+        self._compress_requests = compress_requests
+
+    def create_session(self, host):
+        retry_strategy = Retry(
+            total=3,
+            backoff_factor=1,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=["HEAD", "GET", "OPTIONS"],
+        )
+        # python-arango makes one session per host, so only one pool is needed per adapter
+        http_adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=self._pool_size, max_retries=retry_strategy)
+
+        session = Session()
+        session.mount("https://", http_adapter)
+        session.mount("http://", http_adapter)
+        if not self._keep_alive:
+            session.headers['Connection'] = 'close'
+        return session
+
+    def send_request(
+            self, session, method, url, headers=None, params=None, data=None, auth=None):
+        if self._compress(method, url, data):
+            data = gzip.compress(data.encode('utf-8'), compresslevel=COMPRESS_LEVEL)
+            headers = dict(headers or {})
+            headers['Content-Encoding'] = 'gzip'
+        response = session.request(
+            method=method,
+            url=url,
+            params=params,
+            data=data,
+            headers=headers,
+            auth=auth,
+            timeout=self._request_timeout_sec,
+        )
+        return Response(
+            method=method,
+            url=response.url,
+            headers=response.headers,
+            status_code=response.status_code,
+            status_text=response.reason,
+            raw_body=response.text,
+        )
+
+    def _compress(self, method, url, data):
+        return (self._compress_requests
+                and method == 'post'
+                and isinstance(data, str)
+                and len(data) >= COMPRESS_MIN_BYTES
+                and urlparse(url).path.endswith(_IMPORT_PATH))
+
+
+def connect(
+        urls,
+        database,
+        username=None,
+        password=None,
+        pool_size=DEFAULT_POOL_SIZE,
+        keep_alive=True,
+        request_timeout_sec=DEFAULT_REQUEST_TIMEOUT_SEC,
+        compress_requests=False):
+    """
+    Connect to an ArangoDB database.
+
+    urls - the URLs of one or more ArangoDB coordinators. Requests are distributed across the
+      coordinators round robin.
+    database - the name of the database.
+    username - the name of the user, if any. Omit to connect with default credentials.
+    password - the password for the user.
+    pool_size, keep_alive, request_timeout_sec, compress_requests - see LoaderHTTPClient.
+
+    Returns a python-arango database.
+    """
+    if isinstance(urls, str):
+        urls = [urls]
+    if not urls:
+        raise ValueError('At least one url is required')
+    client = ArangoClient(
+        hosts=list(urls),
+        host_resolver='roundrobin',
+        http_client=LoaderHTTPClient(
+            pool_size=pool_size,
+            keep_alive=keep_alive,
+            request_timeout_sec=request_timeout_sec,
+            compress_requests=compress_requests))
+    if username:
+        return client.db(database, username, password, verify=True)
+    return client.db(database, verify=True)
+
+
+def connect_from_config(cfg):
+    """
+    Connect to an ArangoDB database given a configuration object with the fields of the Arango
+    section of the loader configurations, e.g. relation_engine.taxa.config.DeltaLoaderConfig:
+    urls, database, username, password, pool_size, keep_alive, request_timeout_sec, and
+    compress_requests.
+
+    Returns a python-arango database.
+    """
+    return connect(
+        cfg.urls,
+        cfg.database,
+        username=cfg.username,
+        password=cfg.password,
+        pool_size=cfg.pool_size,
+        keep_alive=cfg.keep_alive,
+        request_timeout_sec=cfg.request_timeout_sec,
+        compress_requests=cfg.compress_requests)
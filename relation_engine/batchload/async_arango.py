@@ -0,0 +1,168 @@
+"""
+A minimal asyncio ArangoDB client supporting the requests made by the delta loader in its
+inner loops - AQL queries and bulk imports - against the ArangoDB REST API.
+
+python-arango is synchronous, so the loaders use it for everything else, e.g. checking the
+collections and indexes.
+"""
+
+import gzip
+import itertools
+import json
+
+import aiohttp
+
+from relation_engine.batchload.arango_connection import (
+    DEFAULT_POOL_SIZE,
+    DEFAULT_REQUEST_TIMEOUT_SEC,
+    COMPRESS_LEVEL,
+    COMPRESS_MIN_BYTES,
+)
+
+# large batches mean fewer round trips for big queries; the loader's queries are bounded by its
+# batch size anyway
+_CURSOR_BATCH_SIZE = 10000
+
+
+class AsyncArangoError(Exception):
+    """
+    An error returned by ArangoDB.
+
+    http_code - the HTTP status code of the response.
+    error_code - the ArangoDB error number, if any.
+    """
+
+    def __init__(self, message, http_code, error_code=None):
+        super().__init__(message)
+        self.http_code = http_code
+        self.error_code = error_code
+
+
+class AsyncArangoDatabase:
+    """
+    An asyncio client for an ArangoDB database.
+
+    The client must be closed when it is no longer needed, either by calling close() or by using
+    it as an async context manager. It must be created and used in the same event loop.
+    """
+
+    def __init__(
+            self,
+            urls,
+            database,
+            username=None,
+            password=None,
+            pool_size=DEFAULT_POOL_SIZE,
+            keep_alive=True,
+            request_timeout_sec=DEFAULT_REQUEST_TIMEOUT_SEC,
+            compress_requests=False):
+        """
+        urls - the URLs of one or more ArangoDB coordinators. Requests are distributed across the
+          coordinators round robin.
+        database - the name of the database.
+        username - the name of the user, if any. Omit to connect with default credentials.
+        password - the password for the user.
+        pool_size - the maximum number of concurrent connections across all coordinators. This
+          bounds the number of requests in flight.
+        keep_alive, request_timeout_sec, compress_requests - see
+          relation_engine.batchload.arango_connection.LoaderHTTPClient.
+        """
+        if isinstance(urls, str):
+            urls = [urls]
+        if not urls:
+            raise ValueError('At least one url is required')
+        if pool_size < 1:
+            raise ValueError('pool_size must be at least 1')
+        if request_timeout_sec <= 0:
+            raise ValueError('request_timeout_sec must be greater than 0')
+        self._urls = itertools.cycle([f'{u.rstrip("/")}/_db/{database}' for u in urls])
+        self._compress_requests = compress_requests
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=pool_size, force_close=not keep_alive),
+            timeout=aiohttp.ClientTimeout(total=request_timeout_sec),
+            auth=aiohttp.BasicAuth(username, password or '') if username else None,
+        )
+
+    async def close(self):
+        """
+        Close the client's connections.
+        """
+        await self._session.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def aql(self, query, bind_vars=None):
+        """
+        Run an AQL query and return the results as a list, fetching all the cursor batches.
+
+        query - the AQL query.
+        bind_vars - a dict of the query's bind variables.
+        """
+        # cursors are bound to the coordinator that created them
+        url = next(self._urls)
+        res = await self._request('post', url + '/_api/cursor', json={
+            'query': query,
+            'bindVars': bind_vars or {},
+            'batchSize': _CURSOR_BATCH_SIZE,
+        })
+        results = res['result']
+        try:
+            while res.get('hasMore'):
+                res = await self._request('put', f'{url}/_api/cursor/{res["id"]}')
+                results.extend(res['result'])
+        except BaseException:
+            if res.get('hasMore'):
+                # don't leave the cursor open on the server until it times out
+                await self._request('delete', f'{url}/_api/cursor/{res["id"]}', ignore_errors=True)
+            raise
+        return results
+
+    async def import_bulk(self, collection, documents, on_duplicate='error'):
+        """
+        Import documents into a collection in one request.
+
+        collection - the name of the collection.
+        documents - the documents to import.
+        on_duplicate - the action to take on a document key collision, one of error, update,
+          replace, or ignore.
+
+        Returns the result of the import as a dict, with the created, errors, empty, updated,
+        ignored, and details keys.
+        """
+        data = '\n'.join(json.dumps(d) for d in documents)
+        headers = {'Content-Type': 'application/x-ldjson'}
+        if self._compress_requests and len(data) >= COMPRESS_MIN_BYTES:
+            data = gzip.compress(data.encode('utf-8'), compresslevel=COMPRESS_LEVEL)
+            headers['Content-Encoding'] = 'gzip'
+        return await self._request(
+            'post',
+            next(self._urls) + '/_api/import',
+            params={
+                'collection': collection,
+                'type': 'documents',
+                'onDuplicate': on_duplicate,
+                'details': 'true',
+            },
+            data=data,
+            headers=headers,
+        )
+
+    async def _request(self, method, url, ignore_errors=False, **kwargs):
+        async with self._session.request(method, url, **kwargs) as resp:
+            try:
+                body = await resp.json(content_type=None)
+            except ValueError:
+                body = None
+            if resp.status < 300 or ignore_errors:
+                return body
+            if isinstance(body, dict) and body.get('error'):
+                raise AsyncArangoError(
+                    f'[HTTP {resp.status}][ERR {body.get("errorNum")}] '
+                    + f'{body.get("errorMessage")}',
+                    resp.status,
+                    body.get('errorNum'))
+            raise AsyncArangoError(f'[HTTP {resp.status}] {resp.reason}', resp.status)
@@ -0,0 +1,214 @@
+"""
+An asyncio version of the time travelling database interface in time_travelling_database for
+the delta loader's requests, which allows many lookups and bulk writes to be in flight at once
+from a single thread.
+
+The collection and index checks and the load registry operations happen once per load and use
+the synchronous python-arango implementation.
+"""
+
+import asyncio as _asyncio
+
+import aiohttp as _aiohttp
+
+from relation_engine.batchload.async_arango import AsyncArangoError as _AsyncArangoError
+from relation_engine.batchload.time_travelling_database import (
+    BatchUpdater as _BatchUpdater,
+    TRANSIENT_HTTP_CODES as _TRANSIENT_HTTP_CODES,
+    documents_by_id as _documents_by_id,
+    get_failed_documents as _get_failed_documents,
+)
+
+
+class AsyncArangoBatchTimeTravellingDB:
+    """
+    An asyncio wrapper around ArangoBatchTimeTravellingDB. The methods have the same names,
+    arguments, and return values as the synchronous methods, but the methods that access the
+    database are coroutines.
+
+    Only the methods required by delta_load.load_graph_delta_async are provided.
+    """
+
+    def __init__(self, database, async_database):
+        """
+        database - an ArangoBatchTimeTravellingDB configured with the collections to use.
+        async_database - a relation_engine.batchload.async_arango.AsyncArangoDatabase for the
+          same ArangoDB database.
+        """
+        self._db = database
+        self._adb = async_database
+
+    def get_registry_collection(self):
+        """
+        Returns the name of the registry collection.
+        """
+        return self._db.get_registry_collection()
+
+    def get_vertex_collection(self):
+        """
+        Returns the name of the vertex collection.
+        """
+        return self._db.get_vertex_collection()
+
+    def get_default_edge_collection(self):
+        """
+        Returns the name of the default edge collection or None.
+        """
+        return self._db.get_default_edge_collection()
+
+    def get_edge_collections(self):
+        """
+        Returns the names of all the registered edge collections as a list, including the default
+        edge collection, if any. Does not include the merge collection.
+        """
+        return self._db.get_edge_collections()
+
+    def get_merge_collection(self):
+        """
+        Return the name of the merge collection or None if no merge collection was registered.
+        """
+        return self._db.get_merge_collection()
+
+    async def register_load_start(
+            self,
+            load_namespace,
+            load_version,
+            timestamp,
+            release_timestamp,
+            current_time):
+        """
+        See ArangoBatchTimeTravellingDB.register_load_start.
+        """
+        await _asyncio.to_thread(
+            self._db.register_load_start,
+            load_namespace, load_version, timestamp, release_timestamp, current_time)
+
+    async def register_load_complete(self, load_namespace, load_version, current_time):
+        """
+        See ArangoBatchTimeTravellingDB.register_load_complete.
+        """
+        await _asyncio.to_thread(
+            self._db.register_load_complete, load_namespace, load_version, current_time)
+
+    async def get_registered_loads(self, load_namespace):
+        """
+        See ArangoBatchTimeTravellingDB.get_registered_loads.
+        """
+        return await _asyncio.to_thread(self._db.get_registered_loads, load_namespace)
+
+    async def get_vertices(self, ids, timestamp):
+        """
+        See ArangoBatchTimeTravellingDB.get_vertices.
+        """
+        return await self._get_documents(ids, timestamp, self._db.get_vertex_collection())
+
+    async def get_edges(self, ids, timestamp, edge_collection=None):
+        """
+        See ArangoBatchTimeTravellingDB.get_edges.
+        """
+        return await self._get_documents(
+            ids, timestamp, self._db.get_edge_collection_name(edge_collection))
+
+    async def _get_documents(self, ids, timestamp, collection_name):
+        aql, bind_vars = self._db.get_documents_query(ids, timestamp, collection_name)
+        docs = await self._adb.aql(aql, bind_vars=bind_vars)
+        return _documents_by_id(docs, timestamp, collection_name)
+
+    async def expire_extant_vertices_without_last_version(
+            self, timestamp, release_timestamp, version):
+        """
+        See ArangoBatchTimeTravellingDB.expire_extant_vertices_without_last_version.
+        """
+        await self._expire_extant_document_without_last_version(
+            timestamp, release_timestamp, version, self._db.get_vertex_collection())
+
+    async def expire_extant_edges_without_last_version(
+            self,
+            timestamp,
+            release_timestamp,
+            version,
+            edge_collection=None):
+        """
+        See ArangoBatchTimeTravellingDB.expire_extant_edges_without_last_version.
+        """
+        await self._expire_extant_document_without_last_version(
+            timestamp, release_timestamp, version,
+            self._db.get_edge_collection_name(edge_collection))
+
+    async def _expire_extant_document_without_last_version(
+            self,
+            timestamp,
+            release_timestamp,
+            version,
+            collection_name):
+        aql, bind_vars = self._db.get_expire_query(
+            timestamp, release_timestamp, version, collection_name)
+        await self._adb.aql(aql, bind_vars=bind_vars)
+
+    def get_batch_updater(self, edge_collection_name=None):
+        """
+        Get a batch updater for a collection. Updates can be added to the updater and then
+        applied at once.
+
+        edge_collection_name - the name of the edge collection that will be updated. If not
+          provided the vertex collection is used.
+
+        Returns an AsyncBatchUpdater.
+        """
+        b = self._db.get_batch_updater(edge_collection_name)
+        return AsyncBatchUpdater(b.get_arango_collection(), self._adb, b.is_edge, b.get_metrics())
+
+    def get_import_metrics(self):
+        """
+        Get the bulk import metrics as a dict. The metrics are shared with the synchronous
+        database; see ArangoBatchTimeTravellingDB.get_import_metrics().
+        """
+        return self._db.get_import_metrics()
+
+
+class AsyncBatchUpdater(_BatchUpdater):
+    """
+    A BatchUpdater where update() is a coroutine.
+    """
+
+    def __init__(self, collection, async_database, edge=False, metrics=None):
+        """
+        Do not create this class directly - call
+        AsyncArangoBatchTimeTravellingDB.get_batch_updater().
+
+        collection - the python-arango collection where updates will be applied.
+        async_database - the AsyncArangoDatabase to use to apply the updates.
+        edge - True if the collection is an edge collection.
+        metrics - an ImportMetrics instance in which to record imports and retries.
+        """
+        super().__init__(collection, edge, metrics)
+        self._adb = async_database
+
+    async def update(self):
+        """
+        Apply the updates collected so far and clear the update list.
+
+        Failures are retried as for BatchUpdater.update(). Unlike BatchUpdater, the update list
+        is cleared even if the updates fail.
+        """
+        # swap the list before awaiting so the updater can be reused while the request is in
+        # flight
+        docs, self._updates = self._updates, []
+        attempt = 1
+        while True:
+            self._metrics.add('imports')
+            res = None
+            try:
+                res = await self._adb.import_bulk(
+                    self.get_collection(), docs, on_duplicate='update')
+                err = None
+                docs = _get_failed_documents(docs, res, self.get_collection())
+            except (_AsyncArangoError, _aiohttp.ClientError, _asyncio.TimeoutError) as e:
+                if isinstance(e, _AsyncArangoError) and e.http_code not in _TRANSIENT_HTTP_CODES:
+                    raise
+                err = e
+            if not err and not docs:
+                return
+            delay = self._next_attempt(attempt, docs, res, err)
+            attempt += 1
+            await _asyncio.sleep(delay)
@@ -8,11 +8,23 @@ the load timestamp are not reproducible as the load may be partially complete. L
 take this into account and take measures to prevent it.
 """
 
+import asyncio as _asyncio
 from collections import defaultdict as _defaultdict
+from collections import deque as _deque
+from concurrent.futures import ThreadPoolExecutor as _ThreadPoolExecutor
 import datetime as _dt
+import hashlib as _hashlib
 import itertools as _itertools
+import json as _json
+import os as _os
+import pickle as _pickle
+import tempfile as _tempfile
 import time as _time
 
+from relation_engine.batchload.sorted_join import external_sort as _external_sort
+from relation_engine.batchload.sorted_join import check_sorted as _check_sorted
+from relation_engine.batchload.sorted_join import sorted_join as _sorted_join
+
 
 # TODO TEST
 # TODO DOCS document reserved fields that will be overwritten if supplied
@@ -21,8 +33,11 @@ import time as _time
 # algorithm. Remove _VERBOSE prints at that point
 
 # TODO CODE consider threading / multiprocessing here. Virtually all the time is db access
+# load_graph_delta_async is an asyncio alternative. Edge lookups and updates are made
+# concurrently across edge collections
 
 _VERBOSE = False
+_EXPIRE_BATCH_SIZE = 10000
 _ID = 'id'
 _KEY = '_key'
 
@@ -36,7 +51,15 @@ def load_graph_delta(
         release_timestamp,
         load_version,
         merge_source=None,
-        batch_size=10000):
+        batch_size=10000,
+        sweep_concurrency=4,
+        max_writes_in_flight=4,
+        touch_free=False,
+        state_cache=None,
+        sorted_join=False,
+        sources_sorted=False,
+        sort_temp_dir=None,
+        deletions=None):
     """
     Loads a new version of a graph into a graph database, calculating the delta between the graphs
     and expiring / creating new vertices and edges as neccessary.
@@ -64,45 +87,610 @@ def load_graph_delta(
          loads in which it exists). 'from' and 'to' fields are required that identify the vertices
          where the edge originates (the merged vertex) and terminates (the vertex the old vertex
          was merged into). If merge_source is specified, the database must have a merge collection
-         specified.
+         specified. Each vertex may only be merged once. Chains of merges are resolved such that
+         the merged vertex is merged into the final target in the chain. The merge source is
+         read into memory before the load starts.
     batch_size - the number of vertices or edges to process per batch. Higher batch sizes typically
       decrease processing time and increase memory usage.
+    sweep_concurrency - the maximum number of edge collections to expire concurrently after the
+      edges are loaded.
+    max_writes_in_flight - the maximum number of batches to write concurrently when the load is
+      the first load for the namespace.
+    touch_free - True to avoid writing to unchanged vertices and edges. The loader keeps the keys
+      of the unchanged documents in memory, rather than setting the last version field on them,
+      and then expires the extant documents that were not seen in the load. The last version
+      field of a document is then the version of the last load that created the document or
+      set the field, and rolling back the load works as usual. Memory use is proportional to the
+      number of unchanged documents.
+    state_cache - a batchload.load_state_cache.LoadStateCache in which to record the state of
+      the namespace after the load. If the cache contains the state after the latest completed
+      load in the namespace, the changes are calculated against the cache rather than the
+      database, and the load is touch free.
+    sorted_join - True to calculate the changes by streaming all the extant documents in each
+      collection from the database sorted by ID and joining them to the sources sorted by ID,
+      rather than looking up the documents in each batch. Documents that are not in the sources
+      fall out of the join, so the collections are not swept afterwards, and the load is touch
+      free. Vertices referenced by new or moved edges are still looked up. Memory use is
+      proportional to the number of created and deleted vertices. Cannot be combined with a
+      state cache. IDs must sort the same way in ArangoDB, which uses its configured
+      collation, and Python, or the load fails.
+    sources_sorted - True if the vertex source is sorted by ID and the edge source by the
+      _collection field, or the default edge collection if absent, and then by ID. Otherwise the
+      sources are sorted on disk for a sorted join. The sort order is checked during the load.
+    sort_temp_dir - the directory in which to sort the sources. Defaults to the system temporary
+      directory.
+    deletions - if provided, the sources only contain the vertices and edges that were created
+      or changed since the previous load, and this object provides the vertices and edges that
+      were deleted, as for batchload.graph_delta.GraphDelta. It must have a
+      deleted_vertex_ids() method that returns an iterable of vertex IDs and a deleted_edges()
+      method that returns an iterable of (edge collection, edge ID) tuples, where the collection
+      is None for the default collection. Only the documents in the sources and deletions are
+      looked up and no collections are swept. The load is touch free. Edges must be included in
+      the edge source if their vertices changed. Cannot be combined with a state cache or a
+      sorted join, or used for the first load of a namespace.
+
+    If the namespace has no registered loads and the collections are empty, the graph is
+    loaded without looking up existing vertices and edges or expiring documents, and batches are
+    written concurrently. The IDs of the vertices are held in memory to check the edges.
+
+    Returns a dict of collection name to the time in seconds taken to sweep the collection for
+    the documents that are not in the load. The dict is empty for loads that don't sweep the
+    collections, i.e. the first load, sorted join loads, and loads with deletions.
     """
+    _check_sweep_concurrency(sweep_concurrency)
+    if max_writes_in_flight < 1:
+        raise ValueError('max_writes_in_flight must be at least 1')
     db = database
     if merge_source and not db.get_merge_collection():
         raise ValueError('A merge source is specified but the database ' +
                          'has no merge collection')
-    db.register_load_start(
-        load_namespace, load_version, timestamp, release_timestamp, _get_current_timestamp())
+    if sorted_join and state_cache:
+        raise ValueError('sorted_join and state_cache cannot both be specified')
+    if deletions and (sorted_join or state_cache):
+        raise ValueError('deletions cannot be combined with sorted_join or state_cache')
+    resolver = _MergeResolver(merge_source) if merge_source else None
+    loads = db.get_registered_loads(load_namespace)
+    first_load = not loads and db.is_empty()
+    if deletions and first_load:
+        raise ValueError('deletions cannot be applied to the first load of a namespace')
+    cached = False
+    sweep_times = {}
+    if state_cache:
+        prev = loads[0] if loads and loads[0]['state'] == 'complete' else None
+        cached = state_cache.begin(
+            load_namespace, prev, db.get_vertex_collection(), db.get_edge_collections())
+    try:
+        db.register_load_start(
+            load_namespace, load_version, timestamp, release_timestamp, _get_current_timestamp())
+        if first_load:
+            _process_first_load(
+                db, vertex_source, edge_source, resolver, timestamp, release_timestamp,
+                load_version, batch_size, max_writes_in_flight, state_cache)
+        elif deletions:
+            _process_partial(
+                db, vertex_source, edge_source, deletions, resolver, timestamp,
+                release_timestamp, load_version, batch_size)
+        elif sorted_join:
+            _process_sorted_join(
+                db, vertex_source, edge_source, resolver, timestamp, release_timestamp,
+                load_version, batch_size, sources_sorted, sort_temp_dir)
+        else:
+            sweep_times = _process_delta(
+                db, vertex_source, edge_source, resolver, timestamp, release_timestamp,
+                load_version, batch_size, sweep_concurrency, touch_free, state_cache, cached)
+        db.register_load_complete(load_namespace, load_version, _get_current_timestamp())
+    except BaseException:
+        if state_cache:
+            state_cache.abort()
+        raise
+    if state_cache:
+        state_cache.commit(db.get_registered_loads(load_namespace)[0])
+    return sweep_times
+
 
-    _process_verts(db, vertex_source, timestamp, release_timestamp, load_version, batch_size)
-    if merge_source:
-        _process_merges(db, merge_source, timestamp, release_timestamp, load_version, batch_size)
+def _process_delta(
+        db,
+        vertex_source,
+        edge_source,
+        resolver,
+        timestamp,
+        release_timestamp,
+        load_version,
+        batch_size,
+        sweep_concurrency,
+        touch_free,
+        state,
+        cached):
+    seen = _SeenKeys(db) if touch_free and not cached else None
+    # expires the documents that were not in this load without the last_version field
+    expirer = _CachedStateExpirer(db, state) if cached else seen
+    if cached:
+        _process_verts_cached(
+            db, state, vertex_source, timestamp, release_timestamp, load_version, batch_size)
+    else:
+        _process_verts(db, vertex_source, timestamp, release_timestamp, load_version, batch_size,
+                       seen, state)
+    if resolver:
+        _process_merges(
+            db, resolver, timestamp, release_timestamp, load_version, batch_size, state)
 
     if _VERBOSE:
         print(f'expiring vertices: {_time.time()}')
-    db.expire_extant_vertices_without_last_version(
-        timestamp - 1, release_timestamp - 1, load_version)
+    if expirer:
+        expire_verts = expirer.expire_unseen_vertices
+    else:
+        expire_verts = db.expire_extant_vertices_without_last_version
+    # returns the sweep times
+    times = _run_sweeps({db.get_vertex_collection(): lambda _: expire_verts(
+        timestamp - 1, release_timestamp - 1, load_version)}, 1)
 
-    _process_edges(db, edge_source, timestamp, release_timestamp, load_version, batch_size)
+    _process_edges(db, edge_source, timestamp, release_timestamp, load_version, batch_size,
+                   seen, state, cached)
 
     if _VERBOSE:
         print(f'expiring edges: {_time.time()}')
-    for col in db.get_edge_collections():
-        db.expire_extant_edges_without_last_version(
-            timestamp - 1, release_timestamp - 1,  load_version, edge_collection=col)
+    if expirer:
+        expire_edges = expirer.expire_unseen_edges
+    else:
+        expire_edges = db.expire_extant_edges_without_last_version
+    times.update(_run_sweeps({col: lambda c: expire_edges(
+        timestamp - 1, release_timestamp - 1,  load_version, edge_collection=c)
+        for col in db.get_edge_collections()}, sweep_concurrency))
+    return times
+
+
+def _process_partial(
+        db,
+        vertex_source,
+        edge_source,
+        deletions,
+        resolver,
+        timestamp,
+        release_timestamp,
+        load_version,
+        batch_size):
+    # unchanged documents are expected to be rare, and are left as they are
+    seen = _SeenKeys(db)
+    _process_verts(
+        db, vertex_source, timestamp, release_timestamp, load_version, batch_size, seen)
+    if resolver:
+        _process_merges(db, resolver, timestamp, release_timestamp, load_version, batch_size)
+    if _VERBOSE:
+        print(f'expiring deleted vertices: {_time.time()}')
+    for ids in _chunkiter(deletions.deleted_vertex_ids(), batch_size):
+        bulk = db.get_batch_updater()
+        # merged vertices are already expired and so won't be found
+        for v in db.get_vertices(list(ids), timestamp).values():
+            bulk.expire_vertex(v[_KEY], timestamp - 1, release_timestamp - 1)
+        bulk.update()
+    _process_edges(
+        db, edge_source, timestamp, release_timestamp, load_version, batch_size, seen)
+    if _VERBOSE:
+        print(f'expiring deleted edges: {_time.time()}')
+    for edges in _chunkiter(deletions.deleted_edges(), batch_size):
+        bycol = _defaultdict(list)
+        for col, id_ in edges:
+            bycol[col or db.get_default_edge_collection()].append(id_)
+        for col, ids in bycol.items():
+            bulk = db.get_batch_updater(col)
+            for e in db.get_edges(ids, timestamp, edge_collection=col).values():
+                bulk.expire_edge(e, timestamp - 1, release_timestamp - 1)
+            bulk.update()
+
+
+def _process_sorted_join(
+        db,
+        vertex_source,
+        edge_source,
+        resolver,
+        timestamp,
+        release_timestamp,
+        load_version,
+        batch_size,
+        sources_sorted,
+        sort_temp_dir):
+    def id_key(d):
+        return d[_ID]
+
+    def edge_key(e):
+        return (e.get('_collection') or db.get_default_edge_collection(), e[_ID])
+
+    if not sources_sorted:
+        vertex_source = _external_sort(vertex_source, id_key, temp_dir=sort_temp_dir)
+        edge_source = _external_sort(edge_source, edge_key, temp_dir=sort_temp_dir)
+    created, deleted = _process_verts_sorted_join(
+        db, vertex_source, id_key, timestamp, release_timestamp, load_version, batch_size)
+    merged = set()
+    if resolver:
+        # the merged vertices aren't in the source, so expiring them is deferred until here
+        merged = set(_process_merges(
+            db, resolver, timestamp, release_timestamp, load_version, batch_size))
+    expire = [k for id_, k in deleted.items() if id_ not in merged]
+    if _VERBOSE:
+        print(f'expiring {len(expire)} vertices: {_time.time()}')
+    for keys in _chunkiter(expire, _EXPIRE_BATCH_SIZE):
+        bulk = db.get_batch_updater()
+        for k in keys:
+            bulk.expire_vertex(k, timestamp - 1, release_timestamp - 1)
+        bulk.update()
+
+    edge_source = _check_sorted(edge_source, edge_key, 'the edge source')
+    groups = _itertools.groupby(edge_source, key=lambda e: edge_key(e)[0])
+    group = next(groups, None)
+    for col in sorted(db.get_edge_collections()):
+        if group and group[0] < col:
+            break  # not a registered collection
+        matched = group and group[0] == col
+        _process_edges_sorted_join(db, col, group[1] if matched else (), created, deleted,
+                                   timestamp, release_timestamp, load_version, batch_size)
+        if matched:
+            # the group's edges must be consumed before advancing
+            group = next(groups, None)
+    if group:
+        raise ValueError(f'Edge collection {group[0]} was not registered at initialization')
+
+
+def _process_verts_sorted_join(
+        db, vertex_source, id_key, timestamp, release_timestamp, load_version, batch_size):
+    """
+    Join the vertex source to the extant vertices, creating new vertices, and replacing and
+    expiring changed vertices.
+
+    Returns the set of the IDs of the created vertices and a dict of ID to key for the extant
+    vertices that are not in the source, which have not been expired.
+    """
+    created = set()
+    deleted = {}
+    pairs = _sorted_join(
+        vertex_source, db.get_extant_vertices_by_id(timestamp), id_key,
+        'the vertex source', f'the extant vertices in collection {db.get_vertex_collection()}')
+    count = 1
+    for batch in _chunkiter(pairs, batch_size):
+        if _VERBOSE:
+            print(f'vertex batch {count}: {_time.time()}')
+        count += 1
+        bulk = db.get_batch_updater()
+        for v, dbv in batch:
+            if not v:
+                deleted[dbv[_ID]] = dbv[_KEY]
+            elif not dbv or not _special_equal(v, dbv):
+                if dbv:
+                    bulk.expire_vertex(dbv[_KEY], timestamp - 1, release_timestamp - 1)
+                bulk.create_vertex(v[_ID], load_version, timestamp, release_timestamp, v)
+                created.add(v[_ID])
+        if _VERBOSE:
+            print(f'  updating {bulk.count()} vertices: {_time.time()}')
+        bulk.update()
+    return created, deleted
 
-    db.register_load_complete(load_namespace, load_version, _get_current_timestamp())
+
+def _process_edges_sorted_join(
+        db,
+        collection,
+        edge_source,
+        created,
+        deleted,
+        timestamp,
+        release_timestamp,
+        load_version,
+        batch_size):
+    """
+    Join the edges in the source for a collection to the extant edges in the collection,
+    creating new edges, replacing and expiring changed edges, and expiring edges that are not in
+    the source.
+
+    An edge's vertices are known without a lookup if they were created in this load or the
+    extant edge points to the same vertices, which were not expired.
+    """
+    pairs = _sorted_join(
+        edge_source, db.get_extant_edges_by_id(timestamp, edge_collection=collection),
+        lambda e: e[_ID], f'the edge source for collection {collection}',
+        f'the extant edges in collection {collection}')
+    count = 1
+    for batch in _chunkiter(pairs, batch_size):
+        batch = list(batch)
+        if _VERBOSE:
+            print(f'edge batch {count} for collection {collection}: {_time.time()}')
+        count += 1
+        keys = {e[end] for e, dbe in batch if e for end in ('from', 'to')
+                if not _is_known_vertex(e, dbe, end, created, deleted)}
+        if _VERBOSE:
+            print(f'  looking up {len(keys)} vertices: {_time.time()}')
+        dbverts = db.get_vertices(list(keys), timestamp) if keys else {}
+
+        def vertex(e, dbe, end):
+            if e[end] in created:
+                return db.get_vertex_reference(e[end], load_version)
+            if _is_known_vertex(e, dbe, end, created, deleted):
+                return {'_id': dbe['_' + end], _ID: e[end]}
+            return dbverts[e[end]]
+
+        bulk = db.get_batch_updater(collection)
+        for e, dbe in batch:
+            if not e:
+                bulk.expire_edge(dbe, timestamp - 1, release_timestamp - 1)
+                continue
+            e.pop('_collection', None)
+            from_ = vertex(e, dbe, 'from')
+            to = vertex(e, dbe, 'to')
+            if (dbe and _special_equal(e, dbe) and
+                    dbe['_from'] == from_['_id'] and dbe['_to'] == to['_id']):
+                continue
+            if dbe:
+                bulk.expire_edge(dbe, timestamp - 1, release_timestamp - 1)
+            bulk.create_edge(e[_ID], from_, to, load_version, timestamp, release_timestamp, e)
+        if _VERBOSE:
+            print(f'  updating {bulk.count()} edges: {_time.time()}')
+        bulk.update()
+
+
+def _is_known_vertex(edge, dbedge, end, created, deleted):
+    id_ = edge[end]
+    if id_ in created:
+        return True
+    return bool(dbedge) and dbedge[end] == id_ and id_ not in deleted
+
+
+def _check_sweep_concurrency(sweep_concurrency):
+    if sweep_concurrency < 1:
+        raise ValueError('sweep_concurrency must be at least 1')
+
+
+def _run_sweeps(sweeps, concurrency):
+    """
+    Run full collection sweeps concurrently.
+
+    sweeps - a dict of collection name to a function that sweeps the collection. The function
+      is passed the collection name.
+    concurrency - the maximum number of sweeps to run at once.
+
+    Returns a dict of collection name to the time taken to sweep the collection in seconds.
+    """
+    def sweep(col):
+        t = _time.time()
+        sweeps[col](col)
+        t = _time.time() - t
+        if _VERBOSE:
+            print(f'  swept {col} in {t:.3f}s: {_time.time()}')
+        return t
+
+    if not sweeps:
+        return {}
+    with _ThreadPoolExecutor(max_workers=min(concurrency, len(sweeps))) as ex:
+        return dict(zip(sweeps, ex.map(sweep, sweeps)))
 
 
 def _get_current_timestamp():
     return int(_dt.datetime.now(tz=_dt.timezone.utc).timestamp() * 1000)
 
 
-def _process_verts(db, vertex_source, timestamp, release_timestamp, load_version, batch_size):
+def _process_first_load(
+        db,
+        vertex_source,
+        edge_source,
+        resolver,
+        timestamp,
+        release_timestamp,
+        load_version,
+        batch_size,
+        max_writes_in_flight,
+        state):
+    """
+    Create all the vertices and edges without looking up existing documents, which is only
+    correct for empty collections.
+
+    The IDs of the vertices are kept in memory so that edges to vertices that are not in the
+    load, or are merged, fail as they do in a delta load.
+    """
+    if _VERBOSE:
+        print(f'first load for namespace, creating vertices: {_time.time()}')
+    vertex_ids = set()
+    with _ThreadPoolExecutor(max_workers=max_writes_in_flight) as ex:
+        writes = _BoundedWrites(ex, max_writes_in_flight)
+        for vertgen in _chunkiter(vertex_source, batch_size):
+            bulk = db.get_batch_updater(insert_only=True)
+            rows = []
+            for v in vertgen:
+                vertex_ids.add(v[_ID])
+                key = bulk.create_vertex(v[_ID], load_version, timestamp, release_timestamp, v)
+                if state:
+                    rows.append(_vertex_row(db, v, key, load_version))
+            writes.submit(bulk)
+            if state:
+                state.add_vertices(rows)
+        writes.wait()
+
+        # The merged vertices may be in the vertex source, so this needs lookups to be correct,
+        # but there are far fewer merges than vertices.
+        if resolver:
+            vertex_ids.difference_update(_process_merges(
+                db, resolver, timestamp, release_timestamp, load_version, batch_size, state))
+
+        if _VERBOSE:
+            print(f'creating edges: {_time.time()}')
+        for edgegen in _chunkiter(edge_source, batch_size):
+            bulkset = {}
+            rows = _defaultdict(list)
+            for e in edgegen:
+                col = e.pop('_collection', None)
+                if not col:
+                    col = db.get_default_edge_collection()
+                if col not in bulkset:
+                    bulkset[col] = db.get_batch_updater(col, insert_only=True)
+                for vid in (e['from'], e['to']):
+                    if vid not in vertex_ids:
+                        raise ValueError(f'Edge {e[_ID]} in collection {col} refers to vertex '
+                                         + f'{vid}, which is not an extant vertex in the load')
+                from_ = db.get_vertex_reference(e['from'], load_version)
+                to = db.get_vertex_reference(e['to'], load_version)
+                key = bulkset[col].create_edge(
+                    e[_ID], from_, to, load_version, timestamp, release_timestamp, e)
+                if state:
+                    rows[col].append(_edge_row(e, key, from_['_id'], to['_id']))
+            for b in bulkset.values():
+                writes.submit(b)
+            for col, r in rows.items():
+                state.add_edges(col, r)
+        writes.wait()
+
+
+class _BoundedWrites:
+    """
+    Applies batch updates on an executor, limiting the number in flight.
+    """
+
+    def __init__(self, executor, max_in_flight):
+        self._ex = executor
+        self._max = max_in_flight
+        self._futures = _deque()
+
+    def submit(self, batch_updater):
+        """
+        Submit a batch updater to be applied, waiting for the oldest write first if the maximum
+        number of writes are in flight. Throws the error from the waited for write, if any.
+        """
+        while len(self._futures) >= self._max:
+            self._futures.popleft().result()
+        self._futures.append(self._ex.submit(batch_updater.update))
+
+    def wait(self):
+        """
+        Wait for all submitted writes to complete. Throws the first error, if any.
+        """
+        while self._futures:
+            self._futures.popleft().result()
+
+
+class _SeenKeys:
+    """
+    Records the keys of the unchanged documents in a load, and expires the extant documents that
+    were not seen, for touch free loads.
+    """
+
+    def __init__(self, db):
+        self._db = db
+        self._vertices = set()
+        self._edges = _defaultdict(set)
+
+    def add_vertex(self, key):
+        """
+        Record that a vertex was seen in the load.
+        """
+        self._vertices.add(key)
+
+    def add_edge(self, key, edge_collection):
+        """
+        Record that an edge was seen in the load.
+        """
+        self._edges[edge_collection].add(key)
+
+    def expire_unseen_vertices(self, timestamp, release_timestamp, version):
+        """
+        Expire extant vertices that were neither seen nor created in this load, with the same
+        arguments as ArangoBatchTimeTravellingDB.expire_extant_vertices_without_last_version().
+        The seen vertices are discarded.
+        """
+        seen, self._vertices = self._vertices, set()
+        bulk = self._db.get_batch_updater()
+        for v in self._db.get_extant_vertices_without_last_version(timestamp, version):
+            if v[_KEY] not in seen:
+                bulk.expire_vertex(v[_KEY], timestamp, release_timestamp)
+                self._update_if_full(bulk)
+        bulk.update()
+
+    def expire_unseen_edges(self, timestamp, release_timestamp, version, edge_collection):
+        """
+        Expire extant edges that were neither seen nor created in this load, with the same
+        arguments as ArangoBatchTimeTravellingDB.expire_extant_edges_without_last_version().
+        The seen edges for the collection are discarded.
+
+        This method may be called concurrently for different edge collections.
+        """
+        seen = self._edges.pop(edge_collection, set())
+        bulk = self._db.get_batch_updater(edge_collection)
+        for e in self._db.get_extant_edges_without_last_version(
+                timestamp, version, edge_collection=edge_collection):
+            if e[_KEY] not in seen:
+                bulk.expire_edge(e, timestamp, release_timestamp)
+                self._update_if_full(bulk)
+        bulk.update()
+
+    def _update_if_full(self, bulk):
+        _update_if_full(bulk)
+
+
+class _CachedStateExpirer:
+    """
+    Expires the extant documents that were in the cached state of the previous load but not
+    in the current load, without querying the database.
+    """
+
+    def __init__(self, db, state):
+        self._db = db
+        self._state = state
+
+    def expire_unseen_vertices(self, timestamp, release_timestamp, version):
+        """
+        As for _SeenKeys.
+        """
+        bulk = self._db.get_batch_updater()
+        for key in self._state.get_unseen_vertices():
+            bulk.expire_vertex(key, timestamp, release_timestamp)
+            _update_if_full(bulk)
+        bulk.update()
+
+    def expire_unseen_edges(self, timestamp, release_timestamp, version, edge_collection):
+        """
+        As for _SeenKeys.
+        """
+        bulk = self._db.get_batch_updater(edge_collection)
+        for key, from_, to in self._state.get_unseen_edges(edge_collection):
+            bulk.expire_edge({_KEY: key, '_from': from_, '_to': to}, timestamp, release_timestamp)
+            _update_if_full(bulk)
+        bulk.update()
+
+
+def _update_if_full(bulk):
+    if bulk.count() >= _EXPIRE_BATCH_SIZE:
+        bulk.update()
+
+
+def _hash_document(doc):
+    """
+    Returns a hash of a document that is the same for documents that _special_equal considers
+    equal, barring differences in numeric types.
+    """
+    d = {k: v for k, v in doc.items() if k not in _HASH_IGNORED_FIELDS}
+    return _hashlib.blake2b(
+        _json.dumps(d, sort_keys=True, separators=(',', ':')).encode('utf-8'),
+        digest_size=16).digest()
+
+
+def _vertex_row(db, vertex, key, load_version):
+    # returns a state cache row for a vertex created in this load
+    return (vertex[_ID], _hash_document(vertex), key,
+            db.get_vertex_reference(vertex[_ID], load_version)['_id'])
+
+
+def _edge_row(edge, key, from_id, to_id):
+    return (edge[_ID], _hash_document(edge), key, from_id, to_id)
+
+
+def _process_verts(
+        db,
+        vertex_source,
+        timestamp,
+        release_timestamp,
+        load_version,
+        batch_size,
+        seen=None,
+        state=None):
     """
     For each vertex we're importing, either replace and expire an existing vertex, create a
-    new vertex, or leave an existing vertex unchanged, updating its version.
+    new vertex, or leave an existing vertex unchanged, updating its version or recording it as
+    seen.
+
+    If a state cache is provided, the vertices are recorded in the new state.
     """
     count = 1
     for vertgen in _chunkiter(vertex_source, batch_size):
@@ -117,131 +705,850 @@ def _process_verts(db, vertex_source, timestamp, release_timestamp, load_version
         if _VERBOSE:
             print(f'  got {len(dbverts)} vertices: {_time.time()}')
         bulk = db.get_batch_updater()
+        rows = []
         for v in vertices:
             dbv = dbverts.get(v[_ID])
-            if not dbv:
-                bulk.create_vertex(v[_ID], load_version, timestamp, release_timestamp, v)
-            elif not _special_equal(v, dbv):
+            if dbv and _special_equal(v, dbv):
+                if seen:
+                    seen.add_vertex(dbv[_KEY])
+                else:
+                    # mark node as seen in this version
+                    bulk.set_last_version_on_vertex(dbv[_KEY], load_version)
+                if state:
+                    rows.append((v[_ID], _hash_document(v), dbv[_KEY], dbv['_id']))
+                continue
+            if dbv:
                 bulk.expire_vertex(dbv[_KEY], timestamp - 1, release_timestamp - 1)
-                bulk.create_vertex(v[_ID], load_version, timestamp, release_timestamp, v)
-            else:
-                # mark node as seen in this version
-                bulk.set_last_version_on_vertex(dbv[_KEY], load_version)
+            key = bulk.create_vertex(v[_ID], load_version, timestamp, release_timestamp, v)
+            if state:
+                rows.append(_vertex_row(db, v, key, load_version))
         if _VERBOSE:
             print(f'  updating {bulk.count()} vertices: {_time.time()}')
         bulk.update()
+        if state:
+            state.add_vertices(rows)
 
 
-def _process_merges(db, merge_source, timestamp, release_timestamp, load_version, batch_size):
+def _process_verts_cached(
+        db, state, vertex_source, timestamp, release_timestamp, load_version, batch_size):
     """
-    For each merge edge, if both vertices exist in the current graph (it is expected that vertices
-    have been updated by _process_verts), add the merge edge to the database.
+    As _process_verts, but calculates the changes against the cached state of the previous
+    load. Unchanged vertices are not updated.
+    """
+    count = 1
+    for vertgen in _chunkiter(vertex_source, batch_size):
+        vertices = list(vertgen)
+        if _VERBOSE:
+            print(f'vertex batch {count}: {_time.time()}')
+        count += 1
+        prev = state.get_previous_vertices([v[_ID] for v in vertices])
+        bulk = db.get_batch_updater()
+        rows = []
+        for v in vertices:
+            hash_ = _hash_document(v)
+            # rows are id, hash, key, _id
+            p = prev.get(v[_ID])
+            if p and p[1] == hash_:
+                rows.append(p)
+                continue
+            if p:
+                bulk.expire_vertex(p[2], timestamp - 1, release_timestamp - 1)
+            key = bulk.create_vertex(v[_ID], load_version, timestamp, release_timestamp, v)
+            rows.append(_vertex_row(db, v, key, load_version))
+        if _VERBOSE:
+            print(f'  updating {bulk.count()} vertices: {_time.time()}')
+        bulk.update()
+        state.add_vertices(rows)
 
-    This could be made smarter in the future.
+
+def _process_merges(
+        db, resolver, timestamp, release_timestamp, load_version, batch_size, state=None):
     """
+    For each merge edge, if the merged vertex and the merge target exist in the current graph (it
+    is expected that vertices have been updated by _process_verts), add the merge edge to the
+    database.
+
+    Merge chains are resolved so that merged vertices are merged into the final target - see
+    _MergeResolver. Merges that are already in the merge collection are skipped without looking
+    up their vertices.
+
+    If a state cache is provided, the merged vertices are removed from the new state.
+
+    Returns the IDs of the merged vertices.
+    """
+    ret = []
     count = 1
-    for mergen in _chunkiter(merge_source, batch_size):
+    for mergen in _chunkiter(resolver.get_merges(), batch_size):
         merges = list(mergen)
         if _VERBOSE:
             print(f'merge batch {count}: {_time.time()}')
         count += 1
-        keys = list({m['from'] for m in merges} | {m['to'] for m in merges})
+        dbmerges = db.get_edges(
+            [m[_ID] for m, _ in merges], timestamp, edge_collection=db.get_merge_collection())
+        merges = _filter_existing_merges(resolver, merges, dbmerges)
+        if not merges:
+            continue
+        keys = _merge_vertex_keys(merges)
         if _VERBOSE:
             print(f'  looking up {len(keys)} vertices: {_time.time()}')
         dbverts = db.get_vertices(keys, timestamp)
+        keys = _merge_fallback_vertex_keys(resolver, merges, dbverts)
+        if keys:
+            dbverts.update(db.get_vertices(keys, timestamp))
         if _VERBOSE:
             print(f'  got {len(dbverts)} vertices: {_time.time()}')
         bulk = db.get_batch_updater(db.get_merge_collection())
         vertbulk = db.get_batch_updater()
-        for m in merges:
-            dbmerged = dbverts.get(m['from'])
-            dbtarget = dbverts.get(m['to'])
-            # only add the merge if nodes exist at this point
-            # trying to figure out where to set the edge if nodes are deleted gets complicated,
-            # so we don't worry about it for now.
-            if dbmerged and dbtarget:
-                vertbulk.expire_vertex(dbmerged[_KEY], timestamp - 1, release_timestamp - 1)
-                bulk.create_edge(
-                    m[_ID], dbmerged, dbtarget, load_version, timestamp, release_timestamp, m)
+        merged = _add_merges(resolver, merges, dbverts, bulk, vertbulk,
+                             timestamp, release_timestamp, load_version)
+        if state:
+            state.remove_vertices(merged)
+        ret.extend(merged)
         if _VERBOSE:
             print(f'  updating {bulk.count()} edges: {_time.time()}')
         bulk.update()
         if _VERBOSE:
             print(f'  updating {vertbulk.count()} vertices: {_time.time()}')
         vertbulk.update()
+    return ret
+
+
+class _MergeResolver:
+    """
+    Resolves merge chains, e.g. A merged into B and B merged into C, in memory, such that each
+    merged vertex is merged into the final target of its chain (C). The merges form a forest
+    where each merged vertex points to its target, and the final targets are found as in a union
+    find structure with path compression.
+
+    Memory use is proportional to the number of merges.
+    """
+
+    def __init__(self, merge_source):
+        """
+        merge_source - the merge source as for load_graph_delta. Each vertex may be merged once.
+        """
+        self._merges = {}
+        for m in merge_source:
+            if m['from'] in self._merges:
+                raise ValueError(f"Vertex {m['from']} is merged more than once")
+            self._merges[m['from']] = m
+        self._roots = {}
+        for from_ in self._merges:
+            self.get_target(from_)
+
+    def get_merges(self):
+        """
+        Returns an iterator over the merges as tuples of the merge and its final target, in the
+        order of the merge source.
+        """
+        return ((m, self.get_target(f)) for f, m in self._merges.items())
+
+    def get_target(self, vertex):
+        """
+        Returns the final merge target for a vertex, or the vertex if it is not merged.
+        """
+        path = []
+        onpath = set()
+        while vertex in self._merges and vertex not in self._roots:
+            if vertex in onpath:
+                raise ValueError(f'Merge cycle detected at vertex {vertex}')
+            path.append(vertex)
+            onpath.add(vertex)
+            vertex = self._merges[vertex]['to']
+        root = self._roots.get(vertex, vertex)
+        for v in path:
+            self._roots[v] = root
+        return root
+
+    def get_chain(self, vertex):
+        """
+        Returns the merge targets between a merged vertex and its final target, in chain order,
+        excluding the final target.
+        """
+        chain = []
+        target = self.get_target(vertex)
+        vertex = self._merges[vertex]['to']
+        while vertex != target:
+            chain.append(vertex)
+            vertex = self._merges[vertex]['to']
+        return chain
+
+
+def _filter_existing_merges(resolver, merges, dbmerges):
+    # merge edges are never updated once created, so a merge with the same ID and from as an
+    # existing merge, and to either its final target or the chain vertex it fell back to, needs
+    # no work
+    ret = []
+    for m, target in merges:
+        dbm = dbmerges.get(m[_ID])
+        if not dbm or not _is_existing_merge(resolver, m, target, dbm['from'], dbm['to']):
+            ret.append((m, target))
+    return ret
+
+
+def _is_existing_merge(resolver, merge, target, from_, to):
+    if from_ != merge['from']:
+        return False
+    return to == target or to in resolver.get_chain(merge['from'])
+
+
+def _merge_vertex_keys(merges):
+    return list({m['from'] for m, _ in merges} | {t for _, t in merges})
+
+
+def _merge_fallback_vertex_keys(resolver, merges, dbverts):
+    # If the final target doesn't exist, the merge falls back to the closest existing vertex
+    # to the final target in the chain. Returns the keys of the chain vertices that need to be
+    # looked up.
+    keys = set()
+    for m, target in merges:
+        if m['from'] in dbverts and target not in dbverts:
+            keys.update(resolver.get_chain(m['from']))
+    return list(keys - dbverts.keys())
+
+
+def _add_merges(resolver, merges, dbverts, bulk, vertbulk,
+                timestamp, release_timestamp, load_version):
+    # returns the IDs of the merged vertices
+    merged = []
+    for m, target in merges:
+        dbmerged = dbverts.get(m['from'])
+        dbtarget = dbverts.get(target)
+        if dbmerged and not dbtarget:
+            for v in reversed(resolver.get_chain(m['from'])):
+                if v in dbverts:
+                    dbtarget = dbverts[v]
+                    break
+        # only add the merge if nodes exist at this point
+        # trying to figure out where to set the edge if nodes are deleted gets complicated,
+        # so we don't worry about it for now.
+        if dbmerged and dbtarget:
+            vertbulk.expire_vertex(dbmerged[_KEY], timestamp - 1, release_timestamp - 1)
+            bulk.create_edge(
+                m[_ID], dbmerged, dbtarget, load_version, timestamp, release_timestamp, m)
+            merged.append(m['from'])
+    return merged
 
 # assumes verts have been processed
 
 
-def _process_edges(db, edge_source, timestamp, release_timestamp, load_version, batch_size):
+def _process_edges(
+        db,
+        edge_source,
+        timestamp,
+        release_timestamp,
+        load_version,
+        batch_size,
+        seen=None,
+        state=None,
+        cached=False):
     """
     For each edge we're importing, either replace and expire an existing edge, create a
-    new edge, or leave an existing edge unchanged, updating its version.
+    new edge, or leave an existing edge unchanged, updating its version or recording it as seen.
+
+    If a state cache is provided, the edges are recorded in the new state. If cached is true,
+    the changes are calculated against the cached state of the previous load rather than the
+    database.
+
+    The lookups for a batch, and the updates for a batch, are made concurrently across the
+    edge collections.
     """
     count = 1
-    for edgegen in _chunkiter(edge_source, batch_size):
-        edges = list(edgegen)
-        if _VERBOSE:
-            print(f'edge batch {count}: {_time.time()}')
-        count += 1
-        keys = _defaultdict(list)
-        bulkset = {}
-        vertkeys = set()
-        for e in edges:
-            # The edges exists in the current load so their nodes must exist by now
-            vertkeys.add(e['to'])
-            vertkeys.add(e['from'])
-            col = e.get('_collection')
-            if not col:
-                col = db.get_default_edge_collection()
-            keys[col].append(e[_ID])
-            if col not in bulkset:
-                bulkset[col] = db.get_batch_updater(col)
-        dbedges = {}
-        for col, keys in keys.items():
+    # one thread per edge collection plus one for the vertex lookup
+    with _ThreadPoolExecutor(max_workers=len(db.get_edge_collections()) + 1) as ex:
+        for edgegen in _chunkiter(edge_source, batch_size):
+            edges = list(edgegen)
             if _VERBOSE:
-                print(f'  looking up {len(keys)} edges in {col}: {_time.time()}')
-            dbedges[col] = db.get_edges(keys, timestamp, edge_collection=col)
-            if _VERBOSE:
-                print(f'  got {len(dbedges[col])} edges: {_time.time()}')
+                print(f'edge batch {count}: {_time.time()}')
+            count += 1
+            if cached:
+                _process_edges_batch_cached(
+                    ex, db, state, edges, timestamp, release_timestamp, load_version)
+            else:
+                _process_edges_batch(
+                    ex, db, edges, timestamp, release_timestamp, load_version, seen, state)
 
-        # Could cache these, may be fetching the same vertex over and over, but no guarantees
-        # the same vertexes are repeated in a reasonable amount of time
-        # Batching the fetch is probably enough
-        if _VERBOSE:
-            print(f'  looking up {len(vertkeys)} vertices: {_time.time()}')
-        dbverts = db.get_vertices(list(vertkeys), timestamp)
-        if _VERBOSE:
-            print(f'  got {len(dbverts)} vertices: {_time.time()}')
-        keys = None
-        vertkeys = None
-
-        for e in edges:
-            col = e.pop('_collection', None)
-            if not col:
-                col = db.get_default_edge_collection()
-            dbe = dbedges[col].get(e[_ID])
-            bulk = bulkset[col]
-            from_ = dbverts[e['from']]
-            to = dbverts[e['to']]
-            if dbe:
-                if (not _special_equal(e, dbe) or
-                        # these two conditions check whether the nodes the edge is attached to
-                        # have been updated this load
-                        # This is an abstraction leak, bleah
-                        dbe['_from'] != from_['_id'] or
-                        dbe['_to'] != to['_id']):
-                    bulk.expire_edge(dbe, timestamp - 1, release_timestamp - 1)
-                    bulk.create_edge(
-                        e[_ID], from_, to, load_version, timestamp, release_timestamp, e)
+
+def _process_edges_batch(
+        executor, db, edges, timestamp, release_timestamp, load_version, seen, state):
+    keys = _defaultdict(list)
+    bulkset = {}
+    vertkeys = set()
+    for e in edges:
+        # The edges exists in the current load so their nodes must exist by now
+        vertkeys.add(e['to'])
+        vertkeys.add(e['from'])
+        col = e.get('_collection')
+        if not col:
+            col = db.get_default_edge_collection()
+        keys[col].append(e[_ID])
+        if col not in bulkset:
+            bulkset[col] = db.get_batch_updater(col)
+    if _VERBOSE:
+        print(f'  looking up edges in {len(keys)} collections and {len(vertkeys)} vertices: '
+              + f'{_time.time()}')
+    edgefutures = {col: executor.submit(db.get_edges, k, timestamp, edge_collection=col)
+                   for col, k in keys.items()}
+    # Could cache these, may be fetching the same vertex over and over, but no guarantees
+    # the same vertexes are repeated in a reasonable amount of time
+    # Batching the fetch is probably enough
+    dbverts = db.get_vertices(list(vertkeys), timestamp)
+    dbedges = {col: f.result() for col, f in edgefutures.items()}
+    if _VERBOSE:
+        print(f'  got {sum([len(d) for d in dbedges.values()])} edges and {len(dbverts)} '
+              + f'vertices: {_time.time()}')
+    keys = None
+    vertkeys = None
+
+    rows = _defaultdict(list)
+    for e in edges:
+        col = e.pop('_collection', None)
+        if not col:
+            col = db.get_default_edge_collection()
+        dbe = dbedges[col].get(e[_ID])
+        bulk = bulkset[col]
+        from_ = dbverts[e['from']]
+        to = dbverts[e['to']]
+        if dbe:
+            if (not _special_equal(e, dbe) or
+                    # these two conditions check whether the nodes the edge is attached to
+                    # have been updated this load
+                    # This is an abstraction leak, bleah
+                    dbe['_from'] != from_['_id'] or
+                    dbe['_to'] != to['_id']):
+                bulk.expire_edge(dbe, timestamp - 1, release_timestamp - 1)
+                key = bulk.create_edge(
+                    e[_ID], from_, to, load_version, timestamp, release_timestamp, e)
+            else:
+                key = dbe[_KEY]
+                if seen:
+                    seen.add_edge(dbe[_KEY], col)
                 else:
                     bulk.set_last_version_on_edge(dbe, load_version)
-            else:
+        else:
+            key = bulk.create_edge(
+                e[_ID], from_, to, load_version, timestamp, release_timestamp, e)
+        if state:
+            rows[col].append(_edge_row(e, key, from_['_id'], to['_id']))
+    _update_edges(executor, bulkset)
+    for col, r in rows.items():
+        state.add_edges(col, r)
+
+
+def _process_edges_batch_cached(
+        executor, db, state, edges, timestamp, release_timestamp, load_version):
+    edgesbycol = _defaultdict(list)
+    vertkeys = set()
+    for e in edges:
+        col = e.pop('_collection', None)
+        if not col:
+            col = db.get_default_edge_collection()
+        edgesbycol[col].append(e)
+        vertkeys.add(e['from'])
+        vertkeys.add(e['to'])
+    # The edges exist in the current load so their nodes must be in the new state by now
+    # rows are id, hash, key, _id
+    verts = state.get_vertices(list(vertkeys))
+    bulkset = {}
+    for col, coledges in edgesbycol.items():
+        # rows are id, hash, key, _from, _to
+        prev = state.get_previous_edges(col, [e[_ID] for e in coledges])
+        bulk = bulkset[col] = db.get_batch_updater(col)
+        rows = []
+        for e in coledges:
+            from_ = {'_id': verts[e['from']][3], _ID: e['from']}
+            to = {'_id': verts[e['to']][3], _ID: e['to']}
+            row = (e[_ID], _hash_document(e))
+            p = prev.get(e[_ID])
+            if p and p[1:2] + p[3:] == row[1:] + (from_['_id'], to['_id']):
+                rows.append(p)
+                continue
+            if p:
+                bulk.expire_edge({_KEY: p[2], '_from': p[3], '_to': p[4]},
+                                 timestamp - 1, release_timestamp - 1)
+            key = bulk.create_edge(
+                e[_ID], from_, to, load_version, timestamp, release_timestamp, e)
+            rows.append(row + (key, from_['_id'], to['_id']))
+        state.add_edges(col, rows)
+    _update_edges(executor, bulkset)
+
+
+def _update_edges(executor, bulkset):
+    if _VERBOSE:
+        print(f'  updating {sum([b.count() for b in bulkset.values()])} edges in '
+              + f'{len(bulkset)} collections: {_time.time()}')
+    # list() waits for the updates and throws the first error, if any
+    list(executor.map(lambda b: b.update(), bulkset.values()))
+
+
+async def load_graph_delta_async(
+        load_namespace,
+        vertex_source,
+        edge_source,
+        database,
+        timestamp,
+        release_timestamp,
+        load_version,
+        merge_source=None,
+        batch_size=10000,
+        max_batches_in_flight=4):
+    """
+    An asyncio version of load_graph_delta that processes several batches at once and looks up
+    the edges and vertices for an edge batch concurrently.
+
+    The arguments are the same as load_graph_delta other than:
+
+    database - an asyncio wrapper for the database storing the graph, e.g.
+      batchload.async_time_travelling_database.AsyncArangoBatchTimeTravellingDB.
+    max_batches_in_flight - the maximum number of batches to process at once. Memory use
+      increases proportionally.
+
+    The ids in each source must be unique, as batches from the same source may be processed in
+    any order. The sources are consumed in the
+    event loop thread, so sources that do a lot of work per item will limit the number of
+    requests in flight.
+    """
+    if max_batches_in_flight < 1:
+        raise ValueError('max_batches_in_flight must be at least 1')
+    db = database
+    if merge_source and not db.get_merge_collection():
+        raise ValueError('A merge source is specified but the database ' +
+                         'has no merge collection')
+    resolver = _MergeResolver(merge_source) if merge_source else None
+    await db.register_load_start(
+        load_namespace, load_version, timestamp, release_timestamp, _get_current_timestamp())
+
+    async def verts(vertices):
+        await _process_verts_batch_async(db, vertices, timestamp, release_timestamp, load_version)
+
+    async def merges(merges):
+        await _process_merges_batch_async(
+            db, resolver, merges, timestamp, release_timestamp, load_version)
+
+    async def edges(edges):
+        await _process_edges_batch_async(db, edges, timestamp, release_timestamp, load_version)
+
+    # Merges and edges must see the vertices of this load, so each stage must complete before
+    # the next starts.
+    await _process_batches_async(vertex_source, batch_size, max_batches_in_flight, verts)
+    if resolver:
+        await _process_batches_async(
+            resolver.get_merges(), batch_size, max_batches_in_flight, merges)
+
+    await db.expire_extant_vertices_without_last_version(
+        timestamp - 1, release_timestamp - 1, load_version)
+
+    await _process_batches_async(edge_source, batch_size, max_batches_in_flight, edges)
+
+    await _asyncio.gather(*[db.expire_extant_edges_without_last_version(
+        timestamp - 1, release_timestamp - 1,  load_version, edge_collection=col)
+        for col in db.get_edge_collections()])
+
+    await db.register_load_complete(load_namespace, load_version, _get_current_timestamp())
+
+
+async def _process_batches_async(source, batch_size, max_in_flight, process):
+    """
+    Call the process coroutine on batches of the source, with up to max_in_flight batches being
+    processed at once. Fails on the first error.
+    """
+    running = set()
+    try:
+        for batchgen in _chunkiter(source, batch_size):
+            batch = list(batchgen)
+            if len(running) >= max_in_flight:
+                done, running = await _asyncio.wait(
+                    running, return_when=_asyncio.FIRST_COMPLETED)
+                for t in done:
+                    t.result()  # raise any errors
+            running.add(_asyncio.create_task(process(batch)))
+        for t in _asyncio.as_completed(running):
+            await t
+    finally:
+        # only has any effect if there's an error
+        for t in running:
+            t.cancel()
+        await _asyncio.gather(*running, return_exceptions=True)
+
+
+async def _process_verts_batch_async(db, vertices, timestamp, release_timestamp, load_version):
+    dbverts = await db.get_vertices([v[_ID] for v in vertices], timestamp)
+    bulk = db.get_batch_updater()
+    for v in vertices:
+        dbv = dbverts.get(v[_ID])
+        if not dbv:
+            bulk.create_vertex(v[_ID], load_version, timestamp, release_timestamp, v)
+        elif not _special_equal(v, dbv):
+            bulk.expire_vertex(dbv[_KEY], timestamp - 1, release_timestamp - 1)
+            bulk.create_vertex(v[_ID], load_version, timestamp, release_timestamp, v)
+        else:
+            # mark node as seen in this version
+            bulk.set_last_version_on_vertex(dbv[_KEY], load_version)
+    await bulk.update()
+
+
+async def _process_merges_batch_async(
+        db, resolver, merges, timestamp, release_timestamp, load_version):
+    # see _process_merges
+    dbmerges = await db.get_edges(
+        [m[_ID] for m, _ in merges], timestamp, edge_collection=db.get_merge_collection())
+    merges = _filter_existing_merges(resolver, merges, dbmerges)
+    if not merges:
+        return
+    dbverts = await db.get_vertices(_merge_vertex_keys(merges), timestamp)
+    keys = _merge_fallback_vertex_keys(resolver, merges, dbverts)
+    if keys:
+        dbverts.update(await db.get_vertices(keys, timestamp))
+    bulk = db.get_batch_updater(db.get_merge_collection())
+    vertbulk = db.get_batch_updater()
+    _add_merges(resolver, merges, dbverts, bulk, vertbulk,
+                timestamp, release_timestamp, load_version)
+    await _asyncio.gather(bulk.update(), vertbulk.update())
+
+
+async def _process_edges_batch_async(db, edges, timestamp, release_timestamp, load_version):
+    keys = _defaultdict(list)
+    vertkeys = set()
+    for e in edges:
+        vertkeys.add(e['to'])
+        vertkeys.add(e['from'])
+        keys[e.get('_collection') or db.get_default_edge_collection()].append(e[_ID])
+    cols = list(keys)
+    results = await _asyncio.gather(
+        db.get_vertices(list(vertkeys), timestamp),
+        *[db.get_edges(keys[col], timestamp, edge_collection=col) for col in cols])
+    dbverts = results[0]
+    dbedges = dict(zip(cols, results[1:]))
+    bulkset = {col: db.get_batch_updater(col) for col in cols}
+
+    for e in edges:
+        col = e.pop('_collection', None) or db.get_default_edge_collection()
+        dbe = dbedges[col].get(e[_ID])
+        bulk = bulkset[col]
+        from_ = dbverts[e['from']]
+        to = dbverts[e['to']]
+        if dbe:
+            # see _process_edges
+            if (not _special_equal(e, dbe) or
+                    dbe['_from'] != from_['_id'] or
+                    dbe['_to'] != to['_id']):
+                bulk.expire_edge(dbe, timestamp - 1, release_timestamp - 1)
                 bulk.create_edge(e[_ID], from_, to, load_version, timestamp, release_timestamp, e)
-        for b in bulkset.values():
+            else:
+                bulk.set_last_version_on_edge(dbe, load_version)
+        else:
+            bulk.create_edge(e[_ID], from_, to, load_version, timestamp, release_timestamp, e)
+    await _asyncio.gather(*[b.update() for b in bulkset.values()])
+
+
+class BackfillRelease:
+    """
+    A release of a graph to be loaded by backfill_graph_history.
+    """
+
+    def __init__(
+            self,
+            load_version,
+            timestamp,
+            release_timestamp,
+            vertex_source,
+            edge_source,
+            merge_source=None):
+        """
+        Create the release. The arguments are as for load_graph_delta.
+        """
+        self.load_version = load_version
+        self.timestamp = timestamp
+        self.release_timestamp = release_timestamp
+        self.vertex_source = vertex_source
+        self.edge_source = edge_source
+        self.merge_source = merge_source
+
+
+def backfill_graph_history(
+        load_namespace,
+        releases,
+        database,
+        batch_size=10000,
+        max_writes_in_flight=4,
+        run_size=None,
+        temp_dir=None):
+    """
+    Loads the history of a graph from a series of releases into an empty namespace, with the same
+    result as calling load_graph_delta for each release in turn without the touch free options.
+
+    Rather than loading each release into the database, the releases are streamed in order and
+    the intervals of consecutive releases over which each vertex and edge was unchanged are
+    tracked in sorted files on disk. Each document is written once, when its interval ends, with
+    its final last version, expiration, and release expiration fields. A load is registered
+    for each release, so the latest load can be rolled back as usual and later releases can be
+    loaded with load_graph_delta.
+
+    load_namespace - the name of the data that is being loaded, as for load_graph_delta. The
+      namespace must have no registered loads.
+    releases - an iterable of BackfillRelease in load order. The timestamps must be strictly
+      increasing. The sources of a release are consumed before the next release is requested,
+      so a generator may open and close the files for each release in turn.
+    database - a wrapper for the database storing the graph, as for load_graph_delta. The
+      collections must be empty.
+    batch_size - the number of documents to write per batch.
+    max_writes_in_flight - the maximum number of batches to write concurrently.
+    run_size - the maximum number of documents to hold in memory while sorting a release.
+      Defaults to the default for batchload.sorted_join.external_sort.
+    temp_dir - the directory in which to store the sorted releases and intervals. Defaults to
+      the system temporary directory.
+
+    Memory use is proportional to the number of vertices in a release and the number of merges.
+    The loads are registered as in progress as each release is read and completed once all the
+    documents are written. If the backfill fails, the collections must be emptied and the loads
+    deleted from the registry before trying again.
+
+    Returns a dict of collection name to the number of documents written.
+    """
+    if max_writes_in_flight < 1:
+        raise ValueError('max_writes_in_flight must be at least 1')
+    db = database
+    if db.get_registered_loads(load_namespace) or not db.is_empty():
+        raise ValueError('History can only be backfilled into an empty namespace')
+    sort_args = {'run_size': run_size} if run_size else {}
+    with _ThreadPoolExecutor(max_workers=max_writes_in_flight) as ex, \
+            _tempfile.TemporaryDirectory(prefix='backfill_', dir=temp_dir) as tmp:
+        sort_args['temp_dir'] = tmp
+        writer = _HistoryWriter(db, ex, batch_size, max_writes_in_flight)
+        verts = _Intervals(_os.path.join(tmp, 'vertices'), lambda v: v[_ID],
+                           writer.write_vertex, sort_args)
+        edges = _Intervals(_os.path.join(tmp, 'edges'), lambda e: (
+            e.get('_collection') or db.get_default_edge_collection(), e[_ID]),
+            writer.write_edge, sort_args)
+        merges = {}
+        for index, r in enumerate(releases):
+            if writer.releases and r.timestamp <= writer.releases[-1].timestamp:
+                raise ValueError('Release timestamps must be strictly increasing')
+            if r.merge_source and not db.get_merge_collection():
+                raise ValueError('A merge source is specified but the database ' +
+                                 'has no merge collection')
+            db.register_load_start(load_namespace, r.load_version, r.timestamp,
+                                   r.release_timestamp, _get_current_timestamp())
+            writer.releases.append(r)
             if _VERBOSE:
-                print(f'  updating {b.count()} edges in {b.get_collection()}: {_time.time()}')
-            b.update()
+                print(f'backfilling load version {r.load_version}: {_time.time()}')
+            current = {}
+            missing = verts.update(r.vertex_source, index, _hash_document, current,
+                                   f'the vertices of load version {r.load_version}')
+            if r.merge_source:
+                _backfill_merges(r.merge_source, index, verts, current, missing, merges, writer)
+
+            def digest(e, ver=r.load_version):
+                # edges change when their vertices change, as in _process_edges
+                for end in ('from', 'to'):
+                    if e[end] not in current:
+                        raise ValueError(f'Edge {e[_ID]} in load version {ver} references '
+                                         + f'vertex {e[end]}, which does not exist')
+                return (_hash_document(e), current[e['from']], current[e['to']])
+            edges.update(r.edge_source, index, digest,
+                         name=f'the edges of load version {r.load_version}')
+        if not writer.releases:
+            return {}
+        verts.finish(len(writer.releases) - 1)
+        edges.finish(len(writer.releases) - 1)
+        writer.flush()
+    for r in writer.releases:
+        db.register_load_complete(load_namespace, r.load_version, _get_current_timestamp())
+    return writer.get_counts()
+
+
+def _backfill_merges(merge_source, index, verts, current, missing, merges, writer):
+    # Mirrors _process_merges. The vertices that exist when the merges are processed are the
+    # vertices in the release and the vertices missing from the release, which are expired
+    # afterwards. merges records the from and to vertex IDs of the merges that were added.
+    def extant(id_):
+        return current[id_] if id_ in current else missing.get(id_)
+
+    resolver = _MergeResolver(merge_source)
+    for m, target in resolver.get_merges():
+        if m[_ID] in merges and _is_existing_merge(resolver, m, target, *merges[m[_ID]]):
+            continue
+        from_ = extant(m['from'])
+        to = extant(target)
+        if from_ is not None and to is None:
+            for v in reversed(resolver.get_chain(m['from'])):
+                if extant(v) is not None:
+                    target, to = v, extant(v)
+                    break
+        if from_ is not None and to is not None:
+            if m['from'] in current:
+                # the vertex is in the release, so its interval ends here
+                verts.expire(m['from'], index)
+                del current[m['from']]
+            writer.write_merge(m, from_, target, to, index)
+            merges[m[_ID]] = (m['from'], target)
+
+
+class _Intervals:
+    """
+    Tracks the intervals of consecutive releases over which documents were unchanged, for
+    backfill_graph_history. The open intervals are stored in a file sorted by document key as
+    (key, hash, first release index, document) tuples.
+    """
+
+    def __init__(self, path, key, close, sort_args):
+        """
+        path - the path of the file of open intervals.
+        key - a function that returns the key of a document.
+        close - a function called with the interval tuple, the index of the last release in the
+          interval, and the index of the release where the document was expired, or None, when
+          an interval is closed.
+        sort_args - keyword arguments for external_sort.
+        """
+        self._path = path
+        self._key = key
+        self._close = close
+        self._sort_args = sort_args
+        self._expired = {}
+
+    def _read(self):
+        if not _os.path.exists(self._path):
+            return
+        with open(self._path, 'rb') as f:
+            while True:
+                try:
+                    interval = _pickle.load(f)
+                except EOFError:
+                    return
+                if interval[0] in self._expired:
+                    end = self._expired.pop(interval[0])
+                    self._close(interval, end, end)
+                else:
+                    yield interval
+
+    def update(self, docs, index, digest, opened=None, name='the documents'):
+        """
+        Add the documents in a release to the intervals, closing the intervals of documents
+        that are missing from the release or have changed.
+
+        docs - the documents in the release.
+        index - the index of the release.
+        digest - a function that returns a hash of a document's contents.
+        opened - a dict in which to record the first release index of the interval of each
+          document in the release by key.
+        name - a description of the documents for error messages.
+
+        Returns a dict of key to first release index for the intervals of the documents that
+        are missing from the release.
+        """
+        missing = {}
+        docs = _external_sort(docs, self._key, **self._sort_args)
+        with open(self._path + '.new', 'wb') as out:
+            for old, new in _sorted_join(
+                    self._read(), docs, lambda x: x[0] if isinstance(x, tuple) else self._key(x),
+                    'the open intervals', name):
+                interval = None
+                if new:
+                    h = digest(new)
+                    interval = old if old and old[1] == h else (self._key(new), h, index, new)
+                    _pickle.dump(interval, out, _pickle.HIGHEST_PROTOCOL)
+                    if opened is not None:
+                        opened[interval[0]] = interval[2]
+                if old and old is not interval:
+                    self._close(old, index - 1, index)
+                    if not new:
+                        missing[old[0]] = old[2]
+        _os.replace(self._path + '.new', self._path)
+        return missing
+
+    def expire(self, key, index):
+        """
+        Close the open interval for a document that is in the release with the given index,
+        expiring the document at that release.
+        """
+        self._expired[key] = index
+
+    def finish(self, index):
+        """
+        Close the remaining intervals after the last release, with the given index.
+        """
+        for interval in self._read():
+            self._close(interval, index, None)
+        if _os.path.exists(self._path):
+            _os.remove(self._path)
+
+
+class _HistoryWriter:
+    """
+    Writes the documents for closed intervals in batches for backfill_graph_history.
+    """
+
+    def __init__(self, db, executor, batch_size, max_in_flight):
+        self._db = db
+        self._writes = _BoundedWrites(executor, max_in_flight)
+        self._batch_size = batch_size
+        self._bulks = {}
+        self._counts = _defaultdict(int)
+        # the releases read so far, in order
+        self.releases = []
+
+    def _expiration(self, end):
+        if end is None:
+            return {}
+        r = self.releases[end]
+        return {'expiration_time': r.timestamp - 1,
+                'release_expiration_time': r.release_timestamp - 1}
+
+    def _ref(self, id_, index):
+        return self._db.get_vertex_reference(id_, self.releases[index].load_version)
+
+    def _bulk(self, collection):
+        if collection not in self._bulks:
+            self._bulks[collection] = self._db.get_batch_updater(collection, insert_only=True)
+        return self._bulks[collection]
+
+    def _written(self, collection):
+        self._counts[collection or self._db.get_vertex_collection()] += 1
+        if self._bulks[collection].count() >= self._batch_size:
+            self._writes.submit(self._bulks.pop(collection))
+
+    def write_vertex(self, interval, last, end):
+        _, _, first, v = interval
+        r = self.releases[first]
+        self._bulk(None).create_vertex(
+            v[_ID], r.load_version, r.timestamp, r.release_timestamp, v,
+            last_version=self.releases[last].load_version, **self._expiration(end))
+        self._written(None)
+
+    def write_edge(self, interval, last, end):
+        (col, _), (_, from_, to), first, e = interval
+        e = dict(e)
+        e.pop('_collection', None)
+        r = self.releases[first]
+        self._bulk(col).create_edge(
+            e[_ID], self._ref(e['from'], from_), self._ref(e['to'], to), r.load_version,
+            r.timestamp, r.release_timestamp, e,
+            last_version=self.releases[last].load_version, **self._expiration(end))
+        self._written(col)
+
+    def write_merge(self, merge, from_, to_id, to, index):
+        col = self._db.get_merge_collection()
+        r = self.releases[index]
+        self._bulk(col).create_edge(
+            merge[_ID], self._ref(merge['from'], from_), self._ref(to_id, to), r.load_version,
+            r.timestamp, r.release_timestamp, merge)
+        self._written(col)
+
+    def flush(self):
+        """
+        Write the remaining documents and wait for the writes to complete.
+        """
+        for b in self._bulks.values():
+            if b.count():
+                self._writes.submit(b)
+        self._bulks.clear()
+        self._writes.wait()
+
+    def get_counts(self):
+        """
+        Returns a dict of collection name to the number of documents written.
+        """
+        return dict(self._counts)
 
 
 # TODO CODE these fields are shared between here and the database. Should probably put them somewhere in common.
@@ -251,6 +1558,7 @@ def _process_edges(db, edge_source, timestamp, release_timestamp, load_version,
 _SPECIAL_EQUAL_IGNORED_FIELDS = ['_id', _KEY, '_to', '_from', 'created', 'expired',
                                  'release_created', 'release_expired',
                                  'first_version', 'last_version']
+_HASH_IGNORED_FIELDS = set(_SPECIAL_EQUAL_IGNORED_FIELDS) | {'_collection'}
 
 
 def _special_equal(doc1, doc2):
@@ -278,7 +1586,7 @@ def _chunkiter(iterable, size):
 # TODO CODE fields here shared with the DB. Put them somewhere in common.
 
 
-def roll_back_last_load(database, load_namespace):
+def roll_back_last_load(database, load_namespace, sweep_concurrency=4):
     """
     Removes the most recent data load to a namespace and reverts it to the prior state.
 
@@ -287,7 +1595,11 @@ def roll_back_last_load(database, load_namespace):
       currently the only implementation of the interface.
     load_namespace - the name of the data set that is to be reverted,
         e.g. ncbi_taxa, gene_ontology, etc. Must be unique across all load sources.
+    sweep_concurrency - the maximum number of collections to revert concurrently.
+
+    Returns a dict of collection name to the time taken to revert the collection in seconds.
     """
+    _check_sweep_concurrency(sweep_concurrency)
     loads = database.get_registered_loads(load_namespace)
     # Was checking state == complete here, but that means if a load or rollback fails midway,
     # it can't be rolled back. Rollbacks should generally always work.
@@ -311,9 +1623,12 @@ def roll_back_last_load(database, load_namespace):
     # For now just testing manually
     db.register_load_rollback(load_namespace, current_ver)
 
-    for c in collections:
+    def revert(c):
         db.delete_created_documents(c, timestamp)
         db.undo_expire_documents(c, timestamp - 1)
         db.reset_last_version(c, current_ver, prior_ver)
 
+    times = _run_sweeps({c: revert for c in collections}, sweep_concurrency)
+
     db.delete_registered_load(load_namespace, current_ver)
+    return times
@@ -0,0 +1,251 @@
+"""
+Calculates the differences between two releases of a graph without a database and stores them
+in a delta file, which load_graph_delta can apply to a database that contains the older
+release.
+
+The delta file is a gzipped JSON lines file. The first line is a header containing the load
+version of the older release in the 'base_version' field, and each following line is a record
+with a type field 't':
+
+v - a created or changed vertex, in the 'd' field.
+e - a created or changed edge, in the 'd' field. Edges whose vertices were created or changed
+    are included even if the edge is unchanged, since the edge must point to the new vertex.
+m - a new merge edge, in the 'd' field.
+-v - the ID, in the 'id' field, of a deleted vertex.
+-e - the ID, in the 'id' field, and the collection, in the 'c' field, of a deleted edge. The
+    collection is null for the default collection.
+end - the last line, containing the record counts in the 'counts' field.
+
+Vertex records precede merge records, which precede edge records.
+"""
+
+import gzip
+import hashlib
+import itertools
+import json
+
+from relation_engine.batchload.delta_load import load_graph_delta
+from relation_engine.batchload.sorted_join import external_sort, sorted_join
+
+_FORMAT = 'relation_engine_graph_delta'
+_FORMAT_VERSION = 2
+
+_ID = 'id'
+_COLLECTION = '_collection'
+
+_T_VERTEX = 'v'
+_T_EDGE = 'e'
+_T_MERGE = 'm'
+_T_DEL_VERTEX = '-v'
+_T_DEL_EDGE = '-e'
+_T_END = 'end'
+
+_COUNT_NAMES = {
+    _T_VERTEX: 'vertices',
+    _T_MERGE: 'merges',
+    _T_EDGE: 'edges',
+    _T_DEL_VERTEX: 'deleted_vertices',
+    _T_DEL_EDGE: 'deleted_edges',
+}
+
+
+def diff_graphs(
+        old_vertices,
+        new_vertices,
+        old_edges,
+        new_edges,
+        delta_file,
+        base_version,
+        old_merges=None,
+        new_merges=None,
+        run_size=None,
+        temp_dir=None):
+    """
+    Calculate the differences between two releases of a graph and write them to a delta file.
+
+    The vertices, edges, and merges are in the form expected by load_graph_delta. The releases
+    are sorted on disk, keeping only the ID and a hash of each vertex and edge of the old release,
+    so memory use is bounded by the run size and the number of created and changed vertices.
+
+    old_vertices - an iterable over the vertices of the old release.
+    new_vertices - an iterable over the vertices of the new release.
+    old_edges - an iterable over the edges of the old release.
+    new_edges - an iterable over the edges of the new release.
+    delta_file - the path of the delta file to write.
+    base_version - the load version of the old release in the database to which the delta
+      will be applied. The delta can only be applied when this is the latest load.
+    old_merges - an iterable over the merges of the old release, if any.
+    new_merges - an iterable over the merges of the new release, if any. Merges that are not
+      in the old release or have changed are written to the delta file.
+    run_size - the maximum number of items to hold in memory while sorting. Defaults to the
+      default for batchload.sorted_join.external_sort.
+    temp_dir - the directory in which to sort the releases. Defaults to the system temporary
+      directory.
+
+    Returns a dict of the number of records written with the keys vertices, merges, edges,
+    deleted_vertices, and deleted_edges.
+    """
+    sort_args = {'temp_dir': temp_dir}
+    if run_size:
+        sort_args['run_size'] = run_size
+    counts = {n: 0 for n in _COUNT_NAMES.values()}
+    with gzip.open(delta_file, 'wt') as out:
+        def write(record):
+            counts[_COUNT_NAMES[record['t']]] += 1
+            out.write(json.dumps(record, separators=(',', ':')) + '\n')
+
+        out.write(json.dumps({'format': _FORMAT, 'version': _FORMAT_VERSION,
+                              'base_version': base_version}) + '\n')
+        changed = set()
+        for old, new in _join(old_vertices, new_vertices, _id_key, sort_args, 'vertices'):
+            if not new:
+                write({'t': _T_DEL_VERTEX, 'id': old[0]})
+            elif not old or old[1] != _hash(new):
+                changed.add(new[_ID])
+                write({'t': _T_VERTEX, 'd': new})
+
+        for old, new in _join(old_merges or [], new_merges or [], _id_key, sort_args,
+                              'merges'):
+            if new and (not old or old[1] != _hash(new)):
+                write({'t': _T_MERGE, 'd': new})
+
+        for old, new in _join(old_edges, new_edges, _edge_key, sort_args, 'edges'):
+            if not new:
+                write({'t': _T_DEL_EDGE, 'c': old[0][0] or None, 'id': old[0][1]})
+            elif (not old or old[1] != _hash(new)
+                    or new['from'] in changed or new['to'] in changed):
+                write({'t': _T_EDGE, 'd': new})
+        out.write(json.dumps({'t': _T_END, 'counts': counts}) + '\n')
+    return counts
+
+
+def _id_key(d):
+    return d[_ID]
+
+
+def _edge_key(e):
+    return (e.get(_COLLECTION) or '', e[_ID])
+
+
+def _hash(doc):
+    return hashlib.blake2b(json.dumps(doc, sort_keys=True).encode('utf-8'),
+                           digest_size=16).digest()
+
+
+def _join(old, new, key, sort_args, name):
+    # the old release is reduced to (key, hash) tuples so the sort runs are small
+    old = external_sort(((key(d), _hash(d)) for d in old), lambda t: t[0], **sort_args)
+    new = external_sort(new, key, **sort_args)
+    return sorted_join(old, new, lambda x: x[0] if isinstance(x, tuple) else key(x),
+                       f'the old {name}', f'the new {name}')
+
+
+def apply_graph_delta(
+        load_namespace,
+        delta,
+        database,
+        load_timestamp,
+        release_timestamp,
+        load_version):
+    """
+    Apply a delta file as a delta load.
+
+    The latest load in the namespace must be complete and have the delta's base version, as
+    otherwise the result would match neither release.
+
+    load_namespace - the namespace of the load.
+    delta - the GraphDelta to apply.
+    database - the ArangoBatchTimeTravellingDB to which the delta will be applied.
+    load_timestamp - the timestamp of the load, as for load_graph_delta.
+    release_timestamp - the release timestamp of the load, as for load_graph_delta.
+    load_version - the version of the load, as for load_graph_delta.
+    """
+    loads = database.get_registered_loads(load_namespace)
+    base = delta.get_base_version()
+    if not loads or loads[0]['load_version'] != base or loads[0]['state'] != 'complete':
+        latest = (f"{loads[0]['load_version']} ({loads[0]['state']})"
+                  if loads else 'no load')
+        raise ValueError(f'The delta file applies to load version {base} but the latest load '
+                         + f'in namespace {load_namespace} is {latest}')
+    load_graph_delta(load_namespace, delta.vertices(), delta.edges(), database,
+                     load_timestamp, release_timestamp, load_version,
+                     merge_source=delta.merges(), deletions=delta)
+
+
+class GraphDelta:
+    """
+    Reads a delta file written by diff_graphs. Each method makes a pass through the file.
+
+    Apply the delta with apply_graph_delta, which checks that the latest load in the namespace
+    is the release the delta was calculated from.
+    """
+
+    def __init__(self, delta_file):
+        """
+        delta_file - the path to the delta file. The file is checked for completeness.
+        """
+        self._path = delta_file
+        with gzip.open(self._path, 'rt') as f:
+            header = json.loads(f.readline() or 'null')
+            if not isinstance(header, dict) or header.get('format') != _FORMAT:
+                raise ValueError(f'{delta_file} is not a graph delta file')
+            if header.get('version') != _FORMAT_VERSION:
+                raise ValueError(f'Unsupported graph delta file version: {header.get("version")}')
+            self._base_version = header['base_version']
+            last = None
+            for last in f:
+                pass
+        last = json.loads(last) if last else {}
+        if last.get('t') != _T_END:
+            raise ValueError(f'{delta_file} is truncated')
+        self._counts = last['counts']
+
+    def get_base_version(self):
+        """
+        Returns the load version of the release the delta was calculated from.
+        """
+        return self._base_version
+
+    def get_counts(self):
+        """
+        Returns a dict of the number of records in the file, as returned by diff_graphs.
+        """
+        return dict(self._counts)
+
+    def _records(self, type_):
+        with gzip.open(self._path, 'rt') as f:
+            for line in itertools.islice(f, 1, None):
+                r = json.loads(line)
+                if r['t'] == type_:
+                    yield r
+
+    def vertices(self):
+        """
+        Returns an iterator over the created and changed vertices.
+        """
+        return (r['d'] for r in self._records(_T_VERTEX))
+
+    def edges(self):
+        """
+        Returns an iterator over the created and changed edges.
+        """
+        return (r['d'] for r in self._records(_T_EDGE))
+
+    def merges(self):
+        """
+        Returns a list of the new merges.
+        """
+        return [r['d'] for r in self._records(_T_MERGE)]
+
+    def deleted_vertex_ids(self):
+        """
+        Returns an iterator over the IDs of the deleted vertices.
+        """
+        return (r['id'] for r in self._records(_T_DEL_VERTEX))
+
+    def deleted_edges(self):
+        """
+        Returns an iterator over (collection, ID) tuples for the deleted edges. The collection
+        is None for the default collection.
+        """
+        return ((r['c'], r['id']) for r in self._records(_T_DEL_EDGE))
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+
+# Benchmarks the delta loader against the in memory ArangoDB stand-in with injected latency,
+# which makes the results depend on the number and concurrency of requests rather than the
+# speed of a real server.
+# Loads a synthetic graph and then a second version of the graph with some changes, with
+# load_graph_delta and / or load_graph_delta_async.
+# use -h for help.
+
+import argparse
+import asyncio
+import random
+import time
+
+from arango import ArangoClient
+
+from relation_engine.batchload.async_arango import AsyncArangoDatabase
+from relation_engine.batchload.async_time_travelling_database import (
+    AsyncArangoBatchTimeTravellingDB
+)
+from relation_engine.batchload.delta_load import load_graph_delta, load_graph_delta_async
+from relation_engine.batchload.test.test_helpers import create_timetravel_collection
+from relation_engine.batchload.time_travelling_database import ArangoBatchTimeTravellingDB
+from relation_engine.test.arango_standin import ArangoStandin
+
+_DB = 'benchmark'
+
+
+def parseargs():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the delta loader against the ArangoDB stand-in.')
+    parser.add_argument('--vertices', type=int, default=100000,
+                        help='the number of vertices in the graph.')
+    parser.add_argument('--edges', type=int, default=200000,
+                        help='the number of edges in the graph.')
+    parser.add_argument('--edge-collections', type=int, default=1,
+                        help='the number of edge collections to spread the edges across.')
+    parser.add_argument('--change-fraction', type=float, default=0.1,
+                        help='the fraction of vertices and edges to change in the second load.')
+    parser.add_argument('--batch-size', type=int, default=10000,
+                        help='the delta loader batch size.')
+    parser.add_argument('--max-batches-in-flight', type=int, default=4,
+                        help='the maximum number of batches in flight for the async loader.')
+    parser.add_argument('--latency-ms', type=float, default=2,
+                        help='the latency to add to each request.')
+    parser.add_argument('--import-latency-per-doc-us', type=float, default=5,
+                        help='the latency to add per document for bulk imports.')
+    parser.add_argument('--skip-sync', action='store_true', help='skip load_graph_delta.')
+    parser.add_argument('--skip-async', action='store_true',
+                        help='skip load_graph_delta_async.')
+    parser.add_argument('--seed', type=int, default=42, help='the random seed for the graph.')
+
+    return parser.parse_args()
+
+
+def make_graph(a, version):
+    r = random.Random(a.seed)
+    # the seed is the same for each version, so only the changed items differ
+    change = random.Random(a.seed + version)
+    verts = [{'id': f'v{i}', 'data': i} for i in range(a.vertices)]
+    edges = []
+    for i in range(a.edges):
+        e = {'id': f'e{i}',
+             'from': f'v{r.randrange(a.vertices)}',
+             'to': f'v{r.randrange(a.vertices)}',
+             '_collection': f'e{i % a.edge_collections}',
+             'data': i}
+        edges.append(e)
+    if version > 1:
+        for items in (verts, edges):
+            for item in change.sample(items, int(len(items) * a.change_fraction)):
+                item['data'] = -item['data']
+    return verts, edges
+
+
+def setup(url, a):
+    client = ArangoClient(hosts=url)
+    sys = client.db('_system')
+    sys.delete_database(_DB, ignore_missing=True)
+    sys.create_database(_DB)
+    db = client.db(_DB)
+    create_timetravel_collection(db, 'v')
+    ecols = [f'e{i}' for i in range(a.edge_collections)]
+    for c in ecols:
+        create_timetravel_collection(db, c, edge=True)
+    db.create_collection('r')
+    return ArangoBatchTimeTravellingDB(db, 'r', 'v', edge_collections=ecols)
+
+
+def load_sync(url, a, attdb, verts, edges, ver):
+    load_graph_delta('bench', verts, edges, attdb, ver * 100, ver * 100, str(ver),
+                     batch_size=a.batch_size)
+
+
+def load_async(url, a, attdb, verts, edges, ver):
+    async def load():
+        async with AsyncArangoDatabase(url, _DB) as adb:
+            await load_graph_delta_async(
+                'bench', verts, edges, AsyncArangoBatchTimeTravellingDB(attdb, adb),
+                ver * 100, ver * 100, str(ver), batch_size=a.batch_size,
+                max_batches_in_flight=a.max_batches_in_flight)
+    asyncio.run(load())
+
+
+def run(name, loader, a):
+    standin = ArangoStandin(a.latency_ms, a.import_latency_per_doc_us)
+    url = standin.start_in_thread()
+    try:
+        attdb = setup(url, a)
+        for ver in (1, 2):
+            verts, edges = make_graph(a, ver)
+            standin.request_counts.clear()
+            standin.max_concurrent_requests = 0
+            t0 = time.time()
+            loader(url, a, attdb, verts, edges, ver)
+            t = time.time() - t0
+            print(f'{name} load {ver}: {t:.2f}s, {sum(standin.request_counts.values())} '
+                  + f'requests, max {standin.max_concurrent_requests} concurrent')
+    finally:
+        standin.stop()
+
+
+def main():
+    a = parseargs()
+    if not a.skip_sync:
+        run('load_graph_delta', load_sync, a)
+    if not a.skip_async:
+        run('load_graph_delta_async', load_async, a)
+
+
+if __name__ == '__main__':
+    main()
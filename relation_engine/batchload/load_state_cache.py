@@ -0,0 +1,231 @@
+"""
+A local cache of the state of a namespace after a delta load, which allows the next delta load
+to calculate the changes to the graph without looking up documents in the database.
+
+The cache is a SQLite file containing the ID, content hash, and database key of every extant
+vertex and edge, along with the vertex _id and the edge _from and _to fields. It is tagged with
+the load version, load timestamp, and start and completion times of the load from the registry
+and only used if they match the latest completed load, so a rollback or a load without the cache
+invalidates it, even if the load is rerun with the same version.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+# Stay well below the SQLite limit on the number of variables in a query
+_MAX_QUERY_IDS = 500
+
+_META_NAMESPACE = 'load_namespace'
+_META_LOAD = 'load'
+_META_VERTEX_COLLECTION = 'vertex_collection'
+_META_EDGE_COLLECTIONS = 'edge_collections'
+
+# The registry fields that identify a load. The version alone is not enough, as a load may be
+# rolled back and rerun with the same version.
+_LOAD_FIELDS = ('load_version', 'load_timestamp', 'start_time', 'completion_time')
+
+_SCHEMA = [
+    'CREATE TABLE meta (name TEXT PRIMARY KEY, value TEXT)',
+    '''CREATE TABLE vertices (
+        id TEXT PRIMARY KEY, hash BLOB, key TEXT, full_id TEXT) WITHOUT ROWID''',
+    '''CREATE TABLE edges (
+        collection TEXT, id TEXT, hash BLOB, key TEXT, from_id TEXT, to_id TEXT,
+        PRIMARY KEY (collection, id)) WITHOUT ROWID''',
+    'CREATE TABLE removed (id TEXT PRIMARY KEY) WITHOUT ROWID',
+]
+
+
+class LoadStateCache:
+    """
+    A cache of the state of a namespace after a load. The new state is recorded as the load
+    proceeds and replaces the cached state when the load is committed.
+
+    Vertex rows are tuples of (id, hash, key, _id) and edge rows are tuples of
+    (id, hash, key, _from, _to).
+
+    This class is thread safe.
+    """
+
+    def __init__(self, path):
+        """
+        path - the path to the cache file. The file is created if it does not exist. A file with
+          the same path plus a '.new' suffix is used while a load is in progress.
+        """
+        if not path:
+            raise ValueError('path is required')
+        self._path = Path(path)
+        self._new_path = self._path.with_name(self._path.name + '.new')
+        self._lock = threading.Lock()
+        self._conn = None
+        self._meta = None
+        self._has_previous = False
+
+    def begin(self, load_namespace, previous_load, vertex_collection, edge_collections):
+        """
+        Start recording the state of a new load.
+
+        load_namespace - the namespace of the load.
+        previous_load - the registry entry of the latest load in the namespace, as returned by
+          get_registered_loads, if it is complete, or None otherwise.
+        vertex_collection - the name of the vertex collection for the load.
+        edge_collections - the names of the edge collections for the load.
+
+        Returns True if the cache contains the state of the previous load for the same
+        collections, in which case the get_previous_* methods may be used.
+        """
+        with self._lock:
+            if self._conn:
+                raise ValueError('A load is already in progress')
+            self._meta = {
+                _META_NAMESPACE: load_namespace,
+                _META_VERTEX_COLLECTION: vertex_collection,
+                _META_EDGE_COLLECTIONS: json.dumps(sorted(edge_collections)),
+            }
+            self._has_previous = previous_load is not None and self._read_meta() == dict(
+                self._meta, **{_META_LOAD: _load_id(previous_load)})
+            if self._new_path.exists():
+                self._new_path.unlink()
+            self._conn = sqlite3.connect(self._new_path, check_same_thread=False)
+            # the file is discarded on failure, so durability is not needed
+            self._conn.execute('PRAGMA journal_mode = OFF')
+            self._conn.execute('PRAGMA synchronous = OFF')
+            for s in _SCHEMA:
+                self._conn.execute(s)
+            if self._has_previous:
+                self._conn.execute('ATTACH DATABASE ? AS prev', (str(self._path),))
+            return self._has_previous
+
+    def _read_meta(self):
+        if not self._path.exists():
+            return None
+        conn = sqlite3.connect(f'file:{self._path}?mode=ro', uri=True)
+        try:
+            return dict(conn.execute('SELECT name, value FROM meta'))
+        except sqlite3.DatabaseError:
+            # not a cache file or a corrupt file, just rebuild it
+            return None
+        finally:
+            conn.close()
+
+    def add_vertices(self, rows):
+        """
+        Add vertex rows to the new state.
+        """
+        with self._lock:
+            self._conn.executemany('INSERT OR REPLACE INTO vertices VALUES (?, ?, ?, ?)', rows)
+
+    def remove_vertices(self, ids):
+        """
+        Remove vertices that were expired during the load, e.g. by a merge, from the new state.
+        The vertices are not returned by get_unseen_vertices.
+        """
+        ids = [(i,) for i in ids]
+        with self._lock:
+            self._conn.executemany('DELETE FROM vertices WHERE id = ?', ids)
+            self._conn.executemany('INSERT OR IGNORE INTO removed VALUES (?)', ids)
+
+    def add_edges(self, collection, rows):
+        """
+        Add edge rows for an edge collection to the new state.
+        """
+        with self._lock:
+            self._conn.executemany('INSERT OR REPLACE INTO edges VALUES (?, ?, ?, ?, ?, ?)',
+                                   [(collection,) + tuple(r) for r in rows])
+
+    def get_vertices(self, ids):
+        """
+        Get vertices from the new state as a dict of ID to row.
+        """
+        return self._get('SELECT * FROM vertices WHERE id IN ({})', [], ids)
+
+    def get_previous_vertices(self, ids):
+        """
+        Get vertices from the state of the previous load as a dict of ID to row.
+        """
+        self._check_previous()
+        return self._get('SELECT * FROM prev.vertices WHERE id IN ({})', [], ids)
+
+    def get_previous_edges(self, collection, ids):
+        """
+        Get edges in an edge collection from the state of the previous load as a dict of ID to
+        row.
+        """
+        self._check_previous()
+        return self._get(
+            '''SELECT id, hash, key, from_id, to_id FROM prev.edges
+               WHERE collection = ? AND id IN ({})''',
+            [collection], ids)
+
+    def _get(self, query, params, ids):
+        ret = {}
+        with self._lock:
+            for i in range(0, len(ids), _MAX_QUERY_IDS):
+                chunk = ids[i:i + _MAX_QUERY_IDS]
+                q = query.format(', '.join('?' * len(chunk)))
+                for row in self._conn.execute(q, params + list(chunk)):
+                    ret[row[0]] = row
+        return ret
+
+    def get_unseen_vertices(self):
+        """
+        Get the keys of the vertices in the state of the previous load that are not in the new
+        state and were not removed as a list.
+        """
+        self._check_previous()
+        with self._lock:
+            return [r[0] for r in self._conn.execute(
+                '''SELECT p.key FROM prev.vertices p
+                   WHERE NOT EXISTS (SELECT 1 FROM vertices v WHERE v.id = p.id)
+                     AND NOT EXISTS (SELECT 1 FROM removed r WHERE r.id = p.id)''')]
+
+    def get_unseen_edges(self, collection):
+        """
+        Get the edges in an edge collection in the state of the previous load that are not in the
+        new state as a list of (key, _from, _to) tuples.
+        """
+        self._check_previous()
+        with self._lock:
+            return self._conn.execute(
+                '''SELECT p.key, p.from_id, p.to_id FROM prev.edges p
+                   WHERE p.collection = ? AND NOT EXISTS (
+                       SELECT 1 FROM edges e WHERE e.collection = p.collection AND e.id = p.id)
+                ''', (collection,)).fetchall()
+
+    def _check_previous(self):
+        if not self._has_previous:
+            raise ValueError('The cache does not contain the state of the previous load')
+
+    def commit(self, load):
+        """
+        Tag the new state with the load, which must be complete, and replace the cached state
+        with the new state.
+
+        load - the registry entry of the load, as returned by get_registered_loads.
+        """
+        with self._lock:
+            self._meta[_META_LOAD] = _load_id(load)
+            self._conn.executemany('INSERT INTO meta VALUES (?, ?)', self._meta.items())
+            self._conn.execute('DROP TABLE removed')
+            self._conn.commit()
+            self._close()
+            os.replace(self._new_path, self._path)
+
+    def abort(self):
+        """
+        Discard the new state, leaving the cached state unchanged.
+        """
+        with self._lock:
+            if self._conn:
+                self._close()
+                self._new_path.unlink()
+
+    def _close(self):
+        self._conn.close()
+        self._conn = None
+
+
+def _load_id(load):
+    return json.dumps([load[f] for f in _LOAD_FIELDS])
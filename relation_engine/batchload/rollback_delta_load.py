@@ -4,9 +4,9 @@
 
 import argparse
 import getpass
-from arango import ArangoClient
 
 from relation_engine.batchload.delta_load import roll_back_last_load
+from relation_engine.batchload.arango_connection import connect
 from relation_engine.batchload.time_travelling_database import ArangoBatchTimeTravellingDBFactory
 
 
@@ -19,7 +19,9 @@ The most recent load will be removed.
     parser.add_argument(
         '--arango-url',
         required=True,
-        help='The url of the ArangoDB server (e.g. http://localhost:8528')
+        help='The url of the ArangoDB server (e.g. http://localhost:8528). Multiple ' +
+        'comma separated urls may be supplied, in which case requests are distributed ' +
+        'across them round robin.')
     parser.add_argument(
         '--database',
         required=True,
@@ -42,25 +44,30 @@ The most recent load will be removed.
         required=True,
         help='the name of the ArangoDB collection where loads are registered. ' +
         'This is typically the same collection for all delta loaded data.')
+    parser.add_argument(
+        '--sweep-concurrency',
+        type=int,
+        default=4,
+        help='the maximum number of collections to revert concurrently. Default 4.')
 
     return parser.parse_args()
 
 
 def main():
     a = parse_args()
-    client = ArangoClient(hosts=a.arango_url)
+    pwd = None
     if a.user:
         if a.pwd_file:
             with open(a.pwd_file) as pwd_file:
                 pwd = pwd_file.read().strip()
         else:
             pwd = getpass.getpass()
-        db = client.db(a.database, a.user, pwd, verify=True)
-    else:
-        db = client.db(a.database, verify=True)
+    db = connect(a.arango_url.split(','), a.database, a.user, pwd)
     fac = ArangoBatchTimeTravellingDBFactory(db, a.load_registry_collection)
 
-    roll_back_last_load(fac, a.load_namespace)
+    times = roll_back_last_load(fac, a.load_namespace, sweep_concurrency=a.sweep_concurrency)
+    for col, t in times.items():
+        print(f'Reverted collection {col} in {t:.2f}s')
 
 
 if __name__ == '__main__':
@@ -0,0 +1,113 @@
+"""
+Functions for sorting and joining streams of documents that are too large to hold in memory.
+"""
+
+import heapq
+import itertools
+import os
+import pickle
+import tempfile
+
+DEFAULT_RUN_SIZE = 1000000
+
+_END = object()
+
+
+def external_sort(items, key, run_size=DEFAULT_RUN_SIZE, temp_dir=None):
+    """
+    Sort an iterable, spilling sorted runs to disk if there are more items than fit in a run.
+    The runs are merged as the sorted items are consumed.
+
+    items - the items to sort. If there is more than one run, the items must be picklable.
+    key - a function that returns the sort key for an item.
+    run_size - the maximum number of items to hold in memory while sorting.
+    temp_dir - the directory in which to create temporary files. Defaults to the system
+        temporary directory.
+
+    Returns a generator over the sorted items. The temporary files are removed when the
+    generator is exhausted or closed.
+    """
+    if run_size < 1:
+        raise ValueError('run_size must be at least 1')
+    items = iter(items)
+    run = sorted(itertools.islice(items, run_size), key=key)
+    if len(run) < run_size:
+        # the common case for small sources, no need to touch the disk
+        yield from run
+        return
+    with tempfile.TemporaryDirectory(prefix='external_sort_', dir=temp_dir) as tmp:
+        runs = []
+        while run:
+            path = os.path.join(tmp, f'run_{len(runs)}')
+            with open(path, 'wb') as f:
+                for item in run:
+                    pickle.dump(item, f, pickle.HIGHEST_PROTOCOL)
+            runs.append(path)
+            run = sorted(itertools.islice(items, run_size), key=key)
+        files = [open(r, 'rb') for r in runs]
+        try:
+            yield from heapq.merge(*[_read_run(f) for f in files], key=key)
+        finally:
+            for f in files:
+                f.close()
+
+
+def _read_run(f):
+    while True:
+        try:
+            yield pickle.load(f)
+        except EOFError:
+            return
+
+
+def check_sorted(items, key, name):
+    """
+    Pass through the items in an iterable, checking that their keys are strictly increasing.
+
+    items - the items to check.
+    key - a function that returns the key for an item.
+    name - a description of the items for error messages, e.g. 'the vertex source'.
+
+    Returns a generator over the items that throws a ValueError if an item's key is not greater
+    than the previous item's key.
+    """
+    prev = _END
+    for item in items:
+        k = key(item)
+        if prev is not _END and not prev < k:
+            raise ValueError(f'Keys are not strictly increasing in {name}: {prev!r} is followed by '
+                             + f'{k!r}')
+        prev = k
+        yield item
+
+
+def sorted_join(left, right, key, left_name='the left items', right_name='the right items'):
+    """
+    Full outer join two iterables that are sorted by a unique key.
+
+    left - the left items.
+    right - the right items.
+    key - a function that returns the key for an item. Keys from both iterables must be
+        comparable.
+    left_name - a description of the left items for error messages.
+    right_name - a description of the right items for error messages.
+
+    Returns a generator over (left item, right item) tuples in key order, where one of the
+    items is None if the other iterable has no item with that key. Throws a ValueError if
+    either iterable is not sorted by strictly increasing key.
+    """
+    left = check_sorted(left, key, left_name)
+    right = check_sorted(right, key, right_name)
+    l_ = next(left, _END)
+    r = next(right, _END)
+    while l_ is not _END or r is not _END:
+        if r is _END or (l_ is not _END and key(l_) < key(r)):
+            yield l_, None
+            l_ = next(left, _END)
+        elif l_ is _END or key(r) < key(l_):
+            yield None, r
+            r = next(right, _END)
+        else:
+            yield l_, r
+            l_ = next(left, _END)
+            r = next(right, _END)
@@ -0,0 +1,88 @@
+import gzip
+from pytest import raises
+
+from relation_engine.batchload.arango_connection import LoaderHTTPClient
+from relation_engine.test.testing_helpers import assert_exception_correct
+
+_IMPORT_URL = 'http://localhost:8529/_db/mydb/_api/import'
+_BIG = '{"_key": "k"}\n' * 10000
+
+
+class _FakeResponse:
+
+    def __init__(self, url):
+        self.url = url
+        self.headers = {}
+        self.status_code = 201
+        self.reason = 'Created'
+        self.text = '{}'
+
+
+class _FakeSession:
+
+    def __init__(self):
+        self.calls = []
+
+    def request(self, **kwargs):
+        self.calls.append(kwargs)
+        return _FakeResponse(kwargs['url'])
+
+
+def _send(client, method, url, data, headers=None):
+    session = _FakeSession()
+    resp = client.send_request(session, method, url, headers=headers, data=data)
+    assert resp.status_code == 201
+    assert len(session.calls) == 1
+    return session.calls[0]
+
+
+def test_defaults():
+    call = _send(LoaderHTTPClient(), 'post', _IMPORT_URL, _BIG, {'foo': 'bar'})
+
+    assert call['data'] == _BIG
+    assert call['headers'] == {'foo': 'bar'}
+    assert call['timeout'] == 60
+
+
+def test_compress_import():
+    headers = {'foo': 'bar'}
+    call = _send(LoaderHTTPClient(compress_requests=True, request_timeout_sec=5),
+                 'post', _IMPORT_URL + '?collection=foo', _BIG, headers)
+
+    assert gzip.decompress(call['data']).decode('utf-8') == _BIG
+    assert call['headers'] == {'foo': 'bar', 'Content-Encoding': 'gzip'}
+    assert headers == {'foo': 'bar'}  # the caller's headers are not modified
+    assert call['timeout'] == 5
+
+
+def test_compress_skipped():
+    client = LoaderHTTPClient(compress_requests=True)
+    for method, url, data in [
+        ('post', _IMPORT_URL, _BIG[:1000]),  # too small
+        ('put', _IMPORT_URL, _BIG),
+        ('post', 'http://localhost:8529/_db/mydb/_api/cursor', _BIG),
+    ]:
+        call = _send(client, method, url, data)
+        assert call['data'] == data
+        assert call['headers'] is None
+
+
+def test_create_session():
+    session = LoaderHTTPClient(pool_size=42).create_session('http://localhost:8529')
+    adapter = session.get_adapter('http://localhost:8529')
+    assert adapter._pool_maxsize == 42
+    assert adapter._pool_connections == 1
+    assert 'Connection' not in session.headers or session.headers['Connection'] != 'close'
+
+    session = LoaderHTTPClient(keep_alive=False).create_session('http://localhost:8529')
+    assert session.headers['Connection'] == 'close'
+
+
+def test_fail_construct():
+    for kwargs, err in [
+        ({'pool_size': 0}, 'pool_size must be at least 1'),
+        ({'request_timeout_sec': 0}, 'request_timeout_sec must be greater than 0'),
+    ]:
+        with raises(Exception) as got:
+            LoaderHTTPClient(**kwargs)
+        assert_exception_correct(got.value, ValueError(err))
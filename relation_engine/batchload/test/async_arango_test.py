@@ -0,0 +1,170 @@
+import asyncio
+import json
+from aiohttp import web
+from pytest import raises
+
+from relation_engine.batchload.async_arango import AsyncArangoDatabase, AsyncArangoError
+from relation_engine.test.testing_helpers import assert_exception_correct
+
+
+class _FakeArango:
+    """
+    Serves canned cursor and import responses and records the requests.
+    """
+
+    def __init__(self, cursor_batches=None, cursor_error_batch=None):
+        self.requests = []
+        self.cursor_batches = cursor_batches or [[]]
+        self.cursor_error_batch = cursor_error_batch
+        self.app = web.Application()
+        self.app.router.add_route('*', '/{path:.*}', self._handle)
+
+    async def _handle(self, request):
+        # aiohttp decompresses gzipped request bodies
+        body = await request.read()
+        self.requests.append((request.method, request.path, dict(request.query),
+                              dict(request.headers), body.decode('utf-8')))
+        if request.path.endswith('/_api/import'):
+            return web.json_response({'created': len(body.splitlines()), 'errors': 0},
+                                     status=201)
+        if request.method == 'DELETE':
+            return web.json_response({}, status=202)
+        if request.method == 'POST':
+            query = json.loads(body)['query']
+            if query == 'bad':
+                return web.json_response(
+                    {'error': True, 'errorNum': 1501, 'errorMessage': 'syntax error',
+                     'code': 400},
+                    status=400)
+            return self._cursor(0)
+        batch = int(request.path.split('/')[-1])
+        if batch == self.cursor_error_batch:
+            return web.Response(status=503, reason='Service Unavailable')
+        return self._cursor(batch)
+
+    def _cursor(self, batch):
+        has_more = batch + 1 < len(self.cursor_batches)
+        return web.json_response({
+            'result': self.cursor_batches[batch],
+            'hasMore': has_more,
+            # the cursor ID is the index of the next batch
+            'id': str(batch + 1) if has_more else None,
+        }, status=201)
+
+
+def _run(fake, test):
+    async def run():
+        runner = web.AppRunner(fake.app)
+        await runner.setup()
+        site = web.TCPSite(runner, 'localhost', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        try:
+            return await test(port)
+        finally:
+            await runner.cleanup()
+    return asyncio.run(run())
+
+
+def test_aql_cursor_batches():
+    fake = _FakeArango(cursor_batches=[[{'a': 1}, {'a': 2}], [{'a': 3}], [{'a': 4}]])
+
+    async def test(port):
+        async with AsyncArangoDatabase(f'http://localhost:{port}/', 'mydb') as db:
+            return await db.aql('FOR d IN @@col RETURN d', bind_vars={'@col': 'foo'})
+
+    assert _run(fake, test) == [{'a': 1}, {'a': 2}, {'a': 3}, {'a': 4}]
+    assert [(r[0], r[1]) for r in fake.requests] == [
+        ('POST', '/_db/mydb/_api/cursor'),
+        ('PUT', '/_db/mydb/_api/cursor/1'),
+        ('PUT', '/_db/mydb/_api/cursor/2'),
+    ]
+    body = json.loads(fake.requests[0][4])
+    assert body['query'] == 'FOR d IN @@col RETURN d'
+    assert body['bindVars'] == {'@col': 'foo'}
+
+
+def test_aql_fail():
+    fake = _FakeArango()
+
+    async def test(port):
+        async with AsyncArangoDatabase(f'http://localhost:{port}', 'mydb') as db:
+            with raises(Exception) as got:
+                await db.aql('bad')
+            return got.value
+
+    err = _run(fake, test)
+    assert_exception_correct(err, AsyncArangoError('[HTTP 400][ERR 1501] syntax error', 400))
+    assert err.http_code == 400
+    assert err.error_code == 1501
+
+
+def test_aql_fail_deletes_cursor():
+    fake = _FakeArango(cursor_batches=[[1], [2], [3]], cursor_error_batch=2)
+
+    async def test(port):
+        async with AsyncArangoDatabase(f'http://localhost:{port}', 'mydb') as db:
+            with raises(Exception) as got:
+                await db.aql('FOR d IN foo RETURN d')
+            return got.value
+
+    err = _run(fake, test)
+    assert_exception_correct(err, AsyncArangoError('[HTTP 503] Service Unavailable', 503))
+    assert err.error_code is None
+    assert [(r[0], r[1]) for r in fake.requests] == [
+        ('POST', '/_db/mydb/_api/cursor'),
+        ('PUT', '/_db/mydb/_api/cursor/1'),
+        ('PUT', '/_db/mydb/_api/cursor/2'),
+        ('DELETE', '/_db/mydb/_api/cursor/2'),
+    ]
+
+
+def test_import_bulk():
+    fake = _FakeArango()
+    docs = [{'_key': str(i), 'data': 'x' * 100} for i in range(1000)]
+
+    async def test(port):
+        url = f'http://localhost:{port}'
+        async with AsyncArangoDatabase(url, 'mydb', compress_requests=True) as db:
+            small = await db.import_bulk('foo', docs[:2], on_duplicate='update')
+            big = await db.import_bulk('foo', docs)
+            return small, big
+
+    small, big = _run(fake, test)
+    assert small == {'created': 2, 'errors': 0}
+    assert big == {'created': 1000, 'errors': 0}
+    (_, path, query, headers, body), (_, _, _, bigheaders, bigbody) = fake.requests
+    assert path == '/_db/mydb/_api/import'
+    assert query == {'collection': 'foo', 'type': 'documents', 'onDuplicate': 'update',
+                     'details': 'true'}
+    assert 'Content-Encoding' not in headers
+    assert [json.loads(line) for line in body.splitlines()] == docs[:2]
+    assert bigheaders['Content-Encoding'] == 'gzip'
+    assert [json.loads(line) for line in bigbody.splitlines()] == docs
+
+
+def test_round_robin():
+    fake = _FakeArango()
+
+    async def test(port):
+        urls = [f'http://localhost:{port}/', f'http://127.0.0.1:{port}']
+        async with AsyncArangoDatabase(urls, 'mydb', username='u', password='p') as db:
+            for _ in range(3):
+                await db.aql('RETURN 1')
+
+    _run(fake, test)
+    assert [r[3]['Host'].split(':')[0] for r in fake.requests] == [
+        'localhost', '127.0.0.1', 'localhost']
+    assert {r[3]['Authorization'] for r in fake.requests} == {'Basic dTpw'}
+
+
+def test_fail_construct():
+    for args, kwargs, err in [
+        ([[], 'db'], {}, 'At least one url is required'),
+        (['http://foo', 'db'], {'pool_size': 0}, 'pool_size must be at least 1'),
+        (['http://foo', 'db'], {'request_timeout_sec': 0},
+         'request_timeout_sec must be greater than 0'),
+    ]:
+        with raises(Exception) as got:
+            AsyncArangoDatabase(*args, **kwargs)
+        assert_exception_correct(got.value, ValueError(err))
@@ -12,11 +12,20 @@
 from relation_engine.batchload.time_travelling_database import ArangoBatchTimeTravellingDB
 from relation_engine.batchload.time_travelling_database import ArangoBatchTimeTravellingDBFactory
 from relation_engine.batchload.delta_load import load_graph_delta, roll_back_last_load
+from relation_engine.batchload.delta_load import load_graph_delta_async
+from relation_engine.batchload.delta_load import backfill_graph_history, BackfillRelease
+from relation_engine.batchload.graph_delta import diff_graphs, GraphDelta, apply_graph_delta
+from relation_engine.batchload.load_state_cache import LoadStateCache
+from relation_engine.batchload.async_arango import AsyncArangoDatabase
+from relation_engine.batchload.async_time_travelling_database import (
+    AsyncArangoBatchTimeTravellingDB
+)
 from relation_engine.batchload.test.test_helpers import create_timetravel_collection
 from relation_engine.batchload.test.test_helpers import check_docs, check_exception
 from arango import ArangoClient
+import asyncio
 import datetime
-from pytest import fixture
+from pytest import fixture, raises
 
 HOST = 'http://localhost:8529'
 DB_NAME = 'test_delta_load_integration_db'
@@ -58,6 +67,12 @@ def test_merge_setup_fail(arango_db):
         ValueError, 'A merge source is specified but the database has no merge collection')
 
 
+def test_load_fail_bad_sweep_concurrency():
+    check_exception(
+        lambda: load_graph_delta('ns', [], [], None, 1, 1, "2", sweep_concurrency=0),
+        ValueError, 'sweep_concurrency must be at least 1')
+
+
 def test_load_no_merge_source_batch_2(arango_db):
     _load_no_merge_source(arango_db, 2)
 
@@ -66,7 +81,27 @@ def test_load_no_merge_source_batch_default(arango_db):
     _load_no_merge_source(arango_db, None)
 
 
-def _load_no_merge_source(arango_db, batchsize):
+def test_load_no_merge_source_async_batch_2(arango_db):
+    _load_no_merge_source(arango_db, 2, _load_async)
+
+
+def test_load_no_merge_source_async_batch_default(arango_db):
+    _load_no_merge_source(arango_db, None, _load_async)
+
+
+def _load_async(*args, **kwargs):
+    """
+    Runs load_graph_delta_async with the same arguments as load_graph_delta.
+    """
+    async def load():
+        async with AsyncArangoDatabase(HOST, DB_NAME) as adb:
+            args_ = list(args)
+            args_[3] = AsyncArangoBatchTimeTravellingDB(args[3], adb)
+            await load_graph_delta_async(*args_, **kwargs)
+    asyncio.run(load())
+
+
+def _load_no_merge_source(arango_db, batchsize, load=load_graph_delta):
     """
     Test delta loading a small graph, including deleted, updated, unchanged, and new nodes and
     edges.
@@ -154,9 +189,9 @@ def _load_no_merge_source(arango_db, batchsize):
                                      edge_collections=['e1', 'e2'])
 
     if batchsize:
-        load_graph_delta('ns', vsource, esource, db, 500, 400, 'v2', batch_size=batchsize)
+        load('ns', vsource, esource, db, 500, 400, 'v2', batch_size=batchsize)
     else:
-        load_graph_delta('ns', vsource, esource, db, 500, 400, 'v2')
+        load('ns', vsource, esource, db, 500, 400, 'v2')
 
     vexpected = [
         {'id': 'expire', '_key': 'expire_v0', '_id': 'v/expire_v0',
@@ -275,6 +310,14 @@ def _load_no_merge_source(arango_db, batchsize):
 
 
 def test_merge_edges(arango_db):
+    _merge_edges(arango_db, load_graph_delta)
+
+
+def test_merge_edges_async(arango_db):
+    _merge_edges(arango_db, _load_async)
+
+
+def _merge_edges(arango_db, load):
     """
     Test that merge edges are handled appropriately.
     """
@@ -319,7 +362,7 @@ def test_merge_edges(arango_db):
     db = ArangoBatchTimeTravellingDB(arango_db, 'r', 'v', default_edge_collection='e',
                                      merge_collection='m')
 
-    load_graph_delta('mns', vsource, esource, db, 500, 400, 'v2', merge_source=msource)
+    load('mns', vsource, esource, db, 500, 400, 'v2', merge_source=msource)
 
     vexpected = [
         {'id': 'root', '_key': 'root_v1', '_id': 'v/root_v1',
@@ -374,6 +417,789 @@ def test_merge_edges(arango_db):
 
     _check_registry_doc(arango_db, registry_expected, 'r', compare_times_to_now=True)
 
+
+def test_first_load(arango_db):
+    """
+    Test that the first load into empty collections creates the graph without looking up edges
+    or vertices, other than for merges.
+    """
+    create_timetravel_collection(arango_db, 'v')
+    create_timetravel_collection(arango_db, 'def_e', edge=True)
+    create_timetravel_collection(arango_db, 'e1', edge=True)
+    create_timetravel_collection(arango_db, 'm', edge=True)
+    arango_db.create_collection('r')
+
+    db = ArangoBatchTimeTravellingDB(arango_db, 'r', 'v', default_edge_collection='def_e',
+                                     edge_collections=['e1'], merge_collection='m')
+    lookups = []
+    get_vertices = db.get_vertices
+
+    def record_get_vertices(keys, timestamp):
+        lookups.append(set(keys))
+        return get_vertices(keys, timestamp)
+
+    db.get_vertices = record_get_vertices
+    db.get_edges = None  # only the merges use get_edges
+
+    vsource = [{'id': i, 'data': 'foo' + i} for i in ['1', '2', '3']]
+    esource = [
+        {'id': '1', 'from': '1', 'to': '2', 'data': 'bar'},
+        {'_collection': 'e1', 'id': '2', 'from': '2', 'to': '3'},
+    ]
+    # the first load doesn't sweep the collections
+    assert load_graph_delta('ns', vsource, esource, db, 500, 400, 'v1', batch_size=2,
+                            max_writes_in_flight=2) == {}
+
+    assert lookups == []
+    m = ADB_MAX_TIME
+    vexpected = [
+        {'id': i, '_key': i + '_v1', '_id': 'v/' + i + '_v1', 'data': 'foo' + i,
+         'first_version': 'v1', 'last_version': 'v1', 'created': 500, 'expired': m,
+         'release_created': 400, 'release_expired': m}
+        for i in ['1', '2', '3']
+    ]
+    check_docs(arango_db, vexpected, 'v')
+
+    def edge(col, id_, from_, to, data=None):
+        e = {'id': id_, 'from': from_, 'to': to, '_key': id_ + '_v1', '_id': f'{col}/{id_}_v1',
+             '_from': f'v/{from_}_v1', '_to': f'v/{to}_v1',
+             'first_version': 'v1', 'last_version': 'v1', 'created': 500, 'expired': m,
+             'release_created': 400, 'release_expired': m}
+        if data:
+            e['data'] = data
+        return e
+
+    check_docs(arango_db, [edge('def_e', '1', '1', '2', 'bar')], 'def_e')
+    check_docs(arango_db, [edge('e1', '2', '2', '3')], 'e1')
+    check_docs(arango_db, [], 'm')
+    assert db.get_import_metrics()['imports'] == 4
+    assert [(d['load_version'], d['state']) for d in db.get_registered_loads('ns')] == [
+        ('v1', 'complete')]
+
+    # the second load is a delta load
+    del db.get_edges
+    load_graph_delta('ns', vsource[:2], [{'id': '1', 'from': '1', 'to': '2', 'data': 'bar'}],
+                     db, 600, 500, 'v2', merge_source=[{'id': '3', 'from': '3', 'to': '2'}])
+    assert lookups == [{'1', '2'}, {'2', '3'}, {'1', '2'}]
+    vexpected[2].update({'expired': 599, 'release_expired': 499})
+    for v in vexpected[:2]:
+        v['last_version'] = 'v2'
+    check_docs(arango_db, vexpected, 'v')
+
+
+def test_first_load_fail_duplicate_vertex(arango_db):
+    create_timetravel_collection(arango_db, 'v')
+    create_timetravel_collection(arango_db, 'e', edge=True)
+    arango_db.create_collection('r')
+    db = ArangoBatchTimeTravellingDB(arango_db, 'r', 'v', default_edge_collection='e')
+
+    with raises(ValueError) as got:
+        load_graph_delta('ns', [{'id': '1'}, {'id': '1'}], [], db, 500, 400, 'v1')
+    assert got.value.args[0].startswith(
+        'Document already exists in collection v: at position 1: creating document failed')
+
+
+def test_first_load_fail_missing_vertex(arango_db):
+    arango_db.create_collection('r')
+    verts = [{'id': '1'}, {'id': '2'}, {'id': '3'}]
+    for i, (edge, merges, vid) in enumerate([
+        ({'id': 'x', 'from': '1', 'to': '4'}, None, '4'),
+        ({'id': 'x', 'from': '4', 'to': '1'}, None, '4'),
+        # merged vertices are expired, so edges to them would dangle
+        ({'id': 'x', 'from': '1', 'to': '3'}, [{'id': '3', 'from': '3', 'to': '2'}], '3'),
+    ]):
+        # the first load requires empty collections
+        create_timetravel_collection(arango_db, f'v{i}')
+        create_timetravel_collection(arango_db, f'e{i}', edge=True)
+        create_timetravel_collection(arango_db, f'm{i}', edge=True)
+        db = ArangoBatchTimeTravellingDB(arango_db, 'r', f'v{i}', default_edge_collection=f'e{i}',
+                                         merge_collection=f'm{i}')
+        check_exception(
+            lambda: load_graph_delta(f'ns{i}', [dict(v) for v in verts], [edge], db, 500, 400,
+                                     'v1', merge_source=merges),
+            ValueError,
+            f'Edge x in collection e{i} refers to vertex {vid}, which is not an extant vertex '
+            + 'in the load')
+        check_docs(arango_db, [], f'e{i}')
+
+
+def test_load_fail_bad_max_writes_in_flight():
+    check_exception(
+        lambda: load_graph_delta('ns', [], [], None, 1, 1, "2", max_writes_in_flight=0),
+        ValueError, 'max_writes_in_flight must be at least 1')
+
+
+def test_load_touch_free(arango_db):
+    """
+    Test that a touch free load only writes created and expired documents, and that it can be
+    rolled back.
+    """
+    vcol = create_timetravel_collection(arango_db, 'v')
+    ecol = create_timetravel_collection(arango_db, 'e', edge=True)
+    arango_db.create_collection('r')
+
+    m = ADB_MAX_TIME
+    _import_bulk(vcol, [{'id': 'same'}, {'id': 'change', 'data': 'foo'}, {'id': 'gone'}],
+                 100, m, 99, m, 'v1')
+    _import_bulk(ecol, [{'id': 'same', 'from': 'same', 'to': 'same'},
+                        {'id': 'gone', 'from': 'same', 'to': 'gone'}],
+                 100, m, 99, m, 'v1', vert_col_name='v')
+
+    db = ArangoBatchTimeTravellingDB(arango_db, 'r', 'v', default_edge_collection='e')
+    db.register_load_start('ns', 'v1', 100, 99, 0)
+    db.register_load_complete('ns', 'v1', 1)
+
+    vsource = [{'id': 'same'}, {'id': 'change', 'data': 'bar'}, {'id': 'new'}]
+    esource = [{'id': 'same', 'from': 'same', 'to': 'same'},
+               {'id': 'new', 'from': 'same', 'to': 'new'}]
+    times = load_graph_delta('ns', vsource, esource, db, 500, 400, 'v2', touch_free=True)
+    assert times.keys() == {'v', 'e'}
+    assert all(t >= 0 for t in times.values())
+
+    def doc(col, id_, ver, created, expired, data=None, from_=None, to=None):
+        d = {'id': id_, '_key': f'{id_}_{ver}', '_id': f'{col}/{id_}_{ver}',
+             'first_version': ver, 'last_version': ver, 'created': created, 'expired': expired,
+             'release_created': created - (1 if ver == 'v1' else 100),
+             'release_expired': m if expired == m else expired - 100}
+        if data:
+            d['data'] = data
+        if from_:
+            d.update({'from': from_, 'to': to, '_from': f'v/{from_}_v1', '_to': f'v/{to}_{ver}'})
+        return d
+
+    # the unchanged documents are not updated
+    v1verts = [doc('v', 'same', 'v1', 100, m), doc('v', 'change', 'v1', 100, m, 'foo'),
+               doc('v', 'gone', 'v1', 100, m)]
+    v1edges = [doc('e', 'same', 'v1', 100, m, from_='same', to='same'),
+               doc('e', 'gone', 'v1', 100, m, from_='same', to='gone')]
+    check_docs(arango_db, [
+        v1verts[0],
+        doc('v', 'change', 'v1', 100, 499, 'foo'),
+        doc('v', 'gone', 'v1', 100, 499),
+        doc('v', 'change', 'v2', 500, m, 'bar'),
+        doc('v', 'new', 'v2', 500, m),
+    ], 'v')
+    check_docs(arango_db, [
+        v1edges[0],
+        doc('e', 'gone', 'v1', 100, 499, from_='same', to='gone'),
+        doc('e', 'new', 'v2', 500, m, from_='same', to='new'),
+    ], 'e')
+    # vertex batch, vertex expiry, edge batch, edge expiry
+    assert db.get_import_metrics()['imports'] == 4
+
+    roll_back_last_load(ArangoBatchTimeTravellingDBFactory(arango_db, 'r'), 'ns')
+
+    check_docs(arango_db, v1verts, 'v')
+    check_docs(arango_db, v1edges, 'e')
+
+
+def test_load_state_cache(arango_db, tmp_path):
+    """
+    Test that a load with a state cache that contains the state of the previous load calculates
+    the changes without looking up documents, and that the cache is not used after a rollback.
+    """
+    create_timetravel_collection(arango_db, 'v')
+    create_timetravel_collection(arango_db, 'e', edge=True)
+    create_timetravel_collection(arango_db, 'm', edge=True)
+    arango_db.create_collection('r')
+    db = ArangoBatchTimeTravellingDB(arango_db, 'r', 'v', default_edge_collection='e',
+                                     merge_collection='m')
+    cache = LoadStateCache(tmp_path / 'state.db')
+
+    vsource = [{'id': 'same'}, {'id': 'change', 'data': 'foo'}, {'id': 'gone'},
+               {'id': 'merged'}, {'id': 'moved'}]
+    esource = [{'id': 'same', 'from': 'same', 'to': 'same'},
+               {'id': 'gone', 'from': 'same', 'to': 'gone'},
+               {'id': 'moved', 'from': 'same', 'to': 'moved'}]
+    load_graph_delta('ns', vsource, esource, db, 100, 99, 'v1', state_cache=cache)
+
+    lookups = []
+    get_vertices = db.get_vertices
+
+    def record_get_vertices(keys, timestamp):
+        lookups.append(set(keys))
+        return get_vertices(keys, timestamp)
+
+    get_edges = db.get_edges
+
+    def record_get_edges(keys, timestamp, edge_collection=None):
+        lookups.append(edge_collection)
+        return get_edges(keys, timestamp, edge_collection=edge_collection)
+
+    db.get_vertices = record_get_vertices
+    db.get_edges = record_get_edges
+    imports = db.get_import_metrics()['imports']
+
+    vsource = [{'id': 'same'}, {'id': 'change', 'data': 'bar'}, {'id': 'moved', 'data': 'x'},
+               {'id': 'new'}]
+    esource = [{'id': 'same', 'from': 'same', 'to': 'same'},
+               {'id': 'new', 'from': 'same', 'to': 'new'},
+               {'id': 'moved', 'from': 'same', 'to': 'moved'}]
+    load_graph_delta('ns', vsource, esource, db, 500, 400, 'v2', state_cache=cache,
+                     merge_source=[{'id': 'merged', 'from': 'merged', 'to': 'same'}])
+
+    # only the merge looks up documents
+    assert lookups == ['m', {'merged', 'same'}]
+    m = ADB_MAX_TIME
+
+    def doc(col, id_, ver, created, expired, data=None, from_=None, to=None, to_ver=None):
+        d = {'id': id_, '_key': f'{id_}_{ver}', '_id': f'{col}/{id_}_{ver}',
+             'first_version': ver, 'last_version': ver, 'created': created, 'expired': expired,
+             'release_created': created - (1 if ver == 'v1' else 100),
+             'release_expired': m if expired == m else expired - 100}
+        if data:
+            d['data'] = data
+        if from_:
+            d.update({'from': from_, 'to': to, '_from': f'v/{from_}_v1',
+                      '_to': f'v/{to}_{to_ver or ver}'})
+        return d
+
+    v1verts = [doc('v', 'same', 'v1', 100, m), doc('v', 'change', 'v1', 100, m, 'foo'),
+               doc('v', 'gone', 'v1', 100, m), doc('v', 'merged', 'v1', 100, m),
+               doc('v', 'moved', 'v1', 100, m)]
+    v1edges = [doc('e', 'same', 'v1', 100, m, from_='same', to='same'),
+               doc('e', 'gone', 'v1', 100, m, from_='same', to='gone'),
+               doc('e', 'moved', 'v1', 100, m, from_='same', to='moved')]
+    check_docs(arango_db, [
+        v1verts[0],
+        doc('v', 'change', 'v1', 100, 499, 'foo'),
+        doc('v', 'gone', 'v1', 100, 499),
+        doc('v', 'merged', 'v1', 100, 499),
+        doc('v', 'moved', 'v1', 100, 499),
+        doc('v', 'change', 'v2', 500, m, 'bar'),
+        doc('v', 'moved', 'v2', 500, m, 'x'),
+        doc('v', 'new', 'v2', 500, m),
+    ], 'v')
+    check_docs(arango_db, [
+        v1edges[0],
+        doc('e', 'gone', 'v1', 100, 499, from_='same', to='gone'),
+        doc('e', 'moved', 'v1', 100, 499, from_='same', to='moved'),
+        doc('e', 'moved', 'v2', 500, m, from_='same', to='moved'),
+        doc('e', 'new', 'v2', 500, m, from_='same', to='new'),
+    ], 'e')
+    # vertex batch, merge, merged vertex, vertex expiry, edge batch, edge expiry
+    assert db.get_import_metrics()['imports'] - imports == 6
+
+    # the cache is stale after a rollback, so the next load looks up the documents
+    roll_back_last_load(ArangoBatchTimeTravellingDBFactory(arango_db, 'r'), 'ns')
+    check_docs(arango_db, v1verts, 'v')
+    check_docs(arango_db, v1edges, 'e')
+    lookups.clear()
+    load_graph_delta('ns', vsource[:1], esource[:1], db, 500, 400, 'v2', state_cache=cache)
+    # the edges and their vertices are looked up concurrently
+    assert len(lookups) == 3 and lookups.count({'same'}) == 2 and 'e' in lookups
+    assert cache.begin('ns', db.get_registered_loads('ns')[0], 'v', ['e']) is True
+    cache.abort()
+
+    # the cache is stale after rerunning the rolled back load without it, even though the
+    # load version is the same
+    roll_back_last_load(ArangoBatchTimeTravellingDBFactory(arango_db, 'r'), 'ns')
+    load_graph_delta('ns', vsource[:1], esource[:1], db, 500, 400, 'v2')
+    assert cache.begin('ns', db.get_registered_loads('ns')[0], 'v', ['e']) is False
+    cache.abort()
+
+
+def _setup_sorted_join(arango_db):
+    vcol = create_timetravel_collection(arango_db, 'v')
+    ecol = create_timetravel_collection(arango_db, 'e', edge=True)
+    e2col = create_timetravel_collection(arango_db, 'e2', edge=True)
+    create_timetravel_collection(arango_db, 'm', edge=True)
+    arango_db.create_collection('r')
+
+    m = ADB_MAX_TIME
+    _import_bulk(vcol, [{'id': 'same'}, {'id': 'change', 'data': 'foo'}, {'id': 'gone'},
+                        {'id': 'merged'}, {'id': 'moved'}, {'id': 'keep'}],
+                 100, m, 99, m, 'v1')
+    _import_bulk(ecol, [{'id': 'same', 'from': 'same', 'to': 'same'},
+                        {'id': 'gone', 'from': 'same', 'to': 'gone'},
+                        {'id': 'moved', 'from': 'same', 'to': 'moved'}],
+                 100, m, 99, m, 'v1', vert_col_name='v')
+    _import_bulk(e2col, [{'id': 'repoint', 'from': 'same', 'to': 'keep'},
+                         {'id': 'drop', 'from': 'same', 'to': 'same'}],
+                 100, m, 99, m, 'v1', vert_col_name='v')
+
+    db = ArangoBatchTimeTravellingDB(arango_db, 'r', 'v', default_edge_collection='e',
+                                     edge_collections=['e2'], merge_collection='m')
+    db.register_load_start('ns', 'v1', 100, 99, 0)
+    db.register_load_complete('ns', 'v1', 1)
+    return db
+
+
+def test_load_sorted_join(arango_db):
+    """
+    Test that a sorted join load only looks up the vertices of new or moved edges, only writes
+    created and expired documents, and can be rolled back.
+    """
+    db = _setup_sorted_join(arango_db)
+    lookups = []
+    get_vertices = db.get_vertices
+    get_edges = db.get_edges
+
+    def record_get_vertices(keys, timestamp):
+        lookups.append(set(keys))
+        return get_vertices(keys, timestamp)
+
+    def record_get_edges(keys, timestamp, edge_collection=None):
+        lookups.append(edge_collection)
+        return get_edges(keys, timestamp, edge_collection=edge_collection)
+
+    db.get_vertices = record_get_vertices
+    db.get_edges = record_get_edges
+
+    vsource = [{'id': 'new'}, {'id': 'moved', 'data': 'x'}, {'id': 'same'},
+               {'id': 'keep'}, {'id': 'change', 'data': 'bar'}]
+    esource = [{'id': 'moved', 'from': 'same', 'to': 'moved'},
+               {'_collection': 'e2', 'id': 'repoint', 'from': 'keep', 'to': 'same'},
+               {'id': 'new', 'from': 'same', 'to': 'new'},
+               {'_collection': 'e', 'id': 'same', 'from': 'same', 'to': 'same'}]
+    load_graph_delta('ns', vsource, esource, db, 500, 400, 'v2', sorted_join=True,
+                     merge_source=[{'id': 'merged', 'from': 'merged', 'to': 'same'}])
+
+    assert lookups == ['m', {'merged', 'same'}, {'same'}, {'keep', 'same'}]
+    m = ADB_MAX_TIME
+
+    def doc(col, id_, ver, created, expired, data=None, from_=None, to=None, to_ver=None):
+        d = {'id': id_, '_key': f'{id_}_{ver}', '_id': f'{col}/{id_}_{ver}',
+             'first_version': ver, 'last_version': ver, 'created': created, 'expired': expired,
+             'release_created': created - (1 if ver == 'v1' else 100),
+             'release_expired': m if expired == m else expired - 100}
+        if data:
+            d['data'] = data
+        if from_:
+            d.update({'from': from_, 'to': to, '_from': f'v/{from_}_v1',
+                      '_to': f'v/{to}_{to_ver or ver}'})
+        return d
+
+    v1verts = [doc('v', i, 'v1', 100, m) for i in ['same', 'gone', 'merged', 'moved', 'keep']]
+    v1verts.append(doc('v', 'change', 'v1', 100, m, 'foo'))
+    v1edges = [doc('e', i, 'v1', 100, m, from_='same', to=i) for i in ['same', 'gone', 'moved']]
+    v1e2edges = [doc('e2', 'repoint', 'v1', 100, m, from_='same', to='keep'),
+                 doc('e2', 'drop', 'v1', 100, m, from_='same', to='same')]
+    check_docs(arango_db, [
+        v1verts[0],
+        doc('v', 'gone', 'v1', 100, 499),
+        doc('v', 'merged', 'v1', 100, 499),
+        doc('v', 'moved', 'v1', 100, 499),
+        v1verts[4],
+        doc('v', 'change', 'v1', 100, 499, 'foo'),
+        doc('v', 'change', 'v2', 500, m, 'bar'),
+        doc('v', 'moved', 'v2', 500, m, 'x'),
+        doc('v', 'new', 'v2', 500, m),
+    ], 'v')
+    check_docs(arango_db, [
+        v1edges[0],
+        doc('e', 'gone', 'v1', 100, 499, from_='same', to='gone'),
+        doc('e', 'moved', 'v1', 100, 499, from_='same', to='moved'),
+        doc('e', 'moved', 'v2', 500, m, from_='same', to='moved'),
+        doc('e', 'new', 'v2', 500, m, from_='same', to='new'),
+    ], 'e')
+    check_docs(arango_db, [
+        doc('e2', 'repoint', 'v1', 100, 499, from_='same', to='keep'),
+        doc('e2', 'drop', 'v1', 100, 499, from_='same', to='same'),
+        doc('e2', 'repoint', 'v2', 500, m, from_='keep', to='same', to_ver='v1'),
+    ], 'e2')
+    # vertex batch, merge, merged vertex, vertex expiry, edge batch per collection
+    assert db.get_import_metrics()['imports'] == 6
+
+    roll_back_last_load(ArangoBatchTimeTravellingDBFactory(arango_db, 'r'), 'ns')
+
+    check_docs(arango_db, v1verts, 'v')
+    check_docs(arango_db, v1edges, 'e')
+    check_docs(arango_db, v1e2edges, 'e2')
+
+
+def test_load_sorted_join_fail_unsorted_source(arango_db):
+    db = _setup_sorted_join(arango_db)
+    for vsource, esource, err in [
+        ([{'id': 'b'}, {'id': 'a'}], [],
+         "Keys are not strictly increasing in the vertex source: 'b' is followed by 'a'"),
+        ([], [{'id': 'a', '_collection': 'e2'}, {'id': 'b', 'from': 'a', 'to': 'b'}],
+         "Keys are not strictly increasing in the edge source: ('e2', 'a') is followed by "
+         + "('e', 'b')"),
+    ]:
+        check_exception(
+            lambda: load_graph_delta('ns', vsource, esource, db, 500, 400, 'v2',
+                                     sorted_join=True, sources_sorted=True),
+            ValueError, err)
+        roll_back_last_load(ArangoBatchTimeTravellingDBFactory(arango_db, 'r'), 'ns')
+
+
+def test_load_sorted_join_fail_unknown_edge_collection(arango_db):
+    db = _setup_sorted_join(arango_db)
+    esource = [{'_collection': 'e3', 'id': 'same', 'from': 'same', 'to': 'same'}]
+    check_exception(
+        lambda: load_graph_delta('ns', [{'id': 'same'}], esource, db, 500, 400, 'v2',
+                                 sorted_join=True),
+        ValueError, 'Edge collection e3 was not registered at initialization')
+
+
+def test_load_fail_sorted_join_and_state_cache(tmp_path):
+    check_exception(
+        lambda: load_graph_delta('ns', [], [], None, 1, 1, "2", sorted_join=True,
+                                 state_cache=LoadStateCache(tmp_path / 'c')),
+        ValueError, 'sorted_join and state_cache cannot both be specified')
+
+
+def test_load_graph_delta_file(arango_db, tmp_path):
+    """
+    Test that applying a delta file between two releases to the first release results in the
+    second release.
+    """
+    create_timetravel_collection(arango_db, 'v')
+    create_timetravel_collection(arango_db, 'e', edge=True)
+    create_timetravel_collection(arango_db, 'e2', edge=True)
+    create_timetravel_collection(arango_db, 'm', edge=True)
+    arango_db.create_collection('r')
+    db = ArangoBatchTimeTravellingDB(arango_db, 'r', 'v', default_edge_collection='e',
+                                     edge_collections=['e2'], merge_collection='m')
+
+    old_verts = [{'id': i, 'data': i} for i in ['same', 'change', 'gone', 'merged', 'keep']]
+    old_edges = [{'id': 'same', 'from': 'same', 'to': 'same'},
+                 {'id': 'touch', 'from': 'keep', 'to': 'change'},
+                 {'id': 'gone', 'from': 'same', 'to': 'gone'},
+                 {'_collection': 'e2', 'id': 'moved', 'from': 'same', 'to': 'same'}]
+    new_verts = [{'id': 'same', 'data': 'same'}, {'id': 'change', 'data': 'new'},
+                 {'id': 'new', 'data': 'new'}, {'id': 'keep', 'data': 'keep'}]
+    new_edges = [{'id': 'same', 'from': 'same', 'to': 'same'},
+                 {'id': 'touch', 'from': 'keep', 'to': 'change'},
+                 {'id': 'new', 'from': 'new', 'to': 'same'},
+                 {'_collection': 'e2', 'id': 'moved', 'from': 'same', 'to': 'keep'}]
+    merges = [{'id': 'merged', 'from': 'merged', 'to': 'same'}]
+
+    load_graph_delta('ns', [dict(v) for v in old_verts], [dict(e) for e in old_edges], db,
+                     100, 99, 'v1')
+    path = tmp_path / 'delta.gz'
+    diff_graphs(old_verts, new_verts, old_edges, new_edges, path, 'v1', new_merges=merges)
+    apply_graph_delta('ns', GraphDelta(path), db, 500, 400, 'v2')
+
+    def extant(docs, fields):
+        return [{k: d[k] for k in fields if k in d} for d in docs]
+
+    vids = {v['id']: v['_id'] for v in db.get_extant_vertices_by_id(500)}
+    assert extant(db.get_extant_vertices_by_id(500), ['id', 'data']) == sorted(
+        new_verts, key=lambda v: v['id'])
+    for col in ['e', 'e2']:
+        expected = sorted([e for e in new_edges if e.get('_collection', 'e') == col],
+                          key=lambda e: e['id'])
+        got = list(db.get_extant_edges_by_id(500, edge_collection=col))
+        assert extant(got, ['id', 'from', 'to']) == extant(expected, ['id', 'from', 'to'])
+        for e in got:
+            assert (e['_from'], e['_to']) == (vids[e['from']], vids[e['to']])
+    assert [e['id'] for e in db.get_extant_edges_by_id(500, edge_collection='m')] == ['merged']
+    assert vids['same'] == 'v/same_v1'
+    assert vids['change'] == 'v/change_v2'
+    assert [v['_key'] for v in db.get_vertices(['merged'], 499).values()] == ['merged_v1']
+    assert db.get_vertices(['gone', 'merged'], 500) == {}
+
+    roll_back_last_load(ArangoBatchTimeTravellingDBFactory(arango_db, 'r'), 'ns')
+    assert extant(db.get_extant_vertices_by_id(500), ['id', 'data']) == sorted(
+        old_verts, key=lambda v: v['id'])
+
+
+def test_apply_graph_delta_fail_wrong_base(arango_db, tmp_path):
+    """
+    Test that a delta file is only applied when the latest load is the complete load of the
+    release the delta was calculated from.
+    """
+    create_timetravel_collection(arango_db, 'v')
+    create_timetravel_collection(arango_db, 'e', edge=True)
+    arango_db.create_collection('r')
+    db = ArangoBatchTimeTravellingDB(arango_db, 'r', 'v', default_edge_collection='e')
+
+    verts = [{'id': 'a', 'data': 'a'}]
+    path = tmp_path / 'delta.gz'
+    diff_graphs(verts, [{'id': 'a', 'data': 'b'}], [], [], path, 'v1')
+    delta = GraphDelta(path)
+
+    def fail(ns, latest):
+        check_exception(
+            lambda: apply_graph_delta(ns, delta, db, 500, 400, 'v3'), ValueError,
+            f'The delta file applies to load version v1 but the latest load in namespace {ns} '
+            + f'is {latest}')
+
+    fail('ns', 'no load')
+    load_graph_delta('ns', [dict(v) for v in verts], [], db, 100, 99, 'v1')
+    load_graph_delta('ns', [{'id': 'a', 'data': 'c'}], [], db, 200, 199, 'v2')
+    fail('ns', 'v2 (complete)')
+    db.register_load_start('ns2', 'v1', 100, 99, 1000)
+    fail('ns2', 'v1 (in_progress)')
+
+    # applying the delta twice is refused
+    roll_back_last_load(ArangoBatchTimeTravellingDBFactory(arango_db, 'r'), 'ns')
+    apply_graph_delta('ns', delta, db, 500, 400, 'v3')
+    fail('ns', 'v3 (complete)')
+    assert [v['data'] for v in db.get_extant_vertices_by_id(500)] == ['b']
+
+
+def test_load_fail_deletions(arango_db, tmp_path):
+    create_timetravel_collection(arango_db, 'v')
+    create_timetravel_collection(arango_db, 'e', edge=True)
+    arango_db.create_collection('r')
+    db = ArangoBatchTimeTravellingDB(arango_db, 'r', 'v', default_edge_collection='e')
+    path = tmp_path / 'delta.gz'
+    diff_graphs([], [], [], [], path, '1')
+    delta = GraphDelta(path)
+
+    for kwargs in [{'sorted_join': True}, {'state_cache': LoadStateCache(tmp_path / 'c')}]:
+        check_exception(
+            lambda: load_graph_delta('ns', [], [], db, 1, 1, "2", deletions=delta, **kwargs),
+            ValueError, 'deletions cannot be combined with sorted_join or state_cache')
+    check_exception(
+        lambda: load_graph_delta('ns', [], [], db, 1, 1, "2", deletions=delta),
+        ValueError, 'deletions cannot be applied to the first load of a namespace')
+
+
+def _backfill_releases():
+    # (version, timestamp, release timestamp, vertices, edges, merges)
+    return [
+        ('1', 100, 50,
+         [{'id': i, 'data': 1} for i in ['a', 'b', 'c', 'd']],
+         [{'id': 'e1', 'from': 'a', 'to': 'b'},
+          {'_collection': 'e2', 'id': 'e2', 'from': 'b', 'to': 'c'},
+          {'id': 'e3', 'from': 'c', 'to': 'd'}],
+         []),
+        ('2', 200, 150,
+         [{'id': 'a', 'data': 1}, {'id': 'b', 'data': 2}, {'id': 'c', 'data': 1},
+          {'id': 'd', 'data': 1}, {'id': 'f', 'data': 1}],
+         [{'id': 'e1', 'from': 'a', 'to': 'b'},
+          {'id': 'e3', 'from': 'c', 'to': 'd'},
+          {'_collection': 'e2', 'id': 'e4', 'from': 'd', 'to': 'f'}],
+         [{'id': 'x', 'from': 'x', 'to': 'a'}]),
+        ('3', 300, 250,
+         [{'id': 'a', 'data': 1}, {'id': 'b', 'data': 2}, {'id': 'c', 'data': 1},
+          {'id': 'f', 'data': 1}, {'id': 'g', 'data': 1}],
+         [{'id': 'e1', 'from': 'a', 'to': 'b'},
+          {'_collection': 'e2', 'id': 'e5', 'from': 'c', 'to': 'f'}],
+         [{'id': 'x', 'from': 'x', 'to': 'a'}, {'id': 'd', 'from': 'd', 'to': 'c'}]),
+        ('4', 400, 350,
+         [{'id': 'a', 'data': 1}, {'id': 'b', 'data': 2}, {'id': 'c', 'data': 1},
+          {'id': 'd', 'data': 1}, {'id': 'f', 'data': 2}, {'id': 'g', 'data': 1}],
+         [{'id': 'e1', 'from': 'a', 'to': 'b'}, {'id': 'e3', 'from': 'c', 'to': 'd'}],
+         [{'id': 'd', 'from': 'd', 'to': 'c'}, {'id': 'f', 'from': 'f', 'to': 'h'},
+          {'id': 'h', 'from': 'h', 'to': 'g'}]),
+        ('5', 500, 450,
+         [{'id': 'a', 'data': 1}, {'id': 'b', 'data': 2}, {'id': 'c', 'data': 1},
+          {'id': 'd', 'data': 1}, {'id': 'f', 'data': 2}],
+         [{'id': 'e1', 'from': 'a', 'to': 'b'}, {'id': 'e3', 'from': 'c', 'to': 'd'},
+          {'_collection': 'e2', 'id': 'e4', 'from': 'd', 'to': 'f'}],
+         []),
+    ]
+
+
+def _setup_backfill(arango_db, prefix):
+    create_timetravel_collection(arango_db, prefix + 'v')
+    for c in ['e', 'e2', 'm']:
+        create_timetravel_collection(arango_db, prefix + c, edge=True)
+    return ArangoBatchTimeTravellingDB(
+        arango_db, 'r', prefix + 'v', default_edge_collection=prefix + 'e',
+        edge_collections=[prefix + 'e2'], merge_collection=prefix + 'm')
+
+
+def _backfill_state(arango_db, prefix, namespace):
+    # returns the documents and the registered loads, stripped of the collection names and times
+    state = {}
+    for c in ['v', 'e', 'e2', 'm']:
+        docs = []
+        for d in arango_db.aql.execute('FOR d IN @@col RETURN d', bind_vars={'@col': prefix + c}):
+            d = {k: v for k, v in d.items() if k not in ('_rev', '_id')}
+            for f in ('_from', '_to'):
+                if f in d:
+                    d[f] = d[f].split('/')[1]
+            docs.append(d)
+        state[c] = sorted(docs, key=lambda d: d['_key'])
+    state['loads'] = [
+        {k: v for k, v in d.items()
+         if k not in ('_id', '_rev', '_key', 'load_namespace', 'start_time', 'completion_time',
+                      'vertex_collection', 'edge_collections', 'merge_collection')}
+        for d in ArangoBatchTimeTravellingDBFactory(arango_db, 'r').get_registered_loads(namespace)]
+    return state
+
+
+def _copy(docs, prefix=''):
+    docs = [dict(d) for d in docs]
+    for d in docs:
+        if '_collection' in d:
+            d['_collection'] = prefix + d['_collection']
+    return docs
+
+
+def test_backfill_graph_history(arango_db):
+    arango_db.create_collection('r')
+    db = _setup_backfill(arango_db, '')
+    for ver, ts, rts, verts, edges, merges in _backfill_releases():
+        load_graph_delta('ns', _copy(verts), _copy(edges), db, ts, rts, ver,
+                         merge_source=_copy(merges), batch_size=2)
+
+    bdb = _setup_backfill(arango_db, 'b')
+    counts = backfill_graph_history(
+        'bns', (BackfillRelease(ver, ts, rts, _copy(v), _copy(e, 'b'), _copy(m))
+                for ver, ts, rts, v, e, m in _backfill_releases()),
+        bdb, batch_size=2, run_size=2)
+
+    expected = _backfill_state(arango_db, '', 'ns')
+    assert _backfill_state(arango_db, 'b', 'bns') == expected
+    assert counts == {'bv': 10, 'be': 4, 'be2': 4, 'bm': 2}
+    # spot check some intervals
+    assert [v['_key'] for v in expected['v'] if v['id'] == 'f'] == ['f_2', 'f_4', 'f_5']
+    assert [(v['last_version'], v['expired']) for v in expected['v'] if v['id'] == 'f'] == [
+        ('3', 399), ('4', 399), ('5', ADB_MAX_TIME)]
+    assert [m['_key'] for m in expected['m']] == ['d_3', 'f_4']
+
+    for ns, prefix in [('ns', ''), ('bns', 'b')]:
+        roll_back_last_load(ArangoBatchTimeTravellingDBFactory(arango_db, 'r'), ns)
+    assert _backfill_state(arango_db, 'b', 'bns') == _backfill_state(arango_db, '', 'ns')
+
+
+def test_backfill_graph_history_no_releases(arango_db):
+    arango_db.create_collection('r')
+    db = _setup_backfill(arango_db, '')
+    assert backfill_graph_history('ns', [], db) == {}
+    assert db.get_registered_loads('ns') == []
+
+
+def test_backfill_graph_history_fail(arango_db):
+    arango_db.create_collection('r')
+    db = _setup_backfill(arango_db, '')
+    nomerge = ArangoBatchTimeTravellingDB(arango_db, 'r', 'v', default_edge_collection='e')
+
+    def rel(ver, ts, verts=None, edges=None, merges=None):
+        return BackfillRelease(ver, ts, ts, verts or [], edges or [], merges)
+
+    check_exception(lambda: backfill_graph_history('ns', [], db, max_writes_in_flight=0),
+                    ValueError, 'max_writes_in_flight must be at least 1')
+    for d, releases, err in [
+        (db, [rel('1', 2), rel('2', 2)], 'Release timestamps must be strictly increasing'),
+        (nomerge, [rel('1', 2, merges=[{'id': 'm', 'from': 'a', 'to': 'b'}])],
+         'A merge source is specified but the database has no merge collection'),
+        (db, [rel('1', 2, [{'id': 'a'}], [{'id': 'e', 'from': 'a', 'to': 'b'}])],
+         'Edge e in load version 1 references vertex b, which does not exist'),
+        (db, [rel('1', 2, [{'id': 'a'}, {'id': 'a'}])],
+         "Keys are not strictly increasing in the vertices of load version 1: 'a' is "
+         + "followed by 'a'"),
+    ]:
+        check_exception(lambda: backfill_graph_history('ns', releases, d), ValueError, err)
+        for load in d.get_registered_loads('ns'):
+            d.delete_registered_load('ns', load['load_version'])
+        assert d.is_empty()
+
+    load_graph_delta('ns', [{'id': 'a'}], [], db, 1, 1, '1')
+    check_exception(lambda: backfill_graph_history('ns', [rel('2', 2)], db), ValueError,
+                    'History can only be backfilled into an empty namespace')
+
+
+def test_merge_chains(arango_db):
+    _merge_chains(arango_db, load_graph_delta)
+
+
+def test_merge_chains_async(arango_db):
+    _merge_chains(arango_db, _load_async)
+
+
+def _merge_chains(arango_db, load):
+    """
+    Test that merge chains are resolved to the final target, or to the closest existing vertex
+    in the chain if the final target doesn't exist, and that existing merges are skipped in
+    the next load.
+    """
+    db = _setup_merge_chains(arango_db)
+
+    load('mns', *_merge_chain_sources(), db, 500, 400, 'v2', merge_source=_merge_chain_merges())
+
+    _check_merge_chains(arango_db)
+
+
+def _setup_merge_chains(arango_db):
+    vcol = create_timetravel_collection(arango_db, 'v')
+    create_timetravel_collection(arango_db, 'e', edge=True)
+    create_timetravel_collection(arango_db, 'm', edge=True)
+    arango_db.create_collection('r')
+
+    _import_bulk(vcol, [{'id': i} for i in ['root', 'a', 'b', 'c', 'd', 'e']],
+                 100, ADB_MAX_TIME, 99, ADB_MAX_TIME, 'v1')
+
+    return ArangoBatchTimeTravellingDB(arango_db, 'r', 'v', default_edge_collection='e',
+                                       merge_collection='m')
+
+
+def _merge_chain_sources():
+    return [{'id': 'root'}, {'id': 'c'}, {'id': 'e'}], []
+
+
+def _merge_chain_merges():
+    return [
+        {'id': 'a', 'from': 'a', 'to': 'b'},    # a -> b -> c, merged into c
+        {'id': 'b', 'from': 'b', 'to': 'c'},
+        {'id': 'd', 'from': 'd', 'to': 'e'},    # d -> e -> gone, gone doesn't exist so into e
+        {'id': 'e', 'from': 'e', 'to': 'gone'}  # will be ignored
+    ]
+
+
+def _check_merge_chains(arango_db):
+    def vert(id_, last_version, expired, release_expired):
+        return {'id': id_, '_key': id_ + '_v1', '_id': 'v/' + id_ + '_v1',
+                'first_version': 'v1', 'last_version': last_version, 'created': 100,
+                'expired': expired, 'release_created': 99, 'release_expired': release_expired}
+
+    m = ADB_MAX_TIME
+    vexpected = [vert('root', 'v2', m, m), vert('a', 'v1', 499, 399), vert('b', 'v1', 499, 399),
+                 vert('c', 'v2', m, m), vert('d', 'v1', 499, 399), vert('e', 'v2', m, m)]
+    check_docs(arango_db, vexpected, 'v')
+
+    m_expected = [
+        {'id': f, 'from': f, 'to': t, '_key': f + '_v2', '_id': 'm/' + f + '_v2',
+         '_from': 'v/' + f + '_v1', '_to': 'v/' + t + '_v1',
+         'first_version': 'v2', 'last_version': 'v2', 'created': 500, 'expired': m,
+         'release_created': 400, 'release_expired': m}
+        for f, t in [('a', 'c'), ('b', 'c'), ('d', 'e')]
+    ]
+    check_docs(arango_db, m_expected, 'm')
+
+
+def test_merge_skip_existing(arango_db):
+    """
+    Test that merges that already exist don't cause vertex lookups.
+    """
+    db = _setup_merge_chains(arango_db)
+    load_graph_delta('mns', *_merge_chain_sources(), db, 500, 400, 'v2',
+                     merge_source=_merge_chain_merges())
+
+    lookups = []
+    get_vertices = db.get_vertices
+
+    def record_get_vertices(keys, timestamp):
+        lookups.append(set(keys))
+        return get_vertices(keys, timestamp)
+
+    db.get_vertices = record_get_vertices
+    load_graph_delta('mns', *_merge_chain_sources(), db, 600, 500, 'v3',
+                     merge_source=_merge_chain_merges())
+
+    # the first lookup is for the vertex source. The d merge fell back to e in the chain and so
+    # is skipped, but the e merge was never applied and so is looked up again.
+    assert lookups == [{'root', 'c', 'e'}, {'e', 'gone'}]
+    assert arango_db.collection('m').count() == 3
+
+
+def test_merge_fail_duplicate(arango_db):
+    _fail_merges(arango_db, [{'id': '1', 'from': 'a', 'to': 'b'}, {'id': '2', 'from': 'a', 'to': 'c'}],
+                 'Vertex a is merged more than once')
+
+
+def test_merge_fail_cycle(arango_db):
+    _fail_merges(arango_db, [{'id': '1', 'from': 'a', 'to': 'b'}, {'id': '2', 'from': 'b', 'to': 'c'},
+                             {'id': '3', 'from': 'c', 'to': 'a'}],
+                 'Merge cycle detected at vertex a')
+
+
+def _fail_merges(arango_db, merges, expected):
+    db = _setup_merge_chains(arango_db)
+    check_exception(
+        lambda: load_graph_delta('mns', [], [], db, 500, 400, 'v2', merge_source=merges),
+        ValueError, expected)
+    # the load shouldn't have started
+    assert arango_db.collection('r').count() == 0
+
+
 ######################################
 # Rollback tests
 ######################################
@@ -397,6 +1223,12 @@ def test_rollback_fail_nothing_to_roll_back(arango_db):
         'Nothing to roll back')
 
 
+def test_rollback_fail_bad_sweep_concurrency():
+    check_exception(
+        lambda: roll_back_last_load(None, 'ns1', sweep_concurrency=0), ValueError,
+        'sweep_concurrency must be at least 1')
+
+
 def test_rollback_with_merge_collection(arango_db):
     """
     Test rolling back a load including a merge collection.
@@ -441,7 +1273,8 @@ def test_rollback_with_merge_collection(arango_db):
 
     fac = ArangoBatchTimeTravellingDBFactory(arango_db, 'r')
 
-    roll_back_last_load(fac, 'ns1')
+    times = roll_back_last_load(fac, 'ns1', sweep_concurrency=2)
+    assert sorted(times) == ['def_e', 'e1', 'e2', 'm', 'v']
 
     vexpected = [
         {'id': '1', '_key': '1_v1', '_id': 'v/1_v1',
@@ -543,7 +1376,8 @@ def test_rollback_without_merge_collection(arango_db):
 
     fac = ArangoBatchTimeTravellingDBFactory(arango_db, 'r')
 
-    roll_back_last_load(fac, 'ns1')
+    times = roll_back_last_load(fac, 'ns1', sweep_concurrency=1)
+    assert sorted(times) == ['e', 'v']
 
     vexpected = [
         {'id': '1', '_key': '1_v1', '_id': 'v/1_v1',
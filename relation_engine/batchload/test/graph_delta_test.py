@@ -0,0 +1,85 @@
+import gzip
+import json
+
+from relation_engine.batchload.graph_delta import diff_graphs, GraphDelta
+from relation_engine.batchload.test.test_helpers import check_exception
+
+_OLD_VERTS = [{'id': i, 'data': i} for i in ['same', 'change', 'gone', 'merged', 'moved']]
+_NEW_VERTS = [{'id': 'same', 'data': 'same'}, {'id': 'change', 'data': 'new'},
+              {'id': 'new', 'data': 'new'}, {'id': 'moved', 'data': 'moved'}]
+_OLD_EDGES = [
+    {'id': 'same', 'from': 'same', 'to': 'same'},
+    {'id': 'touch', 'from': 'same', 'to': 'change'},
+    {'id': 'gone', 'from': 'same', 'to': 'gone'},
+    {'_collection': 'e2', 'id': 'same', 'from': 'same', 'to': 'same'},
+    {'_collection': 'e2', 'id': 'moved', 'from': 'same', 'to': 'same'},
+]
+_NEW_EDGES = [
+    {'_collection': 'e2', 'id': 'moved', 'from': 'same', 'to': 'moved'},
+    {'id': 'same', 'from': 'same', 'to': 'same'},
+    {'id': 'touch', 'from': 'same', 'to': 'change'},
+    {'id': 'new', 'from': 'same', 'to': 'same'},
+]
+_OLD_MERGES = [{'id': 'old', 'from': 'old', 'to': 'same'}]
+_NEW_MERGES = [{'id': 'merged', 'from': 'merged', 'to': 'same'},
+               {'id': 'old', 'from': 'old', 'to': 'same'}]
+
+
+def test_diff_graphs(tmp_path):
+    for run_size in [None, 1, 2]:
+        path = tmp_path / 'delta.gz'
+        counts = diff_graphs(_OLD_VERTS, _NEW_VERTS, _OLD_EDGES, _NEW_EDGES, path, 'v1',
+                             old_merges=_OLD_MERGES, new_merges=_NEW_MERGES, run_size=run_size,
+                             temp_dir=tmp_path if run_size else None)
+        expected_counts = {'vertices': 2, 'merges': 1, 'edges': 3, 'deleted_vertices': 2,
+                           'deleted_edges': 2}
+        assert counts == expected_counts
+
+        delta = GraphDelta(path)
+        assert delta.get_base_version() == 'v1'
+        assert delta.get_counts() == expected_counts
+        assert list(delta.vertices()) == [{'id': 'change', 'data': 'new'},
+                                          {'id': 'new', 'data': 'new'}]
+        assert list(delta.deleted_vertex_ids()) == ['gone', 'merged']
+        assert delta.merges() == [{'id': 'merged', 'from': 'merged', 'to': 'same'}]
+        # unchanged edges to changed vertices are included
+        assert list(delta.edges()) == [
+            {'id': 'new', 'from': 'same', 'to': 'same'},
+            {'id': 'touch', 'from': 'same', 'to': 'change'},
+            {'_collection': 'e2', 'id': 'moved', 'from': 'same', 'to': 'moved'},
+        ]
+        assert list(delta.deleted_edges()) == [(None, 'gone'), ('e2', 'same')]
+
+
+def test_diff_graphs_no_merges(tmp_path):
+    path = tmp_path / 'delta.gz'
+    diff_graphs(_OLD_VERTS, _OLD_VERTS, [], [], path, 'v1')
+    delta = GraphDelta(path)
+    assert delta.get_counts() == {'vertices': 0, 'merges': 0, 'edges': 0,
+                                  'deleted_vertices': 0, 'deleted_edges': 0}
+    assert delta.merges() == []
+
+
+def test_diff_graphs_fail_duplicate_id(tmp_path):
+    check_exception(
+        lambda: diff_graphs([], [{'id': 'a'}, {'id': 'a'}], [], [], tmp_path / 'd.gz', 'v1'),
+        ValueError, "Keys are not strictly increasing in the new vertices: 'a' is followed by 'a'")
+
+
+def test_graph_delta_fail_bad_file(tmp_path):
+    path = tmp_path / 'delta.gz'
+    diff_graphs(_OLD_VERTS, _NEW_VERTS, [], [], path, 'v1')
+    with gzip.open(path, 'rt') as f:
+        lines = f.readlines()
+
+    for content, err in [
+        ([], f'{path} is not a graph delta file'),
+        (['{"format": "foo"}\n'], f'{path} is not a graph delta file'),
+        ([json.dumps({'format': 'relation_engine_graph_delta', 'version': 1}) + '\n'],
+         'Unsupported graph delta file version: 1'),
+        (lines[:1], f'{path} is truncated'),
+        (lines[:-1], f'{path} is truncated'),
+    ]:
+        with gzip.open(path, 'wt') as f:
+            f.writelines(content)
+        check_exception(lambda: GraphDelta(path), ValueError, err)
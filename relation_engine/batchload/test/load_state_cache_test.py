@@ -0,0 +1,110 @@
+from relation_engine.batchload.load_state_cache import LoadStateCache
+from relation_engine.batchload.test.test_helpers import check_exception
+
+
+def _load(version, start_time=None):
+    # a registry entry. A load rerun with the same version has different times
+    t = start_time or int(version[1:]) * 100
+    return {'load_namespace': 'ns', 'load_version': version, 'load_timestamp': t,
+            'release_timestamp': t - 1, 'start_time': t, 'completion_time': t + 10,
+            'state': 'complete', 'vertex_collection': 'v', 'merge_collection': None,
+            'edge_collections': ['e']}
+
+
+def _begin(cache, prev='v1', vcol='v', ecols=('e',)):
+    return cache.begin('ns', _load(prev) if isinstance(prev, str) else prev, vcol, list(ecols))
+
+
+def _load_v1(path):
+    cache = LoadStateCache(path)
+    assert _begin(cache, prev=None) is False
+    cache.add_vertices([('1', b'h1', '1_v1', 'v/1_v1'), ('2', b'h2', '2_v1', 'v/2_v1')])
+    cache.add_edges('e', [('1', b'eh1', '1_v1', 'v/1_v1', 'v/2_v1')])
+    cache.add_edges('e', [('2', b'eh2', '2_v1', 'v/2_v1', 'v/1_v1')])
+    cache.commit(_load('v1'))
+    return cache
+
+
+def test_load_state(tmp_path):
+    cache = _load_v1(tmp_path / 'c')
+    assert not (tmp_path / 'c.new').exists()
+
+    assert _begin(cache) is True
+    assert cache.get_previous_vertices(['1', '3']) == {'1': ('1', b'h1', '1_v1', 'v/1_v1')}
+    assert cache.get_previous_edges('e', ['2', '1']) == {
+        '1': ('1', b'eh1', '1_v1', 'v/1_v1', 'v/2_v1'),
+        '2': ('2', b'eh2', '2_v1', 'v/2_v1', 'v/1_v1')}
+    assert cache.get_previous_edges('e2', ['1']) == {}
+
+    cache.add_vertices([('1', b'h1', '1_v1', 'v/1_v1'), ('3', b'h3', '3_v2', 'v/3_v2')])
+    cache.remove_vertices(['2'])
+    cache.add_edges('e', [('1', b'eh1', '1_v1', 'v/1_v1', 'v/2_v1')])
+    assert cache.get_vertices(['1', '2', '3']) == {
+        '1': ('1', b'h1', '1_v1', 'v/1_v1'), '3': ('3', b'h3', '3_v2', 'v/3_v2')}
+    assert cache.get_unseen_vertices() == []
+    assert cache.get_unseen_edges('e') == [('2_v1', 'v/2_v1', 'v/1_v1')]
+    cache.commit(_load('v2'))
+
+    assert _begin(cache, prev='v2') is True
+    assert cache.get_previous_vertices(['1', '2', '3']).keys() == {'1', '3'}
+    assert cache.get_unseen_vertices() == ['1_v1', '3_v2']
+    cache.abort()
+
+
+def test_abort(tmp_path):
+    cache = _load_v1(tmp_path / 'c')
+    _begin(cache)
+    cache.add_vertices([('3', b'h3', '3_v2', 'v/3_v2')])
+    cache.abort()
+    assert not (tmp_path / 'c.new').exists()
+    cache.abort()  # no op
+
+    assert _begin(cache) is True
+    assert cache.get_previous_vertices(['1', '2', '3']).keys() == {'1', '2'}
+    cache.abort()
+
+
+def test_stale_state(tmp_path):
+    cache = _load_v1(tmp_path / 'c')
+    for args in [{'prev': 'v2'}, {'prev': None}, {'vcol': 'v2'}, {'ecols': ['e', 'e2']},
+                 # the load was rolled back and rerun with the same version
+                 {'prev': _load('v1', start_time=500)},
+                 {'prev': dict(_load('v1'), completion_time=999)},
+                 {'prev': dict(_load('v1'), load_timestamp=999)}]:
+        assert _begin(cache, **args) is False
+        check_exception(lambda: cache.get_previous_vertices(['1']), ValueError,
+                        'The cache does not contain the state of the previous load')
+        cache.abort()
+    assert cache.begin('ns2', _load('v1'), 'v', ['e']) is False
+    cache.abort()
+    assert _begin(cache) is True
+    cache.abort()
+
+
+def test_invalid_file(tmp_path):
+    path = tmp_path / 'c'
+    path.write_text('not a database')
+    cache = LoadStateCache(path)
+    assert _begin(cache) is False
+    cache.commit(_load('v2'))
+    assert _begin(cache, prev='v2') is True
+    cache.abort()
+
+
+def test_many_ids(tmp_path):
+    cache = LoadStateCache(tmp_path / 'c')
+    _begin(cache, prev=None)
+    cache.add_vertices([(str(i), b'h', f'{i}_v1', f'v/{i}_v1') for i in range(1200)])
+    assert len(cache.get_vertices([str(i) for i in range(1300)])) == 1200
+    cache.abort()
+
+
+def test_fail_begin_twice(tmp_path):
+    cache = LoadStateCache(tmp_path / 'c')
+    _begin(cache)
+    check_exception(lambda: _begin(cache), ValueError, 'A load is already in progress')
+    cache.abort()
+
+
+def test_fail_no_path():
+    check_exception(lambda: LoadStateCache(None), ValueError, 'path is required')
@@ -0,0 +1,72 @@
+import os
+
+from relation_engine.batchload.sorted_join import check_sorted, external_sort, sorted_join
+from relation_engine.batchload.test.test_helpers import check_exception
+
+
+def _key(d):
+    return d['id']
+
+
+def test_external_sort_in_memory(tmp_path):
+    items = [{'id': i} for i in 'dbca']
+    got = list(external_sort(items, _key, run_size=5, temp_dir=tmp_path))
+    assert got == [{'id': i} for i in 'abcd']
+    assert got[0] is items[3]
+    assert os.listdir(tmp_path) == []
+
+
+def test_external_sort_runs(tmp_path):
+    items = [{'id': i, 'data': [i]} for i in 'hdgbfcea']
+    for run_size in [1, 3, 4, 7]:
+        gen = external_sort(items, _key, run_size=run_size, temp_dir=tmp_path)
+        assert next(gen) == {'id': 'a', 'data': ['a']}
+        assert len(os.listdir(tmp_path)) == 1
+        assert list(gen) == [{'id': i, 'data': [i]} for i in 'bcdefgh']
+        assert os.listdir(tmp_path) == []
+
+
+def test_external_sort_close(tmp_path):
+    gen = external_sort([{'id': i} for i in 'cba'], _key, run_size=1, temp_dir=tmp_path)
+    next(gen)
+    gen.close()
+    assert os.listdir(tmp_path) == []
+
+
+def test_external_sort_empty():
+    assert list(external_sort([], _key, run_size=1)) == []
+
+
+def test_external_sort_fail_run_size():
+    check_exception(lambda: list(external_sort([], _key, run_size=0)), ValueError,
+                    'run_size must be at least 1')
+
+
+def test_check_sorted():
+    assert list(check_sorted([1, 2, 5], lambda x: x, 'foo')) == [1, 2, 5]
+    for items, err in [([1, 2, 2], '2 is followed by 2'), ([1, 3, 2], '3 is followed by 2')]:
+        check_exception(lambda: list(check_sorted(items, lambda x: x, 'the foos')), ValueError,
+                        f'Keys are not strictly increasing in the foos: {err}')
+    check_exception(lambda: list(check_sorted(['b', 'a'], lambda x: x, 'the foos')), ValueError,
+                    "Keys are not strictly increasing in the foos: 'b' is followed by 'a'")
+
+
+def test_sorted_join():
+    left = [{'id': i, 's': 'l'} for i in 'acdf']
+    right = [{'id': i, 's': 'r'} for i in 'bcfg']
+    got = [(l_ and l_['id'], r and r['id']) for l_, r in sorted_join(left, right, _key)]
+    assert got == [('a', None), (None, 'b'), ('c', 'c'), ('d', None), ('f', 'f'), (None, 'g')]
+
+    assert list(sorted_join([], [], _key)) == []
+    assert list(sorted_join([{'id': 'a'}], [], _key)) == [({'id': 'a'}, None)]
+    assert list(sorted_join([], [{'id': 'a'}], _key)) == [(None, {'id': 'a'})]
+
+
+def test_sorted_join_fail_unsorted():
+    for left, right, err in [
+        ('ba', 'a', "Keys are not strictly increasing in the left items: 'b' is followed by 'a'"),
+        ('a', 'cc', "Keys are not strictly increasing in the right items: 'c' is followed by 'c'"),
+    ]:
+        check_exception(
+            lambda: list(sorted_join([{'id': i} for i in left], [{'id': i} for i in right], _key)),
+            ValueError, err)
@@ -6,10 +6,14 @@
 
 from relation_engine.batchload.time_travelling_database import ArangoBatchTimeTravellingDB
 from relation_engine.batchload.time_travelling_database import ArangoBatchTimeTravellingDBFactory
+from relation_engine.batchload.time_travelling_database import BatchUpdater, ImportMetrics
+from relation_engine.batchload import time_travelling_database
 from relation_engine.batchload.test.test_helpers import create_timetravel_collection
 from relation_engine.batchload.test.test_helpers import check_docs, check_exception
 from arango import ArangoClient
+from arango.exceptions import DocumentInsertError
 from pytest import fixture
+from unittest.mock import Mock
 
 HOST = 'http://localhost:8529'
 DB_NAME = 'test_timetravel_delta_batch_load_db'
@@ -88,6 +92,26 @@ def test_get_merge_collection(arango_db):
     assert att.get_merge_collection() == 'm'
 
 
+def test_get_edge_collection_name(arango_db):
+    create_timetravel_collection(arango_db, 'v')
+    create_timetravel_collection(arango_db, 'e1', edge=True)
+    create_timetravel_collection(arango_db, 'e2', edge=True)
+    create_timetravel_collection(arango_db, 'm', edge=True)
+    arango_db.create_collection('reg')
+
+    att = ArangoBatchTimeTravellingDB(arango_db, 'reg', 'v', default_edge_collection='e1',
+                                      edge_collections=['e2'], merge_collection='m')
+    assert att.get_edge_collection_name() == 'e1'
+    assert att.get_edge_collection_name('e2') == 'e2'
+    assert att.get_edge_collection_name('m') == 'm'
+    check_exception(lambda: att.get_edge_collection_name('v'), ValueError,
+                    'Edge collection v was not registered at initialization')
+
+    att = ArangoBatchTimeTravellingDB(arango_db, 'reg', 'v', edge_collections=['e2'])
+    check_exception(lambda: att.get_edge_collection_name(), ValueError,
+                    'No default edge collection specified, must specify edge collection')
+
+
 def test_init_fail_no_edge_collections(arango_db):
     create_timetravel_collection(arango_db, 'v')
     create_timetravel_collection(arango_db, 'm', edge=True)
@@ -228,6 +252,24 @@ def test_init_fail_no_expire_index_merge_collection(arango_db):
         ValueError, f'Collection m is missing required index with specification {IDX_SPEC_EXP}')
 
 
+def test_init_recheck_indexes_on_recreated_collection(arango_db):
+    create_timetravel_collection(arango_db, 'v')
+    create_timetravel_collection(arango_db, 'e', edge=True)
+    arango_db.create_collection('reg')
+
+    # the index checks are cached
+    ArangoBatchTimeTravellingDB(arango_db, 'reg', 'v', default_edge_collection='e')
+    ArangoBatchTimeTravellingDB(arango_db, 'reg', 'v', default_edge_collection='e')
+
+    arango_db.delete_collection('v')
+    col = arango_db.create_collection('v')
+    col.add_persistent_index(['expired', 'created', 'last_version'])
+
+    check_exception(
+        lambda: ArangoBatchTimeTravellingDB(arango_db, 'reg', 'v', default_edge_collection='e'),
+        ValueError, f'Collection v is missing required index with specification {IDX_SPEC_ID}')
+
+
 def test_fail_no_default_edge_collection(arango_db):
     """
     Really should test this for all methods but that seems like a lot of tests for the same
@@ -1709,6 +1751,275 @@ def test_factory_get_registered_loads(arango_db):
     got = fac.get_registered_loads('ns2')
     assert got == expected
 
+
+class _FakeCollection:
+    """
+    Returns the import results or throws the errors in order and records the imported documents.
+    """
+
+    def __init__(self, *results, stored=None):
+        self.name = 'fake'
+        self.results = list(results)
+        self.imports = []
+        self.on_duplicate = []
+        self.stored = stored or {}
+
+    def import_bulk(self, docs, on_duplicate, halt_on_error):
+        assert not halt_on_error
+        self.imports.append([d['id'] for d in docs])
+        self.on_duplicate.append(on_duplicate)
+        res = self.results.pop(0)
+        if isinstance(res, Exception):
+            raise res
+        return res
+
+    def get_many(self, keys):
+        return [self.stored[k] for k in keys if k in self.stored]
+
+
+def _server_error(http_code):
+    resp = Mock(status_code=http_code, error_code=None, error_message='oops', url='http://foo',
+                method='post', headers={}, raw_body='', status_text='', body={})
+    return DocumentInsertError(resp, Mock())
+
+
+def _updater(monkeypatch, col, insert_only=False):
+    monkeypatch.setattr(time_travelling_database, '_IMPORT_BACKOFF_SEC', 0)
+    b = BatchUpdater(col, metrics=ImportMetrics(), insert_only=insert_only)
+    for i in range(4):
+        b.create_vertex(f'{i}', 'load', 100, 100, {})
+    return b
+
+
+def test_batch_update_retry_failed_documents(monkeypatch):
+    col = _FakeCollection(
+        {'created': 2, 'errors': 2, 'details': [
+            "at position 1: creating document failed with error 'timeout'",
+            "at position 3: creating document failed with error 'timeout'"]},
+        {'created': 1, 'errors': 1, 'details': [
+            "at position 0: creating document failed with error 'write-write conflict'"]},
+        {'created': 1, 'errors': 0, 'details': []})
+    b = _updater(monkeypatch, col)
+
+    b.update()
+
+    assert col.imports == [['0', '1', '2', '3'], ['1', '3'], ['1']]
+    assert col.on_duplicate == ['update'] * 3
+    assert b.count() == 0
+    assert b._metrics.get() == {'imports': 3, 'retried_requests': 0, 'retried_documents': 3}
+
+
+def test_batch_update_retry_all_documents_on_unparseable_details(monkeypatch):
+    col = _FakeCollection({'created': 3, 'errors': 1, 'details': ['lock timeout']},
+                          {'created': 4, 'errors': 0})
+    b = _updater(monkeypatch, col)
+
+    b.update()
+
+    assert col.imports == [['0', '1', '2', '3'], ['0', '1', '2', '3']]
+    assert b._metrics.get() == {'imports': 2, 'retried_requests': 0, 'retried_documents': 4}
+
+
+def test_batch_update_retry_transient_errors(monkeypatch):
+    col = _FakeCollection(_server_error(503), _server_error(429), {'created': 4, 'errors': 0})
+    b = _updater(monkeypatch, col)
+
+    b.update()
+
+    assert len(col.imports) == 3
+    assert b.count() == 0
+    assert b._metrics.get() == {'imports': 3, 'retried_requests': 2, 'retried_documents': 0}
+
+
+def test_batch_update_fail_non_transient_error(monkeypatch):
+    err = _server_error(400)
+    b = _updater(monkeypatch, _FakeCollection(err))
+
+    check_exception(b.update, DocumentInsertError, '[HTTP 400] oops')
+    assert b.count() == 4
+
+
+def test_batch_update_fail_non_transient_document_error(monkeypatch):
+    for err in [
+        "at position 2: creating document failed with error 'illegal document key', "
+        + 'offending document: {"timeout": 1}',
+        'who knows',
+    ]:
+        col = _FakeCollection({'created': 3, 'errors': 1, 'details': [err]})
+        b = _updater(monkeypatch, col)
+
+        check_exception(b.update, ValueError,
+                        'Document failed to import into collection fake: ' + err)
+        assert b.count() == 4
+        assert b._metrics.get() == {'imports': 1, 'retried_requests': 0, 'retried_documents': 0}
+
+
+def test_batch_update_fail_max_attempts_documents(monkeypatch):
+    err = "at position 0: creating document failed with error 'timeout'"
+    res = {'created': 3, 'errors': 1, 'details': [err]}
+    b = _updater(monkeypatch, _FakeCollection(*[res] * 5))
+
+    check_exception(b.update, ValueError,
+                    '1 documents failed to import into collection fake after 5 attempts. '
+                    + 'First error: ' + err)
+    assert b.count() == 4
+    assert b._metrics.get() == {'imports': 5, 'retried_requests': 0, 'retried_documents': 4}
+
+
+def test_batch_update_fail_max_attempts_transient_error(monkeypatch):
+    b = _updater(monkeypatch, _FakeCollection(*[_server_error(503)] * 5))
+
+    check_exception(b.update, DocumentInsertError, '[HTTP 503] oops')
+    assert b._metrics.get() == {'imports': 5, 'retried_requests': 4, 'retried_documents': 0}
+
+
+_EXISTS = "creating document failed with error 'unique constraint violated'"
+
+
+def test_batch_update_insert_only(monkeypatch):
+    col = _FakeCollection(_server_error(503), {'created': 1, 'errors': 3, 'details': [
+        f'at position 0: {_EXISTS}',
+        "at position 2: creating document failed with error 'timeout'",
+        f'at position 3: {_EXISTS}']},
+        {'created': 1, 'errors': 0})
+    b = _updater(monkeypatch, col, insert_only=True)
+    # documents created by the failed request
+    col.stored = {d['_key']: dict(d, _id=f"fake/{d['_key']}", _rev='1')
+                  for d in [b._updates[0], b._updates[3]]}
+
+    b.update()
+
+    assert col.on_duplicate == ['error'] * 3
+    assert col.imports == [['0', '1', '2', '3'], ['0', '1', '2', '3'], ['2']]
+    assert b.count() == 0
+
+
+def test_batch_update_insert_only_fail_exists_after_retry(monkeypatch):
+    err = f'at position 1: {_EXISTS}'
+    col = _FakeCollection(_server_error(503), {'created': 3, 'errors': 1, 'details': [err]})
+    b = _updater(monkeypatch, col, insert_only=True)
+    for stored in [{}, {'1_load': dict(b._updates[1], foo='bar')}]:
+        # the document was not created by the failed request
+        col.results = [_server_error(503), {'created': 3, 'errors': 1, 'details': [err]}]
+        col.stored = stored
+        check_exception(b.update, ValueError, 'Document already exists in collection fake: ' + err)
+
+
+def test_batch_update_insert_only_fail_exists(monkeypatch):
+    err = "at position 1: creating document failed with error 'unique constraint violated'"
+    b = _updater(monkeypatch, _FakeCollection({'created': 3, 'errors': 1, 'details': [err]}),
+                 insert_only=True)
+
+    check_exception(b.update, ValueError, 'Document already exists in collection fake: ' + err)
+
+
+def test_batch_update_insert_only_fail_update(monkeypatch):
+    b = _updater(monkeypatch, _FakeCollection(), insert_only=True)
+    err = 'Batch updater is configured to only insert documents'
+    check_exception(lambda: b.set_last_version_on_vertex('1', 'v'), ValueError, err)
+    check_exception(lambda: b.expire_vertex('1', 1, 1), ValueError, err)
+    b.is_edge = True
+    edge = {'_key': '1', '_from': 'v/1', '_to': 'v/2'}
+    check_exception(lambda: b.set_last_version_on_edge(edge, 'v'), ValueError, err)
+    check_exception(lambda: b.expire_edge(edge, 1, 1), ValueError, err)
+
+
+def test_batch_update_metrics(arango_db):
+    create_timetravel_collection(arango_db, 'v')
+    create_timetravel_collection(arango_db, 'e', edge=True)
+    arango_db.create_collection('r')
+    att = ArangoBatchTimeTravellingDB(arango_db, 'r', 'v', default_edge_collection='e')
+
+    assert att.get_import_metrics() == {'imports': 0, 'retried_requests': 0,
+                                        'retried_documents': 0}
+    b = att.get_batch_updater()
+    b.create_vertex('1', 'load', 100, 100, {})
+    b.update()
+    b = att.get_batch_updater('e')
+    v = {'_id': 'v/1_load', 'id': '1'}
+    b.create_edge('1', v, v, 'load', 100, 100)
+    b.update()
+
+    assert att.get_import_metrics() == {'imports': 2, 'retried_requests': 0,
+                                        'retried_documents': 0}
+
+
+def test_is_empty(arango_db):
+    vcol = create_timetravel_collection(arango_db, 'v')
+    create_timetravel_collection(arango_db, 'e', edge=True)
+    mcol = create_timetravel_collection(arango_db, 'm', edge=True)
+    arango_db.create_collection('r')
+    att = ArangoBatchTimeTravellingDB(arango_db, 'r', 'v', default_edge_collection='e',
+                                      merge_collection='m')
+
+    assert att.is_empty() is True
+    mcol.insert({'_key': '1', '_from': 'v/1', '_to': 'v/2'})
+    assert att.is_empty() is False
+    mcol.delete('1')
+    assert att.is_empty() is True
+    vcol.insert({'_key': '1'})
+    assert att.is_empty() is False
+
+
+def test_get_extant_documents_without_last_version(arango_db):
+    vcol = create_timetravel_collection(arango_db, 'v')
+    ecol = create_timetravel_collection(arango_db, 'e', edge=True)
+    arango_db.create_collection('r')
+    m = 2**53 - 1
+    docs = [
+        {'_key': '1', 'created': 100, 'expired': m, 'last_version': '1'},
+        {'_key': '2', 'created': 100, 'expired': m, 'last_version': '2'},  # version matches
+        {'_key': '3', 'created': 100, 'expired': 199, 'last_version': '1'},  # expired
+        {'_key': '4', 'created': 300, 'expired': m, 'last_version': '1'},  # not yet created
+        {'_key': '5', 'created': 200, 'expired': 200, 'last_version': '1'},
+    ]
+    vcol.import_bulk(docs)
+    ecol.import_bulk([dict(d, _from='v/1', _to='v/2') for d in docs])
+    att = ArangoBatchTimeTravellingDB(arango_db, 'r', 'v', default_edge_collection='e')
+
+    got = att.get_extant_vertices_without_last_version(200, '2')
+    assert sorted([v['_key'] for v in got]) == ['1', '5']
+
+    got = att.get_extant_edges_without_last_version(200, '2')
+    assert sorted(got, key=lambda e: e['_key']) == [
+        {'_key': '1', '_from': 'v/1', '_to': 'v/2'}, {'_key': '5', '_from': 'v/1', '_to': 'v/2'}]
+
+
+def test_get_extant_documents_by_id(arango_db):
+    vcol = create_timetravel_collection(arango_db, 'v')
+    ecol = create_timetravel_collection(arango_db, 'e', edge=True)
+    arango_db.create_collection('r')
+    m = 2**53 - 1
+    docs = [
+        {'_key': '1', 'id': 'c', 'created': 100, 'expired': m},
+        {'_key': '2', 'id': 'a', 'created': 100, 'expired': 200},
+        {'_key': '3', 'id': 'b', 'created': 100, 'expired': 199},  # expired
+        {'_key': '4', 'id': 'd', 'created': 300, 'expired': m},  # not yet created
+        {'_key': '5', 'id': 'b', 'created': 200, 'expired': m},
+    ]
+    vcol.import_bulk(docs)
+    ecol.import_bulk([dict(d, _from='v/1', _to='v/2') for d in docs])
+    att = ArangoBatchTimeTravellingDB(arango_db, 'r', 'v', default_edge_collection='e')
+
+    got = list(att.get_extant_vertices_by_id(200))
+    assert [(v['id'], v['_key'], v['_id']) for v in got] == [
+        ('a', '2', 'v/2'), ('b', '5', 'v/5'), ('c', '1', 'v/1')]
+    assert '_rev' not in got[0]
+
+    got = att.get_extant_edges_by_id(200)
+    assert [(e['id'], e['_key'], e['_from']) for e in got] == [
+        ('a', '2', 'v/1'), ('b', '5', 'v/1'), ('c', '1', 'v/1')]
+
+
+def test_get_vertex_reference(arango_db):
+    create_timetravel_collection(arango_db, 'v')
+    create_timetravel_collection(arango_db, 'e', edge=True)
+    arango_db.create_collection('r')
+    att = ArangoBatchTimeTravellingDB(arango_db, 'r', 'v', default_edge_collection='e')
+
+    assert att.get_vertex_reference('foo', 'v1') == {'_id': 'v/foo_v1', 'id': 'foo'}
+
+
 ####################################
 # Helper funcs
 ####################################
@@ -11,8 +11,18 @@ more classes and methods can be added as needed.
 # TODO CODE check id, from, and to for validity per
 # https://www.arangodb.com/docs/stable/data-modeling-naming-conventions-document-keys.html
 
+import collections as _collections
+import re as _re
+import threading as _threading
+import time as _time
+import weakref as _weakref
+from concurrent.futures import ThreadPoolExecutor as _ThreadPoolExecutor
+
 from arango.exceptions import AQLQueryExecuteError as _AQLQueryExecuteError
+from arango.exceptions import ArangoServerError as _ArangoServerError
 from arango.exceptions import DocumentDeleteError as _DocumentDeleteError
+from requests.exceptions import ConnectionError as _ConnectionError
+from requests.exceptions import Timeout as _Timeout
 
 _INTERNAL_ARANGO_FIELDS = ['_rev']
 
@@ -50,6 +60,98 @@ _FLD_RGSTR_STATE_ROLLBACK = 'rollback'
 # in unix epoch ms this is 2255/6/5
 _MAX_ADB_INTEGER = 2**53 - 1
 
+# Bulk imports are retried, as a whole on transient request errors or for the failed documents
+# on transient document errors. Documents are keyed by ID and version and the updates set fixed
+# values, so resending them is safe. Other document errors, e.g. illegal keys, fail immediately.
+_IMPORT_MAX_ATTEMPTS = 5
+# doubled after each attempt
+_IMPORT_BACKOFF_SEC = 1
+# the HTTP status codes of transient request errors, which are retried
+TRANSIENT_HTTP_CODES = {408, 429, 500, 502, 503, 504}
+_IMPORT_ERROR_POSITION = _re.compile(r'^at position (\d+):')
+_IMPORT_ERROR_MESSAGE = _re.compile(r"with error '([^']*)'")
+_IMPORT_UNIQUE_ERROR = 'unique constraint violated'
+# Document error messages that indicate a transient error, e.g. write-write conflicts, lock
+# timeouts, and unavailable servers
+_TRANSIENT_IMPORT_ERRORS = ('conflict', 'timeout', 'unavailable', 'shutdown in progress')
+
+# The client may spend a while writing changes between fetching batches of a scan, e.g. a
+# sorted scan or a touch free sweep.
+_SCAN_BATCH_SIZE = 10000
+_SCAN_TTL_SEC = 3600
+
+# The queries are shared with the ArangoDB stand-in in relation_engine.test.arango_standin. The
+# asyncio implementation in async_time_travelling_database gets them from get_documents_query()
+# and get_expire_query().
+_INSERT_AQL = 'INSERT @d in @@col'
+
+_UPDATE_AQL = 'UPDATE @d in @@col'
+
+_GET_DOCUMENTS_AQL = f"""
+    FOR d IN @@col
+        OPTIONS {{indexHint: @id_idx, forceIndexHint: true}}
+        FILTER d.{_FLD_ID} IN @ids
+        FILTER d.{_FLD_EXPIRED} >= @timestamp AND d.{_FLD_CREATED} <= @timestamp
+        RETURN d
+    """
+
+_EXPIRE_EXTANT_DOCUMENTS_AQL = f"""
+    FOR d IN @@col
+        FILTER d.{_FLD_EXPIRED} >= @timestamp && d.{_FLD_CREATED} <= @timestamp
+        FILTER d.{_FLD_VER_LST} != @version
+        UPDATE d WITH {{{_FLD_EXPIRED}: @timestamp, {_FLD_RELEASE_EXPIRED}: @reltimestamp}}
+            IN @@col
+    """
+
+_GET_EXTANT_DOCUMENTS_AQL = f"""
+    FOR d IN @@col
+        FILTER d.{_FLD_EXPIRED} >= @timestamp && d.{_FLD_CREATED} <= @timestamp
+        FILTER d.{_FLD_VER_LST} != @version
+        RETURN KEEP(d, '{_FLD_KEY}', '{_FLD_FROM}', '{_FLD_TO}')
+    """
+
+_GET_EXTANT_DOCUMENTS_BY_ID_AQL = f"""
+    FOR d IN @@col
+        OPTIONS {{indexHint: @id_idx, forceIndexHint: true}}
+        FILTER d.{_FLD_EXPIRED} >= @timestamp AND d.{_FLD_CREATED} <= @timestamp
+        SORT d.{_FLD_ID}
+        RETURN d
+    """
+
+_GET_REGISTERED_LOADS_AQL = f"""
+    FOR d in @@col
+        FILTER d.{_FLD_RGSTR_LOAD_NAMESPACE} == @load_namespace
+        SORT d.{_FLD_RGSTR_LOAD_TIMESTAMP} DESC
+        return d
+    """
+
+_DELETE_CREATED_DOCUMENTS_AQL = f"""
+    FOR d IN @@col
+        FILTER d.{_FLD_CREATED} == @timestamp
+        REMOVE d IN @@col
+    """
+
+_UNDO_EXPIRE_DOCUMENTS_AQL = f"""
+    FOR d IN @@col
+        FILTER d.{_FLD_EXPIRED} == @timestamp
+        UPDATE d WITH {{
+            {_FLD_EXPIRED}: {_MAX_ADB_INTEGER},
+            {_FLD_RELEASE_EXPIRED}: {_MAX_ADB_INTEGER}
+        }} IN @@col
+    """
+
+_RESET_LAST_VERSION_AQL = f"""
+    FOR d IN @@col
+        FILTER d.{_FLD_VER_LST} == @last_version
+        UPDATE d WITH {{{_FLD_VER_LST}: @new_last}} IN @@col
+    """
+
+# The collections that have passed the index checks, as
+# python-arango database -> {(collection name, collection ID): ID index name}.
+# The collection ID changes if the collection is dropped and recreated, in which case the indexes
+# are checked again. Index changes to an existing collection are not detected.
+_VALIDATED_INDEXES = _weakref.WeakKeyDictionary()
+
 
 class ArangoBatchTimeTravellingDBFactory:
     """
@@ -146,9 +248,6 @@ class ArangoBatchTimeTravellingDB:
         is not the default edge collection, or is not the merge collection will result in an error.
         """
         self._database = database
-        self._merge_collection = None
-        if merge_collection:
-            self._merge_collection = self._init_col(merge_collection, edge=True)
         self._default_edge_collection = default_edge_collection
         edgecols = set()
         if default_edge_collection:
@@ -157,26 +256,45 @@ class ArangoBatchTimeTravellingDB:
             edgecols.update(edge_collections)
         if not edgecols:
             raise ValueError("At least one edge collection must be specified")
-        self._vertex_collection = self._init_col(vertex_collection)
         # TODO CODE could check if any loads are in progress for the namespace and bail if so
-        self._registry_collection = self._init_col(load_registry_collection)
-
-        self._edgecols = {n: self._init_col(n, edge=True) for n in edgecols}
-
-        self._id_indexes = self._check_indexes()
-
-    def _check_indexes(self):
+        cols, col_ids = _init_collections(
+            database,
+            ([(merge_collection, True)] if merge_collection else [])
+            + [(vertex_collection, False), (load_registry_collection, False)]
+            + [(n, True) for n in sorted(edgecols)])
+        self._merge_collection = cols[merge_collection] if merge_collection else None
+        self._vertex_collection = cols[vertex_collection]
+        self._registry_collection = cols[load_registry_collection]
+        self._edgecols = {n: cols[n] for n in edgecols}
+
+        self._id_indexes = self._check_indexes(col_ids)
+        self._import_metrics = ImportMetrics()
+
+    def _check_indexes(self, col_ids):
         # check indexes and store names of required indexes
-        cols = [self._vertex_collection] + list(self._edgecols.values())
+        cols = [self._vertex_collection] + [self._edgecols[n] for n in sorted(self._edgecols)]
         if self.get_merge_collection():
             cols.append(self._merge_collection)
 
+        validated = _VALIDATED_INDEXES.setdefault(self._database, {})
+        todo = [c for c in cols if (c.name, col_ids[c.name]) not in validated]
+        # fetch the indexes for all the unchecked collections in one concurrent round of
+        # requests. The collections are checked in order afterwards so the error is consistent
+        indexes = {}
+        if todo:
+            with _ThreadPoolExecutor(max_workers=len(todo)) as ex:
+                indexes = dict(zip([c.name for c in todo], ex.map(lambda c: c.indexes(), todo)))
+
         id_indexes = {}
         for col in cols:
-            idx = col.indexes()  # http request
-            id_indexes[col.name] = self._get_index_name(col.name, self._ID_EXP_CRE_INDEX, idx)
-            # check the other required index exists. Don't need to store it for later though
-            self._get_index_name(col.name, self._EXP_CRE_LAST_VER_INDEX, idx)
+            key = (col.name, col_ids[col.name])
+            if key not in validated:
+                idx = indexes[col.name]
+                id_idx = self._get_index_name(col.name, self._ID_EXP_CRE_INDEX, idx)
+                # check the other required index exists. Don't need to store it for later though
+                self._get_index_name(col.name, self._EXP_CRE_LAST_VER_INDEX, idx)
+                validated[key] = id_idx
+            id_indexes[col.name] = validated[key]
 
         return id_indexes
 
@@ -250,7 +368,7 @@ class ArangoBatchTimeTravellingDB:
 
         try:
             self._database.aql.execute(
-                'INSERT @d in @@col',
+                _INSERT_AQL,
                 bind_vars={'d': doc, '@col': self._registry_collection.name}
             )
         except _AQLQueryExecuteError as e:
@@ -273,7 +391,7 @@ class ArangoBatchTimeTravellingDB:
 
         try:
             self._database.aql.execute(
-                'UPDATE @d in @@col',
+                _UPDATE_AQL,
                 bind_vars={'d': doc, '@col': self._registry_collection.name}
             )
         except _AQLQueryExecuteError as e:
@@ -294,7 +412,7 @@ class ArangoBatchTimeTravellingDB:
 
         try:
             self._database.aql.execute(
-                'UPDATE @d in @@col',
+                _UPDATE_AQL,
                 bind_vars={'d': doc, '@col': self._registry_collection.name}
             )
         # could combine some of this code with the above method... meh
@@ -349,6 +467,27 @@ class ArangoBatchTimeTravellingDB:
         # for some reason is None works, just a check doesn't
         return None if self._merge_collection is None else self._merge_collection.name
 
+    def is_empty(self):
+        """
+        Returns True if the vertex, edge, and merge collections contain no documents.
+        """
+        cols = [self._vertex_collection] + list(self._edgecols.values())
+        if self._merge_collection is not None:
+            cols.append(self._merge_collection)
+        return not any(c.count() for c in cols)
+
+    def get_vertex_reference(self, id_, version):
+        """
+        Get a reference to a vertex created with BatchUpdater.create_vertex() that can be passed
+        to BatchUpdater.create_edge() in place of the vertex document, without looking up the
+        vertex.
+
+        id_ - the external ID of the vertex.
+        version - the version of the load in which the vertex was created.
+        """
+        return {_FLD_FULL_ID: self._vertex_collection.name + '/' + id_ + '_' + version,
+                _FLD_ID: id_}
+
     def get_vertices(self, ids, timestamp):
         """
         Get vertices that exist at the given timestamp from a collection.
@@ -365,27 +504,29 @@ class ArangoBatchTimeTravellingDB:
         return self._get_documents(ids, timestamp, col_name)
 
     def _get_documents(self, ids, timestamp, collection_name):
-        id_idx = self._id_indexes[collection_name]
-        cur = self._database.aql.execute(
-            f"""
-          FOR d IN @@col
-              OPTIONS {{indexHint: @id_idx, forceIndexHint: true}}
-              FILTER d.{_FLD_ID} IN @ids
-              FILTER d.{_FLD_EXPIRED} >= @timestamp AND d.{_FLD_CREATED} <= @timestamp
-              RETURN d
-          """,
-            bind_vars={'ids': ids, 'timestamp': timestamp, '@col': collection_name, 'id_idx': id_idx}
-        )
-        ret = {}
+        aql, bind_vars = self.get_documents_query(ids, timestamp, collection_name)
+        cur = self._database.aql.execute(aql, bind_vars=bind_vars)
         try:
-            for d in cur:
-                if d[_FLD_ID] in ret:
-                    raise ValueError(f'db contains > 1 document for id {d[_FLD_ID]}, ' +
-                                     f'timestamp {timestamp}, collection {collection_name}')
-                ret[d[_FLD_ID]] = _clean(d)
+            return documents_by_id(cur, timestamp, collection_name)
         finally:
             cur.close(ignore_missing=True)
-        return ret
+
+    def get_documents_query(self, ids, timestamp, collection_name):
+        """
+        Get the AQL query used by get_vertices() and get_edges(), e.g. to run the query with
+        another client.
+
+        ids - the IDs of the documents to get.
+        timestamp - the time at which the documents must exist in Unix epoch milliseconds.
+        collection_name - the name of the vertex, edge, or merge collection to query.
+
+        Returns a tuple of the query and its bind variables. The query results can be passed to
+          documents_by_id().
+        """
+        return _GET_DOCUMENTS_AQL, {'ids': ids,
+                                    'timestamp': timestamp,
+                                    '@col': collection_name,
+                                    'id_idx': self._id_indexes[collection_name]}
 
     def get_edges(self, ids, timestamp, edge_collection=None):
         """
@@ -401,8 +542,7 @@ class ArangoBatchTimeTravellingDB:
         Returns a dict of edge ID -> edge. Missing edges are not included and do not
           cause an error.
         """
-        col_name = self._get_edge_collection(edge_collection).name
-        return self._get_documents(ids, timestamp, col_name)
+        return self._get_documents(ids, timestamp, self.get_edge_collection_name(edge_collection))
 
     # may need to separate timestamp into find and expire timestamps, but YAGNI for now
     def expire_extant_vertices_without_last_version(self, timestamp, release_timestamp, version):
@@ -449,20 +589,111 @@ class ArangoBatchTimeTravellingDB:
             release_timestamp,
             version,
             col):
-        self._database.aql.execute(
-            f"""
-            FOR d IN @@col
-                FILTER d.{_FLD_EXPIRED} >= @timestamp && d.{_FLD_CREATED} <= @timestamp
-                FILTER d.{_FLD_VER_LST} != @version
-                UPDATE d WITH {{{_FLD_EXPIRED}: @timestamp, {_FLD_RELEASE_EXPIRED}: @reltimestamp}}
-                    IN @@col
-            """,
-            bind_vars={
-                'version': version,
-                'timestamp': timestamp,
-                'reltimestamp': release_timestamp,
-                '@col': col.name},
+        aql, bind_vars = self.get_expire_query(timestamp, release_timestamp, version, col.name)
+        self._database.aql.execute(aql, bind_vars=bind_vars)
+
+    def get_expire_query(self, timestamp, release_timestamp, version, collection_name):
+        """
+        Get the AQL query used by expire_extant_vertices_without_last_version() and
+        expire_extant_edges_without_last_version(), e.g. to run the query with another client.
+
+        The arguments are as for expire_extant_edges_without_last_version(), except that
+        collection_name is the name of the vertex, edge, or merge collection to update.
+
+        Returns a tuple of the query and its bind variables.
+        """
+        return _EXPIRE_EXTANT_DOCUMENTS_AQL, {'version': version,
+                                              'timestamp': timestamp,
+                                              'reltimestamp': release_timestamp,
+                                              '@col': collection_name}
+
+    def get_extant_vertices_without_last_version(self, timestamp, version):
+        """
+        Get the keys of all vertices that exist at the given timestamp where the last version
+        field is not equal to the given version.
+
+        timestamp - the timestamp to use to find extant vertices in Unix epoch milliseconds.
+        version - the version in the last version field of vertices to exclude.
+
+        Returns an iterator over dicts containing the _key field.
+        """
+        return self._get_extant_documents_without_last_version(
+            timestamp, version, self._vertex_collection)
+
+    def get_extant_edges_without_last_version(self, timestamp, version, edge_collection=None):
+        """
+        Get the keys, _from, and _to fields of all edges that exist at the given timestamp where
+        the last version field is not equal to the given version. The edges can be passed to
+        BatchUpdater.expire_edge().
+
+        timestamp - the timestamp to use to find extant edges in Unix epoch milliseconds.
+        version - the version in the last version field of edges to exclude.
+        edge_collection - the collection name to query. If none is provided, the default will
+          be used.
+
+        Returns an iterator over dicts containing the _key, _from, and _to fields.
+        """
+        return self._get_extant_documents_without_last_version(
+            timestamp, version, self._get_edge_collection(edge_collection))
+
+    def _get_extant_documents_without_last_version(self, timestamp, version, col):
+        cur = self._database.aql.execute(
+            _GET_EXTANT_DOCUMENTS_AQL,
+            bind_vars={'version': version, 'timestamp': timestamp, '@col': col.name},
+            batch_size=_SCAN_BATCH_SIZE,
+            ttl=_SCAN_TTL_SEC,
+            stream=True,
+        )
+        try:
+            yield from cur
+        finally:
+            cur.close(ignore_missing=True)
+
+    def get_extant_vertices_by_id(self, timestamp):
+        """
+        Get all the vertices that exist at the given timestamp, sorted by ID. The vertices are
+        streamed from the database in batches.
+
+        Note that ArangoDB sorts strings with its configured collation, which may differ from
+        Python's ordering for mixed case IDs or IDs containing punctuation.
+
+        timestamp - the timestamp to use to find extant vertices in Unix epoch milliseconds.
+
+        Returns an iterator over the vertices.
+        """
+        return self._get_extant_documents_by_id(timestamp, self._vertex_collection.name)
+
+    def get_extant_edges_by_id(self, timestamp, edge_collection=None):
+        """
+        Get all the edges that exist at the given timestamp in a collection, sorted by ID. The
+        edges are streamed from the database in batches.
+
+        See the notes for get_extant_vertices_by_id.
+
+        timestamp - the timestamp to use to find extant edges in Unix epoch milliseconds.
+        edge_collection - the collection name to query. If none is provided, the default will
+          be used.
+
+        Returns an iterator over the edges.
+        """
+        return self._get_extant_documents_by_id(
+            timestamp, self._get_edge_collection(edge_collection).name)
+
+    def _get_extant_documents_by_id(self, timestamp, collection_name):
+        cur = self._database.aql.execute(
+            _GET_EXTANT_DOCUMENTS_BY_ID_AQL,
+            bind_vars={'timestamp': timestamp,
+                       '@col': collection_name,
+                       'id_idx': self._id_indexes[collection_name]},
+            batch_size=_SCAN_BATCH_SIZE,
+            ttl=_SCAN_TTL_SEC,
+            stream=True,
         )
+        try:
+            for d in cur:
+                yield _clean(d)
+        finally:
+            cur.close(ignore_missing=True)
 
     # TODO PERF could add created index to speed this up
     def delete_created_documents(self, collection, creation_time):
@@ -475,11 +706,7 @@ class ArangoBatchTimeTravellingDB:
         """
         col = self._get_collection(collection)  # ensure collection exists
         self._database.aql.execute(
-            f"""
-            FOR d IN @@col
-                FILTER d.{_FLD_CREATED} == @timestamp
-                REMOVE d IN @@col
-            """,
+            _DELETE_CREATED_DOCUMENTS_AQL,
             bind_vars={'timestamp': creation_time, '@col': col.name},
         )
 
@@ -493,14 +720,7 @@ class ArangoBatchTimeTravellingDB:
         """
         col = self._get_collection(collection)  # ensure collection exists
         self._database.aql.execute(
-            f"""
-            FOR d IN @@col
-                FILTER d.{_FLD_EXPIRED} == @timestamp
-                UPDATE d WITH {{
-                    {_FLD_EXPIRED}: {_MAX_ADB_INTEGER},
-                    {_FLD_RELEASE_EXPIRED}: {_MAX_ADB_INTEGER}
-                }} IN @@col
-            """,
+            _UNDO_EXPIRE_DOCUMENTS_AQL,
             bind_vars={'timestamp': expire_time, '@col': col.name},
         )
 
@@ -516,11 +736,7 @@ class ArangoBatchTimeTravellingDB:
         """
         col = self._get_collection(collection)  # ensure collection exists
         self._database.aql.execute(
-            f"""
-            FOR d IN @@col
-                FILTER d.{_FLD_VER_LST} == @last_version
-                UPDATE d WITH {{{_FLD_VER_LST}: @new_last}} IN @@col
-            """,
+            _RESET_LAST_VERSION_AQL,
             bind_vars={
                 'last_version': last_version,
                 'new_last': new_last_version,
@@ -537,6 +753,17 @@ class ArangoBatchTimeTravellingDB:
             raise ValueError(f'Collection {collection} was not registered at initialization')
         return self._edgecols[collection]
 
+    def get_edge_collection_name(self, edge_collection=None):
+        """
+        Get the name of an edge collection, checking that it was registered at initialization.
+
+        edge_collection - the name of the edge or merge collection. If none is provided, the
+          default edge collection is used.
+
+        Returns the name of the collection.
+        """
+        return self._get_edge_collection(edge_collection).name
+
     def _get_edge_collection(self, collection):
         if not collection:
             if not self._default_edge_collection:
@@ -550,24 +777,63 @@ class ArangoBatchTimeTravellingDB:
             raise ValueError(f'Edge collection {collection} was not registered at initialization')
         return self._edgecols[collection]
 
-    def get_batch_updater(self, edge_collection_name=None):
+    def get_batch_updater(self, edge_collection_name=None, insert_only=False):
         """
         Get a batch updater for a collection. Updates can be added to the updater and then
         applied at once.
 
         edge_collection_name - the name of the edge collection that will be updated. If not
           provided the vertex collection is used.
+        insert_only - True if the updater will only create documents; see BatchUpdater.
 
         Returns a BatchUpdater.
         """
         if not edge_collection_name:
-            return BatchUpdater(self._vertex_collection, False)
-        return BatchUpdater(self._get_edge_collection(edge_collection_name), True)
+            return BatchUpdater(
+                self._vertex_collection, False, self._import_metrics, insert_only)
+        return BatchUpdater(self._get_edge_collection(edge_collection_name), True,
+                            self._import_metrics, insert_only)
+
+    def get_import_metrics(self):
+        """
+        Get the bulk import metrics for the batch updaters from this instance as a dict with the
+        keys:
+
+        imports - the number of bulk imports.
+        retried_requests - the number of import requests that were retried after a transient
+          error.
+        retried_documents - the number of documents that were retried after failing to import.
+        """
+        return self._import_metrics.get()
+
+
+class ImportMetrics:
+    """
+    Thread safe counts of bulk import attempts and retries.
+    """
+
+    def __init__(self):
+        self._lock = _threading.Lock()
+        self._counts = _collections.Counter(imports=0, retried_requests=0, retried_documents=0)
+
+    def add(self, key, count=1):
+        """
+        Add to a count.
+        """
+        with self._lock:
+            self._counts[key] += count
+
+    def get(self):
+        """
+        Returns the counts as a dict.
+        """
+        with self._lock:
+            return dict(self._counts)
 
 
 class BatchUpdater:
 
-    def __init__(self, collection, edge=False):
+    def __init__(self, collection, edge=False, metrics=None, insert_only=False):
         """
         Do not create this class directly - call ArangoBatchTimeTravellingDB.get_batch_updater().
 
@@ -578,6 +844,12 @@ class BatchUpdater:
         collection - the python-arango collection where updates will be applied.
         edge - True if the collection is an edge collection. Checking this property requires
           an http call, and so providing the type is required.
+        metrics - an ImportMetrics instance in which to record imports and retries.
+        insert_only - True to throw an error when applying the updates if a created document
+          already exists, rather than updating the document. Expiring or setting the last version
+          on documents is not allowed. If an import request is retried after a transient error,
+          documents that exist are accepted if they are identical to the created documents, as
+          they may have been created by the failed request.
 
         Properties:
         is_edge - True if the updater will update against an edge collection, false otherwise.
@@ -585,6 +857,8 @@ class BatchUpdater:
         self._col = collection
         self.is_edge = edge
         self._updates = []
+        self._metrics = metrics or ImportMetrics()
+        self._insert_only = insert_only
 
     def get_collection(self):
         """
@@ -592,7 +866,28 @@ class BatchUpdater:
         """
         return self._col.name
 
-    def create_vertex(self, id_, version, created_time, release_time, data):
+    def get_arango_collection(self):
+        """
+        Return the python-arango collection to which updates will be applied.
+        """
+        return self._col
+
+    def get_metrics(self):
+        """
+        Return the ImportMetrics instance in which imports and retries are recorded.
+        """
+        return self._metrics
+
+    def create_vertex(
+            self,
+            id_,
+            version,
+            created_time,
+            release_time,
+            data,
+            last_version=None,
+            expiration_time=None,
+            release_expiration_time=None):
         """
         Save a vertex in the database.
 
@@ -609,11 +904,19 @@ class BatchUpdater:
         release_time - the time at which the vertex was released at the data source in Unix epoch
           milliseconds.
         data - the vertex contents as a dict.
+        last_version - the last version of the vertex, if the vertex is created with its final
+          state. Defaults to the version.
+        expiration_time - the time, in Unix epoch milliseconds, at which the vertex ceases to
+          exist, if the vertex is created with its final state. Defaults to never.
+        release_expiration_time - the time, in Unix epoch milliseconds, when the vertex was
+          expired at the data source, if the vertex is created with its final state. Defaults to
+          never.
 
         Returns the key for the vertex.
         """
         self._ensure_vertex()
         vert = _create_vertex(data, id_, version, created_time, release_time)
+        _set_final_state(vert, last_version, expiration_time, release_expiration_time)
         self._updates.append(vert)
         return vert[_FLD_KEY]
 
@@ -625,7 +928,10 @@ class BatchUpdater:
             version,
             created_time,
             release_time,
-            data=None):
+            data=None,
+            last_version=None,
+            expiration_time=None,
+            release_expiration_time=None):
         """
         Save an edge in the database.
 
@@ -645,11 +951,16 @@ class BatchUpdater:
         release_time - the time at which the edge was released at the data source in Unix epoch
           milliseconds.
         data - the edge contents as a dict.
+        last_version - the last version of the edge, as for create_vertex().
+        expiration_time - the expiration time of the edge, as for create_vertex().
+        release_expiration_time - the release expiration time of the edge, as for
+          create_vertex().
 
         Returns the key for the edge.
         """
         self._ensure_edge()
         edge = _create_edge(id_, from_vertex, to_vertex, version, created_time, release_time, data)
+        _set_final_state(edge, last_version, expiration_time, release_expiration_time)
         self._updates.append(edge)
         return edge[_FLD_KEY]
 
@@ -661,6 +972,7 @@ class BatchUpdater:
         last_version - the version to set.
         """
         self._ensure_vertex()
+        self._ensure_updatable()
         self._updates.append({_FLD_KEY: key, _FLD_VER_LST: last_version})
 
     def set_last_version_on_edge(self, edge, last_version):
@@ -674,6 +986,7 @@ class BatchUpdater:
 
     def _update_edge(self, edge, update):
         self._ensure_edge()
+        self._ensure_updatable()
         update[_FLD_KEY] = edge[_FLD_KEY]
         # this is really lame. Arango requires the _to and _from edges even when the
         # document you're updating already has them.
@@ -692,6 +1005,7 @@ class BatchUpdater:
           expired at the data source.
         """
         self._ensure_vertex()
+        self._ensure_updatable()
         self._updates.append({
             _FLD_KEY: key,
             _FLD_EXPIRED: expiration_time,
@@ -714,10 +1028,79 @@ class BatchUpdater:
     def update(self):
         """
         Apply the updates collected so far and clear the update list.
-        """
-        self._col.import_bulk(self._updates, on_duplicate="update")
+
+        Transient request errors and documents that fail to import with a transient error are
+        retried with backoff. Other errors are thrown immediately. If the updates still fail after
+        the retries, an error is thrown. The update list is not cleared on failure.
+        """
+        docs = self._updates
+        on_duplicate = 'error' if self._insert_only else 'update'
+        attempt = 1
+        request_failed = False
+        while True:
+            self._metrics.add('imports')
+            res = None
+            try:
+                res = self._col.import_bulk(
+                    docs, on_duplicate=on_duplicate, halt_on_error=False)
+                err = None
+                docs = self._get_failed_documents(docs, res, request_failed)
+            except (_ArangoServerError, _ConnectionError, _Timeout) as e:
+                if not _is_transient_error(e):
+                    raise
+                err = e
+                request_failed = True
+            if not err and not docs:
+                break
+            delay = self._next_attempt(attempt, docs, res, err)
+            attempt += 1
+            _time.sleep(delay)
         self._updates.clear()
 
+    def _get_failed_documents(self, docs, result, request_failed):
+        if self._insert_only and result.get('errors'):
+            details = []
+            existing = []
+            for d in result.get('details') or []:
+                if _IMPORT_UNIQUE_ERROR not in d:
+                    details.append(d)
+                    continue
+                m = _IMPORT_ERROR_POSITION.match(d)
+                if not request_failed or not m:
+                    self._fail_exists(d)
+                existing.append((docs[int(m.group(1))], d))
+            if existing:
+                self._check_created_by_failed_request(existing)
+                result = dict(result, errors=result['errors'] - len(existing), details=details)
+        return get_failed_documents(docs, result, self.get_collection())
+
+    def _check_created_by_failed_request(self, existing):
+        # A failed request may have created some of the documents, in which case the stored
+        # documents are the same as the created documents. Anything else existed before.
+        stored = {d[_FLD_KEY]: d for d in self._col.get_many([d[_FLD_KEY] for d, _ in existing])}
+        for doc, detail in existing:
+            s = stored.get(doc[_FLD_KEY])
+            if not s or {k: v for k, v in s.items() if k not in ('_id', '_rev')} != doc:
+                self._fail_exists(detail)
+
+    def _fail_exists(self, detail):
+        raise ValueError(f'Document already exists in collection {self.get_collection()}: {detail}')
+
+    def _next_attempt(self, attempt, docs, result, err):
+        # records the retry and returns the delay before it, or throws if there are no retries
+        # left
+        if attempt >= _IMPORT_MAX_ATTEMPTS:
+            if err:
+                raise err
+            raise ValueError(f'{len(docs)} documents failed to import into collection '
+                             + f'{self.get_collection()} after {attempt} attempts. '
+                             + f'First error: {_first_import_error(result)}')
+        if err:
+            self._metrics.add('retried_requests')
+        else:
+            self._metrics.add('retried_documents', len(docs))
+        return _IMPORT_BACKOFF_SEC * 2 ** (attempt - 1)
+
     def count(self):
         """
         Get the number of pending updates.
@@ -732,6 +1115,49 @@ class BatchUpdater:
         if not self.is_edge:
             raise ValueError('Batch updater is configured for a vertex collection')
 
+    def _ensure_updatable(self):
+        if self._insert_only:
+            raise ValueError('Batch updater is configured to only insert documents')
+
+
+def _is_transient_error(err):
+    if isinstance(err, _ArangoServerError):
+        return err.http_code in TRANSIENT_HTTP_CODES
+    return True
+
+
+def get_failed_documents(docs, import_result, collection_name):
+    """
+    Returns the documents that failed to import given the result of an import with details.
+    Throws an error if any document failed with an error that is not transient.
+    """
+    if not import_result.get('errors'):
+        return []
+    positions = []
+    for d in import_result.get('details') or []:
+        if not _is_transient_import_error(d):
+            raise ValueError(f'Document failed to import into collection {collection_name}: {d}')
+        m = _IMPORT_ERROR_POSITION.match(d)
+        if m:
+            positions.append(int(m.group(1)))
+    if len(positions) != import_result['errors']:
+        # can't tell which documents failed, so send them all again
+        return docs
+    return [docs[p] for p in positions]
+
+
+def _is_transient_import_error(detail):
+    # details are of the form
+    # at position 1: creating document failed with error 'foo', offending document: {...}
+    m = _IMPORT_ERROR_MESSAGE.search(detail)
+    msg = m.group(1) if m else detail.split(', offending document')[0]
+    return any(e in msg for e in _TRANSIENT_IMPORT_ERRORS)
+
+
+def _first_import_error(import_result):
+    details = import_result.get('details')
+    return details[0] if details else 'unknown'
+
 
 def _create_vertex(data, id_, version, created_time, release_time):
     data = dict(data)  # make a copy and overwrite the old data variable
@@ -772,6 +1198,15 @@ def _create_edge(
     data[_FLD_RELEASE_EXPIRED] = _MAX_ADB_INTEGER
     return data
 
+
+def _set_final_state(doc, last_version, expiration_time, release_expiration_time):
+    if last_version is not None:
+        doc[_FLD_VER_LST] = last_version
+    if expiration_time is not None:
+        doc[_FLD_EXPIRED] = expiration_time
+    if release_expiration_time is not None:
+        doc[_FLD_RELEASE_EXPIRED] = release_expiration_time
+
 # if an edge is inserted into a non-edge collection _from and _to are silently dropped
 
 
@@ -782,6 +1217,48 @@ def _init_collection(database, collection, edge=False):
         raise ValueError(f'{collection} is not {ctype} collection')
     return c
 
+
+def _init_collections(database, collections):
+    """
+    Checks the types of the collections, given as a list of (name, is edge collection) tuples,
+    with one request to list the collections in the database rather than a request per
+    collection. The collections are checked in order.
+
+    Returns a dict of collection name to python-arango collection and a dict of collection name
+    to collection ID.
+    """
+    dbcols = {c['name']: c for c in database.collections()}  # this is a http call
+    cols = {}
+    col_ids = {}
+    for name, edge in collections:
+        if name not in dbcols:
+            # fall back to the single collection check to throw the same error as
+            # python-arango would for a missing collection
+            cols[name] = _init_collection(database, name, edge)
+            col_ids[name] = cols[name].properties()['id']
+            continue
+        if (dbcols[name]['type'] == 'edge') is not edge:
+            ctype = 'an edge' if edge else 'a vertex'
+            raise ValueError(f'{name} is not {ctype} collection')
+        cols[name] = database.collection(name)
+        col_ids[name] = dbcols[name]['id']
+    return cols, col_ids
+
+
+def documents_by_id(docs, timestamp, collection_name):
+    """
+    Returns a dict of document ID -> document given the results of a query from
+    ArangoBatchTimeTravellingDB.get_documents_query(). Throws an error if there is more than one
+    document for an ID.
+    """
+    ret = {}
+    for d in docs:
+        if d[_FLD_ID] in ret:
+            raise ValueError(f'db contains > 1 document for id {d[_FLD_ID]}, ' +
+                             f'timestamp {timestamp}, collection {collection_name}')
+        ret[d[_FLD_ID]] = _clean(d)
+    return ret
+
 # mutates in place!
 
 
@@ -796,12 +1273,7 @@ def _clean(obj):
 
 def _get_registered_loads(database, registry_collection, load_namespace):
     cur = database.aql.execute(
-        f"""
-        FOR d in @@col
-            FILTER d.{_FLD_RGSTR_LOAD_NAMESPACE} == @load_namespace
-            SORT d.{_FLD_RGSTR_LOAD_TIMESTAMP} DESC
-            return d
-        """,
+        _GET_REGISTERED_LOADS_AQL,
         bind_vars={'load_namespace': load_namespace, '@col': registry_collection.name}
     )
     return [_clean(d) for d in cur]
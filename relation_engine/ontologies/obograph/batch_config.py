@@ -0,0 +1,224 @@
+"""
+A configuration parser for the OBOGraph batch delta loader, which loads several ontologies in
+one process. The configuration is expected to be in TOML (https://toml.io/en/) format.
+
+See relation_engine.taxa.config for the single load equivalent for taxa. The two are similar
+but, per the comments there, duplicated rather than shared.
+"""
+
+import os
+import tomli  # TODO swap to stdlib in py 3.11
+from pathlib import Path
+from typing import Optional, BinaryIO
+
+from relation_engine.batchload.arango_connection import (
+    DEFAULT_POOL_SIZE,
+    DEFAULT_REQUEST_TIMEOUT_SEC,
+)
+
+# As for the taxa config, TOML parsing errors etc. are thrown as is.
+
+_SEC_ARANGO = "Arango"
+_SEC_BATCH = "Batch"
+_SEC_ONTOLOGIES = "Ontologies"
+_ENV_ARANGO_PASSWORD = "ARANGO_PWD"
+
+_DEFAULT_MAX_CONCURRENT_LOADS = 4
+_DEFAULT_PROGRESS_INTERVAL_SEC = 60
+
+
+class OntologyLoadConfig:
+    """
+    The configuration for loading one ontology. Contains the fields:
+
+    file: Path - the path to the OBOGraph JSON file.
+    onto_id_prefix: str - the prefix of the ontology IDs in the load, e.g. GO, ENVO.
+    graph_id: str | None - the full ID of the graph to load if the file contains more than one
+        graph.
+    load_namespace: str - the name of the data that is being loaded, e.g. envo, gene_ontology.
+    node_collection: str - the name of the ArangoDB collection in which to load ontology nodes.
+    edge_collection: str - the name of the ArangoDB collection in which to load ontology edges.
+    merge_edge_collection: str - the name of the ArangoDB collection in which to load merge
+        edges.
+    load_version: str - the version of the load.
+    load_timestamp: int - the timestamp of the load in epoch milliseconds, e.g. when the load
+        will start to exist in the database.
+    release_timestamp: int - the timestamp, in unix epoch milliseconds, when the data was
+        released at the source.
+    """
+
+    def __init__(self, config, section):
+        """
+        config - a dict containing the section.
+        section - the name of the section containing the ontology configuration.
+        """
+        self.file = Path(_get_string_required(config, section, "file"))
+        self.onto_id_prefix = _get_string_required(config, section, "onto-id-prefix")
+        self.graph_id = _get_string_optional(config, section, "graph-id")
+        self.load_namespace = _get_string_required(config, section, "load-namespace")
+        self.node_collection = _get_string_required(config, section, "node-collection")
+        self.edge_collection = _get_string_required(config, section, "edge-collection")
+        self.merge_edge_collection = _get_string_required(
+            config, section, "merge-edge-collection")
+        self.load_version = _get_string_required(config, section, "load-version")
+        self.load_timestamp = _get_int_required(config, section, "load-timestamp")
+        self.release_timestamp = _get_int_required(config, section, "release-timestamp")
+
+
+class OBOGraphBatchConfig:
+    """
+    The batch delta load configuration parsed from a TOML configuration file. Once initialized,
+    this class will contain the fields:
+
+    url: str - the URL of an arango coordinator. If more than one URL is configured, the first
+        URL.
+    urls: tuple[str] - the URLs of one or more arango coordinators.
+    database: str - the name of the ArangoDB database to update.
+    username: str | None - the name, if any, of the user to use when connecting to
+         ArangoDB.
+    password: str | None - the password for the user. Present IFF the user is present.
+    load_registry_collection: str - The name of the ArangoDB collection in which to register
+        the loads.
+    pool_size: int - the maximum number of connections to keep open per coordinator.
+    keep_alive: bool - whether to keep connections open between requests.
+    request_timeout_sec: int - the timeout for ArangoDB requests in seconds.
+    compress_requests: bool - whether to gzip large bulk import requests.
+
+    max_concurrent_loads: int - the maximum number of ontologies to load at once.
+    progress_interval_sec: int - the interval between progress reports in seconds.
+
+    ontologies: tuple[OntologyLoadConfig] - the ontologies to load, in configuration order.
+    """
+
+    def __init__(self, config_file: BinaryIO):
+        """
+        Create the configuration parser.
+
+        config_file - an open file-like object, opened in binary mode, containing the TOML
+            config file data.
+        """
+        if not config_file:
+            raise ValueError("config_file is required")
+        config = tomli.load(config_file)
+        if _SEC_ARANGO not in config:
+            raise ValueError(f"Missing section {_SEC_ARANGO}")
+        self.urls = _get_urls(config, _SEC_ARANGO, "url")
+        self.url = self.urls[0]
+        self.database = _get_string_required(config, _SEC_ARANGO, "database")
+        self.username = _get_string_optional(config, _SEC_ARANGO, "username")
+        self.password = _get_string_optional(config, _SEC_ARANGO, "password")
+        if self.username and not self.password:
+            p = os.environ.get(_ENV_ARANGO_PASSWORD)
+            self.password = p.strip() if p else None
+            if not self.password:
+                raise ValueError(
+                    f"If username is present in the {_SEC_ARANGO} section, password must be "
+                    + f"present either in the config file or the {_ENV_ARANGO_PASSWORD} "
+                    + "environment variable")
+        self.load_registry_collection = _get_string_required(
+            config, _SEC_ARANGO, "load-registry-collection")
+        self.pool_size = _get_positive_int_optional(
+            config, _SEC_ARANGO, "pool-size", DEFAULT_POOL_SIZE)
+        self.keep_alive = _get_bool_optional(config, _SEC_ARANGO, "keep-alive", True)
+        self.request_timeout_sec = _get_positive_int_optional(
+            config, _SEC_ARANGO, "request-timeout-sec", DEFAULT_REQUEST_TIMEOUT_SEC)
+        self.compress_requests = _get_bool_optional(
+            config, _SEC_ARANGO, "compress-requests", False)
+
+        batch = {_SEC_BATCH: config.get(_SEC_BATCH, {})}
+        self.max_concurrent_loads = _get_positive_int_optional(
+            batch, _SEC_BATCH, "max-concurrent-loads", _DEFAULT_MAX_CONCURRENT_LOADS)
+        self.progress_interval_sec = _get_positive_int_optional(
+            batch, _SEC_BATCH, "progress-interval-sec", _DEFAULT_PROGRESS_INTERVAL_SEC)
+
+        onts = config.get(_SEC_ONTOLOGIES)
+        if not onts or not isinstance(onts, list):
+            raise ValueError(f"At least one {_SEC_ONTOLOGIES} entry is required")
+        # name the sections as TOML would for error messages
+        onts = {f"{_SEC_ONTOLOGIES}[{i}]": o for i, o in enumerate(onts)}
+        self.ontologies = tuple(OntologyLoadConfig(onts, sec) for sec in onts)
+        _check_unique(self.ontologies, lambda o: [o.load_namespace], "load-namespace")
+        # loads expire documents per collection, so concurrent loads into the same collection
+        # would expire each other's documents
+        _check_unique(
+            self.ontologies,
+            lambda o: [o.node_collection, o.edge_collection, o.merge_edge_collection],
+            "collection")
+
+
+def _check_unique(ontologies, get_values, name):
+    seen = set()
+    for o in ontologies:
+        for v in set(get_values(o)):
+            if v in seen:
+                raise ValueError(f"The {name} {v} is used by more than one ontology")
+            seen.add(v)
+
+
+# assumes section exists
+def _get_string_required(config, section, key) -> str:
+    putative = _get_string_optional(config, section, key)
+    if not putative:
+        raise ValueError(f"Missing value for key {key} in section {section}")
+    return putative
+
+
+# assumes section exists
+def _get_string_optional(config, section, key) -> Optional[str]:
+    putative = config[section].get(key)
+    if putative is None or not putative.strip():  # typechecks a string here effectively
+        return None
+    return putative.strip()
+
+
+# assumes section exists
+def _get_urls(config, section, key) -> tuple[str]:
+    putative = config[section].get(key)
+    if not isinstance(putative, list):
+        return (_get_string_required(config, section, key),)
+    urls = tuple(u.strip() for u in putative if isinstance(u, str) and u.strip())
+    if len(urls) != len(putative) or not urls:
+        raise ValueError(f"Illegal value for key {key} in section {section}, which expects a "
+                         + "string or a non-empty list of strings")
+    return urls
+
+
+# assumes section exists
+def _get_bool_optional(config, section, key, default) -> bool:
+    putative = config[section].get(key)
+    if putative is None:
+        return default
+    if not isinstance(putative, bool):
+        raise ValueError(
+            f"Illegal type for key {key} in section {section}, which expects a boolean: "
+            + f"{type(putative).__name__}")
+    return putative
+
+
+# assumes section exists
+def _get_positive_int_optional(config, section, key, default) -> int:
+    if config[section].get(key) is None:
+        return default
+    ret = _get_int_required(config, section, key)
+    if ret < 1:
+        raise ValueError(f"Illegal value for key {key} in section {section}, which must be "
+                         + f"at least 1: {ret}")
+    return ret
+
+
+# assumes section exists
+def _get_int_required(config, section, key) -> int:
+    putative = config[section].get(key)
+    if putative is None:
+        raise ValueError(f"Missing value for key {key} in section {section}")
+    if isinstance(putative, int):
+        return putative
+    if isinstance(putative, float):
+        if putative.is_integer():
+            return int(putative)
+        raise ValueError(
+            f"Illegal value for key {key} in section {section}, which expects an integer: "
+            + f"{putative}")
+    raise ValueError(
+        f"Illegal type for key {key} in section {section}, which expects an integer: "
+        + f"{type(putative).__name__}")
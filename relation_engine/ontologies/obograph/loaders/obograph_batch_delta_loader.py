@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+
+# TODO TEST
+# for now tested manually
+
+"""
+Loads several OBOGraph ontologies concurrently in one process, sharing the ArangoDB connection
+and the load registry, and reporting the combined progress of the loads.
+"""
+
+import argparse
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from relation_engine.ontologies.obograph.batch_config import OBOGraphBatchConfig
+from relation_engine.ontologies.obograph.parsers import OBOGraphLoader
+from relation_engine.batchload.delta_load import load_graph_delta
+from relation_engine.batchload.arango_connection import connect_from_config
+from relation_engine.batchload.time_travelling_database import (
+    ArangoBatchTimeTravellingDBFactory
+)
+from relation_engine.version import VERSION
+
+_STATE_WAITING = 'waiting'
+_STATE_RUNNING = 'running'
+_STATE_COMPLETE = 'complete'
+_STATE_FAILED = 'failed'
+
+
+def get_config():
+    parser = argparse.ArgumentParser(description="""
+Load multiple OBOGraph ontology files into an ArangoDB time travelling database, calculating and
+applying the changes between the prior load and the current load for each ontology, and
+retaining the prior loads.
+""".strip())
+    parser.add_argument('--config', required=True,
+                        help='the path to the batch loader configuration file. NOTE: the config '
+                        + 'file will need to be updated for each consecutive load; it is not '
+                        + 'static.')
+    parser.add_argument('--version', action='version', version=VERSION)
+    a = parser.parse_args()
+    with open(a.config, 'rb') as c:
+        return OBOGraphBatchConfig(c)
+
+
+class _LoadProgress:
+    """
+    Tracks the progress of one ontology load. The counts are the number of nodes, edges, and
+    merges pulled from the providers by the delta loader.
+    """
+
+    def __init__(self, ontology):
+        self.ontology = ontology
+        self.state = _STATE_WAITING
+        self.counts = {'nodes': 0, 'edges': 0, 'merges': 0}
+        self.start = None
+        self.end = None
+        self.error = None
+
+    def count(self, kind, provider):
+        # only the loading thread updates the counts, the reporting thread just reads them
+        for item in provider:
+            self.counts[kind] += 1
+            yield item
+
+    def elapsed_min(self):
+        if not self.start:
+            return 0
+        return ((self.end or time.time()) - self.start) / 60
+
+    def __str__(self):
+        counts = ' '.join(f'{v} {k}' for k, v in self.counts.items())
+        return (f'{self.ontology.load_namespace}: {self.state} {counts} '
+                + f'{self.elapsed_min():.1f}min')
+
+
+def _load(attdb_factory, progress):
+    o = progress.ontology
+    progress.start = time.time()
+    progress.state = _STATE_RUNNING
+    try:
+        attdb = attdb_factory.get_instance(
+            o.node_collection,
+            default_edge_collection=o.edge_collection,
+            merge_collection=o.merge_edge_collection)
+        # the file is streamed rather than loaded into memory
+        loader = OBOGraphLoader(o.file, o.onto_id_prefix, graph_id=o.graph_id)
+        load_graph_delta(
+            o.load_namespace,
+            progress.count('nodes', loader.get_node_provider()),
+            progress.count('edges', loader.get_edge_provider()),
+            attdb,
+            o.load_timestamp,
+            o.release_timestamp,
+            o.load_version,
+            merge_source=progress.count('merges', loader.get_merge_provider()))
+        progress.state = _STATE_COMPLETE
+    except Exception as e:
+        progress.error = e
+        progress.state = _STATE_FAILED
+    finally:
+        progress.end = time.time()
+
+
+def _report(progresses):
+    done = sum(1 for p in progresses if p.state in (_STATE_COMPLETE, _STATE_FAILED))
+    print(f'{time.strftime("%Y-%m-%d %H:%M:%S")} {done}/{len(progresses)} loads finished')
+    for p in progresses:
+        print(f'  {p}')
+
+
+def _report_periodically(progresses, interval_sec, stop):
+    while not stop.wait(interval_sec):
+        _report(progresses)
+
+
+def main():
+    cfg = get_config()
+    # the connection is shared by all the loads. Cursors can't be shared between threads but
+    # each load only uses its own cursors
+    db = connect_from_config(cfg)
+    # the registry collection is checked once for all the loads
+    attdb_factory = ArangoBatchTimeTravellingDBFactory(db, cfg.load_registry_collection)
+
+    progresses = [_LoadProgress(o) for o in cfg.ontologies]
+    stop = threading.Event()
+    reporter = threading.Thread(
+        target=_report_periodically, args=(progresses, cfg.progress_interval_sec, stop),
+        daemon=True)
+    reporter.start()
+    try:
+        with ThreadPoolExecutor(max_workers=cfg.max_concurrent_loads) as executor:
+            for p in progresses:
+                executor.submit(_load, attdb_factory, p)
+    finally:
+        stop.set()
+        reporter.join()
+    _report(progresses)
+
+    failed = [p for p in progresses if p.error]
+    for p in failed:
+        print(f'Load {p.ontology.load_namespace} failed:')
+        traceback.print_exception(p.error)
+    if failed:
+        raise ValueError(f'{len(failed)} of {len(progresses)} loads failed: '
+                         + ', '.join(p.ontology.load_namespace for p in failed))
+
+
+if __name__ == '__main__':
+    main()
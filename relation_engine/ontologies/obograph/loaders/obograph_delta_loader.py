@@ -7,11 +7,10 @@
 
 import argparse
 import getpass
-import json
-from arango import ArangoClient
 
 from relation_engine.ontologies.obograph.parsers import OBOGraphLoader
 from relation_engine.batchload.delta_load import load_graph_delta
+from relation_engine.batchload.arango_connection import connect
 from relation_engine.batchload.time_travelling_database import ArangoBatchTimeTravellingDB
 
 
@@ -28,7 +27,9 @@ the changes between the prior load and the current load, and retaining the prior
     parser.add_argument(
         '--arango-url',
         required=True,
-        help='The url of the ArangoDB server (e.g. http://localhost:8528')
+        help='The url of the ArangoDB server (e.g. http://localhost:8528). Multiple ' +
+        'comma separated urls may be supplied, in which case requests are distributed ' +
+        'across them round robin.')
     parser.add_argument(
         '--database',
         required=True,
@@ -92,16 +93,14 @@ the changes between the prior load and the current load, and retaining the prior
 
 def main():
     a = parse_args()
-    client = ArangoClient(hosts=a.arango_url)
+    pwd = None
     if a.user:
         if a.pwd_file:
             with open(a.pwd_file) as pwd_file:
                 pwd = pwd_file.read().strip()
         else:
             pwd = getpass.getpass()
-        db = client.db(a.database, a.user, pwd, verify=True)
-    else:
-        db = client.db(a.database, verify=True)
+    db = connect(a.arango_url.split(','), a.database, a.user, pwd)
     attdb = ArangoBatchTimeTravellingDB(
         db,
         a.load_registry_collection,
@@ -109,12 +108,10 @@ def main():
         default_edge_collection=a.edge_collection,
         merge_collection=a.merge_edge_collection)
 
-    with open(a.file) as f:
-        obograph = json.loads(f.read())
+    # the file is streamed rather than loaded into memory
+    loader = OBOGraphLoader(a.file, a.onto_id_prefix, graph_id=a.graph_id)
 
-    loader = OBOGraphLoader(obograph, a.onto_id_prefix, graph_id=a.graph_id)
-
-    load_graph_delta(
+    times = load_graph_delta(
         a.load_namespace,
         loader.get_node_provider(),
         loader.get_edge_provider(),
@@ -123,6 +120,8 @@ def main():
         a.release_timestamp,
         a.load_version,
         merge_source=loader.get_merge_provider())
+    for col, t in times.items():
+        print(f'Swept collection {col} in {t:.2f}s')
 
 
 if __name__ == '__main__':
@@ -8,8 +8,11 @@ So far this has only been run with GO Basic and ENVO.
 # TODO DOCS better documentation.
 # TODO NOW when checking if ID in namespace, split on : and check == id[0] vs .startswith()
 
+import os
 from urllib.parse import urlparse
 
+import ijson
+
 _OBO_GRAPHS = 'graphs'
 _OBO_NODES = 'nodes'
 _OBO_EDGES = 'edges'
@@ -59,63 +62,94 @@ _OUT_CONSIDER = 'consider'
 
 class OBOGraphLoader:
     """
-    OBOGraphLoader loads the graph into memory and allows creation of node, edge, and merge
-    providers suitable for feeding into a delta load time travelling algorithm.
+    OBOGraphLoader allows creation of node, edge, and merge providers suitable for feeding into
+    a delta load time travelling algorithm from an OBO graph, either held in memory or streamed
+    from a file.
     """
 
     def __init__(self, obo, ontology_id_prefix, graph_id=None):
         """
         Create the loader.
-        obo - the OBO graph as loaded from the JSON file.
+        obo - the OBO graph as loaded from the JSON file, or the path to the JSON file. If a path
+          is provided the file is streamed rather than loaded into memory. The file is read
+          once when creating the loader and once per provider.
         ontology_id_prefix - the ID prefix of the ontology to be loaded, e.g. GO or ENVO. This
           is used to exclude nodes and edges that are not part of the ontology.
         graph_id - the ID of the graph in the OBOgraph to load. If there is only one graph this
           may be ommitted.
         """
+        # IDs and predicates recur across nodes, edges, and providers, so normalize each
+        # distinct string once
+        self._stripped_urls = {}
+        self._clean_ids = {}
+        if isinstance(obo, (str, os.PathLike)):
+            self._source = _OBOGraphFile(obo)
+        else:
+            self._source = _OBOGraphDict(obo)
+        # a single light pass to get the graph IDs, node types, and property nodes, which
+        # are few, without holding the other nodes in memory
+        graph_ids = []
+        types = []
+        property_nodes = []
+        for graph, n in self._source.nodes(graph_ids):
+            while len(types) <= graph:
+                types.append(set())
+            if _OBO_TYPE in n:  # Some ENVO nodes don't have types. AAARRARGAGGG
+                types[graph].add(n[_OBO_TYPE])
+            # For ENVO, all the nodes without types are property types, so we include
+            # them in the property map. I really hope this holds for other ontologies
+            # may need to add a flag
+            if not n.get(_OBO_TYPE) or n[_OBO_TYPE] == _OBO_TYPE_PROPERTY:
+                property_nodes.append(n)
+
         if graph_id:
-            self._obo = self._get_graph(obo, graph_id)
-        elif len(obo[_OBO_GRAPHS]) > 1:
+            self._graph = self._get_graph(graph_ids, graph_id)
+        elif len(graph_ids) > 1:
             raise ValueError('Found more than one graph in the OBO file.')
         else:
-            self._obo = obo[_OBO_GRAPHS][0]
+            self._graph = 0
 
-        unknown_types = {n[_OBO_TYPE] for n in self._obo[_OBO_NODES]
-                         if _OBO_TYPE in n} - _OBO_TYPES  # Some ENVO nodes don't have types. AAARRARGAGGG
+        unknown_types = (types[self._graph] if self._graph < len(types) else set()) - _OBO_TYPES
         if unknown_types:
             raise ValueError(f'Found unprocessable node types {unknown_types}')
         self._ont_prefix = ontology_id_prefix
-        self._property_map = self._get_property_map(obo)
+        self._property_map = self._get_property_map(property_nodes)
+
+    def _nodes(self):
+        for graph, n in self._source.nodes():
+            if graph == self._graph:
+                yield n
 
-    def _get_property_map(self, obo):
+    def _edges(self):
+        for graph, e in self._source.edges():
+            if graph == self._graph:
+                yield e
+
+    def _get_property_map(self, property_nodes):
         ret = {}
-        for g in obo[_OBO_GRAPHS]:
-            for n in g[_OBO_NODES]:
-                # For ENVO, all the nodes without types are property types, so we include
-                # them in the property map. I really hope this holds for other ontologies
-                # may need to add a flag
-                if not n.get(_OBO_TYPE) or n[_OBO_TYPE] == _OBO_TYPE_PROPERTY:
-                    if _OBO_LABEL in n:
-                        ret[n[_OBO_ID]] = n[_OBO_LABEL]
-                    elif _OBO_META in n and _OBO_BASIC_PROPS in n[_OBO_META]:
-                        comments = []
-                        for p in n[_OBO_META][_OBO_BASIC_PROPS]:
-                            if self._strip_url(p[_OBO_PREDICATE]) == _OBO_COMMENT:
-                                comments.append(p[_OBO_VALUE])
-                        if len(comments) != 1:
-                            raise ValueError(
-                                f'Property node {n[_OBO_ID]} has no {_OBO_LABEL} field' +
-                                f'and {len(comments)} comments in {_OBO_META}/{_OBO_BASIC_PROPS}')
-                        else:
-                            ret[n[_OBO_ID]] = comments[0]
-                    else:
-                        raise ValueError(f'Property node {n[_OBO_ID]} has no {_OBO_LABEL} ' +
-                                         f'and no {_OBO_META}/{_OBO_BASIC_PROPS} fields')
+        for n in property_nodes:
+            if _OBO_LABEL in n:
+                ret[n[_OBO_ID]] = n[_OBO_LABEL]
+            elif _OBO_META in n and _OBO_BASIC_PROPS in n[_OBO_META]:
+                comments = []
+                for p in n[_OBO_META][_OBO_BASIC_PROPS]:
+                    if self._strip_url(p[_OBO_PREDICATE]) == _OBO_COMMENT:
+                        comments.append(p[_OBO_VALUE])
+                if len(comments) != 1:
+                    raise ValueError(
+                        f'Property node {n[_OBO_ID]} has no {_OBO_LABEL} field' +
+                        f'and {len(comments)} comments in {_OBO_META}/{_OBO_BASIC_PROPS}')
+                else:
+                    ret[n[_OBO_ID]] = comments[0]
+            else:
+                raise ValueError(f'Property node {n[_OBO_ID]} has no {_OBO_LABEL} ' +
+                                 f'and no {_OBO_META}/{_OBO_BASIC_PROPS} fields')
         return ret
 
-    def _get_graph(self, obo, graph_id):
-        for g in obo[_OBO_GRAPHS]:
-            if g[_OBO_ID] == graph_id:
-                return g
+    def _get_graph(self, graph_ids, graph_id):
+        for i, gid in enumerate(graph_ids):
+            if gid == graph_id:
+                return i
         raise ValueError(f'There is no graph with id {graph_id}')
 
     def _strip_url(self, string):
@@ -124,39 +158,41 @@ class OBOGraphLoader:
         This function checks to see if the string looks like a http or https url and if so,
         returns the fragment or the last entry in the path if there is no fragment.
         Otherwise it returns the string as is.
+        Results are cached.
         """
-        u = urlparse(string)
-        if u.scheme != 'http' and u.scheme != 'https':
-            return string
-        if u.fragment:
-            return u.fragment
-        return u.path.split('/')[-1].strip()
-
-    def _get_meta_property(self, meta, metakey, target_predicates):
-        # totally inefficient but probably doesn't matter
-        if not meta or metakey not in meta:
-            return None
-        for d in meta[metakey]:
-            pred = d[_OBO_PREDICATE]
-            if pred in self._property_map:
-                pred = self._property_map[pred]
-            if pred in target_predicates:
-                return d[_OBO_VALUE]
-        # could check if there's any more an throw an error?
+        ret = self._stripped_urls.get(string)
+        if ret is None:
+            ret = _strip_url(string)
+            self._stripped_urls[string] = ret
+        return ret
 
-    def _get_meta_properties(self, meta, metakey, target_predicates):
-        # totally inefficient but probably doesn't matter
-        ret = []
-        if not meta or metakey not in meta:
+    def _get_basic_properties(self, meta):
+        """
+        Returns a dict of the values of the basic properties in the metadata, keyed by the
+        predicate after mapping through the property map, in a single pass. The values are in
+        the same order as in the metadata.
+        """
+        ret = {}
+        if not meta or _OBO_BASIC_PROPS not in meta:
             return ret
-        for d in meta[metakey]:
+        for d in meta[_OBO_BASIC_PROPS]:
             pred = d[_OBO_PREDICATE]
-            if pred in self._property_map:
-                pred = self._property_map[pred]
-            if pred in target_predicates:
-                ret.append(d[_OBO_VALUE])
+            ret.setdefault(self._property_map.get(pred, pred), []).append(d[_OBO_VALUE])
         return ret
 
+    def _get_property_values(self, props, target_predicates):
+        # the target predicate sets currently have one entry, so the values are in metadata
+        # order
+        ret = []
+        for pred in target_predicates:
+            ret.extend(props.get(pred, []))
+        return ret
+
+    def _get_property_value(self, props, target_predicates):
+        # could check if there's any more an throw an error?
+        vals = self._get_property_values(props, target_predicates)
+        return vals[0] if vals else None
+
     # modifies in place!
     def _clean_meta(self, docs):
         for d in docs:
@@ -169,7 +205,15 @@ class OBOGraphLoader:
         2) Splits on _
         if len == 1, return
         if len == 2 and 2nd part is an integer, reassembles with : as the sep.
+        Results are cached.
         """
+        ret = self._clean_ids.get(id_)
+        if ret is None:
+            ret = self._clean_obo_id_uncached(id_)
+            self._clean_ids[id_] = ret
+        return ret
+
+    def _clean_obo_id_uncached(self, id_):
         # could also check that there's a : in the ID if split len == 1
         idc = self._strip_url(id_)
         idc = idc.split('_')
@@ -203,11 +247,12 @@ class OBOGraphLoader:
         """
         Returns a generator over the nodes in the graph in time travelling format.
         """
-        for n in self._obo[_OBO_NODES]:
+        for n in self._nodes():
             if not self._is_valid_node(n):
                 continue
             id_ = self._clean_obo_id(n[_OBO_ID])
             meta = n.get(_OBO_META)
+            props = self._get_basic_properties(meta)
             defi = meta.get(_OBO_DEFINITION) if meta else None
             if defi:
                 defi.pop(_OBO_META, None)
@@ -215,10 +260,8 @@ class OBOGraphLoader:
             ret = {_OUT_ID: id_,
                    _OUT_NODE_TYPE: n[_OBO_TYPE],
                    _OUT_NAME: n.get(_OBO_LABEL),  # some ENVO classes have no label
-                   _OUT_NAMESPACE: self._get_meta_property(
-                       meta, _OBO_BASIC_PROPS, _OBO_NAMESPACES),
-                   _OUT_ALTERNATIVE_IDS: self._get_meta_properties(
-                       meta, _OBO_BASIC_PROPS, _OBO_ALTERNATIVE_IDS),
+                   _OUT_NAMESPACE: self._get_property_value(props, _OBO_NAMESPACES),
+                   _OUT_ALTERNATIVE_IDS: self._get_property_values(props, _OBO_ALTERNATIVE_IDS),
                    _OUT_DEFINITION: defi,
                    _OUT_COMMENTS: meta.get(_OBO_COMMENTS, []) if meta else [],
                    _OUT_SUBSETS: meta.get(_OBO_SUBSETS, []) if meta else [],
@@ -232,14 +275,14 @@ class OBOGraphLoader:
         """
         Returns a generator over the merge edges in the graph in time travelling format.
         """
-        for n in self._obo[_OBO_NODES]:
+        for n in self._nodes():
             if not self._is_valid_node(n, deprecated_ok=True):
                 continue
             from_ = self._clean_obo_id(n[_OBO_ID])
-            meta = n.get(_OBO_META)
+            props = self._get_basic_properties(n.get(_OBO_META))
             for preds, outpred in [(_OBO_REPLACED_BY, _OUT_REPLACED_BY),
                                    (_OBO_CONSIDER, _OUT_CONSIDER)]:
-                for to in self._get_meta_properties(meta, _OBO_BASIC_PROPS, preds):
+                for to in self._get_property_values(props, preds):
                     # In GO some IDs are _, some are :. Wow
                     to = self._clean_obo_id(to)
                     # For GO to is not external. If this is untrue, check prefix and skip.
@@ -260,7 +303,7 @@ class OBOGraphLoader:
         """
         # At least in GO, edges don't contact deprecated nodes
         # Might need to build up a list of deprecated IDs for other ontologies, or GO later
-        for e in self._obo[_OBO_EDGES]:
+        for e in self._edges():
             sub = e[_OBO_SUBJECT]
             obj = e[_OBO_OBJECT]
             if sub in self._property_map or obj in self._property_map:
@@ -275,3 +318,117 @@ class OBOGraphLoader:
             else:
                 pred = self._strip_url(pred)
             yield self._to_edge(from_, to, pred)
+
+
+def _strip_url(string):
+    # skip urlparse for strings that obviously aren't http(s) URLs. urlparse strips leading
+    # whitespace and control characters, so leave those strings to urlparse
+    if string[:4].lower() != 'http' and string[:1] > ' ':
+        return string
+    u = urlparse(string)
+    if u.scheme != 'http' and u.scheme != 'https':
+        return string
+    if u.fragment:
+        return u.fragment
+    return u.path.split('/')[-1].strip()
+
+
+class _OBOGraphDict:
+    """
+    Provides the nodes and edges of an OBO graph held in memory.
+    """
+
+    def __init__(self, obo):
+        self._obo = obo
+
+    def nodes(self, graph_ids=None):
+        """
+        Returns a generator over (graph index, node) tuples for all the graphs. If a list is
+        provided in graph_ids, the graph IDs are appended to it in graph index order. The list
+        is complete when the generator is exhausted.
+        """
+        return self._items(_OBO_NODES, graph_ids)
+
+    def edges(self, graph_ids=None):
+        """
+        As nodes() but for edges.
+        """
+        return self._items(_OBO_EDGES, graph_ids)
+
+    def _items(self, key, graph_ids):
+        for i, g in enumerate(self._obo[_OBO_GRAPHS]):
+            if graph_ids is not None:
+                graph_ids.append(g.get(_OBO_ID))
+            for item in g.get(key, []):
+                yield i, item
+
+
+class _OBOGraphFile:
+    """
+    Streams the nodes and edges of an OBO graph from a JSON file. Only one node or edge is held
+    in memory at a time.
+
+    Graphs are distinguished by their position in the file, as for _OBOGraphDict.
+    """
+
+    def __init__(self, path):
+        self._path = path
+        self._graph_ids = self._get_graph_ids()
+
+    def _get_graph_ids(self):
+        # one entry per graph, None if the graph has no ID, as for _OBOGraphDict
+        graph_prefix = f'{_OBO_GRAPHS}.item'
+        id_prefix = f'{graph_prefix}.{_OBO_ID}'
+        graph_ids = []
+        with open(self._path, 'rb') as f:
+            for prefix, event, value in ijson.parse(f, use_float=True):
+                if prefix == graph_prefix and event == 'start_map':
+                    graph_ids.append(None)
+                elif prefix == id_prefix and event not in ('start_map', 'start_array'):
+                    graph_ids[-1] = value
+        return graph_ids
+
+    def nodes(self, graph_ids=None):
+        """
+        As _OBOGraphDict.nodes().
+        """
+        return self._items(_OBO_NODES, graph_ids)
+
+    def edges(self, graph_ids=None):
+        """
+        As _OBOGraphDict.edges().
+        """
+        return self._items(_OBO_EDGES, graph_ids)
+
+    def _items(self, key, graph_ids):
+        if graph_ids is not None:
+            graph_ids.extend(self._graph_ids)
+        if len(self._graph_ids) > 1:
+            return self._items_multigraph(key)
+        return self._items_single_graph(key)
+
+    def _items_single_graph(self, key):
+        # the usual case. ijson builds the items in C, which is much faster than building
+        # them from the parse events below
+        with open(self._path, 'rb') as f:
+            # use_float to match the json module
+            for item in ijson.items(f, f'{_OBO_GRAPHS}.item.{key}.item', use_float=True):
+                yield 0, item
+
+    def _items_multigraph(self, key):
+        graph_prefix = f'{_OBO_GRAPHS}.item'
+        item_prefix = f'{graph_prefix}.{key}.item'
+        graph = -1
+        builder = None
+        with open(self._path, 'rb') as f:
+            for prefix, event, value in ijson.parse(f, use_float=True):
+                if builder:
+                    builder.event(event, value)
+                    if prefix == item_prefix and event == 'end_map':
+                        yield graph, builder.value
+                        builder = None
+                elif prefix == item_prefix and event == 'start_map':
+                    builder = ijson.ObjectBuilder()
+                    builder.event(event, value)
+                elif prefix == graph_prefix and event == 'start_map':
+                    graph += 1
@@ -0,0 +1,188 @@
+import os
+from io import BytesIO
+from pathlib import Path
+from pytest import raises
+
+from relation_engine.ontologies.obograph.batch_config import OBOGraphBatchConfig
+from relation_engine.test.testing_helpers import assert_exception_correct
+
+_ARANGO = [
+    "[Arango]",
+    'url = "http://localhost:12354"',
+    'database = "mydb"',
+    'load-registry-collection = "lrc"',
+]
+
+
+def _ontology(name, extra=None):
+    return [
+        "[[Ontologies]]",
+        f'file = "./{name}.json"',
+        f'onto-id-prefix = "{name.upper()}"',
+        f'load-namespace = "{name}_ns"',
+        f'node-collection = "{name}_nodes"',
+        f'edge-collection = "{name}_edges"',
+        f'merge-edge-collection = "{name}_merges"',
+        f'load-version = "{name}_ver"',
+        "load-timestamp = 12365",
+        "release-timestamp = -16000",
+    ] + (extra or [])
+
+
+def _config(lines):
+    return BytesIO("\n".join(lines).encode("utf-8"))
+
+
+def test_minimal_config_success():
+    cfg = OBOGraphBatchConfig(_config(_ARANGO + _ontology("go")))
+
+    assert cfg.url == "http://localhost:12354"
+    assert cfg.database == "mydb"
+    assert cfg.username is None
+    assert cfg.password is None
+    assert cfg.load_registry_collection == "lrc"
+    assert cfg.urls == ("http://localhost:12354",)
+    assert cfg.pool_size == 10
+    assert cfg.keep_alive is True
+    assert cfg.request_timeout_sec == 60
+    assert cfg.compress_requests is False
+    assert cfg.max_concurrent_loads == 4
+    assert cfg.progress_interval_sec == 60
+    assert len(cfg.ontologies) == 1
+    o = cfg.ontologies[0]
+    assert o.file == Path("./go.json")
+    assert o.onto_id_prefix == "GO"
+    assert o.graph_id is None
+    assert o.load_namespace == "go_ns"
+    assert o.node_collection == "go_nodes"
+    assert o.edge_collection == "go_edges"
+    assert o.merge_edge_collection == "go_merges"
+    assert o.load_version == "go_ver"
+    assert o.load_timestamp == 12365
+    assert o.release_timestamp == -16000
+
+
+def test_maximal_config_success():
+    cfg = OBOGraphBatchConfig(_config(_ARANGO + [
+        'username = "  user  "',
+        'password = "  pwd  "',
+        "pool-size = 16",
+        "keep-alive = false",
+        "request-timeout-sec = 120",
+        "compress-requests = true",
+        "[Batch]",
+        "max-concurrent-loads = 2",
+        "progress-interval-sec = 10.0",
+    ] + _ontology("go", ['graph-id = "  http://purl.obolibrary.org/obo/go.owl  "'])
+      + _ontology("envo")))
+
+    assert cfg.username == "user"
+    assert cfg.password == "pwd"
+    assert cfg.pool_size == 16
+    assert cfg.keep_alive is False
+    assert cfg.request_timeout_sec == 120
+    assert cfg.compress_requests is True
+    assert cfg.max_concurrent_loads == 2
+    assert cfg.progress_interval_sec == 10
+    assert [o.load_namespace for o in cfg.ontologies] == ["go_ns", "envo_ns"]
+    assert cfg.ontologies[0].graph_id == "http://purl.obolibrary.org/obo/go.owl"
+    assert cfg.ontologies[1].graph_id is None
+    assert cfg.ontologies[1].file == Path("./envo.json")
+
+
+def test_password_from_environment():
+    os.environ["ARANGO_PWD"] = "  envpwd  "
+    try:
+        cfg = OBOGraphBatchConfig(_config(_ARANGO + ['username = "user"'] + _ontology("go")))
+    finally:
+        del os.environ["ARANGO_PWD"]
+    assert cfg.password == "envpwd"
+
+
+def test_template_success():
+    with open(Path(__file__).parent.parent / "batch_configuration_template.toml", "rb") as f:
+        cfg = OBOGraphBatchConfig(f)
+    assert [o.onto_id_prefix for o in cfg.ontologies] == ["GO", "ENVO"]
+
+
+def test_fail_no_config_file():
+    _fail(None, ValueError("config_file is required"))
+
+
+def test_fail_missing_arango_section():
+    _fail(_config(_ontology("go")), ValueError("Missing section Arango"))
+
+
+def test_fail_missing_password():
+    _fail(_config(_ARANGO + ['username = "user"'] + _ontology("go")), ValueError(
+        "If username is present in the Arango section, password must be present either in the "
+        + "config file or the ARANGO_PWD environment variable"))
+
+
+def test_fail_no_ontologies():
+    _fail(_config(_ARANGO), ValueError("At least one Ontologies entry is required"))
+    _fail(_config(_ARANGO + ['Ontologies = "foo"']),
+          ValueError("At least one Ontologies entry is required"))
+
+
+def test_fail_missing_ontology_key():
+    lines = [line for line in _ontology("envo") if not line.startswith("node-collection")]
+    _fail(_config(_ARANGO + _ontology("go") + lines),
+          ValueError("Missing value for key node-collection in section Ontologies[1]"))
+
+
+def test_fail_bad_timestamp():
+    lines = _ontology("go")
+    lines[-1] = 'release-timestamp = "foo"'
+    _fail(_config(_ARANGO + lines), ValueError(
+        "Illegal type for key release-timestamp in section Ontologies[0], which expects an "
+        + "integer: str"))
+
+
+def test_fail_bad_batch_values():
+    for key, val, err in [
+        ("max-concurrent-loads", "0", "Illegal value for key max-concurrent-loads in section "
+         + "Batch, which must be at least 1: 0"),
+        ("progress-interval-sec", "1.5", "Illegal value for key progress-interval-sec in "
+         + "section Batch, which expects an integer: 1.5"),
+    ]:
+        _fail(_config(_ARANGO + ["[Batch]", f"{key} = {val}"] + _ontology("go")),
+              ValueError(err))
+
+
+def test_fail_bad_connection_settings():
+    for line, err in [
+        ("pool-size = -1", "Illegal value for key pool-size in section Arango, which must be at "
+         + "least 1: -1"),
+        ("compress-requests = 1", "Illegal type for key compress-requests in section Arango, "
+         + "which expects a boolean: int"),
+    ]:
+        _fail(_config(_ARANGO + [line] + _ontology("go")), ValueError(err))
+
+
+def test_url_list():
+    lines = list(_ARANGO)
+    lines[1] = 'url = ["http://coord1:8529", "http://coord2:8529"]'
+    cfg = OBOGraphBatchConfig(_config(lines + _ontology("go")))
+    assert cfg.urls == ("http://coord1:8529", "http://coord2:8529")
+    assert cfg.url == "http://coord1:8529"
+
+
+def test_fail_duplicate_namespace():
+    lines = _ontology("envo")
+    lines[3] = 'load-namespace = "go_ns"'
+    _fail(_config(_ARANGO + _ontology("go") + lines),
+          ValueError("The load-namespace go_ns is used by more than one ontology"))
+
+
+def test_fail_duplicate_collection():
+    lines = _ontology("envo")
+    lines[6] = 'merge-edge-collection = "go_edges"'
+    _fail(_config(_ARANGO + _ontology("go") + lines),
+          ValueError("The collection go_edges is used by more than one ontology"))
+
+
+def _fail(config_file, expected):
+    with raises(Exception) as got:
+        OBOGraphBatchConfig(config_file)
+    assert_exception_correct(got.value, expected)
@@ -0,0 +1,186 @@
+import copy
+import json
+from pytest import raises
+
+from relation_engine.ontologies.obograph.parsers import OBOGraphLoader, _strip_url
+from relation_engine.test.testing_helpers import assert_exception_correct
+
+_OBO = "http://purl.obolibrary.org/obo/"
+_OIO = "http://www.geneontology.org/formats/oboInOwl#"
+
+
+def _graph(id_, nodes, edges):
+    return {"id": id_, "meta": {"basicPropertyValues": []}, "nodes": nodes, "edges": edges}
+
+
+GRAPH = {"graphs": [_graph(_OBO + "go.owl", [
+    {
+        "id": _OBO + "GO_0000001",
+        "lbl": "mitochondrion inheritance",
+        "type": "CLASS",
+        "meta": {
+            "definition": {"val": "The distribution of mitochondria.", "xrefs": ["GOC:mcc"]},
+            "comments": ["a comment"],
+            "subsets": [_OBO + "go#goslim_yeast"],
+            "synonyms": [{"pred": "hasExactSynonym", "val": "mito inheritance", "xrefs": []}],
+            "xrefs": [{"val": "Wikipedia:Mitochondrion", "meta": {"foo": "bar"}}],
+            "basicPropertyValues": [
+                {"pred": _OIO + "hasOBONamespace", "val": "biological_process"},
+                {"pred": _OIO + "hasAlternativeId", "val": "GO:0000002"},
+                {"pred": _OIO + "hasAlternativeId", "val": "GO:0000003"},
+            ],
+        },
+    },
+    {
+        "id": _OBO + "GO_0000004",
+        "lbl": "old thing",
+        "type": "CLASS",
+        "meta": {
+            "deprecated": True,
+            "basicPropertyValues": [
+                {"pred": _OIO + "hasOBONamespace", "val": "biological_process"},
+                {"pred": _OBO + "IAO_0100001", "val": "GO:0000001"},
+                {"pred": _OIO + "consider", "val": "GO_0000005"},
+            ],
+        },
+    },
+    {"id": _OBO + "GO_0000005", "lbl": "a weight", "type": "CLASS",
+     "meta": {"basicPropertyValues": [{"pred": _OBO + "RO_0002", "val": 1.5}]}},
+    {"id": _OBO + "ENVO_0000001", "lbl": "not GO", "type": "CLASS"},
+    {"id": _OIO + "hasOBONamespace", "lbl": "has_obo_namespace", "type": "PROPERTY"},
+    {"id": _OIO + "hasAlternativeId", "lbl": "has_alternative_id", "type": "PROPERTY"},
+    {"id": _OIO + "consider", "lbl": "consider", "type": "PROPERTY"},
+    {"id": _OBO + "IAO_0100001", "lbl": "term replaced by", "type": "PROPERTY"},
+    {"id": _OBO + "BFO_0000050", "type": "PROPERTY",
+     "meta": {"basicPropertyValues": [
+         {"pred": "http://www.w3.org/2000/01/rdf-schema#comment", "val": "part of"}]}},
+], [
+    {"sub": _OBO + "GO_0000001", "pred": "is_a", "obj": _OBO + "GO_0000005"},
+    {"sub": _OBO + "GO_0000005", "pred": _OBO + "BFO_0000050", "obj": _OBO + "GO_0000001"},
+    {"sub": _OBO + "GO_0000005", "pred": _OBO + "RO_0000001", "obj": _OBO + "GO_0000001"},
+    {"sub": _OBO + "GO_0000001", "pred": "is_a", "obj": _OBO + "ENVO_0000001"},
+    {"sub": _OBO + "BFO_0000050", "pred": "is_a", "obj": _OBO + "GO_0000001"},
+])]}
+
+NODES = [
+    {
+        "id": "GO:0000001",
+        "type": "CLASS",
+        "name": "mitochondrion inheritance",
+        "namespace": "biological_process",
+        "alt_ids": ["GO:0000002", "GO:0000003"],
+        "def": {"val": "The distribution of mitochondria.", "xrefs": ["GOC:mcc"]},
+        "comments": ["a comment"],
+        "subsets": [_OBO + "go#goslim_yeast"],
+        "synonyms": [{"pred": "hasExactSynonym", "val": "mito inheritance", "xrefs": []}],
+        "xrefs": [{"val": "Wikipedia:Mitochondrion"}],
+    },
+    {
+        "id": "GO:0000005",
+        "type": "CLASS",
+        "name": "a weight",
+        "namespace": None,
+        "alt_ids": [],
+        "def": None,
+        "comments": [],
+        "subsets": [],
+        "synonyms": [],
+        "xrefs": [],
+    },
+]
+
+EDGES = [
+    {"id": "GO:0000001::GO:0000005::is_a", "from": "GO:0000001", "to": "GO:0000005",
+     "type": "is_a"},
+    {"id": "GO:0000005::GO:0000001::part_of", "from": "GO:0000005", "to": "GO:0000001",
+     "type": "part_of"},
+    {"id": "GO:0000005::GO:0000001::RO_0000001", "from": "GO:0000005", "to": "GO:0000001",
+     "type": "RO_0000001"},
+]
+
+MERGES = [
+    {"id": "GO:0000004::GO:0000001::replaced_by", "from": "GO:0000004", "to": "GO:0000001",
+     "type": "replaced_by"},
+    {"id": "GO:0000004::GO:0000005::consider", "from": "GO:0000004", "to": "GO:0000005",
+     "type": "consider"},
+]
+
+
+def _write(tmp_path, obo):
+    f = tmp_path / "graph.json"
+    f.write_text(json.dumps(obo))
+    return f
+
+
+def _check_providers(loader):
+    assert list(loader.get_node_provider()) == NODES
+    assert list(loader.get_edge_provider()) == EDGES
+    assert list(loader.get_merge_provider()) == MERGES
+    # providers can be iterated more than once
+    assert list(loader.get_node_provider()) == NODES
+
+
+def test_loader_in_memory():
+    # the node provider modifies the input
+    _check_providers(OBOGraphLoader(copy.deepcopy(GRAPH), "GO"))
+
+
+def test_loader_streamed(tmp_path):
+    f = _write(tmp_path, GRAPH)
+    _check_providers(OBOGraphLoader(f, "GO"))
+    _check_providers(OBOGraphLoader(str(f), "GO"))
+
+
+def test_loader_select_graph(tmp_path):
+    other = _graph("other", [{"id": _OBO + "GO_0000009", "lbl": "other", "type": "CLASS"}], [])
+    # the graph id is after the nodes and edges in the file
+    obo = {"graphs": [other, {k: GRAPH["graphs"][0][k] for k in ["nodes", "edges", "id"]}]}
+
+    _check_providers(OBOGraphLoader(copy.deepcopy(obo), "GO", graph_id=_OBO + "go.owl"))
+    _check_providers(OBOGraphLoader(_write(tmp_path, obo), "GO", graph_id=_OBO + "go.owl"))
+
+
+def test_loader_fail_multiple_graphs(tmp_path):
+    obo = {"graphs": [GRAPH["graphs"][0], _graph("other", [], [])]}
+    _fail_loader(obo, tmp_path, None, ValueError("Found more than one graph in the OBO file."))
+
+
+def test_loader_graph_without_id(tmp_path):
+    noid = {"nodes": [{"id": _OBO + "GO_0000009", "lbl": "no id", "type": "CLASS"}]}
+    obo = {"graphs": [noid, GRAPH["graphs"][0]]}
+
+    _check_providers(OBOGraphLoader(copy.deepcopy(obo), "GO", graph_id=_OBO + "go.owl"))
+    _check_providers(OBOGraphLoader(_write(tmp_path, obo), "GO", graph_id=_OBO + "go.owl"))
+    _fail_loader(obo, tmp_path, None, ValueError("Found more than one graph in the OBO file."))
+
+
+def test_loader_fail_no_graph(tmp_path):
+    _fail_loader(GRAPH, tmp_path, "foo", ValueError("There is no graph with id foo"))
+
+
+def test_loader_fail_unknown_types(tmp_path):
+    obo = copy.deepcopy(GRAPH)
+    obo["graphs"][0]["nodes"].append({"id": "foo", "type": "WHATSIT"})
+    _fail_loader(obo, tmp_path, None, ValueError("Found unprocessable node types {'WHATSIT'}"))
+
+
+def _fail_loader(obo, tmp_path, graph_id, expected):
+    for o in [obo, _write(tmp_path, obo)]:
+        with raises(Exception) as got:
+            OBOGraphLoader(o, "GO", graph_id=graph_id)
+        assert_exception_correct(got.value, expected)
+
+
+def test_strip_url():
+    for string, expected in [
+        ("GO:0000001", "GO:0000001"),
+        ("is_a", "is_a"),
+        ("httpish", "httpish"),
+        ("ftp://foo.org/bar", "ftp://foo.org/bar"),
+        (_OBO + "GO_0000001", "GO_0000001"),
+        ("HTTPS://foo.org/bar/baz ", "baz"),
+        ("https://foo.org/bar#baz", "baz"),
+        (" http://foo.org/bar", "bar"),
+        ("http:bar", "bar"),
+    ]:
+        assert _strip_url(string) == expected
@@ -9,6 +9,11 @@ from frozendict import frozendict
 from typing import Optional, BinaryIO
 from pathlib import Path
 
+from relation_engine.batchload.arango_connection import (
+    DEFAULT_POOL_SIZE,
+    DEFAULT_REQUEST_TIMEOUT_SEC,
+)
+
 # This could potentially be extended to the obograph loader as well, but would require more
 # inputs. Maybe extend? Might be better to duplicate
 
@@ -30,8 +35,12 @@ class DeltaLoaderConfig:
 
     inputs: dict[str, Path] - a dict with an entry for each input key provided in the
         constructor.
+    state_cache_file: Path | None - the path to the
+        relation_engine.batchload.load_state_cache.LoadStateCache file for the load, if any.
 
-    url: str - the URL of an arango coordinator.
+    url: str - the URL of an arango coordinator. If more than one URL is configured, the first
+        URL.
+    urls: tuple[str] - the URLs of one or more arango coordinators.
     database: str - the name of the ArangoDB database to update.
     username: str | None - the name, if any, of the user to use when connecting to
          ArangoDB.
@@ -42,6 +51,12 @@ class DeltaLoaderConfig:
     edge_collection: str - the name of the ArangoDB collection in which to load taxa edges.
     merge_edge_collection: str | None - the name of the ArangoDB collection in which to
         load merge edges.
+    pool_size: int - the maximum number of connections to keep open per coordinator.
+    keep_alive: bool - whether to keep connections open between requests.
+    request_timeout_sec: int - the timeout for ArangoDB requests in seconds.
+    compress_requests: bool - whether to gzip large bulk import requests.
+
+    See relation_engine.batchload.arango_connection.connect_from_config.
 
     load_version: str - the version of the load.
     load_timestamp: int - the timestamp of the load in epoch milliseconds, e.g. when the load
@@ -81,7 +96,10 @@ class DeltaLoaderConfig:
                 raise ValueError(f"Missing input key {key} in section {_SEC_INPUTS}")
             inputs[key] = Path(config[_SEC_INPUTS][key].strip())
         self.inputs = frozendict(inputs)
-        self.url = _get_string_required(config, _SEC_ARANGO, "url")
+        cache = _get_string_optional(config, _SEC_INPUTS, "state-cache-file")
+        self.state_cache_file = Path(cache) if cache else None
+        self.urls = _get_urls(config, _SEC_ARANGO, "url")
+        self.url = self.urls[0]
         self.database = _get_string_required(config, _SEC_ARANGO, "database")
         self.username = _get_string_optional(config, _SEC_ARANGO, "username")
         self.password = _get_string_optional(config, _SEC_ARANGO, "password")
@@ -99,6 +117,13 @@ class DeltaLoaderConfig:
         self.edge_collection = _get_string_required(config, _SEC_ARANGO, "edge-collection")
         f = _get_string_required if require_merge_collection else _get_string_optional
         self.merge_edge_collection = f(config, _SEC_ARANGO, "merge-edge-collection")
+        self.pool_size = _get_positive_int_optional(
+            config, _SEC_ARANGO, "pool-size", DEFAULT_POOL_SIZE)
+        self.keep_alive = _get_bool_optional(config, _SEC_ARANGO, "keep-alive", True)
+        self.request_timeout_sec = _get_positive_int_optional(
+            config, _SEC_ARANGO, "request-timeout-sec", DEFAULT_REQUEST_TIMEOUT_SEC)
+        self.compress_requests = _get_bool_optional(
+            config, _SEC_ARANGO, "compress-requests", False)
         self.load_version = _get_string_required(config, _SEC_VERSIONING, "load-version")
         self.load_timestamp = _get_int_required(config, _SEC_VERSIONING, "load-timestamp")
         self.release_timestamp = _get_int_required(config, _SEC_VERSIONING, "release-timestamp")
@@ -125,6 +150,41 @@ def _get_string_optional(config, section, key) -> Optional[str]:
     return putative.strip()
 
 
+# assumes section exists
+def _get_urls(config, section, key) -> tuple[str]:
+    putative = config[section].get(key)
+    if not isinstance(putative, list):
+        return (_get_string_required(config, section, key),)
+    urls = tuple(u.strip() for u in putative if isinstance(u, str) and u.strip())
+    if len(urls) != len(putative) or not urls:
+        raise ValueError(f"Illegal value for key {key} in section {section}, which expects a "
+                         + "string or a non-empty list of strings")
+    return urls
+
+
+# assumes section exists
+def _get_bool_optional(config, section, key, default) -> bool:
+    putative = config[section].get(key)
+    if putative is None:
+        return default
+    if not isinstance(putative, bool):
+        raise ValueError(
+            f"Illegal type for key {key} in section {section}, which expects a boolean: "
+            + f"{type(putative).__name__}")
+    return putative
+
+
+# assumes section exists
+def _get_positive_int_optional(config, section, key, default) -> int:
+    if config[section].get(key) is None:
+        return default
+    ret = _get_int_required(config, section, key)
+    if ret < 1:
+        raise ValueError(f"Illegal value for key {key} in section {section}, which must be "
+                         + f"at least 1: {ret}")
+    return ret
+
+
 # assumes section exists
 def _get_int_required(config, section, key) -> int:
     putative = config[section].get(key)
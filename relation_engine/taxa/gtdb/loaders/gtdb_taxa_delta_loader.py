@@ -4,12 +4,14 @@
 # for now tested manually
 
 import argparse
-from arango import ArangoClient
 
 from relation_engine.taxa.config import DeltaLoaderConfig
 from relation_engine.taxa.gtdb.parsers import GTDBNodeProvider
 from relation_engine.taxa.gtdb.parsers import GTDBEdgeProvider
+from relation_engine.taxa.gtdb.parsers import create_lineage_cache
 from relation_engine.batchload.delta_load import load_graph_delta
+from relation_engine.batchload.load_state_cache import LoadStateCache
+from relation_engine.batchload.arango_connection import connect_from_config
 from relation_engine.batchload.time_travelling_database import ArangoBatchTimeTravellingDB
 from relation_engine.version import VERSION
 
@@ -35,11 +37,7 @@ changes between the prior load and the current load, and retaining the prior loa
 
 def main():
     cfg = get_config()
-    client = ArangoClient(hosts=cfg.url)
-    if cfg.username:
-        db = client.db(cfg.database, cfg.username, cfg.password, verify=True)
-    else:
-        db = client.db(cfg.database, verify=True)
+    db = connect_from_config(cfg)
     attdb = ArangoBatchTimeTravellingDB(
         db,
         cfg.load_registry_collection,
@@ -49,11 +47,20 @@ def main():
     bif = cfg.inputs[_BAC_INPUT_FILE]
     aif = cfg.inputs[_AR_INPUT_FILE]
     with open(bif) as bin1, open(bif) as bin2, open(aif) as ain1, open(aif) as ain2:
-        nodeprov = GTDBNodeProvider(bin1, ain1)
-        edgeprov = GTDBEdgeProvider(bin2, ain2)
+        cache = create_lineage_cache()
+        nodeprov = GTDBNodeProvider(bin1, ain1, lineage_cache=cache)
+        edgeprov = GTDBEdgeProvider(bin2, ain2, lineage_cache=cache)
 
-        load_graph_delta(_LOAD_NAMESPACE, nodeprov, edgeprov, attdb,
-                         cfg.load_timestamp, cfg.release_timestamp, cfg.load_version)
+        times = load_graph_delta(_LOAD_NAMESPACE, nodeprov, edgeprov, attdb,
+                                 cfg.load_timestamp, cfg.release_timestamp, cfg.load_version,
+                                 state_cache=_get_state_cache(cfg))
+    print(cache.format_stats())
+    for col, t in times.items():
+        print(f'Swept collection {col} in {t:.2f}s')
+
+
+def _get_state_cache(cfg):
+    return LoadStateCache(cfg.state_cache_file) if cfg.state_cache_file else None
 
 
 if __name__ == '__main__':
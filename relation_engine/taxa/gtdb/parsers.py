@@ -12,6 +12,7 @@ from relation_engine.taxa.common_fields import (
     RANK,
     SPECIES_OR_BELOW,
 )
+from relation_engine.taxa.lineage_cache import LineageCache, DEFAULT_MAX_SIZE
 
 # Since this is KBase internal code we can be a bit less compassionate re good
 # error messages, e.g. throwing KeyErrors or TypeErrors vs a more descriptive message.
@@ -24,6 +25,10 @@ from relation_engine.taxa.common_fields import (
 
 _ABBRV_SPECIES = "s"
 
+# indexes into the parsed taxon tuples
+_ID = 0
+_NAME = 2
+
 _TAXA_TYPES = {
     "d": "domain",
     "p": "phylum",
@@ -41,7 +46,11 @@ class GTDBNodeProvider:
     iteration.
     """
 
-    def __init__(self, gtdb_bacterial_taxonomy_file_handle, gtdb_archaeal_taxonomy_file_handle):
+    def __init__(
+            self,
+            gtdb_bacterial_taxonomy_file_handle,
+            gtdb_archaeal_taxonomy_file_handle,
+            lineage_cache=None):
         """
         Create the node provider.
 
@@ -49,30 +58,32 @@ class GTDBNodeProvider:
             to process.
         gtdb_archaeal_taxonomy_file_handle - an open handle to the archaeal GTDB taxonomy file
             to process.
+        lineage_cache - a cache from create_lineage_cache(), which may be shared with the
+            edge provider. Defaults to a new cache.
         """
         self._bac_fh = gtdb_bacterial_taxonomy_file_handle
         self._arc_fh = gtdb_archaeal_taxonomy_file_handle
+        self._cache = lineage_cache or create_lineage_cache()
 
     def __iter__(self):
         seen_taxa = set()  # not including leaves
         for fh in [self._bac_fh, self._arc_fh]:
             for line in fh:
                 accession, lineage = line.strip().split("\t")
-                lineage = _get_lineage(lineage)
-                for lin in lineage:
-                    l_id = _taxon_to_id(lin)
+                lineage = self._cache.get(lineage)
+                for l_id, rank, name, species in lineage:
                     if l_id not in seen_taxa:
                         yield {
                             ID: l_id,
-                            RANK: _TAXA_TYPES[lin["abbrev"]],
-                            SCI_NAME: lin["name"],
-                            SPECIES_OR_BELOW: lin["abbrev"] == _ABBRV_SPECIES
+                            RANK: rank,
+                            SCI_NAME: name,
+                            SPECIES_OR_BELOW: species
                         }
                     seen_taxa.add(l_id)
                 yield {
                     ID: accession,
                     RANK: "genome",
-                    SCI_NAME: lineage[-1]["name"],
+                    SCI_NAME: lineage[-1][_NAME],
                     SPECIES_OR_BELOW: True
                 }
 
@@ -83,7 +94,11 @@ class GTDBEdgeProvider:
     iteration.
     """
 
-    def __init__(self, gtdb_bacterial_taxonomy_file_handle, gtdb_archaeal_taxonomy_file_handle):
+    def __init__(
+            self,
+            gtdb_bacterial_taxonomy_file_handle,
+            gtdb_archaeal_taxonomy_file_handle,
+            lineage_cache=None):
         """
         Create the edge provider.
 
@@ -91,19 +106,22 @@ class GTDBEdgeProvider:
             to process.
         gtdb_archaeal_taxonomy_file_handle - an open handle to the archaeal GTDB taxonomy file
             to process.
+        lineage_cache - a cache from create_lineage_cache(), which may be shared with the
+            node provider. Defaults to a new cache.
         """
         self._bac_fh = gtdb_bacterial_taxonomy_file_handle
         self._arc_fh = gtdb_archaeal_taxonomy_file_handle
+        self._cache = lineage_cache or create_lineage_cache()
 
     def __iter__(self):
         seen_taxa = set()  # not including leaves
         for fh in [self._bac_fh, self._arc_fh]:
             for line in fh:
                 accession, lineage = line.strip().split("\t")
-                lineage = _get_lineage(lineage)
+                lineage = self._cache.get(lineage)
                 for i in range(len(lineage) - 1):
-                    parent_id = _taxon_to_id(lineage[i])
-                    child_id = _taxon_to_id(lineage[i + 1])
+                    parent_id = lineage[i][_ID]
+                    child_id = lineage[i + 1][_ID]
                     if child_id not in seen_taxa:
                         yield {
                             ID: child_id,  # one edge per child
@@ -111,7 +129,7 @@ class GTDBEdgeProvider:
                             TO: parent_id
                         }
                     seen_taxa.add(child_id)
-                parent_id = _taxon_to_id(lineage[-1])
+                parent_id = lineage[-1][_ID]
                 yield {
                     ID: accession,  # one edge per child
                     FROM: accession,
@@ -119,6 +137,22 @@ class GTDBEdgeProvider:
                 }
 
 
+def create_lineage_cache(max_size=DEFAULT_MAX_SIZE):
+    """
+    Create a cache of parsed GTDB lineages to share between the node and edge providers.
+
+    max_size - the maximum number of lineages to cache.
+    """
+    return LineageCache(_parse_lineage, max_size)
+
+
+def _parse_lineage(linstr):
+    # returns an immutable tuple of (id, rank, name, species or below) tuples, one per taxon
+    return tuple((_taxon_to_id(t), _TAXA_TYPES[t["abbrev"]], t["name"],
+                  t["abbrev"] == _ABBRV_SPECIES)
+                 for t in _get_lineage(linstr))
+
+
 def _get_lineage(linstr):
     ln = linstr.split(";")
     ret = []
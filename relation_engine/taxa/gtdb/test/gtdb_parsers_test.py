@@ -1,7 +1,11 @@
 from io import StringIO
 from pytest import raises
 
-from relation_engine.taxa.gtdb.parsers import GTDBNodeProvider, GTDBEdgeProvider
+from relation_engine.taxa.gtdb.parsers import (
+    GTDBNodeProvider,
+    GTDBEdgeProvider,
+    create_lineage_cache,
+)
 
 from relation_engine.test.testing_helpers import assert_exception_correct
 
@@ -298,3 +302,36 @@ def _edge_provider_fail(bac, arc, expected):
     with raises(Exception) as got:
         list(GTDBEdgeProvider(bac, arc))
     assert_exception_correct(got.value, ValueError(expected))
+
+
+def test_providers_share_lineage_cache():
+    lines = "\n".join([
+        "RS_GCF_000979375.1	d__Archaea;p__Halobacteriota;s__Methanosarcina mazei",
+        "RS_GCF_000970165.1	d__Archaea;p__Halobacteriota;s__Methanosarcina mazei",
+        "RS_GCF_000970166.1	d__Archaea;p__Halobacteriota;s__Methanosarcina barkeri",
+    ])
+    cache = create_lineage_cache()
+
+    nodes = list(GTDBNodeProvider(StringIO(""), StringIO(lines), lineage_cache=cache))
+    assert cache.get_stats() == {"hits": 1, "misses": 2, "size": 2, "hit_rate": 1 / 3}
+    edges = list(GTDBEdgeProvider(StringIO(""), StringIO(lines), lineage_cache=cache))
+    assert cache.get_stats() == {"hits": 4, "misses": 2, "size": 2, "hit_rate": 2 / 3}
+
+    assert [n["id"] for n in nodes] == [
+        "d:Archaea", "p:Halobacteriota", "s:Methanosarcina_mazei", "RS_GCF_000979375.1",
+        "RS_GCF_000970165.1", "s:Methanosarcina_barkeri", "RS_GCF_000970166.1"
+    ]
+    assert nodes[-1] == {
+        "id": "RS_GCF_000970166.1",
+        "rank": "genome",
+        "scientific_name": "Methanosarcina barkeri",
+        "species_or_below": True
+    }
+    assert [(e["from"], e["to"]) for e in edges] == [
+        ("p:Halobacteriota", "d:Archaea"),
+        ("s:Methanosarcina_mazei", "p:Halobacteriota"),
+        ("RS_GCF_000979375.1", "s:Methanosarcina_mazei"),
+        ("RS_GCF_000970165.1", "s:Methanosarcina_mazei"),
+        ("s:Methanosarcina_barkeri", "p:Halobacteriota"),
+        ("RS_GCF_000970166.1", "s:Methanosarcina_barkeri"),
+    ]
@@ -0,0 +1,58 @@
+"""
+A cache of parsed lineages for taxonomy sources where many records share the same lineage
+string, e.g. GTDB genomes or RDP sequences in the same taxon.
+"""
+
+import functools
+
+DEFAULT_MAX_SIZE = 100000
+
+
+class LineageCache:
+    """
+    A least recently used cache of parsed lineages keyed by the raw lineage string.
+
+    The parsed lineages are shared between all the users of the cache, e.g. a node provider and
+    an edge provider reading the same taxonomy files, and so must be immutable.
+
+    This class is thread safe.
+    """
+
+    def __init__(self, parse, max_size=DEFAULT_MAX_SIZE):
+        """
+        Create the cache.
+
+        parse - a function that parses a raw lineage string into an immutable value.
+        max_size - the maximum number of parsed lineages to hold.
+        """
+        if max_size < 1:
+            raise ValueError('max_size must be at least 1')
+        self._get = functools.lru_cache(maxsize=max_size)(parse)
+
+    def get(self, lineage):
+        """
+        Get the parsed lineage for a raw lineage string, parsing the string if it is not in the
+        cache. Errors from the parser are not cached.
+        """
+        return self._get(lineage)
+
+    def get_stats(self):
+        """
+        Returns the cache statistics as a dict with the keys hits, misses, size - the number of
+        parsed lineages in the cache - and hit_rate, which is None if the cache is unused.
+        """
+        info = self._get.cache_info()
+        total = info.hits + info.misses
+        return {'hits': info.hits,
+                'misses': info.misses,
+                'size': info.currsize,
+                'hit_rate': info.hits / total if total else None}
+
+    def format_stats(self):
+        """
+        Returns the cache statistics as a human readable string.
+        """
+        s = self.get_stats()
+        rate = 'n/a' if s['hit_rate'] is None else f"{s['hit_rate']:.1%}"
+        return (f"lineage cache: {s['hits']} hits, {s['misses']} misses, hit rate {rate}, "
+                + f"{s['size']} lineages cached")
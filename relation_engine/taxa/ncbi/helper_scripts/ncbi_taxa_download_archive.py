@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 
-# Downloads all the NCBI tax dumps from the ftp site. Does not download the new_taxdump* archives.
+# Downloads all the NCBI tax dumps from the ftp site. Downloads the new_taxdump* archives, which
+# include precomputed lineages, instead if requested.
 # use -h for help.
 
 # Tested manually. Be sure to retest if you make changes.
@@ -11,6 +12,7 @@ import argparse
 NCBI_HOST = 'ftp.ncbi.nih.gov'
 NCBI_TAX_DIR = '/pub/taxonomy/taxdump_archive/'
 TAXDUMP_PREFIX = 'taxdmp_'
+NEW_TAXDUMP_PREFIX = 'new_taxdump_'
 
 
 def parseargs():
@@ -18,6 +20,9 @@ def parseargs():
         description='Download the entire NCBI Taxonomy archives.')
     parser.add_argument('--dir', required=True,
                         help='the directory in which to store the files')
+    parser.add_argument('--new-taxdump', action='store_true',
+                        help='download the new_taxdump archives, which contain precomputed '
+                        + 'lineages, rather than the standard archives.')
 
     return parser.parse_args()
 
@@ -39,8 +44,9 @@ def main():
     with FTP(NCBI_HOST) as ftp:
         ftp.login()
         ftp.cwd(NCBI_TAX_DIR)
+        prefix = NEW_TAXDUMP_PREFIX if a.new_taxdump else TAXDUMP_PREFIX
         for f in ftp.mlsd(facts=['size']):
-            if f[0].startswith(TAXDUMP_PREFIX):
+            if f[0].startswith(prefix):
                 download_if_missing(ftp, a.dir, f[0])
 
 
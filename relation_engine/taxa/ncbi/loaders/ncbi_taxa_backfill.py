@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+
+# TODO TEST
+# for now tested manually
+
+import argparse
+import datetime
+import getpass
+import re
+from pathlib import Path
+
+from relation_engine.taxa.ncbi.parsers import NCBINodeProvider
+from relation_engine.taxa.ncbi.parsers import NCBIEdgeProvider
+from relation_engine.taxa.ncbi.parsers import NCBIMergeProvider
+from relation_engine.taxa.ncbi.parsers import NCBITaxDump
+from relation_engine.taxa.ncbi.loaders.ncbi_taxa_delta_loader import (
+    NAMES_IN_FILE,
+    NODES_IN_FILE,
+    MERGED_IN_FILE,
+)
+from relation_engine.batchload.delta_load import backfill_graph_history, BackfillRelease
+from relation_engine.batchload.arango_connection import connect
+from relation_engine.batchload.time_travelling_database import ArangoBatchTimeTravellingDB
+from relation_engine.version import VERSION
+
+_LOAD_NAMESPACE = 'ncbi_taxa'
+
+_DUMP_REGEX = re.compile(r'^taxdmp_(\d{4}-\d{2}-\d{2})(\.zip)?$')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="""
+Load the history of the NCBI taxonomy from the tax dump archives into an empty ArangoDB time
+travelling database in one pass, with the same result as loading each dump in turn with the
+delta loader.
+
+Each dump may be either a zip archive, e.g. taxdmp_2022-07-01.zip, as downloaded by
+ncbi_taxa_download_archive.py, which is read without extracting it, or a directory named after the
+archive containing the unzipped dump, e.g. taxdmp_2022-07-01. The date in the name is used as the
+load version, and midnight UTC on that date as the load and release timestamps.
+""".strip())
+    parser.add_argument(
+        '--dump-dir',
+        required=True,
+        help='the directory containing the tax dump archives or unzipped tax dump directories. ' +
+        'Files and directories that are not named like tax dumps are ignored.')
+    parser.add_argument(
+        '--temp-dir',
+        help='the directory in which to store the sorted dumps. Defaults to the system ' +
+        'temporary directory.')
+    parser.add_argument(
+        '--arango-url',
+        required=True,
+        help='The url of the ArangoDB server (e.g. http://localhost:8528). Multiple ' +
+        'comma separated urls may be supplied, in which case requests are distributed ' +
+        'across them round robin.')
+    parser.add_argument(
+        '--database',
+        required=True,
+        help='the name of the ArangoDB database that will be altered')
+    parser.add_argument(
+        '--user',
+        help='the ArangoDB user name; if --pwd-file is not included a password prompt will be ' +
+        'presented. Omit to connect with default credentials.')
+    parser.add_argument(
+        '--pwd-file',
+        help='the path to a file containing the ArangoDB password and nothing else; ' +
+        'if --user is included and --pwd-file is omitted a password prompt will be presented.')
+    parser.add_argument(
+        '--load-registry-collection',
+        required=True,
+        help='the name of the ArangoDB collection where the loads will be registered. ' +
+        'This is typically the same collection for all delta loaded data.')
+    parser.add_argument(
+        '--node-collection',
+        required=True,
+        help='the name of the empty ArangoDB collection into which taxa nodes will be loaded')
+    parser.add_argument(
+        '--edge-collection',
+        required=True,
+        help='the name of the empty ArangoDB collection into which taxa edges will be loaded')
+    parser.add_argument(
+        '--merge-edge-collection',
+        required=True,
+        help='the name of the empty ArangoDB collection into which merge edges will be loaded')
+    parser.add_argument('--version', action='version', version=VERSION)
+    return parser.parse_args()
+
+
+def _get_dumps(dump_dir):
+    dumps = {}
+    for d in Path(dump_dir).iterdir():
+        match = _DUMP_REGEX.match(d.name)
+        if match and d.is_dir() != bool(match.group(2)):
+            version = match.group(1)
+            if version in dumps:
+                raise ValueError(f'Both {dumps[version]} and {d} contain tax dump {version}')
+            dumps[version] = d
+    if not dumps:
+        raise ValueError(f'No tax dumps found in {dump_dir}')
+    return sorted(dumps.items())
+
+
+def _releases(dumps):
+    for version, d in dumps:
+        date = datetime.datetime.strptime(version, '%Y-%m-%d').replace(
+            tzinfo=datetime.timezone.utc)
+        timestamp = int(date.timestamp() * 1000)
+        print(f'Reading {d}')
+        with NCBITaxDump(d) as dump:
+            yield BackfillRelease(
+                version, timestamp, timestamp,
+                NCBINodeProvider(dump.open(NAMES_IN_FILE), dump.open(NODES_IN_FILE)),
+                NCBIEdgeProvider(dump.open(NODES_IN_FILE)),
+                NCBIMergeProvider(dump.open(MERGED_IN_FILE)))
+
+
+def main():
+    a = parse_args()
+    dumps = _get_dumps(a.dump_dir)
+    pwd = None
+    if a.user:
+        if a.pwd_file:
+            with open(a.pwd_file) as pwd_file:
+                pwd = pwd_file.read().strip()
+        else:
+            pwd = getpass.getpass()
+    db = connect(a.arango_url.split(','), a.database, a.user, pwd)
+    attdb = ArangoBatchTimeTravellingDB(
+        db,
+        a.load_registry_collection,
+        a.node_collection,
+        default_edge_collection=a.edge_collection,
+        merge_collection=a.merge_edge_collection)
+
+    counts = backfill_graph_history(
+        _LOAD_NAMESPACE, _releases(dumps), attdb, temp_dir=a.temp_dir)
+    for col, count in sorted(counts.items()):
+        print(f'{col}: {count} documents')
+
+
+if __name__ == '__main__':
+    main()
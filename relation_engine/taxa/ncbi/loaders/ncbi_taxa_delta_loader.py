@@ -4,13 +4,15 @@
 # for now tested manually
 
 import argparse
-from arango import ArangoClient
 
 from relation_engine.taxa.config import DeltaLoaderConfig
 from relation_engine.taxa.ncbi.parsers import NCBINodeProvider
 from relation_engine.taxa.ncbi.parsers import NCBIEdgeProvider
 from relation_engine.taxa.ncbi.parsers import NCBIMergeProvider
+from relation_engine.taxa.ncbi.parsers import NCBITaxDump
 from relation_engine.batchload.delta_load import load_graph_delta
+from relation_engine.batchload.load_state_cache import LoadStateCache
+from relation_engine.batchload.arango_connection import connect_from_config
 from relation_engine.batchload.time_travelling_database import ArangoBatchTimeTravellingDB
 from relation_engine.version import VERSION
 
@@ -20,6 +22,9 @@ _INPUT_DIRECTORY = 'input_directory'
 NAMES_IN_FILE = 'names.dmp'
 NODES_IN_FILE = 'nodes.dmp'
 MERGED_IN_FILE = 'merged.dmp'
+# new_taxdump files
+TAXID_LINEAGE_IN_FILE = 'taxidlineage.dmp'
+RANKED_LINEAGE_IN_FILE = 'rankedlineage.dmp'
 
 
 def get_config():
@@ -31,23 +36,27 @@ changes between the prior load and the current load, and retaining the prior loa
                         help='the path to the loader configuration file. NOTE: the config '
                         + 'file will need to be updated for each consecutive load; it is not '
                         + 'static.')
+    parser.add_argument('--sorted-join', action='store_true',
+                        help='calculate the changes by streaming the extant taxa from the '
+                        + 'database sorted by ID and joining them to the sorted dump files, '
+                        + 'rather than looking up the taxa in batches.')
+    parser.add_argument('--taxid-lineage', action='store_true',
+                        help='determine strains from the precomputed lineages in '
+                        + f'{TAXID_LINEAGE_IN_FILE} rather than by walking up the tree. The '
+                        + 'input must be a new_taxdump dump.')
+    parser.add_argument('--ranked-lineage', action='store_true',
+                        help=f'add the ranked lineage from {RANKED_LINEAGE_IN_FILE} to each taxon '
+                        + 'as the ranked_lineage field. The input must be a new_taxdump dump. '
+                        + 'NOTE: all taxa will change compared to a load without this option.')
     parser.add_argument('--version', action='version', version=VERSION)
     a = parser.parse_args()
     with open(a.config, 'rb') as c:
-        return DeltaLoaderConfig(c, [_INPUT_DIRECTORY], require_merge_collection=True)
+        return DeltaLoaderConfig(c, [_INPUT_DIRECTORY], require_merge_collection=True), a
 
 
 def main():
-    cfg = get_config()
-    rootdir = cfg.inputs[_INPUT_DIRECTORY]
-    nodes = rootdir / NODES_IN_FILE
-    names = rootdir / NAMES_IN_FILE
-    merged = rootdir / MERGED_IN_FILE
-    client = ArangoClient(hosts=cfg.url)
-    if cfg.username:
-        db = client.db(cfg.database, cfg.username, cfg.password, verify=True)
-    else:
-        db = client.db(cfg.database, verify=True)
+    cfg, args = get_config()
+    db = connect_from_config(cfg)
     attdb = ArangoBatchTimeTravellingDB(
         db,
         cfg.load_registry_collection,
@@ -55,14 +64,26 @@ def main():
         default_edge_collection=cfg.edge_collection,
         merge_collection=cfg.merge_edge_collection)
 
-    with open(nodes) as in1, open(names) as namesfile, open(nodes) as in2, open(merged) as merge:
-        nodeprov = NCBINodeProvider(namesfile, in1)
-        edgeprov = NCBIEdgeProvider(in2)
-        merge = NCBIMergeProvider(merge)
+    # the input may be the unzipped dump directory or the dump zip archive
+    with NCBITaxDump(cfg.inputs[_INPUT_DIRECTORY]) as dump:
+        nodeprov = NCBINodeProvider(
+            dump.open(NAMES_IN_FILE),
+            dump.open(NODES_IN_FILE),
+            dump.open(TAXID_LINEAGE_IN_FILE) if args.taxid_lineage else None,
+            dump.open(RANKED_LINEAGE_IN_FILE) if args.ranked_lineage else None)
+        edgeprov = NCBIEdgeProvider(dump.open(NODES_IN_FILE))
+        merge = NCBIMergeProvider(dump.open(MERGED_IN_FILE))
 
-        load_graph_delta(_LOAD_NAMESPACE, nodeprov, edgeprov, attdb,
-                         cfg.load_timestamp, cfg.release_timestamp, cfg.load_version,
-                         merge_source=merge)
+        times = load_graph_delta(_LOAD_NAMESPACE, nodeprov, edgeprov, attdb,
+                                 cfg.load_timestamp, cfg.release_timestamp, cfg.load_version,
+                                 merge_source=merge, state_cache=_get_state_cache(cfg),
+                                 sorted_join=args.sorted_join)
+    for col, t in times.items():
+        print(f'Swept collection {col} in {t:.2f}s')
+
+
+def _get_state_cache(cfg):
+    return LoadStateCache(cfg.state_cache_file) if cfg.state_cache_file else None
 
 
 if __name__ == '__main__':
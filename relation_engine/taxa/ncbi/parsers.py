@@ -10,8 +10,11 @@ Common code for dealing with NCBI taxonomy files.
 # And there was much rejoicing.
 
 
+import io
 import re
+import zipfile
 from collections import defaultdict
+from pathlib import Path
 
 from relation_engine.taxa.common_fields import (
     FROM,
@@ -30,6 +33,60 @@ from relation_engine.taxa.ncbi.ranks import (
 
 _SEP = r'\s\|\s?'
 _SCI_NAME = 'scientific name'
+# the ranks of the columns after the node name in rankedlineage.dmp
+_RANKED_LINEAGE_RANKS = ['species', 'genus', 'family', 'order', 'class', 'phylum', 'kingdom',
+                         'superkingdom']
+
+
+class NCBITaxDump:
+    """
+    NCBITaxDump provides access to the files in a NCBI taxonomy dump, which may be either a
+    directory containing the unzipped dump or the dump zip archive, e.g. taxdmp_2022-07-01.zip.
+    Files in an archive are streamed from the archive rather than extracted to disk.
+
+    Use the dump as a context manager, or call close(), to close the files opened from the dump.
+    """
+
+    def __init__(self, path):
+        """
+        Create the dump.
+        path - the path to the dump directory or zip archive.
+        """
+        self._path = Path(path)
+        self._zip = zipfile.ZipFile(self._path) if self._path.is_file() else None
+        self._files = []
+
+    def open(self, name):
+        """
+        Open a file in the dump, e.g. nodes.dmp, for reading as text. Each call returns a new
+        file handle, so a file may be read more than once at the same time.
+        name - the name of the file.
+        """
+        if self._zip:
+            try:
+                fh = io.TextIOWrapper(self._zip.open(name), encoding='utf-8')
+            except KeyError:
+                raise ValueError(f'{name} is not in the archive {self._path}')
+        else:
+            fh = open(self._path / name, encoding='utf-8')
+        self._files.append(fh)
+        return fh
+
+    def close(self):
+        """
+        Close the files opened from the dump and the archive, if any.
+        """
+        for fh in self._files:
+            fh.close()
+        self._files.clear()
+        if self._zip:
+            self._zip.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
 
 
 class NCBINodeProvider:
@@ -39,20 +96,44 @@ class NCBINodeProvider:
     It requires access to the names.dmp and nodes.dmp files from a taxonomy dump.
     """
 
-    def __init__(self, names_filehandle, nodes_filehandle):
+    def __init__(
+            self,
+            names_filehandle,
+            nodes_filehandle,
+            taxid_lineage_filehandle=None,
+            ranked_lineage_filehandle=None):
         """
         Create the provider.
         names_filehandle - the opened names.dmp file.
-        nodes_filehandle - the opened nodes.dmp file. This file handle must be seek-able.
+        nodes_filehandle - the opened nodes.dmp file. The file is read once, here, and so
+          need not be seekable, e.g. a file streamed from a zip archive.
+        taxid_lineage_filehandle - the opened taxidlineage.dmp file from a new_taxdump dump, if
+          any. If provided, strains are determined from the precomputed lineages in a single
+          pass rather than by walking up the tree.
+        ranked_lineage_filehandle - the opened rankedlineage.dmp file from a new_taxdump dump, if
+          any. If provided, each node has a ranked_lineage field containing a dict of rank to
+          the name of the ancestor with that rank for the species, genus, family, order, class,
+          phylum, kingdom, and superkingdom ranks, omitting ranks that are not in the lineage.
+          The file is read as the nodes are iterated, and so the provider may only be iterated
+          once. The file must be in the same order as nodes.dmp.
         """
         self._names = self._load_names(names_filehandle)
-        self._node_fh = nodes_filehandle
+        self._ranked_lineage_fh = ranked_lineage_filehandle
+        # The node IDs, ranks, and genetic codes in file order. There are few distinct ranks and
+        # genetic codes, so they're shared between nodes.
+        self._ids = []
+        self._ranks = []
+        self._gencodes = []
         # contains strings, not numbers
         # species and subspecies
         self._species_tax_ids = set()
         # anything that has no rank and links to species, subspecies, or strains
         self._strain_tax_ids = set()
-        self._get_species_and_strain_ids()
+        parents = self._load_nodes(nodes_filehandle)
+        if taxid_lineage_filehandle:
+            self._get_strain_ids_from_lineage(taxid_lineage_filehandle, parents.keys())
+        else:
+            self._get_strain_ids(parents)
 
     def _load_names(self, name_file):
         # Could make this use less memory by parsing one nodes worth of entries at a time, since
@@ -66,39 +147,74 @@ class NCBINodeProvider:
 
         return {k: dict(name_table[k]) for k in name_table.keys()}
 
-    def _get_species_and_strain_ids(self):
-        # Almost certainly faster to just load the tree into memory in one pass and recurse.
-        # Originally written this way to avoid memory usage, but > 80% of the node
-        # IDs are going to be stored in memory either way.
-        # Alternately make a sqlite DB or something
-        # Given the use case is a batch load ~ 1 / month, YAGNI
-        not_converged = True
-        count = 1
-        while not_converged:
-            print(f'strain determination round {count}')
-            count += 1
-            not_converged = False
-            for line in self._node_fh:
-                # also fragile
-                record = re.split(_SEP, line)
-                id_, parent, rank = [record[i].strip() for i in [0, 1, 2]]
-                if rank not in RANKS_ALL:
-                    raise ValueError(f"Node {id_} has an unexpected rank of {rank}")
-                if rank in RANKS_SPECIES_AND_BELOW:
-                    self._species_tax_ids.add(id_)  # after the first round this is a no-op
-                elif (rank in RANKS_NON_HIERARCHICAL
-                        and id_ not in self._strain_tax_ids
-                        and (parent in self._species_tax_ids or parent in self._strain_tax_ids)):
-                    not_converged = True
-                    self._strain_tax_ids.add(id_)
-            self._node_fh.seek(0)
+    def _load_nodes(self, nodes_fh):
+        ranks = {}
+        gencodes = {}
+        # the parents of the nodes with non hierarchical ranks
+        parents = {}
+        for line in nodes_fh:
+            # also fragile
+            record = re.split(_SEP, line)
+            id_, parent, rank, gencode = [record[i].strip() for i in [0, 1, 2, 6]]
+            if rank not in RANKS_ALL:
+                raise ValueError(f"Node {id_} has an unexpected rank of {rank}")
+            self._ids.append(id_)
+            self._ranks.append(ranks.setdefault(rank, rank))
+            gencode = int(gencode)
+            self._gencodes.append(gencodes.setdefault(gencode, gencode))
+            if rank in RANKS_SPECIES_AND_BELOW:
+                self._species_tax_ids.add(id_)
+            elif rank in RANKS_NON_HIERARCHICAL:
+                parents[id_] = parent
+        return parents
 
-    def __iter__(self):
-        for line in self._node_fh:
+    def _get_strain_ids(self, parents):
+        # A node with a non hierarchical rank is a strain if its parent is at or below the
+        # species rank or is a strain. Walk up each chain of non hierarchical nodes once,
+        # recording the result for every node on the chain.
+        is_strain = {}
+        for id_ in parents:
+            chain = []
+            onchain = set()
+            node = id_
+            while node in parents and node not in is_strain and node not in onchain:
+                chain.append(node)
+                onchain.add(node)
+                node = parents[node]
+            if node in is_strain:
+                strain = is_strain[node]
+            else:
+                # the root node is its own parent
+                strain = node not in onchain and node in self._species_tax_ids
+            for n in chain:
+                is_strain[n] = strain
+        self._strain_tax_ids = {n for n, strain in is_strain.items() if strain}
+
+    def _get_strain_ids_from_lineage(self, lineage_fh, non_hierarchical):
+        # Equivalent to _get_strain_ids: a node with a non hierarchical rank is a strain if its
+        # nearest ancestor with a hierarchical rank is at or below the species rank.
+        for line in lineage_fh:
+            # fragile
             record = re.split(_SEP, line)
-            # should really make the ints constants but meh
-            id_, rank, gencode = [record[i].strip() for i in [0, 2, 6]]
+            id_ = record[0].strip()
+            if id_ in non_hierarchical:
+                # the lineage is ordered from the root to the parent
+                for ancestor in reversed(record[1].split()):
+                    if ancestor not in non_hierarchical:
+                        if ancestor in self._species_tax_ids:
+                            self._strain_tax_ids.add(id_)
+                        break
 
+    def _ranked_lineages(self):
+        for line in self._ranked_lineage_fh:
+            # fragile
+            record = [r.strip() for r in re.split(_SEP, line)]
+            yield record[0], {rank: name for rank, name in zip(_RANKED_LINEAGE_RANKS, record[2:])
+                              if name}
+
+    def __iter__(self):
+        lineages = self._ranked_lineages() if self._ranked_lineage_fh else None
+        for id_, rank, gencode in zip(self._ids, self._ranks, self._gencodes):
             aliases = []
             # May need to move names into separate nodes for canonical search purposes
             for cat in list(self._names[id_].keys()):
@@ -121,8 +237,14 @@ class NCBINodeProvider:
                                                or id_ in self._species_tax_ids),
                 'aliases':                    aliases,
                 'ncbi_taxon_id':              int(id_),
-                'gencode':                    int(gencode),
+                'gencode':                    gencode,
             }
+            if lineages:
+                lineage_id, lineage = next(lineages, (None, None))
+                if lineage_id != id_:
+                    raise ValueError(f'Expected node {id_} in the ranked lineage file, '
+                                     + f'found {lineage_id}')
+                node['ranked_lineage'] = lineage
 
             yield node
 
@@ -1,7 +1,9 @@
+import zipfile
 from io import StringIO
 from pytest import raises
 
 from relation_engine.taxa.ncbi.parsers import NCBINodeProvider, NCBIEdgeProvider, NCBIMergeProvider
+from relation_engine.taxa.ncbi.parsers import NCBITaxDump
 
 from relation_engine.test.testing_helpers import assert_exception_correct
 
@@ -221,6 +223,92 @@ _NON_SPECIES_RANKS = [
 ]
 
 
+def test_node_provider_unseekable_nodes_and_root():
+    # the nodes file is read once, so a plain iterator works, and the root is its own parent
+    names = StringIO("\n".join([
+        "     1   |    \t    root  \t   |   |  scientific name  \t   | ",
+        "     2   |    \t    sp  \t   |   |  scientific name  \t   | ",
+        "     3   |    \t    nr  \t   |   |  scientific name  \t   | ",
+    ]))
+    nodes = iter([
+        "1	|	1	|	no rank   	|		|	8	|	0	|	1	|	0	|	0	|	0	|	0	|0	|		|",
+        "2	|	1	|	species   	|		|	8	|	0	|	1	|	0	|	0	|	0	|	0	|0	|		|",
+        "3	|	2	|	no rank   	|		|	8	|	0	|	1	|	0	|	0	|	0	|	0	|0	|		|",
+    ])
+
+    prov = NCBINodeProvider(names, nodes)
+    for _ in range(2):
+        assert [(n['id'], n['strain'], n['species_or_below']) for n in prov] == [
+            ('1', False, False), ('2', False, True), ('3', True, True)]
+
+
+_LINEAGE_NODES = [
+    # id, parent, rank, lineage from the root to the parent
+    ("1", "1", "no rank", ""),
+    ("44", "1", "genus", "1"),
+    ("62", "44", "species", "1 44"),
+    ("67", "62", "no rank", "1 44 62"),
+    ("68", "67", "clade", "1 44 62 67"),
+    ("69", "62", "subspecies", "1 44 62"),
+    ("70", "69", "no rank", "1 44 62 69"),
+    ("74", "44", "no rank", "1 44"),
+    ("75", "74", "no rank", "1 44 74"),
+]
+
+
+def _lineage_files():
+    names = StringIO("\n".join(
+        [f"{n[0]}\t|\tname{n[0]}\t|\t\t|\tscientific name\t|" for n in _LINEAGE_NODES]))
+    nodes = StringIO("\n".join(
+        [f"{n[0]}\t|\t{n[1]}\t|\t{n[2]}\t|\t\t|\t8\t|\t0\t|\t1\t|\t0\t|\t0\t|\t0\t|"
+         for n in _LINEAGE_NODES]))
+    lineage = StringIO("\n".join([f"{n[0]}\t|\t{n[3]} \t|" for n in _LINEAGE_NODES]))
+    return names, nodes, lineage
+
+
+def test_node_provider_taxid_lineage():
+    names, nodes, _ = _lineage_files()
+    expected = list(NCBINodeProvider(names, nodes))
+    assert [(n['id'], n['strain']) for n in expected] == [
+        ("1", False), ("44", False), ("62", False), ("67", True), ("68", True), ("69", False),
+        ("70", True), ("74", False), ("75", False)]
+
+    names, nodes, lineage = _lineage_files()
+    assert list(NCBINodeProvider(names, nodes, taxid_lineage_filehandle=lineage)) == expected
+
+
+def test_node_provider_ranked_lineage():
+    names = StringIO(SIMPLE_NAMES)
+    nodes = StringIO("\n".join([
+        "62	|	44	|	species   	|		|	8	|	0	|	8	|	0	|	0	|	0	|	0	|0	|		|",
+        " 63	|	44	|	strain   	|		|	6	|	0	|	11	|	0	|	0	|	0	|	0	|0	|		|",
+    ]))
+    lineage = StringIO("\n".join([
+        "62\t|\tl. skywalkerii\t|\t\t|\tl.\t|\t\t|\t\t|\t\t|\t\t|\t\t|\tEukaryota\t|",
+        "63\t|\tc. bacca\t|\tc. b\t|\tc.\t|\tf\t|\to\t|\tc\t|\tp\t|\tk\t|\tE\t|",
+    ]))
+
+    res = list(NCBINodeProvider(names, nodes, ranked_lineage_filehandle=lineage))
+
+    assert [n['ranked_lineage'] for n in res] == [
+        {'genus': 'l.', 'superkingdom': 'Eukaryota'},
+        {'species': 'c. b', 'genus': 'c.', 'family': 'f', 'order': 'o', 'class': 'c',
+         'phylum': 'p', 'kingdom': 'k', 'superkingdom': 'E'},
+    ]
+
+
+def test_node_provider_fail_ranked_lineage_order():
+    for lineage, found in [("63\t|\tc. bacca\t|\t\t|", "63"), ("", None)]:
+        names = StringIO(SIMPLE_NAMES)
+        nodes = StringIO(
+            "62	|	44	|	species   	|		|	8	|	0	|	8	|	0	|	0	|	0	|	0	|0	|		|")
+        with raises(Exception) as got:
+            list(NCBINodeProvider(
+                names, nodes, ranked_lineage_filehandle=StringIO(lineage)))
+        assert_exception_correct(got.value, ValueError(
+            f'Expected node 62 in the ranked lineage file, found {found}'))
+
+
 def test_node_provider_non_species_ranks():
     # test that non-species ranks are accepted and don't result in marking non hierarchical ranks
     # below them as strains.
@@ -501,3 +589,38 @@ def test_merge_provider():
             "to": "184914",
         },
     ]
+
+
+def _write_dump(dir_):
+    dir_.mkdir()
+    (dir_ / 'names.dmp').write_text(SIMPLE_NAMES)
+    (dir_ / 'nodes.dmp').write_text("\n".join([
+        "62	|	44	|	species   	|		|	8	|	0	|	8	|	0	|	0	|	0	|	0	|0	|		|",
+        " 63	|	44	|	strain   	|		|	6	|	0	|	11	|	0	|	0	|	0	|	0	|0	|		|",
+    ]))
+
+
+def test_tax_dump_directory_and_zip(tmp_path):
+    _write_dump(tmp_path / 'dump')
+    with zipfile.ZipFile(tmp_path / 'taxdmp.zip', 'w') as z:
+        for f in ['names.dmp', 'nodes.dmp']:
+            z.write(tmp_path / 'dump' / f, f)
+
+    for path in [tmp_path / 'dump', tmp_path / 'taxdmp.zip']:
+        with NCBITaxDump(path) as dump:
+            nodes = list(NCBINodeProvider(dump.open('names.dmp'), dump.open('nodes.dmp')))
+            edges = list(NCBIEdgeProvider(dump.open('nodes.dmp')))
+        assert [n['id'] for n in nodes] == ['62', '63']
+        assert edges == [{'id': '62', 'from': '62', 'to': '44'},
+                         {'id': '63', 'from': '63', 'to': '44'}]
+
+
+def test_tax_dump_fail_missing_file(tmp_path):
+    with zipfile.ZipFile(tmp_path / 'taxdmp.zip', 'w') as z:
+        z.writestr('nodes.dmp', '')
+
+    with NCBITaxDump(tmp_path / 'taxdmp.zip') as dump:
+        with raises(Exception) as got:
+            dump.open('merged.dmp')
+    assert_exception_correct(got.value, ValueError(
+        f'merged.dmp is not in the archive {tmp_path / "taxdmp.zip"}'))
@@ -9,11 +9,13 @@ import argparse
 import getpass
 import gzip
 from contextlib import ExitStack
-from arango import ArangoClient
 
 from relation_engine.taxa.rdp.parsers import RDPNodeProvider
 from relation_engine.taxa.rdp.parsers import RDPEdgeProvider
+from relation_engine.taxa.rdp.parsers import create_lineage_cache
 from relation_engine.batchload.delta_load import load_graph_delta
+from relation_engine.batchload.load_state_cache import LoadStateCache
+from relation_engine.batchload.arango_connection import connect
 from relation_engine.batchload.time_travelling_database import ArangoBatchTimeTravellingDB
 
 # TODO probably should make some sort of general arg parser since they're all so similar
@@ -37,7 +39,9 @@ def parse_args():
     parser.add_argument(
         '--arango-url',
         required=True,
-        help='The url of the ArangoDB server (e.g. http://localhost:8528')
+        help='The url of the ArangoDB server (e.g. http://localhost:8528). Multiple ' +
+        'comma separated urls may be supplied, in which case requests are distributed ' +
+        'across them round robin.')
     parser.add_argument(
         '--database',
         required=True,
@@ -82,6 +86,11 @@ def parse_args():
         required=True,
         help='the timestamp, in unix epoch milliseconds, when the data was released ' +
         'at the source.')
+    parser.add_argument(
+        '--state-cache-file',
+        help='the path to a file in which to cache the state of the load. If the file ' +
+        'contains the state of the prior load, the changes are calculated from the file ' +
+        'rather than the database. The file is created if it does not exist.')
 
     return parser.parse_args()
 
@@ -90,16 +99,14 @@ def main():
     a = parse_args()
     if not a.file_16S and not a.file_28S:
         raise ValueError('no input files were supplied')
-    client = ArangoClient(hosts=a.arango_url)
+    pwd = None
     if a.user:
         if a.pwd_file:
             with open(a.pwd_file) as pwd_file:
                 pwd = pwd_file.read().strip()
         else:
             pwd = getpass.getpass()
-        db = client.db(a.database, a.user, pwd, verify=True)
-    else:
-        db = client.db(a.database, verify=True)
+    db = connect(a.arango_url.split(','), a.database, a.user, pwd)
     attdb = ArangoBatchTimeTravellingDB(
         db,
         a.load_registry_collection,
@@ -110,11 +117,17 @@ def main():
         files_16S = [stack.enter_context(gzip.open(f, 'rt')) for f in a.file_16S]
         files_28S = [stack.enter_context(gzip.open(f, 'rt')) for f in a.file_28S]
         edgefiles = [stack.enter_context(gzip.open(f, 'rt')) for f in a.file_16S + a.file_28S]
-        nodeprov = RDPNodeProvider(files_16S, files_28S)
-        edgeprov = RDPEdgeProvider(edgefiles)
+        cache = create_lineage_cache()
+        nodeprov = RDPNodeProvider(files_16S, files_28S, lineage_cache=cache)
+        edgeprov = RDPEdgeProvider(edgefiles, lineage_cache=cache)
 
-        load_graph_delta(_LOAD_NAMESPACE, nodeprov, edgeprov, attdb,
-                         a.load_timestamp, a.release_timestamp, a.load_version)
+        times = load_graph_delta(_LOAD_NAMESPACE, nodeprov, edgeprov, attdb,
+                                 a.load_timestamp, a.release_timestamp, a.load_version,
+                                 state_cache=LoadStateCache(a.state_cache_file)
+                                 if a.state_cache_file else None)
+    print(cache.format_stats())
+    for col, t in times.items():
+        print(f'Swept collection {col} in {t:.2f}s')
 
 
 if __name__ == '__main__':
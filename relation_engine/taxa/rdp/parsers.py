@@ -7,10 +7,15 @@ Common code for dealing with RDP taxonomy files.
 
 import re
 
+from relation_engine.taxa.lineage_cache import LineageCache, DEFAULT_MAX_SIZE
+
 _16S = '16S'
 _28S = '28S'
 _INCERTAE_SEDIS = 'incertae_sedis'
 
+# index of the ID in the parsed taxon tuples
+_ID = 0
+
 _RE_INCERTAE_SEDIS = re.compile('[_ ][Ii]ncertae[_ ][Ss]edis')
 
 
@@ -20,7 +25,11 @@ class RDPNodeProvider:
     iteration.
     """
 
-    def __init__(self, rdp_taxonomy_16Sfile_handles, rdp_taxonomy_28Sfile_handles):
+    def __init__(
+            self,
+            rdp_taxonomy_16Sfile_handles,
+            rdp_taxonomy_28Sfile_handles,
+            lineage_cache=None):
         """
         Create the node provider.
 
@@ -28,9 +37,12 @@ class RDPNodeProvider:
             process.
         rdp_taxonomy_28Sfile_handles - a list of open handles for the RDP taxonomy 28S files to
             process.
+        lineage_cache - a cache from create_lineage_cache(), which may be shared with the
+            edge provider. Defaults to a new cache.
         """
         self._fh_16S = rdp_taxonomy_16Sfile_handles
         self._fh_28S = rdp_taxonomy_28Sfile_handles
+        self._cache = lineage_cache or create_lineage_cache()
 
     def __iter__(self):
         seen_taxa = set()  # not including leaves
@@ -45,19 +57,18 @@ class RDPNodeProvider:
                 continue
             names, lineage = line.split('\t')
             locus, definition = names.split(' ', 1)
-            lineage, unclassified = _get_lineage(lineage)
+            lineage, unclassified = self._cache.get(lineage)
             if not lineage:  # it's an outgroup
                 continue
-            for lin in lineage:
-                l_id = _taxon_to_id(lin)
+            for l_id, rank, name, incertae_sedis in lineage:
                 if l_id not in seen_taxa:
                     yield {
-                        'id': l_id.replace('/', '_'),
-                        'rank': lin['rank'],
-                        'name': lin['name'],
+                        'id': l_id,
+                        'rank': rank,
+                        'name': name,
                         'unclassified': False,
                         'molecule': None,
-                        _INCERTAE_SEDIS: lin[_INCERTAE_SEDIS]
+                        _INCERTAE_SEDIS: incertae_sedis
                     }
                 seen_taxa.add(l_id)
             yield {
@@ -76,13 +87,16 @@ class RDPEdgeProvider:
     iteration.
     """
 
-    def __init__(self, rdp_taxonomy_file_handles):
+    def __init__(self, rdp_taxonomy_file_handles, lineage_cache=None):
         """
         Create the edge provider.
 
         rdp_taxonomy_file_handles - a list of open handles for the RDP taxonomy files to process.
+        lineage_cache - a cache from create_lineage_cache(), which may be shared with the
+            node provider. Defaults to a new cache.
         """
         self._fh = rdp_taxonomy_file_handles
+        self._cache = lineage_cache or create_lineage_cache()
 
     def __iter__(self):
         seen_taxa = set()  # not including leaves
@@ -93,12 +107,12 @@ class RDPEdgeProvider:
                 names, lineage = line.split('\t')
                 locus, _ = names.split(' ', 1)
                 locus = locus[1:].strip()  # remove '>'
-                lineage, _ = _get_lineage(lineage)
+                lineage, _ = self._cache.get(lineage)
                 if not lineage:  # it's an outgroup
                     continue
                 for i in range(len(lineage) - 1):
-                    parent_id = _taxon_to_id(lineage[i]).replace('/', '_')
-                    child_id = _taxon_to_id(lineage[i + 1]).replace('/', '_')
+                    parent_id = lineage[i][_ID]
+                    child_id = lineage[i + 1][_ID]
                     if child_id not in seen_taxa:
                         yield {
                             'id': child_id,  # one edge per child
@@ -106,13 +120,34 @@ class RDPEdgeProvider:
                             'to': parent_id
                         }
                         seen_taxa.add(child_id)
-                parent_id = _taxon_to_id(lineage[-1]).replace('/', '_')
+                parent_id = lineage[-1][_ID]
                 yield {
                     'id': locus,  # one edge per child
                     'from': locus,
                     'to': parent_id
                 }
 
+
+def create_lineage_cache(max_size=DEFAULT_MAX_SIZE):
+    """
+    Create a cache of parsed RDP lineages to share between the node and edge providers.
+
+    max_size - the maximum number of lineages to cache.
+    """
+    return LineageCache(_parse_lineage, max_size)
+
+
+# returns an immutable tuple of (id, rank, name, incertae sedis) tuples, one per taxon, or None
+# if the lineage indicates an outgroup, and whether the sequence is unclassified below the
+# lineage.
+def _parse_lineage(linstr):
+    lineage, unclassified = _get_lineage(linstr)
+    if not lineage:
+        return None, False
+    return tuple((_taxon_to_id(t).replace('/', '_'), t['rank'], t['name'], t[_INCERTAE_SEDIS])
+                 for t in lineage), unclassified
+
+
 # returns None in the first argument if the lineage indicates an outgroup.
 # second argument indicates if the sequence is unclassfied below the provided lineage
 
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+
+# Compares the throughput of the SILVA FASTA parser to Bio.SeqIO, e.g. on
+# SILVA_138_SSUParc_tax_silva.fasta(.gz).
+# Both parsers produce the (id, taxpath, organism_name, sequence) tuples used by the SILVA loader.
+# use -h for help.
+
+import argparse
+import os
+import time
+
+from Bio import SeqIO
+
+from relation_engine.taxa.silva.parsers import parse_silva_fasta, _open_fasta
+
+
+def parseargs():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the SILVA FASTA parser against Bio.SeqIO.')
+    parser.add_argument('--file', required=True,
+                        help='the SILVA FASTA file to parse. May be gzipped.')
+    parser.add_argument('--skip-seqio', action='store_true',
+                        help='only run the SILVA FASTA parser.')
+
+    return parser.parse_args()
+
+
+def parse_seqio(flpth):
+    # equivalent to the SeqIO based code the SILVA parser previously used
+    with _open_fasta(flpth) as f:
+        for record in SeqIO.parse(f, 'fasta'):
+            taxpath, organism_name = record.description.split(' ', 1)[1].rsplit(';', 1)
+            yield record.name, taxpath + ';', organism_name, str(record.seq)
+
+
+def run(name, parser, flpth, size):
+    t0 = time.time()
+    count = 0
+    bases = 0
+    for _, _, _, seq in parser(flpth):
+        count += 1
+        bases += len(seq)
+    t = time.time() - t0
+    print(f'{name}: {count} records, {bases} bases in {t:.2f}s. '
+          + f'{count / t:.0f} records/s, {size / t / 2**20:.1f} MB/s (on disk)')
+    return t
+
+
+def main():
+    a = parseargs()
+    size = os.path.getsize(a.file)
+    t = run('parse_silva_fasta', parse_silva_fasta, a.file, size)
+    if not a.skip_seqio:
+        tseqio = run('Bio.SeqIO', parse_seqio, a.file, size)
+        print(f'speedup: {tseqio / t:.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -8,15 +8,19 @@ Copied and pasted from other taxa delta loaders
 
 import argparse
 import getpass
-from arango import ArangoClient
 
 from relation_engine.taxa.silva.parsers import (
     SILVANodeProvider,
     SILVAEdgeProvider,
-    TaxNode,
-    SeqNode,
+    SILVATaxonomy,
+    SILVASequences,
+    DATASETS,
+    DEFAULT_RELEASE,
 )
+from relation_engine.taxa.silva.sequence_store import ArangoSequenceStore
 from relation_engine.batchload.delta_load import load_graph_delta
+from relation_engine.batchload.load_state_cache import LoadStateCache
+from relation_engine.batchload.arango_connection import connect
 from relation_engine.batchload.time_travelling_database import (
     ArangoBatchTimeTravellingDB,
 )
@@ -36,17 +40,42 @@ changes between the prior load and the current load, and retaining the prior loa
     parser.add_argument(
         "--input-dir",
         required=True,
-        help="the directory containing SILVA 138 SSU taxonomy and sequence files, i.e., "
-        "tax_slv_ssu_138.txt, SILVA_138_SSUParc_tax_silva.fasta, SILVA_138_SSURef_tax_silva.fasta, "
+        help="the directory containing SILVA SSU taxonomy and sequence files, e.g. for release "
+        "138, tax_slv_ssu_138.txt, SILVA_138_SSUParc_tax_silva.fasta, SILVA_138_SSURef_tax_silva.fasta, "
         "and SILVA_138_SSURef_NR99_tax_silva.fasta, which are available at "
         + "https://www.arb-silva.de/no_cache/download/archive/release_138/Exports/. These are "
         "the taxonomy file, Parc sequence dataset, Ref seqeuence dataset, and Ref NR99 "
-        "sequence dataset, respectively",
+        "sequence dataset, respectively. The sequence files may be gzipped.",
+    )
+    parser.add_argument(
+        "--release",
+        default=DEFAULT_RELEASE,
+        help=f"the SILVA release number in the input file names. Default {DEFAULT_RELEASE}.",
+    )
+    parser.add_argument(
+        "--datasets",
+        default=",".join(DATASETS),
+        help="a comma separated list of the sequence datasets to load, any of "
+        + f"{', '.join(DATASETS)}. Default all datasets.",
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        help="the number of processes with which to parse the sequence datasets. Large "
+        + "uncompressed datasets are split between processes. Defaults to the number of CPUs.",
+    )
+    parser.add_argument(
+        "--temp-dir",
+        help="the directory in which to store temporary files while joining the sequence "
+        "datasets. The files are roughly as large as the Parc sequence dataset. Defaults to "
+        "the system temporary directory.",
     )
     parser.add_argument(
         "--arango-url",
         required=True,
-        help="The url of the ArangoDB server (e.g. http://localhost:8528)",
+        help="The url of the ArangoDB server (e.g. http://localhost:8528). Multiple "
+        + "comma separated urls may be supplied, in which case requests are distributed "
+        + "across them round robin.",
     )
     parser.add_argument(
         "--database",
@@ -79,6 +108,13 @@ changes between the prior load and the current load, and retaining the prior loa
         required=True,
         help="the name of the ArangoDB collection into which taxa edges will be loaded",
     )
+    parser.add_argument(
+        "--sequence-collection",
+        help="the name of an ArangoDB collection in which to store the sequences, keyed by the "
+        + "SHA-256 hash of the sequence. If provided, the sequence nodes contain the hash and "
+        + "length of the sequence rather than the sequence itself. NOTE: switching between "
+        + "storing sequences inline and in a sequence collection changes every sequence node.",
+    )
     parser.add_argument(
         "--load-version",
         required=True,
@@ -101,22 +137,26 @@ changes between the prior load and the current load, and retaining the prior loa
         help="the timestamp, in unix epoch milliseconds, when the data was released "
         + "at the source.",
     )
+    parser.add_argument(
+        "--state-cache-file",
+        help="the path to a file in which to cache the state of the load. If the file "
+        + "contains the state of the prior load, the changes are calculated from the file "
+        + "rather than the database. The file is created if it does not exist.",
+    )
 
     return parser.parse_args()
 
 
 def main():
     a = parse_args()
-    client = ArangoClient(hosts=a.arango_url)
+    pwd = None
     if a.user:
         if a.pwd_file:
             with open(a.pwd_file) as pwd_file:
                 pwd = pwd_file.read().strip()
         else:
             pwd = getpass.getpass()
-        db = client.db(a.database, a.user, pwd, verify=True)
-    else:
-        db = client.db(a.database, verify=True)
+    db = connect(a.arango_url.split(','), a.database, a.user, pwd)
     attdb = ArangoBatchTimeTravellingDB(
         db,
         a.load_registry_collection,
@@ -124,21 +164,36 @@ def main():
         default_edge_collection=a.edge_collection,
     )
 
-    TaxNode.parse_taxfile(a.input_dir)
-    SeqNode.parse_fastas(a.input_dir)
-    nodeprov = SILVANodeProvider()
-    edgeprov = SILVAEdgeProvider()
-    print("got node/edge providers")
+    taxonomy = SILVATaxonomy.parse_taxfile(a.input_dir, release=a.release)
+    with SILVASequences(
+            a.input_dir,
+            temp_dir=a.temp_dir,
+            release=a.release,
+            datasets=[d.strip() for d in a.datasets.split(",") if d.strip()],
+            processes=a.processes,
+    ) as sequences:
+        if a.sequence_collection:
+            # store the sequences first so sequence nodes never reference a missing sequence
+            store = ArangoSequenceStore(db, a.sequence_collection)
+            count, new = store.store(sequences)
+            print(f"stored {new} new sequences out of {count} sequences")
+        nodeprov = SILVANodeProvider(
+            taxonomy, sequences, hash_sequences=bool(a.sequence_collection))
+        edgeprov = SILVAEdgeProvider(taxonomy, sequences)
+        print("got node/edge providers")
 
-    load_graph_delta(
-        _LOAD_NAMESPACE,
-        nodeprov,
-        edgeprov,
-        attdb,
-        a.load_timestamp,
-        a.release_timestamp,
-        a.load_version,
-    )
+        times = load_graph_delta(
+            _LOAD_NAMESPACE,
+            nodeprov,
+            edgeprov,
+            attdb,
+            a.load_timestamp,
+            a.release_timestamp,
+            a.load_version,
+            state_cache=LoadStateCache(a.state_cache_file) if a.state_cache_file else None,
+        )
+    for col, t in times.items():
+        print(f"Swept collection {col} in {t:.2f}s")
 
 
 if __name__ == "__main__":
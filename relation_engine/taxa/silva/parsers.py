@@ -9,10 +9,18 @@ Ranks are:
 """
 import pandas as pd
 import numpy as np
+import codecs
+import gzip
+import hashlib
+import heapq
+import itertools
 import logging
-from Bio import SeqIO
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
 import os
+import tempfile
 import time
+from typing import NamedTuple
 
 from relation_engine.taxa.silva.util.dprint import dprint
 
@@ -25,330 +33,555 @@ ROOT_NAME = "Root"  # SILVA does not set this, so arbitrarily chosen
 ROOT_RANK = "root_rank"  # SILVA does not set this, so arbitrarily chosen
 ROOT_TAXID = 0  # SILVA does not set this, so arbitrarily chosen (0 not taken)
 
+_NO_RELEASE = -1
+_NO_PARENT = -1
+
 
 class SILVANodeProvider:
     """
     Required: id, name rank
     """
 
+    def __init__(self, taxonomy, sequences, hash_sequences=False):
+        """
+        taxonomy - the `SILVATaxonomy` parsed from the SILVA taxonomy file.
+        sequences - an iterable of `SeqNode`, typically `SILVASequences`.
+        hash_sequences - True to replace the sequence in sequence nodes with its
+            `sequence_hash` and length. The sequences are expected to be stored separately,
+            e.g. via `relation_engine.taxa.silva.sequence_store`.
+        """
+        self._taxonomy = taxonomy
+        self._sequences = sequences
+        self._hash_sequences = hash_sequences
+
     def __iter__(self):
-        for taxnode in TaxNode.instances.values():
+        tax = self._taxonomy
+        for taxid, name, rank, release in zip(
+                tax.taxids.tolist(), tax.names.tolist(), tax.ranks.tolist(),
+                tax.releases.tolist()):
             node = {
-                "id": str(taxnode.taxid),
-                "name": taxnode.name,
-                "rank": taxnode.rank,
+                "id": str(taxid),
+                "name": name,
+                "rank": rank,
             }
 
             # Root, Archaea, etc. don't have release
-            if taxnode.release is not None:
-                node["release"] = taxnode.release
+            if release != _NO_RELEASE:
+                node["release"] = release
 
             yield (node)
 
-        for seqnode in SeqNode.instances.values():
-            yield {
+        for seqnode in self._sequences:
+            node = {
                 "id": seqnode.id,
                 "name": seqnode.organism_name,
                 "rank": "sequence",
-                "sequence": seqnode.seq,
-                "datasets": seqnode.datasets,
             }
+            if self._hash_sequences:
+                node["sequence_hash"] = sequence_hash(seqnode.seq)
+                node["sequence_length"] = len(seqnode.seq)
+            else:
+                node["sequence"] = seqnode.seq
+            node["datasets"] = seqnode.datasets
+            yield node
+
+
+def sequence_hash(seq):
+    """
+    Returns the content address of a sequence, the hex encoded SHA-256 digest of the sequence.
+    """
+    return hashlib.sha256(seq.encode()).hexdigest()
 
 
 class SILVAEdgeProvider:
+    def __init__(self, taxonomy, sequences):
+        """
+        taxonomy - the `SILVATaxonomy` parsed from the SILVA taxonomy file.
+        sequences - an iterable of `SeqNode`, typically `SILVASequences`.
+        """
+        self._taxonomy = taxonomy
+        self._sequences = sequences
+
     def __iter__(self):
-        for taxnode in TaxNode.instances.values():
-            if taxnode.parent is not None:
+        tax = self._taxonomy
+        for taxid, parent_taxid in zip(tax.taxids.tolist(), tax.parent_taxids.tolist()):
+            if parent_taxid != _NO_PARENT:
                 yield {
-                    "id": str(taxnode.taxid),
-                    "from": str(taxnode.taxid),
-                    "to": str(taxnode.parent.taxid),
+                    "id": str(taxid),
+                    "from": str(taxid),
+                    "to": str(parent_taxid),
                 }
-        for seqnode in SeqNode.instances.values():
+        for seqnode in self._sequences:
             yield {
                 "id": seqnode.id,
                 "from": seqnode.id,
-                "to": str(TaxNode.instances[seqnode.taxpath].taxid),
+                "to": str(tax.get_taxid(seqnode.taxpath)),
             }
 
 
-do_parc = True
-do_ref = True
-do_nr99 = True
-do_check_assumptions = False
+DEFAULT_RELEASE = "138"
 
+_DATASET_PARC = "parc"
+_DATASET_REF = "ref"
+_DATASET_NR99 = "nr99"
 
-class SeqNode:
+# The sequence datasets, in the order they're listed in `SeqNode.datasets`.
+DATASETS = (_DATASET_PARC, _DATASET_REF, _DATASET_NR99)
 
-    instances = dict()
+_DATASET_FILES = {
+    _DATASET_PARC: "SILVA_{release}_SSUParc_tax_silva.fasta",
+    _DATASET_REF: "SILVA_{release}_SSURef_tax_silva.fasta",
+    _DATASET_NR99: "SILVA_{release}_SSURef_NR99_tax_silva.fasta",
+}
 
-    def __init__(self, acs, start, stop, taxpath, organism_name, seq, dataset):
-        """
-        acs, start, stop - INSDC primary accession, start position within the rRNA entry, and
-            stop position within the rRNA entry. "different
-            rRNA regions of the same INSDC entry (genome) may be assigned to multiple
-            paths" (SILVA)
-        """
-        id = ".".join([acs, start, stop])
-
-        self.id = id
-        self.acs = acs
-        self.start = int(start)
-        self.stop = int(stop)
-        self.taxpath = taxpath
-        self.organism_name = organism_name
-        self.seq = seq
-        self.datasets = [dataset]
-
-        if id in self.instances:
-            assert self == self.instances[id]
-            self.instances[id].datasets.append(dataset)
-        else:
-            self.instances[id] = self
+# Number of sequence records held in memory at once when sorting the datasets on disk.
+# ~1.5KB per record for SSU.
+_DEFAULT_RUN_SIZE = 100000
 
-    # TODO are taxids in acc_taxid/taxmap different from taxfile taxids? what about the rest of the info?
+# Size in bytes of the byte ranges of uncompressed FASTA files parsed by each process.
+_DEFAULT_CHUNK_SIZE = 2**28
 
-    @classmethod
-    def parse_fastas(cls, dir):
 
-        cls.instances.clear()
+class SeqNode(NamedTuple):
+    """
+    A SILVA sequence, joined across the datasets in which it appears.
+
+    id - acs.start.stop - INSDC primary accession, start position within the rRNA entry, and
+        stop position within the rRNA entry. "different
+        rRNA regions of the same INSDC entry (genome) may be assigned to multiple
+        paths" (SILVA)
+    taxpath - the semicolon terminated taxonomy path of the sequence.
+    organism_name - the name of the organism from which the sequence originates.
+    seq - the sequence.
+    datasets - the datasets containing the sequence, in Parc, Ref, NR99 order.
+    """
+    id: str
+    taxpath: str
+    organism_name: str
+    seq: str
+    datasets: list[str]
 
-        parc_fasta_flpth = os.path.join(dir, "SILVA_138_SSUParc_tax_silva.fasta")
-        ref_fasta_flpth = os.path.join(dir, "SILVA_138_SSURef_tax_silva.fasta")
-        nr99_fasta_flpth = os.path.join(dir, "SILVA_138_SSURef_NR99_tax_silva.fasta")
 
-        def add_node(record, dataset):
-            acs, start, stop = record.name.split(".")
-            taxpath = (
-                ";".join(record.description.split(" ", 1)[1].split(";")[:-1]) + ";"
-            )
-            organism_name = record.description.split(" ", 1)[1].split(";")[-1]
-            seq = str(record.seq)
+# TODO are taxids in acc_taxid/taxmap different from taxfile taxids? what about the rest of the info?
 
-            cls(acs, start, stop, taxpath, organism_name, seq, dataset)
 
-        if do_parc:
-            logging.info("Parsing %s" % parc_fasta_flpth)
-            t0 = time.time()
+class SILVASequences:
+    """
+    The SILVA Parc, Ref, and NR99 FASTA datasets joined by sequence ID.
 
-            for i, record in enumerate(SeqIO.parse(parc_fasta_flpth, "fasta")):
-                add_node(record, "parc")
+    There are millions of sequences, so rather than joining the datasets in memory each dataset
+    is streamed into sorted runs on disk, and the runs are merged into a single ID sorted file
+    with one line per sequence. Iterating over this class streams that file and yields a
+    `SeqNode` per sequence, so memory use is bounded by the run size rather than the size of the
+    datasets. Sequences are yielded in ID order.
 
-            logging.info(
-                "Parsed %d records. Took %.2fmin" % ((i + 1), (time.time() - t0) / 60)
-            )
+    The datasets are parsed into runs in a process pool. Uncompressed FASTA files are split into
+    byte ranges at record boundaries so that large files, e.g. Parc, are parsed by several
+    processes. Gzipped files can't be split and are parsed by a single process each.
 
-        if do_ref:
-            logging.info("Parsing %s" % ref_fasta_flpth)
-            t0 = time.time()
+    The temporary files are removed by `close()`, or on exit when used as a context manager.
+    """
 
-            for i, record in enumerate(SeqIO.parse(ref_fasta_flpth, "fasta")):
-                add_node(record, "ref")
+    def __init__(
+            self,
+            dir,
+            temp_dir=None,
+            run_size=_DEFAULT_RUN_SIZE,
+            release=DEFAULT_RELEASE,
+            datasets=DATASETS,
+            processes=None,
+            chunk_size=_DEFAULT_CHUNK_SIZE):
+        """
+        Parse and join the sequence datasets.
+
+        dir - the directory containing the SILVA FASTA files, e.g.
+            SILVA_138_SSUParc_tax_silva.fasta. The files may be gzipped, in which case they
+            may also have a .gz extension.
+        temp_dir - the directory in which to create temporary files. Defaults to the system
+            temporary directory. The joined datasets are roughly as large as the Parc FASTA file.
+        run_size - the maximum number of sequences to hold in memory while sorting, per process.
+        release - the SILVA release number, used to find the FASTA files.
+        datasets - the datasets to join, any of `DATASETS`.
+        processes - the number of processes with which to parse the datasets. Defaults to the
+            number of CPUs. If 1, the datasets are parsed in this process.
+        chunk_size - the approximate size in bytes of the byte ranges of uncompressed FASTA files
+            parsed by each process.
+        """
+        unknown = sorted(set(datasets) - set(DATASETS))
+        if unknown:
+            raise ValueError(f"Unknown SILVA datasets: {unknown}")
+        if not datasets:
+            raise ValueError("At least one SILVA dataset is required")
+        if processes is not None and processes < 1:
+            raise ValueError("processes must be at least 1")
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be at least 1")
+        # the dataset index is written after the ID so that the runs sort in dataset order
+        # within an ID
+        self._datasets = [d for d in DATASETS if d in datasets]
+        self._tmp = tempfile.TemporaryDirectory(prefix="silva_seqs_", dir=temp_dir)
+        self._joined = os.path.join(self._tmp.name, "joined.tsv")
+        self._runs = []
+        try:
+            self._join(dir, release, run_size, processes, chunk_size)
+        except Exception:
+            self.close()
+            raise
+
+    def _join(self, dir, release, run_size, processes, chunk_size):
+        tasks = []
+        for i, dataset in enumerate(self._datasets):
+            flpth = os.path.join(dir, _DATASET_FILES[dataset].format(release=release))
+            if not os.path.exists(flpth) and os.path.exists(flpth + ".gz"):
+                flpth += ".gz"
+            chunks = [None] if _is_gzipped(flpth) else _chunk_fasta(flpth, chunk_size)
+            logging.info("Parsing %s in %d chunks" % (flpth, len(chunks)))
+            for byte_range in chunks:
+                run_prefix = os.path.join(self._tmp.name, f"run_{len(tasks)}_")
+                tasks.append((flpth, byte_range, i, run_size, run_prefix))
+
+        t0 = time.time()
+        counts = [0] * len(self._datasets)
+        for (_, _, i, _, _), (runs, count) in zip(tasks, self._parse(tasks, processes)):
+            self._runs.extend(runs)
+            counts[i] += count
+        for dataset, count in zip(self._datasets, counts):
+            logging.info("Parsed %d %s records" % (count, dataset))
+        logging.info("Parsing took %.2fmin" % ((time.time() - t0) / 60))
+
+        logging.info("Merging %d sorted runs" % len(self._runs))
+        t0 = time.time()
+        count = self._merge_runs()
+        logging.info(
+            "Merged %d sequences. Took %.2fmin" % (count, (time.time() - t0) / 60)
+        )
 
-            logging.info(
-                "Parsed %d records. Took %.2fmin" % ((i + 1), (time.time() - t0) / 60)
-            )
+    def _parse(self, tasks, processes):
+        if processes == 1:
+            yield from map(_parse_chunk, tasks)
+            return
+        ex = ProcessPoolExecutor(max_workers=processes)
+        try:
+            yield from ex.map(_parse_chunk, tasks)
+        finally:
+            # on failure, don't wait for the queued chunks to be parsed
+            ex.shutdown(cancel_futures=True)
+
+    def _merge_runs(self):
+        count = 0
+        with ExitStack() as stack, open(self._joined, "w") as out:
+            runs = [stack.enter_context(open(r)) for r in self._runs]
+            # lines with the same ID share the "ID\t" prefix and so are adjacent in the merge
+            for id_, lines in itertools.groupby(heapq.merge(*runs), key=_line_id):
+                datasets = []
+                first = None
+                for line in lines:
+                    _, dataset_index, record = line.split("\t", 2)
+                    if first is None:
+                        first = record
+                    elif record != first:
+                        raise ValueError(f"Sequence {id_} differs between datasets")
+                    datasets.append(self._datasets[int(dataset_index)])
+                out.write(f"{id_}\t{','.join(datasets)}\t{first}")
+                count += 1
+        for r in self._runs:
+            os.remove(r)
+        self._runs.clear()
+        return count
 
-        if do_nr99:
-            logging.info("Parsing %s" % nr99_fasta_flpth)
-            t0 = time.time()
+    def __iter__(self):
+        with open(self._joined) as f:
+            for line in f:
+                id_, datasets, taxpath, seq, organism_name = line.rstrip("\n").split("\t", 4)
+                yield SeqNode(id_, taxpath, organism_name, seq, datasets.split(","))
 
-            for i, record in enumerate(SeqIO.parse(nr99_fasta_flpth, "fasta")):
-                add_node(record, "nr99")
+    def close(self):
+        """
+        Remove the temporary files.
+        """
+        self._tmp.cleanup()
 
-            logging.info(
-                "Parsed %d records. Took %.2fmin" % ((i + 1), (time.time() - t0) / 60)
-            )
+    def __enter__(self):
+        return self
 
-        if do_check_assumptions and do_ref and do_nr99:
-            cls._check_assumptions()
+    def __exit__(self, *args):
+        self.close()
 
-    @classmethod
-    def _check_assumptions(cls):
 
-        # expected num ref and nr99
+def _line_id(line):
+    return line[:line.index("\t")]
 
-        NUM_NR99 = 510984
-        NUM_REF = 2225272
 
-        assert len(cls.instances) == NUM_REF, "num instances: %d, num ref: %d" % (
-            len(cls.instances),
-            NUM_REF,
-        )
-        assert (
-            len(
-                [
-                    True
-                    for seqnode in cls.instances.values()
-                    if "nr99" in seqnode.dataset
-                ]
-            )
-            == NUM_NR99
-        )
+def _parse_chunk(task):
+    # Parses a FASTA file, or a byte range of an uncompressed FASTA file, into sorted runs.
+    # Runs in a worker process, so takes and returns picklable values.
+    flpth, byte_range, dataset_index, run_size, run_prefix = task
+    if byte_range:
+        records = _parse_fasta_blocks(_read_fasta_range(flpth, *byte_range), flpth)
+    else:
+        records = parse_silva_fasta(flpth)
+    runs = []
+    count = 0
+    while True:
+        lines = [
+            f"{id_}\t{dataset_index}\t{taxpath}\t{seq}\t{organism_name}\n"
+            for id_, taxpath, organism_name, seq in itertools.islice(records, run_size)
+        ]
+        if not lines:
+            return runs, count
+        count += len(lines)
+        lines.sort()
+        run = f"{run_prefix}{len(runs)}.tsv"
+        with open(run, "w") as f:
+            f.writelines(lines)
+        runs.append(run)
 
-        # hist seq lengths
-
-        # uniqueness in ref
-
-        num_ref = len(cls.instances)
-        acs = [seqnode.acs for seqnode in cls.instances.values()]
-        taxpaths = [seqnode.taxpath for seqnode in cls.instances.values()]
-        organism_names = [seqnode.organism_name for seqnode in cls.instances.values()]
-        seqs = [seqnode.seq for seqnode in cls.instances.values()]
-
-        dprint(
-            "NUM_REF",
-            "num_ref",
-            "len(set(acs))",
-            "len(set(taxpaths))",
-            "len(set(organism_names))",
-            "len(set(seqs))",
-            "discrete_hist(acs)",
-            "discrete_hist(taxpaths)",
-            "discrete_hist(organism_names)",
-            "discrete_hist(seqs)",
-            run={**globals(), **locals()},
-            max_lines=20,
-        )
 
-        # uniqueness in nr99
+def _chunk_fasta(flpth, chunk_size):
+    """
+    Splits an uncompressed FASTA file into (start, end) byte ranges of roughly chunk_size bytes,
+    where each range after the first starts at the '>' of a record header.
+    """
+    size = os.path.getsize(flpth)
+    starts = [0]
+    with open(flpth, "rb") as f:
+        pos = chunk_size
+        while pos < size:
+            # start at the preceding byte so a header at pos is found. base is the file offset
+            # of buf
+            base = pos - 1
+            f.seek(base)
+            buf = b""
+            while True:
+                block = f.read(_FASTA_BLOCK_SIZE)
+                if not block:
+                    break
+                buf += block
+                i = buf.find(b"\n>")
+                if i >= 0:
+                    break
+                # keep the last byte in case it's the newline of a split "\n>"
+                base += len(buf) - 1
+                buf = buf[-1:]
+            if not block:
+                break
+            start = base + i + 1
+            starts.append(start)
+            pos = start + chunk_size
+    return list(zip(starts, starts[1:] + [size]))
+
+
+def _read_fasta_range(flpth, start, end):
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    with open(flpth, "rb") as f:
+        f.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            block = f.read(min(_FASTA_BLOCK_SIZE, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            text = decoder.decode(block, final=remaining <= 0)
+            if text:
+                yield text
+
+
+def parse_silva_fasta(flpth):
+    """
+    Yields (id, taxpath, organism_name, sequence) string tuples from a SILVA FASTA file.
 
-        num_nr99 = sum(
-            [1 for seqnode in cls.instances.values() if "nr99" in seqnode.dataset]
-        )
-        acs = [
-            seqnode.acs
-            for seqnode in cls.instances.values()
-            if "nr99" in seqnode.dataset
-        ]
-        taxpaths = [
-            seqnode.taxpath
-            for seqnode in cls.instances.values()
-            if "nr99" in seqnode.dataset
-        ]
-        organism_names = [
-            seqnode.organism_name
-            for seqnode in cls.instances.values()
-            if "nr99" in seqnode.dataset
-        ]
-        seqs = [
-            seqnode.seq
-            for seqnode in cls.instances.values()
-            if "nr99" in seqnode.dataset
-        ]
+    SILVA headers are of the form `>acs.start.stop taxpath;organism_name`, where the taxpath
+    is semicolon separated. The returned taxpath is semicolon terminated. The file may be
+    gzipped.
 
-        dprint(
-            "NUM_NR99",
-            "num_nr99",
-            "len(set(acs))",
-            "len(set(taxpaths))",
-            "len(set(organism_names))",
-            "len(set(seqs))",
-            "discrete_hist(acs)",
-            "discrete_hist(taxpaths)",
-            "discrete_hist(organism_names)",
-            "discrete_hist(seqs)",
-            run={**globals(), **locals()},
-            max_lines=20,
-        )
+    The file is read in large blocks that are split into records, rather than line by line, and
+    no SeqRecord or Seq objects are built as with Bio.SeqIO.
+    """
+    with _open_fasta(flpth) as f:
+        yield from _parse_fasta_blocks(iter(lambda: f.read(_FASTA_BLOCK_SIZE), ""), flpth)
 
-        # parent taxpaths exist
 
-        for seqnode in cls.instances.values():
-            TaxNode.instances[seqnode.taxpath]  # shouldn't throw
+def _parse_fasta_blocks(blocks, flpth):
+    rest = ""
+    while not rest:
+        block = next(blocks, "")
+        if not block:
+            return
+        rest = block.lstrip()
+    if not rest.startswith(">"):
+        raise ValueError(f"{flpth} is not a FASTA file")
+    rest = rest[1:]
+    while True:
+        block = next(blocks, "")
+        records = (rest + block).split("\n>")
+        # the last record may be incomplete unless we're at the end of the file
+        rest = records.pop() if block else None
+        for rec in records:
+            yield _parse_fasta_record(rec)
+        if not block:
+            return
 
-    def __eq__(self, other):
-        """
-        Check if all fields, except `dataset`, equal
-        """
-        return (
-            self.id == other.id
-            and self.acs == other.acs
-            and self.start == other.start
-            and self.stop == other.stop
-            and self.taxpath == other.taxpath
-            and self.organism_name == other.organism_name
-            and self.seq == other.seq
-        )
 
+def _parse_fasta_record(rec):
+    header, _, seq = rec.partition("\n")
+    id_, _, desc = header.rstrip().partition(" ")
+    taxpath, _, organism_name = desc.rpartition(";")
+    return id_, taxpath + ";", organism_name, seq.replace("\n", "")
 
-class TaxNode:
-    """
-    Make node for each taxon,
-    store path/node as key/value pair in class var `instances`.
 
-    Probably not the most resource frugal implementation
+_GZIP_MAGIC = b"\x1f\x8b"
+_FASTA_BLOCK_SIZE = 2**22
+
 
-    Recycled from script parsing SILVA taxfile,
-    doing sanity checks,
-    and formatting into RDP Classifier `train` input taxfile
+def _is_gzipped(flpth):
+    with open(flpth, "rb") as f:
+        return f.read(2) == _GZIP_MAGIC
+
+
+def _open_fasta(flpth):
+    if _is_gzipped(flpth):
+        return gzip.open(flpth, "rt")
+    return open(flpth)
+
+
+def _check_assumptions(sequences, taxonomy):
+    """
+    Debugging checks against the 138 release. Holds all the sequence IDs and sequences in memory.
     """
 
-    instances = {}  # path to `TaxNode` instance dict
-    # paths are taken verbatim from taxonomy file
-    # paths begin at domain and follow pattern (Taxname;)+
-    # note: 'Root' is an exception to all above since it's not in the taxonomy file
+    # expected num ref and nr99
 
-    taxids = []  # debug
+    NUM_NR99 = 510984
+    NUM_REF = 2225272
 
-    def __init__(self, path, taxid, rank, release):
-        """
-        Root comes in, artificially, as ('Root', 0, 'rootrank', np.nan)
-        Everything else comes in from tax_slv_ssu_138.txt as (\(Taxname;\)\+, \d+, 'rank', \d+.0|np.nan)  # noqa W605
-        """
-        self.path = path  # begins with domain
-        self.taxid = int(
-            taxid
-        )  # mostly stable in 138+ releases. all taxa have this value
-        self.rank = rank  # all taxa have this value
-        self.release = (
-            None if np.isnan(release) else int(release)
-        )  # root and the three domains and don't have this value
-
-        #
-        self.instances[path] = self
-
-        # debug
-        self.taxids.append(taxid)
-
-    @property
-    def depth(self):
-        """Root is depth 0"""
-        return self.path.count(";")
-
-    @property
-    def name(self):
-        if self.depth == 0:
-            return ROOT_NAME
-        elif self.depth > 0:
-            return self.path.split(";")[-2]  # paths are semicolon-terminated
-        else:
-            raise Exception
+    seqnodes = [s for s in sequences if _DATASET_REF in s.datasets]
 
-    @property
-    def parent(self):
-        return (
-            self.instances[self.parent_path] if self.parent_path is not None else None
+    assert len(seqnodes) == NUM_REF, "num ref instances: %d, num ref: %d" % (
+        len(seqnodes),
+        NUM_REF,
+    )
+    assert (
+        len(
+            [
+                True
+                for seqnode in seqnodes
+                if _DATASET_NR99 in seqnode.datasets
+            ]
         )
+        == NUM_NR99
+    )
+
+    # hist seq lengths
+
+    # uniqueness in ref
+
+    num_ref = len(seqnodes)
+    acs = [seqnode.id.split(".")[0] for seqnode in seqnodes]
+    taxpaths = [seqnode.taxpath for seqnode in seqnodes]
+    organism_names = [seqnode.organism_name for seqnode in seqnodes]
+    seqs = [seqnode.seq for seqnode in seqnodes]
+
+    dprint(
+        "NUM_REF",
+        "num_ref",
+        "len(set(acs))",
+        "len(set(taxpaths))",
+        "len(set(organism_names))",
+        "len(set(seqs))",
+        "discrete_hist(acs)",
+        "discrete_hist(taxpaths)",
+        "discrete_hist(organism_names)",
+        "discrete_hist(seqs)",
+        run={**globals(), **locals()},
+        max_lines=20,
+    )
+
+    # uniqueness in nr99
+
+    nr99 = [seqnode for seqnode in seqnodes if _DATASET_NR99 in seqnode.datasets]
+    num_nr99 = len(nr99)
+    acs = [seqnode.id.split(".")[0] for seqnode in nr99]
+    taxpaths = [seqnode.taxpath for seqnode in nr99]
+    organism_names = [seqnode.organism_name for seqnode in nr99]
+    seqs = [seqnode.seq for seqnode in nr99]
+
+    dprint(
+        "NUM_NR99",
+        "num_nr99",
+        "len(set(acs))",
+        "len(set(taxpaths))",
+        "len(set(organism_names))",
+        "len(set(seqs))",
+        "discrete_hist(acs)",
+        "discrete_hist(taxpaths)",
+        "discrete_hist(organism_names)",
+        "discrete_hist(seqs)",
+        run={**globals(), **locals()},
+        max_lines=20,
+    )
+
+    # parent taxpaths exist
+
+    for seqnode in sequences:
+        taxonomy.get_taxid(seqnode.taxpath)  # shouldn't throw
+
+
+class SILVATaxonomy:
+    """
+    The SILVA taxonomy, stored column-wise in numpy arrays with one entry per taxon.
+
+    The first entry is always the artificial root. The remaining entries are in taxonomy file
+    order. Every derived field (name, depth, parent) is computed once for the whole file with
+    vectorized string operations, and the parent taxids are resolved by joining the parent
+    paths against the taxon paths.
+
+    Attributes:
+    paths - the taxon paths, taken verbatim from the taxonomy file. Paths begin at domain and
+        follow the pattern (Taxname;)+. 'Root' is the exception since it's not in the taxonomy
+        file.
+    taxids - the taxon IDs. Mostly stable in 138+ releases.
+    names - the taxon names, e.g. the last element of the path.
+    ranks - the taxon ranks.
+    depths - the taxon depths. Root is depth 0.
+    releases - the release in which the taxon was introduced, or -1 if there is no release.
+        Root and the three domains don't have this value.
+    parent_taxids - the taxon ID of each taxon's parent, or -1 for the root.
+    """
 
-    @property
-    def parent_path(self):
-        """Used for `self.instances` lookup"""
-        if self.depth == 0:  # root
-            return None
-        elif self.depth == 1:
-            return "Root"
-        elif self.depth > 1:
-            return ";".join(self.path.split(";")[:-2]) + ";"
-        else:
-            raise Exception()
+    def __init__(self, df):
+        """
+        Do not create this class directly - call `SILVATaxonomy.parse_taxfile()`.
 
-    @staticmethod
-    def parse_taxfile(dir):
+        df - a data frame with the path, taxid, name, rank, depth, release, and parent_taxid
+            columns.
+        """
+        self.paths = df["path"].to_numpy()
+        self.taxids = df["taxid"].to_numpy(dtype=np.int64)
+        self.names = df["name"].to_numpy()
+        self.ranks = df["rank"].to_numpy()
+        self.depths = df["depth"].to_numpy(dtype=np.int64)
+        self.releases = df["release"].to_numpy(dtype=np.int64)
+        self.parent_taxids = df["parent_taxid"].to_numpy(dtype=np.int64)
+        self._path_to_taxid = dict(zip(self.paths.tolist(), self.taxids.tolist()))
+
+    def __len__(self):
+        return len(self.taxids)
+
+    def get_taxid(self, path):
+        """
+        Get the taxon ID for a taxon path. Throws a KeyError if the path does not exist.
+        """
+        return self._path_to_taxid[path]
 
-        flpth = os.path.join(dir, "tax_slv_ssu_138.txt")
+    @classmethod
+    def parse_taxfile(cls, dir, release=DEFAULT_RELEASE):
+        """
+        Parse the `tax_slv_ssu_<release>.txt` taxonomy file in the given directory.
 
-        TaxNode.clear()  # TaxNode keeps static list of instances. clear before each taxfile
+        dir - the directory containing the taxonomy file.
+        release - the SILVA release number.
+        """
+        flpth = os.path.join(dir, f"tax_slv_ssu_{release}.txt")
 
         logging.info("Parsing taxonomy file %s" % flpth)
 
@@ -356,46 +589,41 @@ class TaxNode:
             flpth,
             sep="\t",
             names=["path", "taxid", "rank", "remark", "release"],
+            usecols=["path", "taxid", "rank", "release"],
+            dtype={"path": str, "taxid": np.int64, "rank": str, "release": np.float64},
             index_col=False,
         )
 
-        dprint(
-            "set(df['rank'].tolist())",
-            "sorted(df['taxid'].tolist())[:30]",
-            "sorted(df['taxid'].tolist())[-30:]",
-            "[e for e in df['remark'].tolist() if not (type(e) == float and np.isnan(e))] # non-nan remarks",
-            "set(df['release'].tolist())",
-            run={**globals(), **locals()},
-        )
-
-        df.drop(["remark"], inplace=True, axis=1)
-
-        dprint("df", run=locals())
+        # taxid=0 is not taken
+        root = pd.DataFrame({
+            "path": [ROOT_NAME], "taxid": [ROOT_TAXID], "rank": [ROOT_RANK], "release": [np.nan]
+        })
+        df = pd.concat([root, df], ignore_index=True)
 
-        logging.info("Creating `TaxNode` for each taxon path")
+        dupes = df["taxid"][df["taxid"].duplicated()]
+        if len(dupes):
+            raise ValueError(f"Duplicate taxids in {flpth}: {sorted(dupes.tolist())[:10]}")
 
-        # create node for each taxon
+        logging.info("Computing names, depths, and parents for %d taxa" % len(df))
 
-        TaxNode(ROOT_NAME, ROOT_TAXID, ROOT_RANK, np.nan)  # taxid=0 is not taken
+        # paths are semicolon-terminated, so "A;B;C;" splits into ["A;B", "C", ""]
+        parts = df["path"].str.rsplit(";", n=2)
+        df["depth"] = df["path"].str.count(";")
+        df["name"] = parts.str[-2].where(df["depth"] > 0, ROOT_NAME)
+        df["parent_path"] = (parts.str[0] + ";").where(df["depth"] > 1, ROOT_NAME)
+        df.loc[df["depth"] == 0, "parent_path"] = None
+        df["release"] = df["release"].fillna(_NO_RELEASE)
 
-        for index, row in df.iterrows():
-            TaxNode(row["path"], row["taxid"], row["rank"], row["release"])
+        parents = df[["path", "taxid"]].rename(
+            columns={"path": "parent_path", "taxid": "parent_taxid"})
+        df = df.merge(parents, on="parent_path", how="left", validate="many_to_one", sort=False)
 
-        # debug
-
-        assert len(set(TaxNode.taxids)) == len(TaxNode.taxids), list(
-            zip(sorted(set(TaxNode.taxids)), sorted(TaxNode.taxids))
-        )
+        orphans = df["path"][df["parent_taxid"].isna() & (df["depth"] > 0)]
+        if len(orphans):
+            raise ValueError(f"Taxa with no parent in {flpth}: {orphans.tolist()[:10]}")
+        df["parent_taxid"] = df["parent_taxid"].fillna(_NO_PARENT)
 
-        # there are external tests for taxonomy nodes
-
-        return df
-
-    @classmethod
-    def clear(cls):
-        """For testing different taxonomy files"""
-        cls.instances = dict()
-        cls.taxids = []
+        return cls(df)
 
 
 def discrete_hist(elements, cutoff=10, max=100):
@@ -427,10 +655,9 @@ def main():
     cwd = os.path.dirname(os.path.abspath(__file__))
     input_dir = os.path.join(cwd, "test/data/full")
 
-    TaxNode.parse_taxfile(input_dir)
-    SeqNode.parse_fastas(input_dir)
-
-    SeqNode._check_assumptions()
+    taxonomy = SILVATaxonomy.parse_taxfile(input_dir)
+    with SILVASequences(input_dir) as sequences:
+        _check_assumptions(sequences, taxonomy)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,70 @@
+"""
+Content addressed storage for SILVA sequences.
+
+Rather than storing each sequence inline in its sequence node, the sequences can be stored
+once per distinct sequence in a separate, standard (e.g. not time travelling) ArangoDB
+collection keyed by the `sequence_hash` of the sequence. The sequence nodes then carry the hash
+and length of the sequence, which keeps the SILVA node collection small and the delta load
+comparisons cheap. See `SILVANodeProvider`.
+
+Documents in the sequence collection are of the form
+{"_key": <sequence hash>, "sequence": <sequence>, "length": <sequence length>}
+and are never updated or deleted by the loader, so sequences referenced by expired nodes remain
+available.
+"""
+
+import itertools
+
+from relation_engine.taxa.silva.parsers import sequence_hash
+
+_DEFAULT_BATCH_SIZE = 10000
+
+
+class ArangoSequenceStore:
+    """
+    Stores sequences in an ArangoDB collection keyed by the sequence hash.
+    """
+
+    def __init__(self, database, collection):
+        """
+        database - the python-arango database containing the collection.
+        collection - the name of the vertex collection in which to store sequences.
+        """
+        self._database = database
+        self._col = database.collection(collection)
+        if self._col.properties()["edge"]:  # this is a http call
+            raise ValueError(f"{collection} is not a vertex collection")
+
+    def store(self, sequences, batch_size=_DEFAULT_BATCH_SIZE):
+        """
+        Store any sequences that are not already in the collection.
+
+        sequences - an iterable of `SeqNode`, typically `SILVASequences`.
+        batch_size - the number of sequences to check and save per database call.
+
+        Returns a tuple of the number of sequences processed and the number of sequences
+        newly stored.
+        """
+        count = 0
+        new = 0
+        sequences = iter(sequences)
+        while True:
+            batch = list(itertools.islice(sequences, batch_size))
+            if not batch:
+                return count, new
+            count += len(batch)
+            # identical sequences across accessions collapse here
+            seqs = {sequence_hash(s.seq): s.seq for s in batch}
+            existing = set(self._get_existing_keys(list(seqs.keys())))
+            docs = [{"_key": k, "sequence": v, "length": len(v)}
+                    for k, v in seqs.items() if k not in existing]
+            if docs:
+                # ignore rather than fail if another load stored the sequence concurrently
+                self._col.import_bulk(docs, on_duplicate="ignore")
+                new += len(docs)
+
+    def _get_existing_keys(self, keys):
+        return self._database.aql.execute(
+            "FOR d IN @@col FILTER d._key IN @keys RETURN d._key",
+            bind_vars={"@col": self._col.name, "keys": keys},
+        )
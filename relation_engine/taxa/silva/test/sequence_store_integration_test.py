@@ -0,0 +1,54 @@
+# Requires an ArangoDB instance at HOST, as for the batchload integration tests.
+
+from arango import ArangoClient
+from pytest import fixture, raises
+
+from relation_engine.batchload.test.test_helpers import check_docs
+from relation_engine.taxa.silva.parsers import SeqNode, sequence_hash
+from relation_engine.taxa.silva.sequence_store import ArangoSequenceStore
+from relation_engine.test.testing_helpers import assert_exception_correct
+
+HOST = "http://localhost:8529"
+DB_NAME = "test_silva_sequence_store_db"
+
+
+@fixture
+def arango_db():
+    client = ArangoClient(hosts=HOST)
+    sys = client.db("_system", "root", "", verify=True)
+    sys.delete_database(DB_NAME, ignore_missing=True)
+    sys.create_database(DB_NAME)
+    db = client.db(DB_NAME)
+    yield db
+    sys.delete_database(DB_NAME)
+
+
+def _seq(id_, seq):
+    return SeqNode(id_, "Bacteria;", "bug", seq, ["parc"])
+
+
+def _doc(seq):
+    return {"_key": sequence_hash(seq), "_id": "seqs/" + sequence_hash(seq), "sequence": seq,
+            "length": len(seq)}
+
+
+def test_store(arango_db):
+    arango_db.create_collection("seqs")
+    store = ArangoSequenceStore(arango_db, "seqs")
+
+    # identical sequences in the same batch and across batches are stored once
+    seqs = [_seq("A", "ACGU"), _seq("B", "GGCC"), _seq("C", "ACGU"), _seq("D", "UUUA"),
+            _seq("E", "GGCC")]
+    assert store.store(seqs, batch_size=3) == (5, 3)
+    check_docs(arango_db, [_doc("ACGU"), _doc("GGCC"), _doc("UUUA")], "seqs")
+
+    assert store.store([_seq("A", "ACGU"), _seq("F", "AAAA")]) == (2, 1)
+    check_docs(arango_db, [_doc("ACGU"), _doc("GGCC"), _doc("UUUA"), _doc("AAAA")], "seqs")
+
+
+def test_init_fail_edge_collection(arango_db):
+    arango_db.create_collection("seqs", edge=True)
+
+    with raises(Exception) as got:
+        ArangoSequenceStore(arango_db, "seqs")
+    assert_exception_correct(got.value, ValueError("seqs is not a vertex collection"))
@@ -0,0 +1,313 @@
+import gzip
+import shutil
+from pytest import raises
+
+from relation_engine.taxa.silva import parsers
+from relation_engine.taxa.silva.parsers import (
+    SILVATaxonomy,
+    SILVANodeProvider,
+    SILVAEdgeProvider,
+    SeqNode,
+    SILVASequences,
+    parse_silva_fasta,
+    sequence_hash,
+)
+from relation_engine.test.testing_helpers import assert_exception_correct
+
+TAXFILE = "\n".join([
+    "Archaea;\t2\tdomain\t\t",
+    "Archaea;Aenigmarchaeota;\t11084\tphylum\t\t123",
+    "Bacteria;\t3\tdomain\t\t",
+    "Bacteria;Proteobacteria;\t2375\tphylum\t\t",
+    "Bacteria;Proteobacteria;Gammaproteobacteria;\t2381\tclass\tsome remark\t138",
+    "Bacteria;Proteobacteria;Gammaproteobacteria;Gammaproteobacteria Incertae Sedis;\t"
+    + "26664\torder\t\t132",
+]) + "\n"
+
+
+def _write_taxfile(tmp_path, contents, release="138"):
+    (tmp_path / f"tax_slv_ssu_{release}.txt").write_text(contents)
+    return tmp_path
+
+
+def test_taxonomy_parse(tmp_path):
+    tax = SILVATaxonomy.parse_taxfile(_write_taxfile(tmp_path, TAXFILE))
+
+    assert len(tax) == 7
+    assert tax.taxids.tolist() == [0, 2, 11084, 3, 2375, 2381, 26664]
+    assert tax.names.tolist() == [
+        "Root", "Archaea", "Aenigmarchaeota", "Bacteria", "Proteobacteria",
+        "Gammaproteobacteria", "Gammaproteobacteria Incertae Sedis"]
+    assert tax.ranks.tolist() == [
+        "root_rank", "domain", "phylum", "domain", "phylum", "class", "order"]
+    assert tax.depths.tolist() == [0, 1, 2, 1, 2, 3, 4]
+    assert tax.releases.tolist() == [-1, -1, 123, -1, -1, 138, 132]
+    assert tax.parent_taxids.tolist() == [-1, 0, 2, 0, 3, 2375, 2381]
+    assert tax.get_taxid("Bacteria;Proteobacteria;") == 2375
+
+
+def test_taxonomy_parse_release(tmp_path):
+    tax = SILVATaxonomy.parse_taxfile(_write_taxfile(tmp_path, TAXFILE, "139"), release="139")
+
+    assert tax.taxids.tolist() == [0, 2, 11084, 3, 2375, 2381, 26664]
+
+
+def test_providers(tmp_path):
+    tax = SILVATaxonomy.parse_taxfile(_write_taxfile(tmp_path, TAXFILE))
+    seqs = [SeqNode("AB1.1.1500", "Bacteria;Proteobacteria;", "some bug", "ACGU", ["ref"])]
+
+    nodes = list(SILVANodeProvider(tax, seqs))
+    edges = list(SILVAEdgeProvider(tax, seqs))
+
+    assert nodes == [
+        {"id": "0", "name": "Root", "rank": "root_rank"},
+        {"id": "2", "name": "Archaea", "rank": "domain"},
+        {"id": "11084", "name": "Aenigmarchaeota", "rank": "phylum", "release": 123},
+        {"id": "3", "name": "Bacteria", "rank": "domain"},
+        {"id": "2375", "name": "Proteobacteria", "rank": "phylum"},
+        {"id": "2381", "name": "Gammaproteobacteria", "rank": "class", "release": 138},
+        {"id": "26664", "name": "Gammaproteobacteria Incertae Sedis", "rank": "order",
+         "release": 132},
+        {"id": "AB1.1.1500", "name": "some bug", "rank": "sequence", "sequence": "ACGU",
+         "datasets": ["ref"]},
+    ]
+    assert edges == [
+        {"id": "2", "from": "2", "to": "0"},
+        {"id": "11084", "from": "11084", "to": "2"},
+        {"id": "3", "from": "3", "to": "0"},
+        {"id": "2375", "from": "2375", "to": "3"},
+        {"id": "2381", "from": "2381", "to": "2375"},
+        {"id": "26664", "from": "26664", "to": "2381"},
+        {"id": "AB1.1.1500", "from": "AB1.1.1500", "to": "2375"},
+    ]
+
+
+def test_node_provider_hash_sequences(tmp_path):
+    tax = SILVATaxonomy.parse_taxfile(_write_taxfile(tmp_path, TAXFILE))
+    seqs = [SeqNode("AB1.1.1500", "Bacteria;Proteobacteria;", "some bug", "ACGU", ["ref"])]
+
+    nodes = list(SILVANodeProvider(tax, seqs, hash_sequences=True))
+
+    assert len(nodes) == 8
+    assert nodes[7] == {
+        "id": "AB1.1.1500",
+        "name": "some bug",
+        "rank": "sequence",
+        "sequence_hash": "a3c532aca6cd82dd0949dc252d6d1031da32eefbb7f2f42404923359b1a9f08a",
+        "sequence_length": 4,
+        "datasets": ["ref"],
+    }
+
+
+def test_sequence_hash():
+    assert sequence_hash("ACGU") == (
+        "a3c532aca6cd82dd0949dc252d6d1031da32eefbb7f2f42404923359b1a9f08a")
+
+
+def test_taxonomy_parse_fail_duplicate_taxid(tmp_path):
+    d = _write_taxfile(tmp_path, TAXFILE + "Bacteria;Firmicutes;\t2375\tphylum\t\t\n")
+    with raises(Exception) as got:
+        SILVATaxonomy.parse_taxfile(d)
+    assert_exception_correct(got.value, ValueError(
+        f"Duplicate taxids in {d / 'tax_slv_ssu_138.txt'}: [2375]"))
+
+
+def test_taxonomy_parse_fail_missing_parent(tmp_path):
+    d = _write_taxfile(tmp_path, TAXFILE + "Eukaryota;Amorphea;\t46463\tmajor_clade\t\t\n")
+    with raises(Exception) as got:
+        SILVATaxonomy.parse_taxfile(d)
+    assert_exception_correct(got.value, ValueError(
+        f"Taxa with no parent in {d / 'tax_slv_ssu_138.txt'}: ['Eukaryota;Amorphea;']"))
+
+
+def _write_fasta(tmp_path, filename, records):
+    with open(tmp_path / filename, "w") as f:
+        for id_, header, seq in records:
+            f.write(f">{id_} {header}\n")
+            # wrap the sequence as SILVA does
+            for i in range(0, len(seq), 4):
+                f.write(seq[i:i + 4] + "\n")
+
+
+def _write_fastas(tmp_path, release="138"):
+    a = ("A.1.10", "Bacteria;Proteobacteria;bug a", "ACGUACGUAC")
+    b = ("B.1.5", "Bacteria;Proteobacteria;bug; b", "GGGGA")
+    c = ("C.1.9", "Archaea;Aenigmarchaeota;bug c", "UUUUUCCCC")
+    d = ("AB.2.8", "Bacteria;bug d", "CCGG")
+    _write_fasta(tmp_path, f"SILVA_{release}_SSUParc_tax_silva.fasta", [c, b, a, d])
+    _write_fasta(tmp_path, f"SILVA_{release}_SSURef_tax_silva.fasta", [c, a, b])
+    _write_fasta(tmp_path, f"SILVA_{release}_SSURef_NR99_tax_silva.fasta", [a])
+
+
+def test_sequences(tmp_path):
+    _write_fastas(tmp_path)
+
+    # a run size of 1 forces every record into its own run, and a chunk size of 1 every record
+    # into its own chunk
+    for run_size, processes, chunk_size in [
+        (1, 1, 1), (2, 1, 30), (100, 1, 2**20), (1, 2, 1), (2, 3, 30), (100, None, 2**20)
+    ]:
+        with SILVASequences(tmp_path, temp_dir=tmp_path, run_size=run_size,
+                            processes=processes, chunk_size=chunk_size) as seqs:
+            # iterate twice to check the providers can both read the sequences
+            for _ in range(2):
+                assert list(seqs) == [
+                    SeqNode("A.1.10", "Bacteria;Proteobacteria;", "bug a", "ACGUACGUAC",
+                            ["parc", "ref", "nr99"]),
+                    SeqNode("AB.2.8", "Bacteria;", "bug d", "CCGG", ["parc"]),
+                    SeqNode("B.1.5", "Bacteria;Proteobacteria;bug;", " b", "GGGGA",
+                            ["parc", "ref"]),
+                    SeqNode("C.1.9", "Archaea;Aenigmarchaeota;", "bug c", "UUUUUCCCC",
+                            ["parc", "ref"]),
+                ]
+        assert sorted(p.name for p in tmp_path.iterdir()) == [
+            "SILVA_138_SSUParc_tax_silva.fasta",
+            "SILVA_138_SSURef_NR99_tax_silva.fasta",
+            "SILVA_138_SSURef_tax_silva.fasta",
+        ]
+
+
+def test_sequences_release_and_datasets(tmp_path):
+    _write_fastas(tmp_path, release="139")
+    (tmp_path / "SILVA_139_SSUParc_tax_silva.fasta").unlink()
+
+    # datasets are listed in Parc, Ref, NR99 order regardless of the input order
+    with SILVASequences(tmp_path, temp_dir=tmp_path, release="139", datasets=["nr99", "ref"],
+                        processes=1) as seqs:
+        assert [(s.id, s.datasets) for s in seqs] == [
+            ("A.1.10", ["ref", "nr99"]),
+            ("B.1.5", ["ref"]),
+            ("C.1.9", ["ref"]),
+        ]
+
+
+def test_sequences_gzipped(tmp_path):
+    _write_fastas(tmp_path)
+    parc = tmp_path / "SILVA_138_SSUParc_tax_silva.fasta"
+    with open(parc, "rb") as fin, gzip.open(str(parc) + ".gz", "wb") as fout:
+        shutil.copyfileobj(fin, fout)
+    parc.unlink()
+
+    with SILVASequences(tmp_path, temp_dir=tmp_path, run_size=2, chunk_size=1) as seqs:
+        assert [(s.id, s.datasets) for s in seqs] == [
+            ("A.1.10", ["parc", "ref", "nr99"]),
+            ("AB.2.8", ["parc"]),
+            ("B.1.5", ["parc", "ref"]),
+            ("C.1.9", ["parc", "ref"]),
+        ]
+
+
+def test_sequences_fail_mismatch(tmp_path):
+    _write_fastas(tmp_path)
+    _write_fasta(tmp_path, "SILVA_138_SSURef_NR99_tax_silva.fasta", [
+        ("A.1.10", "Bacteria;Proteobacteria;bug a", "ACGUACGUAA")])
+
+    with raises(Exception) as got:
+        SILVASequences(tmp_path, temp_dir=tmp_path, run_size=2)
+    assert_exception_correct(got.value, ValueError("Sequence A.1.10 differs between datasets"))
+    assert len(list(tmp_path.iterdir())) == 3  # temp files are cleaned up
+
+
+def test_sequences_fail_parse(tmp_path):
+    _write_fastas(tmp_path)
+    nr99 = tmp_path / "SILVA_138_SSURef_NR99_tax_silva.fasta"
+    nr99.write_text("A.1.10 Bacteria;bug a\nACGU\n")
+
+    for processes in [1, 2]:
+        with raises(Exception) as got:
+            SILVASequences(tmp_path, temp_dir=tmp_path, processes=processes)
+        assert_exception_correct(got.value, ValueError(f"{nr99} is not a FASTA file"))
+        assert len(list(tmp_path.iterdir())) == 3  # temp files are cleaned up
+
+
+def test_sequences_fail_bad_args(tmp_path):
+    for kwargs, err in [
+        ({"datasets": ["ref", "lsu", "foo"]}, "Unknown SILVA datasets: ['foo', 'lsu']"),
+        ({"datasets": []}, "At least one SILVA dataset is required"),
+        ({"processes": 0}, "processes must be at least 1"),
+        ({"chunk_size": 0}, "chunk_size must be at least 1"),
+    ]:
+        with raises(Exception) as got:
+            SILVASequences(tmp_path, temp_dir=tmp_path, **kwargs)
+        assert_exception_correct(got.value, ValueError(err))
+    assert len(list(tmp_path.iterdir())) == 0
+
+
+_FASTA = "".join([
+    "\n",
+    ">A.1.10 Bacteria;Proteobacteria;bug a  \n",
+    "ACGUA\n",
+    "CGUAC\n",
+    "\n",
+    ">B.1.5 Bacteria;Proteobacteria;bug; b\n",
+    "GGGGA\n",
+    ">C.1.4 Archaea;bug c\n",
+    "UUUU",
+])
+
+_FASTA_EXPECTED = [
+    ("A.1.10", "Bacteria;Proteobacteria;", "bug a", "ACGUACGUAC"),
+    ("B.1.5", "Bacteria;Proteobacteria;bug;", " b", "GGGGA"),
+    ("C.1.4", "Archaea;", "bug c", "UUUU"),
+]
+
+
+def test_parse_silva_fasta(tmp_path):
+    f = tmp_path / "f.fasta"
+    f.write_text(_FASTA)
+
+    assert list(parse_silva_fasta(f)) == _FASTA_EXPECTED
+
+
+def test_parse_silva_fasta_small_blocks(tmp_path, monkeypatch):
+    # records are split across blocks
+    f = tmp_path / "f.fasta"
+    f.write_text(_FASTA)
+
+    for size in [1, 2, 3, 7, 50]:
+        monkeypatch.setattr(parsers, "_FASTA_BLOCK_SIZE", size)
+        assert list(parse_silva_fasta(f)) == _FASTA_EXPECTED
+
+
+def test_chunk_fasta(tmp_path, monkeypatch):
+    f = tmp_path / "f.fasta"
+    f.write_text(_FASTA)
+    # the header offsets are 1, 54, and 98
+    size = len(_FASTA)
+
+    for block_size in [1, 2, 50]:
+        monkeypatch.setattr(parsers, "_FASTA_BLOCK_SIZE", block_size)
+        assert parsers._chunk_fasta(f, 1) == [(0, 1), (1, 54), (54, 98), (98, size)]
+        assert parsers._chunk_fasta(f, 54) == [(0, 54), (54, size)]
+        assert parsers._chunk_fasta(f, 55) == [(0, 98), (98, size)]
+        assert parsers._chunk_fasta(f, 99) == [(0, size)]
+
+        records = []
+        for start, end in parsers._chunk_fasta(f, 1):
+            records.extend(parsers._parse_fasta_blocks(
+                parsers._read_fasta_range(f, start, end), f))
+        assert records == _FASTA_EXPECTED
+
+
+def test_parse_silva_fasta_gzipped(tmp_path):
+    f = tmp_path / "f.fasta.gz"
+    with gzip.open(f, "wt") as fh:
+        fh.write(_FASTA)
+
+    assert list(parse_silva_fasta(f)) == _FASTA_EXPECTED
+
+
+def test_parse_silva_fasta_empty(tmp_path):
+    f = tmp_path / "f.fasta"
+    f.write_text("  \n \n")
+
+    assert list(parse_silva_fasta(f)) == []
+
+
+def test_parse_silva_fasta_fail_not_fasta(tmp_path):
+    f = tmp_path / "f.fasta"
+    f.write_text("\nA.1.10 Bacteria;bug a\nACGU\n")
+
+    with raises(Exception) as got:
+        list(parse_silva_fasta(f))
+    assert_exception_correct(got.value, ValueError(f"{f} is not a FASTA file"))
@@ -1,6 +1,6 @@
 from relation_engine.taxa.silva.parsers import (
-    TaxNode,
-    SeqNode,
+    SILVATaxonomy,
+    SILVASequences,
     SILVANodeProvider,
     SILVAEdgeProvider,
 )
@@ -15,7 +15,7 @@ cwd = os.path.dirname(os.path.abspath(__file__))
 
 class SILVAProviderTest(unittest.TestCase):
     """
-    For testing SILVANodeProvider, SILVAEdgeProvider, and their auxiliary TaxNode
+    For testing SILVANodeProvider, SILVAEdgeProvider, and their auxiliary SILVATaxonomy
 
     Steps are
     1. Parse taxonomy file
@@ -28,20 +28,19 @@ class SILVAProviderTest(unittest.TestCase):
         Parse taxonomy file and get node/edge dicts
         """
 
-        TaxNode.parse_taxfile(input_dir)
-        SeqNode.parse_fastas(input_dir)
+        taxonomy = SILVATaxonomy.parse_taxfile(input_dir)
+        with SILVASequences(input_dir) as sequences:
+            node_prov = SILVANodeProvider(taxonomy, sequences)
+            edge_prov = SILVAEdgeProvider(taxonomy, sequences)
 
-        node_prov = SILVANodeProvider()
-        edge_prov = SILVAEdgeProvider()
+            nodes = []
+            edges = []
 
-        nodes = []
-        edges = []
+            for node in iter(node_prov):
+                nodes.append(node)
 
-        for node in iter(node_prov):
-            nodes.append(node)
-
-        for edge in iter(edge_prov):
-            edges.append(edge)
+            for edge in iter(edge_prov):
+                edges.append(edge)
 
         return nodes, edges
 
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+
+# Calculates the differences between two releases of a taxonomy without a database and writes
+# them to a delta file, which can be applied with relation_engine/batchload/apply_delta_file.py.
+# Use -h for help.
+
+import argparse
+import gzip
+from contextlib import ExitStack
+
+from relation_engine.batchload.graph_delta import diff_graphs
+from relation_engine.taxa.gtdb.parsers import GTDBNodeProvider, GTDBEdgeProvider
+from relation_engine.taxa.ncbi.loaders.ncbi_taxa_delta_loader import (
+    NAMES_IN_FILE,
+    NODES_IN_FILE,
+    MERGED_IN_FILE,
+)
+from relation_engine.taxa.ncbi.parsers import (
+    NCBINodeProvider,
+    NCBIEdgeProvider,
+    NCBIMergeProvider,
+    NCBITaxDump,
+)
+from relation_engine.taxa.rdp.parsers import RDPNodeProvider, RDPEdgeProvider
+from relation_engine.version import VERSION
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="""
+Calculate the node, edge, and merge changes between two releases of a taxonomy and write them to
+a delta file that can be applied to a database containing the old release.
+""".strip())
+    parser.add_argument('--version', action='version', version=VERSION)
+    sub = parser.add_subparsers(dest='source', required=True)
+
+    ncbi = sub.add_parser('ncbi', help='diff two NCBI taxonomy dumps.')
+    ncbi.add_argument('--old-dir', required=True,
+                      help='the directory containing the unzipped old taxonomy dump, or the '
+                      + 'dump zip archive.')
+    ncbi.add_argument('--new-dir', required=True,
+                      help='the directory containing the unzipped new taxonomy dump, or the '
+                      + 'dump zip archive.')
+
+    gtdb = sub.add_parser('gtdb', help='diff two GTDB releases.')
+    for rel in ('old', 'new'):
+        gtdb.add_argument(f'--{rel}-bac-file', required=True,
+                          help=f'the {rel} GTDB bacterial taxonomy file.')
+        gtdb.add_argument(f'--{rel}-ar-file', required=True,
+                          help=f'the {rel} GTDB archaeal taxonomy file.')
+
+    rdp = sub.add_parser('rdp', help='diff two RDP releases.')
+    for rel in ('old', 'new'):
+        for mol, example in (('16S', 'current_Bacteria_unaligned.fa.gz'),
+                             ('28S', 'current_Fungi_unaligned.fa.gz')):
+            rdp.add_argument(f'--{rel}-file-{mol}', action='append', default=[],
+                             help=f'a {rel} RDP taxonomy gzipped FASTA file containing {mol} '
+                             + f'data, e.g. {example}. This option may be specified more than '
+                             + 'once.')
+
+    for p in (ncbi, gtdb, rdp):
+        p.add_argument('--output', required=True, help='the path of the delta file to write.')
+        p.add_argument('--base-version', required=True,
+                       help='the load version of the old release in the database to which the '
+                       + 'delta file will be applied.')
+        p.add_argument('--temp-dir',
+                       help='the directory in which to sort the releases. Defaults to the '
+                       + 'system temporary directory.')
+    return parser.parse_args()
+
+
+def _ncbi_release(stack, path):
+    dump = stack.enter_context(NCBITaxDump(path))
+    return (NCBINodeProvider(dump.open(NAMES_IN_FILE), dump.open(NODES_IN_FILE)),
+            NCBIEdgeProvider(dump.open(NODES_IN_FILE)),
+            NCBIMergeProvider(dump.open(MERGED_IN_FILE)))
+
+
+def _gtdb_release(stack, bac, ar):
+    def open_(f):
+        return stack.enter_context(open(f))
+
+    return (GTDBNodeProvider(open_(bac), open_(ar)),
+            GTDBEdgeProvider(open_(bac), open_(ar)),
+            None)
+
+
+def _rdp_release(stack, files_16S, files_28S):
+    def open_(files):
+        return [stack.enter_context(gzip.open(f, 'rt')) for f in files]
+
+    if not files_16S and not files_28S:
+        raise ValueError('no input files were supplied')
+    return (RDPNodeProvider(open_(files_16S), open_(files_28S)),
+            RDPEdgeProvider(open_(files_16S + files_28S)),
+            None)
+
+
+def main():
+    a = parse_args()
+    with ExitStack() as stack:
+        if a.source == 'ncbi':
+            old = _ncbi_release(stack, a.old_dir)
+            new = _ncbi_release(stack, a.new_dir)
+        elif a.source == 'gtdb':
+            old = _gtdb_release(stack, a.old_bac_file, a.old_ar_file)
+            new = _gtdb_release(stack, a.new_bac_file, a.new_ar_file)
+        else:
+            old = _rdp_release(stack, a.old_file_16S, a.old_file_28S)
+            new = _rdp_release(stack, a.new_file_16S, a.new_file_28S)
+        counts = diff_graphs(old[0], new[0], old[1], new[1], a.output, a.base_version,
+                             old_merges=old[2], new_merges=new[2], temp_dir=a.temp_dir)
+    print(f'Created or changed nodes: {counts["vertices"]}')
+    print(f'Deleted nodes: {counts["deleted_vertices"]}')
+    print(f'New merges: {counts["merges"]}')
+    print(f'Created or changed edges: {counts["edges"]}')
+    print(f'Deleted edges: {counts["deleted_edges"]}')
+
+
+if __name__ == '__main__':
+    main()
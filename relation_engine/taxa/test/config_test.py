@@ -514,6 +514,69 @@ def test_fail_bad_type_release_timestamp():
         + "str"))
 
 
+def test_connection_defaults():
+    cfg = DeltaLoaderConfig(BytesIO(_BASIC_CONFIG), ["input_file"])
+
+    assert cfg.urls == ("http://localhost:12354",)
+    assert cfg.pool_size == 10
+    assert cfg.keep_alive is True
+    assert cfg.request_timeout_sec == 60
+    assert cfg.compress_requests is False
+    assert cfg.state_cache_file is None
+
+
+def test_state_cache_file():
+    cfgfile = BytesIO(_BASIC_CONFIG.replace(
+        b'input_file = "./bar.txt"',
+        b'input_file = "./bar.txt"\nstate-cache-file = "  /tmp/cache.db "'))
+    cfg = DeltaLoaderConfig(cfgfile, ["input_file"])
+
+    assert cfg.state_cache_file == Path("/tmp/cache.db")
+    assert cfg.inputs == {"input_file": Path("./bar.txt")}
+
+
+def test_connection_settings_success():
+    cfgfile = BytesIO(_BASIC_CONFIG.replace(
+        b'url = "http://localhost:12354"',
+        "\n".join([
+            'url = ["  http://coord1:8529  ", "http://coord2:8529"]',
+            "pool-size = 32",
+            "keep-alive = false",
+            "request-timeout-sec = 300",
+            "compress-requests = true",
+        ]).encode("utf-8")))
+    cfg = DeltaLoaderConfig(cfgfile, ["input_file"])
+
+    assert cfg.urls == ("http://coord1:8529", "http://coord2:8529")
+    assert cfg.url == "http://coord1:8529"
+    assert cfg.pool_size == 32
+    assert cfg.keep_alive is False
+    assert cfg.request_timeout_sec == 300
+    assert cfg.compress_requests is True
+
+
+def test_fail_bad_connection_settings():
+    for line, err in [
+        ("url = []", "Illegal value for key url in section Arango, which expects a string or a "
+         + "non-empty list of strings"),
+        ('url = ["http://coord1:8529", "  "]', "Illegal value for key url in section Arango, "
+         + "which expects a string or a non-empty list of strings"),
+        ("pool-size = 0", "Illegal value for key pool-size in section Arango, which must be at "
+         + "least 1: 0"),
+        ('keep-alive = "yes"', "Illegal type for key keep-alive in section Arango, which "
+         + "expects a boolean: str"),
+        ("request-timeout-sec = 1.5", "Illegal value for key request-timeout-sec in section "
+         + "Arango, which expects an integer: 1.5"),
+    ]:
+        key = line.split(" ")[0].encode("utf-8")
+        cfg = _BASIC_CONFIG
+        if key == b"url":
+            cfg = cfg.replace(b'url = "http://localhost:12354"', line.encode("utf-8"))
+        else:
+            cfg = cfg.replace(b'database = "mydb"', b'database = "mydb"\n' + line.encode("utf-8"))
+        _fail_config(BytesIO(cfg), ["input_file"], False, ValueError(err))
+
+
 def _fail_config(config_file, input_keys, require_merge_collection, expected):
     with raises(Exception) as got:
         DeltaLoaderConfig(config_file, input_keys, require_merge_collection)
@@ -0,0 +1,63 @@
+from pytest import raises
+
+from relation_engine.taxa.lineage_cache import LineageCache
+from relation_engine.test.testing_helpers import assert_exception_correct
+
+
+def test_get():
+    calls = []
+
+    def parse(lineage):
+        calls.append(lineage)
+        return tuple(lineage.split(";"))
+
+    cache = LineageCache(parse)
+    assert cache.get_stats() == {"hits": 0, "misses": 0, "size": 0, "hit_rate": None}
+    assert cache.format_stats() == (
+        "lineage cache: 0 hits, 0 misses, hit rate n/a, 0 lineages cached")
+
+    assert cache.get("a;b") == ("a", "b")
+    assert cache.get("a;c") == ("a", "c")
+    res = cache.get("a;b")
+    assert res == ("a", "b")
+    assert res is cache.get("a;b")
+
+    assert calls == ["a;b", "a;c"]
+    assert cache.get_stats() == {"hits": 2, "misses": 2, "size": 2, "hit_rate": 0.5}
+    assert cache.format_stats() == (
+        "lineage cache: 2 hits, 2 misses, hit rate 50.0%, 2 lineages cached")
+
+
+def test_get_evicts_least_recently_used():
+    calls = []
+
+    def parse(lineage):
+        calls.append(lineage)
+        return lineage
+
+    cache = LineageCache(parse, max_size=2)
+    for lin in ["a", "b", "a", "c", "b", "a"]:
+        assert cache.get(lin) == lin
+
+    # b is evicted by c, then a by b
+    assert calls == ["a", "b", "c", "b", "a"]
+    assert cache.get_stats() == {"hits": 1, "misses": 5, "size": 2, "hit_rate": 1 / 6}
+
+
+def test_get_does_not_cache_errors():
+    def parse(lineage):
+        raise ValueError(f"bad lineage {lineage}")
+
+    cache = LineageCache(parse)
+    for _ in range(2):
+        with raises(Exception) as got:
+            cache.get("x")
+        assert_exception_correct(got.value, ValueError("bad lineage x"))
+    assert cache.get_stats() == {"hits": 0, "misses": 2, "size": 0, "hit_rate": 0}
+
+
+def test_init_fail():
+    for size in [0, -1]:
+        with raises(Exception) as got:
+            LineageCache(lambda x: x, max_size=size)
+        assert_exception_correct(got.value, ValueError("max_size must be at least 1"))
@@ -0,0 +1,590 @@
+#!/usr/bin/env python
+
+"""
+An in memory stand-in for an ArangoDB server that implements the subset of the ArangoDB HTTP API
+used by the time travelling loaders and their tests, with optional injected latency.
+
+It is intended for running the ArangoDB tests and benchmarking loader strategies, such as
+batching and concurrency, on a developer machine. It is not a database - there is no
+persistence, query planning, or transaction support - and only the AQL queries that the loaders
+issue are supported, matched by their text. Other queries fail with an error.
+
+To run the tests against the stand-in, start it on the default ArangoDB port:
+
+    python -m relation_engine.test.arango_standin
+
+It can also be run in a thread, e.g. for benchmarks:
+
+    standin = ArangoStandin(latency_ms=2)
+    url = standin.start_in_thread()
+    ...
+    standin.stop()
+"""
+
+import argparse
+import asyncio
+import collections
+import itertools
+import json
+import threading
+import time
+
+from aiohttp import web
+
+from relation_engine.batchload import time_travelling_database as _ttdb
+
+DEFAULT_PORT = 8529
+
+_SYSTEM_DB = '_system'
+_TYPE_DOCUMENT = 2
+_TYPE_EDGE = 3
+_CURSOR_BATCH_SIZE = 1000
+
+# ArangoDB error numbers
+_ERR_NOT_IMPLEMENTED = 9
+_ERR_DOC_NOT_FOUND = 1202
+_ERR_COL_NOT_FOUND = 1203
+_ERR_DUPLICATE_NAME = 1207
+_ERR_UNIQUE_CONSTRAINT = 1210
+_ERR_DB_NOT_FOUND = 1228
+_ERR_EDGE_ATTRIBUTE_MISSING = 1233
+_ERR_QUERY_PARSE = 1501
+_ERR_CURSOR_NOT_FOUND = 1600
+_ERR_INDEX_HINT = 1566
+
+
+class _ArangoError(Exception):
+
+    def __init__(self, http_code, error_num, message):
+        super().__init__(message)
+        self.http_code = http_code
+        self.error_num = error_num
+
+
+def _not_found(col_name):
+    return _ArangoError(404, _ERR_COL_NOT_FOUND, f'collection or view not found: {col_name}')
+
+
+def _normalize(query):
+    return ' '.join(query.split())
+
+
+class _Collection:
+
+    def __init__(self, name, col_id, edge):
+        self.name = name
+        self.id = col_id
+        self.edge = edge
+        self.docs = {}
+        self.indexes = [{
+            'id': f'{name}/0',
+            'name': 'primary',
+            'type': 'primary',
+            'fields': ['_key'],
+            'unique': True,
+            'sparse': False,
+        }]
+        if edge:
+            self.indexes.append({
+                'id': f'{name}/1',
+                'name': 'edge',
+                'type': 'edge',
+                'fields': ['_from', '_to'],
+                'unique': False,
+                'sparse': False,
+            })
+
+    def info(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'isSystem': False,
+            'status': 3,
+            'type': _TYPE_EDGE if self.edge else _TYPE_DOCUMENT,
+            'globallyUniqueId': f'h{self.id}/{self.name}',
+        }
+
+
+class ArangoStandin:
+    """
+    The stand-in server. All data is held in memory and is lost when the server stops.
+
+    Properties:
+    request_counts - a collections.Counter of HTTP method and path template, e.g.
+      ('post', '/_api/cursor'), to the number of requests received.
+    max_concurrent_requests - the maximum number of requests in progress at once.
+    """
+
+    def __init__(self, latency_ms=0, import_latency_per_doc_us=0):
+        """
+        latency_ms - latency to add to every request in milliseconds.
+        import_latency_per_doc_us - latency to add to bulk imports per document in
+          microseconds.
+        """
+        if latency_ms < 0 or import_latency_per_doc_us < 0:
+            raise ValueError('latency cannot be negative')
+        self._latency_sec = latency_ms / 1000
+        self._import_latency_per_doc_sec = import_latency_per_doc_us / 1000000
+        self._dbs = {_SYSTEM_DB: {}}
+        self._ids = itertools.count(1000)
+        self._cursors = {}
+        self._in_flight = 0
+        self.request_counts = collections.Counter()
+        self.max_concurrent_requests = 0
+        self._queries = {_normalize(q): h for q, h in [
+            (_ttdb._INSERT_AQL, self._aql_insert),
+            (_ttdb._UPDATE_AQL, self._aql_update),
+            (_ttdb._GET_DOCUMENTS_AQL, self._aql_get_documents),
+            (_ttdb._EXPIRE_EXTANT_DOCUMENTS_AQL, self._aql_expire_extant),
+            (_ttdb._GET_EXTANT_DOCUMENTS_AQL, self._aql_get_extant),
+            (_ttdb._GET_EXTANT_DOCUMENTS_BY_ID_AQL, self._aql_get_extant_by_id),
+            (_ttdb._GET_REGISTERED_LOADS_AQL, self._aql_get_registered_loads),
+            (_ttdb._DELETE_CREATED_DOCUMENTS_AQL, self._aql_delete_created),
+            (_ttdb._UNDO_EXPIRE_DOCUMENTS_AQL, self._aql_undo_expire),
+            (_ttdb._RESET_LAST_VERSION_AQL, self._aql_reset_last_version),
+            ('FOR d IN @@col FILTER d._key IN @keys RETURN d._key', self._aql_get_keys),
+            ('FOR d IN @@col RETURN d', self._aql_all),
+        ]}
+        self._routes = [
+            ('get', ('_api', 'collection'), self._list_collections),
+            ('post', ('_api', 'collection'), self._create_collection),
+            ('get', ('_api', 'collection', None, 'properties'), self._collection_properties),
+            ('get', ('_api', 'collection', None, 'count'), self._collection_count),
+            ('delete', ('_api', 'collection', None), self._delete_collection),
+            ('post', ('_api', 'database'), self._create_database),
+            ('delete', ('_api', 'database', None), self._delete_database),
+            ('get', ('_api', 'index'), self._list_indexes),
+            ('post', ('_api', 'index'), self._create_index),
+            ('post', ('_api', 'import'), self._import),
+            ('post', ('_api', 'cursor'), self._create_cursor),
+            ('put', ('_api', 'cursor', None), self._next_batch),
+            ('post', ('_api', 'cursor', None), self._next_batch),
+            ('delete', ('_api', 'cursor', None), self._delete_cursor),
+            ('post', ('_api', 'document', None), self._insert_document),
+            ('get', ('_api', 'document', None, None), self._get_document),
+            ('delete', ('_api', 'document', None, None), self._delete_document),
+            ('put', ('_api', 'simple', 'remove-by-example'), self._remove_by_example),
+        ]
+        self.app = web.Application(client_max_size=1024 ** 3)
+        self.app.router.add_route('*', '/{path:.*}', self._handle)
+        self._thread = None
+        self._loop = None
+        self._runner = None
+
+    ##########################
+    # Server lifecycle
+    ##########################
+
+    async def start(self, host='localhost', port=DEFAULT_PORT):
+        """
+        Start the server in the running event loop. Returns the server URL.
+        """
+        self._runner = web.AppRunner(self.app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        return f'http://{host}:{port}'
+
+    async def close(self):
+        """
+        Stop a server started with start().
+        """
+        await self._runner.cleanup()
+
+    def start_in_thread(self, host='localhost', port=0):
+        """
+        Start the server in a daemon thread with its own event loop. Returns the server URL.
+
+        port - the port for the server. The default of 0 selects a free port.
+        """
+        started = threading.Event()
+        result = {}
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            try:
+                result['url'] = self._loop.run_until_complete(self.start(host, port))
+            except BaseException as e:
+                result['err'] = e
+                return
+            finally:
+                started.set()
+            self._loop.run_forever()
+            self._loop.run_until_complete(self.close())
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        started.wait()
+        if 'err' in result:
+            raise result['err']
+        return result['url']
+
+    def stop(self):
+        """
+        Stop a server started with start_in_thread().
+        """
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    ##########################
+    # Request handling
+    ##########################
+
+    async def _handle(self, request):
+        self._in_flight += 1
+        self.max_concurrent_requests = max(self.max_concurrent_requests, self._in_flight)
+        try:
+            if self._latency_sec:
+                await asyncio.sleep(self._latency_sec)
+            status, body = await self._dispatch(request)
+        except _ArangoError as e:
+            status, body = e.http_code, {
+                'error': True,
+                'code': e.http_code,
+                'errorNum': e.error_num,
+                'errorMessage': str(e)
+            }
+        finally:
+            self._in_flight -= 1
+        return web.json_response(body, status=status)
+
+    async def _dispatch(self, request):
+        parts = [p for p in request.path.split('/') if p]
+        dbname = _SYSTEM_DB
+        if parts[:1] == ['_db'] and len(parts) > 1:
+            dbname = parts[1]
+            parts = parts[2:]
+        method = request.method.lower()
+        for rmethod, template, handler in self._routes:
+            if rmethod == method and _matches(template, parts):
+                self.request_counts[(method, '/' + '/'.join(t or '{}' for t in template))] += 1
+                if dbname not in self._dbs:
+                    raise _ArangoError(404, _ERR_DB_NOT_FOUND, 'database not found')
+                args = [p for t, p in zip(template, parts) if t is None]
+                return await handler(request, self._dbs[dbname], *args)
+        raise _ArangoError(501, _ERR_NOT_IMPLEMENTED,
+                           f'{request.method} {request.path} is not supported by the stand-in')
+
+    ##########################
+    # Databases and collections
+    ##########################
+
+    async def _create_database(self, request, _):
+        name = (await request.json())['name']
+        if name in self._dbs:
+            raise _ArangoError(409, _ERR_DUPLICATE_NAME, 'duplicate database name')
+        self._dbs[name] = {}
+        return 201, {'error': False, 'code': 201, 'result': True}
+
+    async def _delete_database(self, request, _, name):
+        if name not in self._dbs or name == _SYSTEM_DB:
+            raise _ArangoError(404, _ERR_DB_NOT_FOUND, 'database not found')
+        del self._dbs[name]
+        return 200, {'error': False, 'code': 200, 'result': True}
+
+    async def _list_collections(self, request, db):
+        return 200, {'error': False, 'code': 200, 'result': [c.info() for c in db.values()]}
+
+    async def _create_collection(self, request, db):
+        body = await request.json()
+        name = body['name']
+        if name in db:
+            raise _ArangoError(409, _ERR_DUPLICATE_NAME, 'duplicate name')
+        db[name] = _Collection(name, str(next(self._ids)), body.get('type') == _TYPE_EDGE)
+        return 200, dict(db[name].info(), error=False, code=200)
+
+    async def _delete_collection(self, request, db, name):
+        col = _get_col(db, name)
+        del db[name]
+        return 200, {'error': False, 'code': 200, 'id': col.id}
+
+    async def _collection_properties(self, request, db, name):
+        return 200, dict(_get_col(db, name).info(), error=False, code=200, waitForSync=False)
+
+    async def _collection_count(self, request, db, name):
+        col = _get_col(db, name)
+        return 200, dict(col.info(), error=False, code=200, count=len(col.docs))
+
+    async def _list_indexes(self, request, db):
+        col = _get_col(db, request.query.get('collection'))
+        return 200, {'error': False, 'code': 200, 'indexes': col.indexes}
+
+    async def _create_index(self, request, db):
+        col = _get_col(db, request.query.get('collection'))
+        body = await request.json()
+        if body.get('type') not in ('persistent', 'hash', 'skiplist'):
+            raise _ArangoError(501, _ERR_NOT_IMPLEMENTED,
+                               f'index type {body.get("type")} is not supported by the stand-in')
+        idx_id = next(self._ids)
+        idx = {
+            'id': f'{col.name}/{idx_id}',
+            'name': body.get('name') or f'idx_{idx_id}',
+            # hash and skiplist are aliases for persistent in current ArangoDB versions
+            'type': 'persistent',
+            'fields': body['fields'],
+            'unique': body.get('unique', False),
+            'sparse': body.get('sparse', False),
+        }
+        col.indexes.append(idx)
+        return 201, dict(idx, isNewlyCreated=True, error=False, code=201)
+
+    ##########################
+    # Documents
+    ##########################
+
+    def _store(self, col, doc):
+        if col.edge and not (isinstance(doc.get('_from'), str)
+                             and isinstance(doc.get('_to'), str)):
+            raise _ArangoError(400, _ERR_EDGE_ATTRIBUTE_MISSING, 'edge attribute missing or invalid')
+        doc = dict(doc)
+        doc['_key'] = str(doc.get('_key') or next(self._ids))
+        doc['_id'] = f'{col.name}/{doc["_key"]}'
+        doc['_rev'] = f'_{next(self._ids)}'
+        col.docs[doc['_key']] = doc
+        return doc
+
+    def _update(self, col, key, update):
+        doc = dict(col.docs[key])
+        doc.update({k: v for k, v in update.items() if k not in ('_key', '_id', '_rev')})
+        return self._store(col, doc)
+
+    async def _insert_document(self, request, db, name):
+        col = _get_col(db, name)
+        doc = await request.json()
+        if doc.get('_key') in col.docs:
+            raise _ArangoError(409, _ERR_UNIQUE_CONSTRAINT, 'unique constraint violated')
+        doc = self._store(col, doc)
+        return 202, {k: doc[k] for k in ('_id', '_key', '_rev')}
+
+    async def _get_document(self, request, db, name, key):
+        doc = _get_doc(_get_col(db, name), key)
+        return 200, doc
+
+    async def _delete_document(self, request, db, name, key):
+        col = _get_col(db, name)
+        doc = _get_doc(col, key)
+        del col.docs[key]
+        return 202, {k: doc[k] for k in ('_id', '_key', '_rev')}
+
+    async def _remove_by_example(self, request, db):
+        body = await request.json()
+        col = _get_col(db, body['collection'])
+        example = body.get('example') or {}
+        keys = [k for k, d in col.docs.items()
+                if all(d.get(f) == v for f, v in example.items())][:body.get('limit') or None]
+        for k in keys:
+            del col.docs[k]
+        return 200, {'error': False, 'code': 200, 'deleted': len(keys)}
+
+    async def _import(self, request, db):
+        col = _get_col(db, request.query.get('collection'))
+        body = await request.text()
+        if request.query.get('type') == 'documents':
+            docs = [json.loads(line) for line in body.splitlines() if line.strip()]
+        else:
+            docs = json.loads(body)
+        if self._import_latency_per_doc_sec:
+            await asyncio.sleep(len(docs) * self._import_latency_per_doc_sec)
+        on_dup = request.query.get('onDuplicate', 'error')
+        complete = _bool_param(request.query.get('complete'))
+        res = {'error': False, 'created': 0, 'errors': 0, 'empty': 0, 'updated': 0,
+               'ignored': 0, 'details': []}
+        if complete:
+            # validate before writing anything as the import is all or nothing
+            trial = _Collection(col.name, col.id, col.edge)
+            trial.docs = dict(col.docs)
+            self._import_docs(trial, docs, on_dup, res)
+            if res['errors']:
+                raise _ArangoError(409, _ERR_UNIQUE_CONSTRAINT, res['details'][0])
+            res = dict(res, created=0, updated=0, ignored=0, empty=0)
+        self._import_docs(col, docs, on_dup, res)
+        if not _bool_param(request.query.get('details')):
+            del res['details']
+        return 201, res
+
+    def _import_docs(self, col, docs, on_dup, res):
+        for i, d in enumerate(docs):
+            key = d.get('_key')
+            try:
+                if not d:
+                    res['empty'] += 1
+                elif key is None or key not in col.docs:
+                    self._store(col, d)
+                    res['created'] += 1
+                elif on_dup == 'update':
+                    self._update(col, key, d)
+                    res['updated'] += 1
+                elif on_dup == 'replace':
+                    self._store(col, d)
+                    res['updated'] += 1
+                elif on_dup == 'ignore':
+                    res['ignored'] += 1
+                else:
+                    raise _ArangoError(409, _ERR_UNIQUE_CONSTRAINT, 'unique constraint violated')
+            except _ArangoError as e:
+                res['errors'] += 1
+                res['details'].append(f'at position {i}: creating document failed with error '
+                                      + f"'{e}', offending document: {json.dumps(d)}")
+
+    ##########################
+    # AQL
+    ##########################
+
+    async def _create_cursor(self, request, db):
+        body = await request.json()
+        handler = self._queries.get(_normalize(body['query']))
+        if not handler:
+            raise _ArangoError(400, _ERR_QUERY_PARSE,
+                               f'query is not supported by the stand-in: {body["query"]}')
+        bind_vars = body.get('bindVars') or {}
+        results = handler(_get_col(db, bind_vars.get('@col')), bind_vars)
+        return 201, self._cursor(results, body.get('batchSize') or _CURSOR_BATCH_SIZE)
+
+    def _cursor(self, results, batch_size, cursor_id=None):
+        batch, rest = results[:batch_size], results[batch_size:]
+        ret = {'error': False, 'code': 201, 'result': batch, 'hasMore': bool(rest),
+               'cached': False, 'extra': {'warnings': [], 'stats': {}}}
+        if cursor_id:
+            self._cursors.pop(cursor_id)
+        if rest:
+            cursor_id = cursor_id or str(next(self._ids))
+            self._cursors[cursor_id] = (rest, batch_size)
+            ret['id'] = cursor_id
+        return ret
+
+    async def _next_batch(self, request, db, cursor_id):
+        if cursor_id not in self._cursors:
+            raise _ArangoError(404, _ERR_CURSOR_NOT_FOUND, 'cursor not found')
+        results, batch_size = self._cursors[cursor_id]
+        return 200, self._cursor(results, batch_size, cursor_id)
+
+    async def _delete_cursor(self, request, db, cursor_id):
+        if not self._cursors.pop(cursor_id, None):
+            raise _ArangoError(404, _ERR_CURSOR_NOT_FOUND, 'cursor not found')
+        return 202, {'error': False, 'code': 202, 'id': cursor_id}
+
+    def _aql_insert(self, col, bind_vars):
+        if bind_vars['d'].get('_key') in col.docs:
+            raise _ArangoError(409, _ERR_UNIQUE_CONSTRAINT, 'unique constraint violated')
+        self._store(col, bind_vars['d'])
+        return []
+
+    def _aql_update(self, col, bind_vars):
+        key = bind_vars['d'].get('_key')
+        _get_doc(col, key)
+        self._update(col, key, bind_vars['d'])
+        return []
+
+    def _aql_get_documents(self, col, bv):
+        if not any(i['name'] == bv['id_idx'] for i in col.indexes):
+            raise _ArangoError(400, _ERR_INDEX_HINT, f'could not use index hint {bv["id_idx"]}')
+        ids = set(bv['ids'])
+        ts = bv['timestamp']
+        return [d for d in col.docs.values()
+                if d.get('id') in ids and _gte(d.get('expired'), ts) and _lte(d.get('created'), ts)]
+
+    def _aql_expire_extant(self, col, bv):
+        ts = bv['timestamp']
+        for d in list(col.docs.values()):
+            if (_gte(d.get('expired'), ts) and _lte(d.get('created'), ts)
+                    and d.get('last_version') != bv['version']):
+                self._update(col, d['_key'], {'expired': ts, 'release_expired': bv['reltimestamp']})
+        return []
+
+    def _aql_get_extant(self, col, bv):
+        ts = bv['timestamp']
+        return [{k: d[k] for k in ('_key', '_from', '_to') if k in d}
+                for d in col.docs.values()
+                if _gte(d.get('expired'), ts) and _lte(d.get('created'), ts)
+                and d.get('last_version') != bv['version']]
+
+    def _aql_get_extant_by_id(self, col, bv):
+        if not any(i['name'] == bv['id_idx'] for i in col.indexes):
+            raise _ArangoError(400, _ERR_INDEX_HINT, f'could not use index hint {bv["id_idx"]}')
+        ts = bv['timestamp']
+        return sorted((d for d in col.docs.values()
+                       if _gte(d.get('expired'), ts) and _lte(d.get('created'), ts)),
+                      key=lambda d: d.get('id'))
+
+    def _aql_get_registered_loads(self, col, bv):
+        docs = [d for d in col.docs.values() if d.get('load_namespace') == bv['load_namespace']]
+        return sorted(docs, key=lambda d: d.get('load_timestamp'), reverse=True)
+
+    def _aql_delete_created(self, col, bv):
+        for k in [k for k, d in col.docs.items() if d.get('created') == bv['timestamp']]:
+            del col.docs[k]
+        return []
+
+    def _aql_undo_expire(self, col, bv):
+        for d in [d for d in col.docs.values() if d.get('expired') == bv['timestamp']]:
+            self._update(col, d['_key'], {'expired': _ttdb._MAX_ADB_INTEGER,
+                                          'release_expired': _ttdb._MAX_ADB_INTEGER})
+        return []
+
+    def _aql_reset_last_version(self, col, bv):
+        for d in [d for d in col.docs.values() if d.get('last_version') == bv['last_version']]:
+            self._update(col, d['_key'], {'last_version': bv['new_last']})
+        return []
+
+    def _aql_get_keys(self, col, bv):
+        return [k for k in bv['keys'] if k in col.docs]
+
+    def _aql_all(self, col, bv):
+        return list(col.docs.values())
+
+
+def _matches(template, parts):
+    return len(template) == len(parts) and all(t is None or t == p for t, p in zip(template, parts))
+
+
+def _bool_param(val):
+    # python-arango sends booleans as 1 and 0
+    return val in ('true', '1')
+
+
+def _get_col(db, name):
+    if name not in db:
+        raise _not_found(name)
+    return db[name]
+
+
+def _get_doc(col, key):
+    if key not in col.docs:
+        raise _ArangoError(404, _ERR_DOC_NOT_FOUND, 'document not found')
+    return col.docs[key]
+
+
+# AQL compares null / missing values as less than numbers
+def _gte(val, ts):
+    return val is not None and val >= ts
+
+
+def _lte(val, ts):
+    return val is None or val <= ts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="""
+Run an in memory stand-in for an ArangoDB server for testing and benchmarking the loaders.
+""".strip())
+    parser.add_argument('--host', default='localhost', help='the host to listen on')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='the port to listen on')
+    parser.add_argument('--latency-ms', type=float, default=0,
+                        help='latency to add to every request in milliseconds')
+    parser.add_argument('--import-latency-per-doc-us', type=float, default=0,
+                        help='latency to add to bulk imports per document in microseconds')
+    a = parser.parse_args()
+    standin = ArangoStandin(a.latency_ms, a.import_latency_per_doc_us)
+    url = standin.start_in_thread(a.host, a.port)
+    print(f'ArangoDB stand-in listening at {url}', flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        standin.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+import time
+from arango import ArangoClient
+from arango.exceptions import AQLQueryExecuteError
+from pytest import fixture, raises
+
+from relation_engine.test.arango_standin import ArangoStandin
+from relation_engine.test.testing_helpers import assert_exception_correct
+
+# The stand-in is mostly tested by running the ArangoDB integration tests against it.
+
+
+@fixture
+def standin():
+    s = ArangoStandin()
+    url = s.start_in_thread()
+    client = ArangoClient(hosts=url)
+    client.db('_system').create_database('db')
+    yield s, client.db('db', verify=True)
+    s.stop()
+
+
+def test_import_bulk(standin):
+    _, db = standin
+    col = db.create_collection('c')
+    res = col.import_bulk([{'_key': '1', 'a': 1, 'b': 2}, {'_key': '2'}, {}])
+    assert (res['created'], res['empty'], res['errors']) == (2, 1, 0)
+
+    res = col.import_bulk([{'_key': '1', 'a': 3}, {'_key': '3'}], on_duplicate='update')
+    assert (res['created'], res['updated']) == (1, 1)
+    doc = col.get('1')
+    del doc['_rev']
+    assert doc == {'_key': '1', '_id': 'c/1', 'a': 3, 'b': 2}
+
+    res = col.import_bulk([{'_key': '3'}, {'_key': '4'}], halt_on_error=False)
+    assert (res['created'], res['errors']) == (1, 1)
+    assert res['details'][0].startswith(
+        "at position 0: creating document failed with error 'unique constraint violated'")
+    assert col.count() == 4
+
+
+def test_edge_import_requires_from_and_to(standin):
+    _, db = standin
+    col = db.create_collection('e', edge=True)
+    res = col.import_bulk([{'_key': '1'}, {'_key': '2', '_from': 'v/1', '_to': 'v/2'}],
+                          halt_on_error=False)
+    assert (res['created'], res['errors']) == (1, 1)
+
+
+def test_cursor_batches(standin):
+    _, db = standin
+    col = db.create_collection('c')
+    col.import_bulk([{'_key': str(i)} for i in range(25)])
+    cur = db.aql.execute('FOR d IN @@col FILTER d._key IN @keys RETURN d._key',
+                         bind_vars={'@col': 'c', 'keys': [str(i) for i in range(30)]},
+                         batch_size=10)
+    assert list(cur) == [str(i) for i in range(25)]
+
+
+def test_unsupported_query(standin):
+    _, db = standin
+    db.create_collection('c')
+    with raises(Exception) as got:
+        db.aql.execute('FOR d IN @@col FILTER d.foo == 1 RETURN d', bind_vars={'@col': 'c'})
+    assert isinstance(got.value, AQLQueryExecuteError)
+    assert got.value.error_code == 1501
+
+
+def test_latency():
+    s = ArangoStandin(latency_ms=50)
+    url = s.start_in_thread()
+    try:
+        db = ArangoClient(hosts=url).db('_system')
+        t = time.time()
+        db.collections()
+        assert time.time() - t >= 0.05
+        assert s.request_counts[('get', '/_api/collection')] == 1
+        assert s.max_concurrent_requests == 1
+    finally:
+        s.stop()
+
+
+def test_fail_negative_latency():
+    for args in [(-1, 0), (0, -1)]:
+        with raises(Exception) as got:
+            ArangoStandin(*args)
+        assert_exception_correct(got.value, ValueError('latency cannot be negative'))
@@ -2,4 +2,4 @@
 The version of the software.
 '''
 
-VERSION = '2.0.0'
+VERSION = '2.1.0'